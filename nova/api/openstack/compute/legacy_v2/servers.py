@@ -216,9 +216,10 @@ class Controller(wsgi.Controller):
         expected_attrs = None
         if is_detail:
             # merge our expected attrs with what the view builder needs for
-            # showing details
+            # showing details, the faults being loaded for the whole list
+            # with a single query
             expected_attrs = self._view_builder.get_show_expected_attrs(
-                                                                expected_attrs)
+                                                                ['fault'])
 
         try:
             instance_list = self.compute_api.get_all(elevated or context,
@@ -234,7 +235,6 @@ class Controller(wsgi.Controller):
 
         if is_detail:
             instance_list._context = context
-            instance_list.fill_faults()
             response = self._view_builder.detail(req, instance_list)
         else:
             response = self._view_builder.index(req, instance_list)
@@ -149,19 +149,6 @@ def get_instances_to_sync(context, updated_since=None, project_id=None,
     cells services aren't self-healing the same instances in nearly
     lockstep.
     """
-    def _get_paginated_instances(context, filters, shuffle, limit, marker):
-        instances = objects.InstanceList.get_by_filters(
-                context, filters, sort_key='deleted', sort_dir='asc',
-                limit=limit, marker=marker)
-        if len(instances) > 0:
-            marker = instances[-1]['uuid']
-            # NOTE(melwitt/alaski): Need a list that supports assignment for
-            # shuffle.  And pop() on the returned result.
-            instances = list(instances)
-            if shuffle:
-                random.shuffle(instances)
-        return instances, marker
-
     filters = {}
     if updated_since is not None:
         filters['changes-since'] = updated_since
@@ -170,21 +157,20 @@ def get_instances_to_sync(context, updated_since=None, project_id=None,
     if not deleted:
         filters['deleted'] = False
     # Active instances first.
-    limit = CONF.cells.instance_update_sync_database_limit
-    marker = None
-
-    instances = []
-    while True:
-        if not instances:
-            instances, marker = _get_paginated_instances(context, filters,
-                    shuffle, limit, marker)
-        if not instances:
-            break
-        instance = instances.pop(0)
-        if uuids_only:
-            yield instance.uuid
-        else:
-            yield instance
+    batches = objects.InstanceList.iter_by_filters(
+        context, filters, CONF.cells.instance_update_sync_database_limit,
+        sort_key='deleted', sort_dir='asc')
+    for instances in batches:
+        # NOTE(melwitt/alaski): Need a list that supports assignment for
+        # shuffle.
+        instances = list(instances)
+        if shuffle:
+            random.shuffle(instances)
+        for instance in instances:
+            if uuids_only:
+                yield instance.uuid
+            else:
+                yield instance
 
 
 def cell_with_item(cell_name, item):
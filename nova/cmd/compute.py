@@ -22,6 +22,7 @@ import traceback
 from oslo_log import log as logging
 from oslo_reports import guru_meditation_report as gmr
 
+from nova.compute import profiler as compute_profiler
 from nova.conductor import rpcapi as conductor_rpcapi
 import nova.conf
 from nova import config
@@ -36,6 +37,7 @@ from nova import version
 
 CONF = nova.conf.CONF
 CONF.import_opt('compute_topic', 'nova.compute.rpcapi')
+CONF.import_opt('periodic_task_profiling', 'nova.compute.manager')
 LOG = logging.getLogger('nova.compute')
 
 
@@ -65,6 +67,10 @@ def main():
         block_db_access()
         objects_base.NovaObject.indirection_api = \
             conductor_rpcapi.ConductorAPI()
+        if CONF.periodic_task_profiling:
+            objects_base.NovaObject.indirection_api = (
+                compute_profiler.CountingIndirectionAPI(
+                    objects_base.NovaObject.indirection_api))
     else:
         LOG.warning(_LW('Conductor local mode is deprecated and will '
                         'be removed in a subsequent release'))
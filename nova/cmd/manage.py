@@ -55,6 +55,7 @@
 from __future__ import print_function
 
 import argparse
+import itertools
 import os
 import sys
 import urllib
@@ -81,6 +82,7 @@ from nova import objects
 from nova.openstack.common import cliutils
 from nova import quota
 from nova import rpc
+from nova.scheduler import profiler
 from nova import servicegroup
 from nova import utils
 from nova import version
@@ -100,6 +102,9 @@ CONF.import_opt('connection', 'oslo_db.options', group='database')
 
 QUOTAS = quota.QUOTAS
 
+# Number of instances read at a time when going through all the instances
+INSTANCE_BATCH_SIZE = 1000
+
 _DEFAULT_LOG_LEVELS = config._DEFAULT_LOG_LEVELS + ['oslo_db=INFO']
 
 
@@ -345,10 +350,17 @@ class FixedIpCommands(object):
             print(_("error: %s") % ex)
             return(2)
 
-        instances = db.instance_get_all(context.get_admin_context())
+        # Only the hostname and host of the instances are kept
         instances_by_uuid = {}
-        for instance in instances:
-            instances_by_uuid[instance['uuid']] = instance
+        batches = db.instance_get_all_by_filters_batched(
+            context.get_admin_context(),
+            {'deleted': False, 'soft_deleted': True}, INSTANCE_BATCH_SIZE,
+            columns_to_join=[])
+        for instances in batches:
+            for instance in instances:
+                instances_by_uuid[instance['uuid']] = {
+                    'hostname': instance['hostname'],
+                    'host': instance['host']}
 
         print("%-18s\t%-15s\t%-15s\t%s" % (_('network'),
                                               _('IP address'),
@@ -690,8 +702,10 @@ class VmCommands(object):
                                              _('index'))))
 
         if host is None:
-            instances = objects.InstanceList.get_by_filters(
-                context.get_admin_context(), {}, expected_attrs=['flavor'])
+            instances = itertools.chain.from_iterable(
+                objects.InstanceList.iter_by_filters(
+                    context.get_admin_context(), {}, INSTANCE_BATCH_SIZE,
+                    expected_attrs=['flavor']))
         else:
             instances = objects.InstanceList.get_by_host(
                 context.get_admin_context(), host, expected_attrs=['flavor'])
@@ -922,6 +936,68 @@ class HostCommands(object):
             print("%-25s\t%-15s" % (h['host'], h['availability_zone']))
 
 
+class SchedulerCommands(object):
+    """Show statistics of the scheduler filters and weighers."""
+
+    def _get_hosts(self, host):
+        if host:
+            return [host]
+        ctxt = context.get_admin_context()
+        return [service['host'] for service in
+                db.service_get_all_by_binary(ctxt, 'nova-scheduler',
+                                             include_disabled=True)]
+
+    @args('--host', metavar='<host>',
+          help='Only show the statistics of the scheduler of this host')
+    @args('--histogram', action='store_true', dest='histogram',
+          default=False,
+          help='Show the histograms of the time spent per request')
+    def profile(self, host=None, histogram=False):
+        """Show the time spent per request by the filters and weighers.
+
+        The statistics are recorded by the schedulers when the
+        scheduler_profiling option is set.
+        """
+        stats = profiler.get_stats(self._get_hosts(host))
+        if not stats:
+            print(_('No scheduler statistics found.'))
+            return 1
+
+        kinds = (profiler.REQUEST, profiler.FILTER, profiler.WEIGHER)
+        stats = sorted(stats.values(),
+                       key=lambda stat: (kinds.index(stat['type']),
+                                         -stat['elapsed_ms']))
+        print_format = "%-8s %-36s %10s %10s %10s %10s %10s %10s"
+        print(print_format % (_('Type'), _('Name'), _('Requests'),
+                              _('Calls'), _('Avg (ms)'), _('Max (ms)'),
+                              _('Hosts in'), _('Hosts out')))
+        for stat in stats:
+            requests = stat['requests']
+            print(print_format % (
+                stat['type'], stat['name'], requests, stat['calls'],
+                '%.2f' % (stat['elapsed_ms'] / requests),
+                '%.2f' % stat['max_ms'],
+                '%.1f' % (float(stat['hosts_in']) / requests),
+                '%.1f' % (float(stat['hosts_out']) / requests)))
+
+        if histogram:
+            bounds = ['<%s' % bound for bound in profiler.HISTOGRAM_BOUNDS]
+            bounds.append('>=%s' % profiler.HISTOGRAM_BOUNDS[-1])
+            print()
+            print(_('Requests per time spent (ms):'))
+            print_format = "%-36s" + " %6s" * len(bounds)
+            print(print_format % tuple([_('Name')] + bounds))
+            for stat in stats:
+                print(print_format % tuple([stat['name']] +
+                                           stat['histogram']))
+
+    @args('--host', metavar='<host>',
+          help='Only reset the statistics of the scheduler of this host')
+    def profile_reset(self, host=None):
+        """Reset the statistics of the filters and weighers."""
+        profiler.reset_stats(self._get_hosts(host))
+
+
 class DbCommands(object):
     """Class for managing the main database."""
 
@@ -1444,6 +1520,7 @@ CATEGORIES = {
     'logs': GetLogCommands,
     'network': NetworkCommands,
     'project': ProjectCommands,
+    'scheduler': SchedulerCommands,
     'service': ServiceCommands,
     'shell': ShellCommands,
     'vm': VmCommands,
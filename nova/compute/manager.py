@@ -26,6 +26,7 @@ terminating it.
 """
 
 import base64
+import collections
 import contextlib
 import functools
 import inspect
@@ -60,6 +61,7 @@ from nova import compute
 from nova.compute import build_results
 from nova.compute import claims
 from nova.compute import power_state
+from nova.compute import profiler as compute_profiler
 from nova.compute import resource_tracker
 from nova.compute import rpcapi as compute_rpcapi
 from nova.compute import task_states
@@ -113,6 +115,29 @@ compute_opts = [
                 help='Whether to batch up the application of IPTables rules'
                      ' during a host restart and apply all at the end of the'
                      ' init phase'),
+    cfg.IntOpt('init_host_instance_concurrency',
+               min=1,
+               default=1,
+               help='Number of instances initialized concurrently when the '
+                    'compute service starts.'),
+    cfg.BoolOpt('init_host_instances_in_background',
+                default=False,
+                help='Whether the compute service starts consuming RPC '
+                     'messages before all its instances are initialized. '
+                     'When enabled, only the instances with an interrupted '
+                     'task are recovered before, the other instances are '
+                     'initialized in the background. The iptables rules '
+                     'deferred by defer_iptables_apply are applied before '
+                     'the background initialization, which does not defer '
+                     'them.'),
+    cfg.BoolOpt('periodic_task_profiling',
+                default=False,
+                help='Whether the wall time of each run of the periodic '
+                     'tasks, and the conductor calls it made along with the '
+                     'number of objects they returned, are sent in a '
+                     'compute.periodic_task.profile notification. A warning '
+                     'is also logged when a task runs for longer than its '
+                     'spacing.'),
     cfg.StrOpt('instances_path',
                default=paths.state_path_def('instances'),
                help='Where instances are stored on disk'),
@@ -148,7 +173,13 @@ compute_opts = [
                     'Starting with Liberty, Cinder can use image volume '
                     'cache. This may help with block device allocation '
                     'performance. Look at the cinder '
-                    'image_volume_cache_enabled configuration option.')
+                    'image_volume_cache_enabled configuration option.'),
+    cfg.BoolOpt('volume_usage_aggregated_notification',
+                default=False,
+                help='Whether the volume usages gathered every '
+                     'volume_usage_poll_interval seconds are sent in a single '
+                     'volume.usage.host notification per compute host, '
+                     'instead of one volume.usage notification per volume.'),
     ]
 
 interval_opts = [
@@ -166,6 +197,19 @@ interval_opts = [
                default=60,
                help="Number of seconds between instance network information "
                     "cache updates"),
+    cfg.IntOpt("heal_instance_info_cache_batch_size",
+               min=1,
+               default=1,
+               help="Number of instances whose network information cache is "
+                    "updated on each run of the periodic task. When greater "
+                    "than 1, the ports of the instances are listed with a "
+                    "single request to Neutron."),
+    cfg.IntOpt("heal_instance_info_cache_concurrency",
+               min=1,
+               default=10,
+               help="Maximum number of network information cache updates "
+                    "running concurrently, when several instances are "
+                    "updated on each run of the periodic task."),
     cfg.IntOpt('reclaim_instance_interval',
                min=0,
                default=0,
@@ -200,6 +244,14 @@ interval_opts = [
                     'that its view of instances is in sync with nova. If the '
                     'CONF option `scheduler_tracks_instance_changes` is '
                     'False, changing this option will have no effect.'),
+    cfg.IntOpt('host_instance_cache_ttl',
+               min=0,
+               default=30,
+               help='Number of seconds during which the periodic tasks share '
+                    'the list of the instances of the host read from the '
+                    'database, instead of each reading it. The list is also '
+                    'dropped whenever an operation on an instance of the '
+                    'host completes. Set to 0 to disable.'),
     cfg.IntOpt('update_resources_interval',
                default=0,
                help='Interval in seconds for updating compute resources. A '
@@ -275,6 +327,8 @@ CONF.import_opt('mksproxy_base_url', 'nova.mks', group='mks')
 CONF.import_opt('destroy_after_evacuate', 'nova.utils', group='workarounds')
 CONF.import_opt('scheduler_tracks_instance_changes',
                 'nova.scheduler.host_manager')
+CONF.import_opt('resource_tracker_batch_nodes',
+                'nova.compute.resource_tracker')
 
 LOG = logging.getLogger(__name__)
 
@@ -405,8 +459,14 @@ def wrap_instance_event(function):
         instance_uuid = keyed_args['instance']['uuid']
 
         event_name = 'compute_{0}'.format(function.__name__)
-        with compute_utils.EventReporter(context, event_name, instance_uuid):
-            return function(self, context, *args, **kwargs)
+        try:
+            with compute_utils.EventReporter(context, event_name,
+                                             instance_uuid):
+                return function(self, context, *args, **kwargs)
+        finally:
+            # The operation may have changed the instances of the host, or
+            # their state, the periodic tasks must not rely on the cached ones
+            self._invalidate_host_instances()
 
     return decorated_function
 
@@ -706,6 +766,9 @@ class ComputeManager(manager.Manager):
         self.instance_events = InstanceEvents()
         self._sync_power_pool = eventlet.GreenPool()
         self._syncs_in_progress = {}
+        self._host_instances = None
+        self._host_instances_attrs = set()
+        self._host_instances_read_at = None
         self.send_instance_updates = CONF.scheduler_tracks_instance_changes
         if CONF.max_concurrent_builds != 0:
             self._build_semaphore = eventlet.semaphore.Semaphore(
@@ -721,6 +784,13 @@ class ComputeManager(manager.Manager):
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
 
+        if CONF.periodic_task_profiling:
+            # NOTE: this shadows the list of the class
+            self._periodic_tasks = [
+                (name, compute_profiler.profile_periodic_task(
+                    task, name, self._periodic_spacing[name], self.notifier))
+                for name, task in self._periodic_tasks]
+
         # NOTE(russellb) Load the driver last.  It may call back into the
         # compute manager via the virtapi, so we want it to be fully
         # initialized before that happens.
@@ -1320,16 +1390,80 @@ class ComputeManager(manager.Manager):
 
         self.init_virt_events()
 
+        background_instances = []
+        if CONF.init_host_instances_in_background:
+            foreground_instances = []
+            for instance in instances:
+                if instance.task_state is None:
+                    background_instances.append(instance)
+                else:
+                    foreground_instances.append(instance)
+        else:
+            foreground_instances = instances
+
         try:
             # checking that instance was not already evacuated to other host
             self._destroy_evacuated_instances(context)
-            for instance in instances:
-                self._init_instance(context, instance)
-        finally:
+            self._init_instances(context, foreground_instances)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._finish_init_host(context, instances)
+
+        if background_instances:
+            # The rules of the instances initialized so far must not wait
+            # for the background initialization, while the service already
+            # handles requests
             if CONF.defer_iptables_apply:
                 self.driver.filter_defer_apply_off()
+            utils.spawn_n(self._init_instances_in_background, context,
+                          background_instances, instances)
+        else:
+            self._finish_init_host(context, instances)
+
+    def _init_instances(self, context, instances):
+        """Initializes the instances during service init, up to
+        init_host_instance_concurrency at a time, and logs the time spent.
+
+        When the initialization of an instance fails, the error is raised
+        once the other instances are initialized.
+        """
+        if not instances:
+            return
+
+        def _init(instance):
+            with timeutils.StopWatch() as timer:
+                self._init_instance(context, instance)
+            LOG.debug('Took %0.2f seconds to initialize the instance.',
+                      timer.elapsed(), instance=instance)
+            return timer.elapsed()
+
+        with timeutils.StopWatch() as timer:
+            pool = eventlet.GreenPool(CONF.init_host_instance_concurrency)
+            threads = [pool.spawn(_init, instance) for instance in instances]
+            pool.waitall()
+            elapsed = [thread.wait() for thread in threads]
+        LOG.info(_LI('Took %(elapsed)0.2f seconds to initialize %(count)d '
+                     'instances, the slowest one took %(slowest)0.2f '
+                     'seconds.'),
+                 {'elapsed': timer.elapsed(), 'count': len(instances),
+                  'slowest': max(elapsed)})
+
+    def _init_instances_in_background(self, context, background_instances,
+                                      instances):
+        try:
+            self._init_instances(context, background_instances)
+        except Exception:
+            LOG.exception(_LE('Error while initializing the instances in '
+                              'the background.'))
+        finally:
+            # The deferred iptables rules were applied by init_host
             self._update_scheduler_instance_info(context, instances)
 
+    def _finish_init_host(self, context, instances):
+        if CONF.defer_iptables_apply:
+            self.driver.filter_defer_apply_off()
+        self._update_scheduler_instance_info(context, instances)
+
     def cleanup_host(self):
         self.driver.register_event_listener(None)
         self.instance_events.cancel_all_events()
@@ -1799,14 +1933,43 @@ class ComputeManager(manager.Manager):
         self.scheduler_client.delete_instance_info(context, self.host,
                                                    instance_uuid)
 
+    def _get_host_instances(self, context, expected_attrs=None):
+        """Returns the instances of the host, for the periodic tasks.
+
+        The list read from the database is shared by the periodic tasks for
+        host_instance_cache_ttl seconds, or until an operation on an instance
+        completes. It is read again with the union of the expected_attrs of
+        all the tasks when one of them expects an attribute not loaded yet.
+        The instances may be shared with other tasks, and must be refreshed
+        before acting on them.
+        """
+        ttl = CONF.host_instance_cache_ttl
+        if ttl <= 0:
+            return objects.InstanceList.get_by_host(
+                context, self.host, expected_attrs=expected_attrs,
+                use_slave=True)
+
+        expected_attrs = set(expected_attrs or [])
+        if (self._host_instances is None or
+                not expected_attrs.issubset(self._host_instances_attrs) or
+                timeutils.is_older_than(self._host_instances_read_at, ttl)):
+            self._host_instances_attrs |= expected_attrs
+            self._host_instances_read_at = timeutils.utcnow()
+            self._host_instances = objects.InstanceList.get_by_host(
+                context, self.host,
+                expected_attrs=sorted(self._host_instances_attrs),
+                use_slave=True)
+        return self._host_instances
+
+    def _invalidate_host_instances(self):
+        self._host_instances = None
+
     @periodic_task.periodic_task(spacing=CONF.scheduler_instance_sync_interval)
     def _sync_scheduler_instance_info(self, context):
         if not self.send_instance_updates:
             return
         context = context.elevated()
-        instances = objects.InstanceList.get_by_host(context, self.host,
-                                                     expected_attrs=[],
-                                                     use_slave=True)
+        instances = self._get_host_instances(context, expected_attrs=[])
         uuids = [instance.uuid for instance in instances]
         self.scheduler_client.sync_instance_info(context, self.host, uuids)
 
@@ -5749,12 +5912,13 @@ class ComputeManager(manager.Manager):
         spacing=CONF.heal_instance_info_cache_interval)
     def _heal_instance_info_cache(self, context):
         """Called periodically.  On every call, try to update the
-        info_cache's network information for another instance by
+        info_cache's network information for other instances by
         calling to the network manager.
 
         This is implemented by keeping a cache of uuids of instances
-        that live on this host.  On each call, we pop one off of a
-        list, pull the DB record, and try the call to the network API.
+        that live on this host.  On each call, we pop
+        heal_instance_info_cache_batch_size of them off of a list, pull
+        their DB records, and try the calls to the network API.
         If anything errors don't fail, as it's possible the instance
         has been deleted, etc.
         """
@@ -5762,16 +5926,17 @@ class ComputeManager(manager.Manager):
         if not heal_interval:
             return
 
+        batch_size = CONF.heal_instance_info_cache_batch_size
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
-        instance = None
+        instances = []
 
         LOG.debug('Starting heal instance info cache')
 
         if not instance_uuids:
             # The list of instances to heal is empty so rebuild it
             LOG.debug('Rebuilding the list of instances to heal')
-            db_instances = objects.InstanceList.get_by_host(
-                context, self.host, expected_attrs=[], use_slave=True)
+            db_instances = self._get_host_instances(context,
+                                                    expected_attrs=[])
             for inst in db_instances:
                 # We don't want to refresh the cache for instances
                 # which are building or deleting so don't put them
@@ -5786,17 +5951,17 @@ class ComputeManager(manager.Manager):
                               'because it is being deleted.', instance=inst)
                     continue
 
-                if not instance:
-                    # Save the first one we find so we don't
-                    # have to get it again
-                    instance = inst
+                if len(instances) < batch_size:
+                    # Save the first ones we find so we don't
+                    # have to get them again
+                    instances.append(inst)
                 else:
                     instance_uuids.append(inst['uuid'])
 
             self._instance_uuids_to_heal = instance_uuids
         else:
-            # Find the next valid instance on the list
-            while instance_uuids:
+            # Find the next valid instances on the list
+            while instance_uuids and len(instances) < batch_size:
                 try:
                     inst = objects.Instance.get_by_uuid(
                             context, instance_uuids.pop(0),
@@ -5817,32 +5982,67 @@ class ComputeManager(manager.Manager):
                     LOG.debug('Skipping network cache update for instance '
                               'because it is being deleted.', instance=inst)
                 else:
-                    instance = inst
-                    break
+                    instances.append(inst)
 
-        if instance:
-            # We have an instance now to refresh
-            try:
-                # Call to network API to get instance info.. this will
-                # force an update to the instance's info_cache
-                self.network_api.get_instance_nw_info(context, instance)
-                LOG.debug('Updated the network info_cache for instance',
-                          instance=instance)
-            except exception.InstanceNotFound:
-                # Instance is gone.
-                LOG.debug('Instance no longer exists. Unable to refresh',
-                          instance=instance)
-                return
-            except exception.InstanceInfoCacheNotFound:
-                # InstanceInfoCache is gone.
-                LOG.debug('InstanceInfoCache no longer exists. '
-                          'Unable to refresh', instance=instance)
-            except Exception:
-                LOG.error(_LE('An error occurred while refreshing the network '
-                              'cache.'), instance=instance, exc_info=True)
-        else:
+        if not instances:
             LOG.debug("Didn't find any instances for network info cache "
                       "update.")
+        elif len(instances) == 1:
+            self._heal_instance_nw_info(context, instances[0])
+        else:
+            self._heal_instances_nw_info(context, instances)
+
+    def _heal_instances_nw_info(self, context, instances):
+        """Refreshes the network info cache of several instances at once.
+
+        The ports of the instances are listed with a single call to the
+        network API when it supports it, and the caches are refreshed by up
+        to heal_instance_info_cache_concurrency greenthreads. The ports of an
+        instance are listed again by the network API if they do not match
+        its info cache once it holds the refresh_cache lock of the instance.
+        """
+        try:
+            ports = self.network_api.get_ports_by_instance(context, instances)
+        except NotImplementedError:
+            ports = None
+        except Exception:
+            LOG.warning(_LW('Unable to list the ports of %d instances, they '
+                            'will be listed for each instance.'),
+                        len(instances), exc_info=True)
+            ports = None
+
+        pool = eventlet.GreenPool(CONF.heal_instance_info_cache_concurrency)
+        for instance in instances:
+            if ports is None:
+                instance_ports = None
+            else:
+                instance_ports = ports.get(instance.uuid, [])
+            pool.spawn_n(self._heal_instance_nw_info, context, instance,
+                         ports=instance_ports)
+        pool.waitall()
+
+    def _heal_instance_nw_info(self, context, instance, ports=None):
+        # We have an instance now to refresh
+        kwargs = {}
+        if ports is not None:
+            kwargs['ports'] = ports
+        try:
+            # Call to network API to get instance info.. this will
+            # force an update to the instance's info_cache
+            self.network_api.get_instance_nw_info(context, instance, **kwargs)
+            LOG.debug('Updated the network info_cache for instance',
+                      instance=instance)
+        except exception.InstanceNotFound:
+            # Instance is gone.
+            LOG.debug('Instance no longer exists. Unable to refresh',
+                      instance=instance)
+        except exception.InstanceInfoCacheNotFound:
+            # InstanceInfoCache is gone.
+            LOG.debug('InstanceInfoCache no longer exists. '
+                      'Unable to refresh', instance=instance)
+        except Exception:
+            LOG.error(_LE('An error occurred while refreshing the network '
+                          'cache.'), instance=instance, exc_info=True)
 
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
@@ -6007,6 +6207,10 @@ class ComputeManager(manager.Manager):
                                self.host):
             return
 
+        # NOTE: The instances are not read by batches with
+        # InstanceList.iter_by_filters(): the filters cannot express the
+        # audit window, the instances are the ones of this host only, and
+        # their number is recorded in the task log before they are audited.
         instances = objects.InstanceList.get_active_by_window_joined(
             context, begin, end, host=self.host,
             expected_attrs=['system_metadata', 'info_cache', 'metadata',
@@ -6072,9 +6276,7 @@ class ComputeManager(manager.Manager):
             else:
                 update_cells = False
 
-            instances = objects.InstanceList.get_by_host(context,
-                                                              self.host,
-                                                              use_slave=True)
+            instances = self._get_host_instances(context, expected_attrs=[])
             try:
                 bw_counters = self.driver.get_all_bw_counters(instances)
             except NotImplementedError:
@@ -6089,27 +6291,35 @@ class ComputeManager(manager.Manager):
                 self._bw_usage_supported = False
                 return
 
+            if not bw_counters:
+                return
+
+            # Fetch the usages of the current and previous audit periods of
+            # all the counters at once, and save them all at once.
+            uuids = set(bw_ctr['uuid'] for bw_ctr in bw_counters)
+            usages = {}
+            for usage in objects.BandwidthUsageList.get_by_uuids_and_periods(
+                    context, list(uuids), [prev_time, start_time],
+                    use_slave=True):
+                period = usage.start_period.replace(tzinfo=None)
+                usages[(period, usage.instance_uuid, usage.mac)] = usage
+
             refreshed = timeutils.utcnow()
+            updates = []
             for bw_ctr in bw_counters:
-                # Allow switching of greenthreads between queries.
-                greenthread.sleep(0)
                 bw_in = 0
                 bw_out = 0
                 last_ctr_in = None
                 last_ctr_out = None
-                usage = objects.BandwidthUsage.get_by_instance_uuid_and_mac(
-                    context, bw_ctr['uuid'], bw_ctr['mac_address'],
-                    start_period=start_time, use_slave=True)
+                key = (bw_ctr['uuid'], bw_ctr['mac_address'])
+                usage = usages.get((start_time,) + key)
                 if usage:
                     bw_in = usage.bw_in
                     bw_out = usage.bw_out
                     last_ctr_in = usage.last_ctr_in
                     last_ctr_out = usage.last_ctr_out
                 else:
-                    usage = (objects.BandwidthUsage.
-                             get_by_instance_uuid_and_mac(
-                        context, bw_ctr['uuid'], bw_ctr['mac_address'],
-                        start_period=prev_time, use_slave=True))
+                    usage = usages.get((prev_time,) + key)
                     if usage:
                         last_ctr_in = usage.last_ctr_in
                         last_ctr_out = usage.last_ctr_out
@@ -6128,36 +6338,51 @@ class ComputeManager(manager.Manager):
                     else:
                         bw_out += (bw_ctr['bw_out'] - last_ctr_out)
 
-                objects.BandwidthUsage(context=context).create(
-                                              bw_ctr['uuid'],
-                                              bw_ctr['mac_address'],
-                                              bw_in,
-                                              bw_out,
-                                              bw_ctr['bw_in'],
-                                              bw_ctr['bw_out'],
-                                              start_period=start_time,
-                                              last_refreshed=refreshed,
-                                              update_cells=update_cells)
+                updates.append({'uuid': bw_ctr['uuid'],
+                                'mac': bw_ctr['mac_address'],
+                                'bw_in': bw_in,
+                                'bw_out': bw_out,
+                                'last_ctr_in': bw_ctr['bw_in'],
+                                'last_ctr_out': bw_ctr['bw_out']})
+
+            objects.BandwidthUsageList.update_multi(
+                context, start_time, updates, last_refreshed=refreshed,
+                update_cells=update_cells)
 
     def _get_host_volume_bdms(self, context, use_slave=False):
         """Return all block device mappings on a compute host."""
         compute_host_bdms = []
-        instances = objects.InstanceList.get_by_host(context, self.host,
-            use_slave=use_slave)
+        if use_slave:
+            instances = self._get_host_instances(context, expected_attrs=[])
+        else:
+            # The shared list is read from the slave, so read the instances
+            # from the master database
+            instances = objects.InstanceList.get_by_host(
+                context, self.host, expected_attrs=[], use_slave=False)
+        if not instances:
+            return compute_host_bdms
+
+        bdms_by_instance = collections.defaultdict(list)
+        bdms = objects.BlockDeviceMappingList.get_by_instance_uuids(
+                context, [instance.uuid for instance in instances],
+                use_slave=use_slave)
+        for bdm in bdms:
+            if bdm.is_volume:
+                bdms_by_instance[bdm.instance_uuid].append(bdm)
         for instance in instances:
-            bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
-                    context, instance.uuid, use_slave=use_slave)
-            instance_bdms = [bdm for bdm in bdms if bdm.is_volume]
-            compute_host_bdms.append(dict(instance=instance,
-                                          instance_bdms=instance_bdms))
+            compute_host_bdms.append(dict(
+                instance=instance,
+                instance_bdms=bdms_by_instance.get(instance.uuid, [])))
 
         return compute_host_bdms
 
     def _update_volume_usage_cache(self, context, vol_usages):
         """Updates the volume usage cache table with a list of stats."""
+        if not vol_usages:
+            return
+
+        usages = []
         for usage in vol_usages:
-            # Allow switching of greenthreads between queries.
-            greenthread.sleep(0)
             vol_usage = objects.VolumeUsage(context)
             vol_usage.volume_id = usage['volume']
             vol_usage.instance_uuid = usage['instance'].uuid
@@ -6168,7 +6393,17 @@ class ComputeManager(manager.Manager):
             vol_usage.curr_read_bytes = usage['rd_bytes']
             vol_usage.curr_writes = usage['wr_req']
             vol_usage.curr_write_bytes = usage['wr_bytes']
-            vol_usage.save()
+            usages.append(vol_usage)
+
+        usages = objects.VolumeUsageList.update_multi(context, usages)
+        if CONF.volume_usage_aggregated_notification:
+            self.notifier.info(context, 'volume.usage.host',
+                               {'host': self.host,
+                                'volume_usages': [
+                                    compute_utils.usage_volume_info(usage)
+                                    for usage in usages]})
+            return
+        for vol_usage in usages:
             self.notifier.info(context, 'volume.usage',
                                compute_utils.usage_volume_info(vol_usage))
 
@@ -6201,12 +6436,22 @@ class ComputeManager(manager.Manager):
         number of virtual machines known by the database, we proceed in a lazy
         loop, one database record at a time, checking if the hypervisor has the
         same power state as is in the database.
+
+        When the driver can report the power states of all its guests in one
+        call, only the instances whose power state does not match the database
+        are synchronized, the others are left alone without taking their lock.
         """
-        db_instances = objects.InstanceList.get_by_host(context, self.host,
-                                                        expected_attrs=[],
-                                                        use_slave=True)
+        db_instances = self._get_host_instances(context, expected_attrs=[])
 
-        num_vm_instances = self.driver.get_num_instances()
+        try:
+            vm_power_states = self.driver.get_power_states()
+        except NotImplementedError:
+            vm_power_states = None
+
+        if vm_power_states is not None:
+            num_vm_instances = len(vm_power_states)
+        else:
+            num_vm_instances = self.driver.get_num_instances()
         num_db_instances = len(db_instances)
 
         if num_vm_instances != num_db_instances:
@@ -6235,6 +6480,11 @@ class ComputeManager(manager.Manager):
             self._syncs_in_progress.pop(db_instance.uuid)
 
         for db_instance in db_instances:
+            if (vm_power_states is not None and
+                    not self._power_state_needs_sync(
+                        db_instance, vm_power_states.get(
+                            db_instance.uuid, power_state.NOSTATE))):
+                continue
             # process syncs asynchronously - don't want instance locking to
             # block entire periodic task thread
             uuid = db_instance.uuid
@@ -6245,6 +6495,33 @@ class ComputeManager(manager.Manager):
                 self._syncs_in_progress[uuid] = True
                 self._sync_power_pool.spawn_n(_sync, db_instance)
 
+    @staticmethod
+    def _power_state_needs_sync(db_instance, vm_power_state):
+        """Returns whether _sync_instance_power_state() would have something
+        to do for an instance, given the power state reported by the driver.
+
+        The instances with a pending task are skipped by the sync, as are the
+        vm_states which it ignores.
+        """
+        if db_instance.task_state is not None:
+            return False
+        if vm_power_state != db_instance.power_state:
+            return True
+        vm_state = db_instance.vm_state
+        if vm_state == vm_states.ACTIVE:
+            return vm_power_state != power_state.RUNNING
+        elif vm_state == vm_states.STOPPED:
+            return vm_power_state not in (power_state.NOSTATE,
+                                          power_state.SHUTDOWN,
+                                          power_state.CRASHED)
+        elif vm_state == vm_states.PAUSED:
+            return vm_power_state in (power_state.SHUTDOWN,
+                                      power_state.CRASHED)
+        elif vm_state in (vm_states.SOFT_DELETED, vm_states.DELETED):
+            return vm_power_state not in (power_state.NOSTATE,
+                                          power_state.SHUTDOWN)
+        return False
+
     def _query_driver_power_state_and_sync(self, context, db_instance):
         if db_instance.task_state is not None:
             LOG.info(_LI("During sync_power_state the instance has a "
@@ -6481,10 +6758,36 @@ class ComputeManager(manager.Manager):
         compute_nodes_in_db = self._get_compute_nodes_in_db(context,
                                                             use_slave=True)
         nodenames = set(self.driver.get_available_nodes())
+        batch_nodes = (CONF.resource_tracker_batch_nodes and
+                       len(nodenames) > 1)
+        if batch_nodes:
+            # Read the usage of all the nodes at once rather than letting
+            # each resource tracker read the usage of its node, which misses
+            # the claims made until each node is audited
+            for nodename in nodenames:
+                self._get_resource_tracker(nodename).record_claims()
+            try:
+                instances_by_node, migrations_by_node = (
+                    resource_tracker.get_usage_by_node(context, self.host,
+                                                       nodenames))
+            except Exception:
+                LOG.exception(_LE("Error reading the usage of the nodes of "
+                                  "host %(host)s, each node reads its own "
+                                  "usage."), {'host': self.host})
+                batch_nodes = False
+                for nodename in nodenames:
+                    self._get_resource_tracker(nodename).recorded_claims = (
+                        None)
         for nodename in nodenames:
             rt = self._get_resource_tracker(nodename)
             try:
-                rt.update_available_resource(context)
+                if batch_nodes:
+                    rt.update_available_resource(
+                        context, instances=instances_by_node[nodename],
+                        migrations=migrations_by_node[nodename],
+                        defer_update=True)
+                else:
+                    rt.update_available_resource(context)
             except exception.ComputeHostNotFound:
                 # NOTE(comstud): We can get to this case if a node was
                 # marked 'deleted' in the DB and then re-added with a
@@ -6506,6 +6809,14 @@ class ComputeManager(manager.Manager):
         # ASAP.
         self._resource_tracker_dict = new_resource_tracker_dict
 
+        if batch_nodes:
+            try:
+                resource_tracker.update_compute_nodes(
+                    context, list(new_resource_tracker_dict.values()))
+            except Exception:
+                LOG.exception(_LE("Error saving the compute nodes of host "
+                                  "%(host)s."), {'host': self.host})
+
         # Delete orphan compute node not reported by driver but still in db
         for cn in compute_nodes_in_db:
             if cn.hypervisor_hostname not in nodenames:
@@ -0,0 +1,184 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Profiling of the compute periodic tasks.
+
+A TaskProfile records the wall time of a run of a periodic task, and the
+remotable object calls it made, which are the conductor calls of a compute
+service, along with the number of objects they returned. The profile of each
+run is sent in a compute.periodic_task.profile notification, and a warning is
+logged when a task ran for longer than its spacing.
+
+The calls are counted by a CountingIndirectionAPI wrapping the object
+indirection API, on the profile of the task run by the current greenthread.
+The calls made by the greenthreads a task spawns are not counted, and no call
+is counted when the conductor is used in local mode.
+"""
+
+import collections
+import functools
+import threading
+import time
+
+from oslo_log import log as logging
+
+from nova.i18n import _LW
+from nova.objects import base as obj_base
+
+LOG = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class TaskProfile(object):
+    """The time spent and the conductor calls made by a periodic task run."""
+
+    def __init__(self, name, spacing):
+        self.name = name
+        self.spacing = spacing
+        self.started_at = time.time()
+        self.elapsed = None
+        self.calls = collections.OrderedDict()
+
+    def _get_call(self, objname, objmethod):
+        name = '%s.%s' % (objname, objmethod)
+        call = self.calls.get(name)
+        if call is None:
+            call = self.calls[name] = {'name': name, 'calls': 0,
+                                       'elapsed_ms': 0.0, 'objects': 0}
+        return call
+
+    def add_call(self, objname, objmethod, elapsed):
+        call = self._get_call(objname, objmethod)
+        call['calls'] += 1
+        call['elapsed_ms'] += elapsed * 1000
+
+    def add_objects(self, objname, objmethod, result):
+        """Counts the objects returned by a call."""
+        call = self._get_call(objname, objmethod)
+        if isinstance(result, obj_base.ObjectListBase):
+            call['objects'] += len(result)
+        elif isinstance(result, obj_base.NovaObject):
+            call['objects'] += 1
+
+    def finish(self):
+        self.elapsed = time.time() - self.started_at
+
+    @property
+    def overrun(self):
+        return self.elapsed is not None and self.elapsed > self.spacing
+
+    def to_dict(self):
+        calls = list(self.calls.values())
+        return {'task': self.name,
+                'spacing': self.spacing,
+                'elapsed_ms': (self.elapsed or 0.0) * 1000,
+                'conductor_calls': sum(call['calls'] for call in calls),
+                'objects': sum(call['objects'] for call in calls),
+                'calls': calls}
+
+
+def get_current_profile():
+    """Returns the profile of the task run by the current greenthread."""
+    return getattr(_local, 'profile', None)
+
+
+class CountingIndirectionAPI(object):
+    """Object indirection API adding the remotable calls to the profile of
+    the current greenthread, if any, before passing them on.
+    """
+
+    def __init__(self, indirection_api):
+        self.indirection_api = indirection_api
+
+    def __getattr__(self, name):
+        return getattr(self.indirection_api, name)
+
+    @staticmethod
+    def _record(objname, objmethod, func, *args):
+        """Calls func, adding the call to the profile of the current
+        greenthread. Returns the profile, if any, with the result.
+        """
+        profile = get_current_profile()
+        start = time.time()
+        result = func(*args)
+        if profile is not None:
+            profile.add_call(objname, objmethod, time.time() - start)
+        return profile, result
+
+    def object_class_action(self, context, objname, objmethod, objver,
+                            args, kwargs):
+        profile, result = self._record(
+            objname, objmethod, self.indirection_api.object_class_action,
+            context, objname, objmethod, objver, args, kwargs)
+        if profile is not None:
+            profile.add_objects(objname, objmethod, result)
+        return result
+
+    def object_class_action_versions(self, context, objname, objmethod,
+                                     object_versions, args, kwargs):
+        profile, result = self._record(
+            objname, objmethod,
+            self.indirection_api.object_class_action_versions,
+            context, objname, objmethod, object_versions, args, kwargs)
+        if profile is not None:
+            profile.add_objects(objname, objmethod, result)
+        return result
+
+    def object_action(self, context, objinst, objmethod, args, kwargs):
+        objname = objinst.obj_name()
+        profile, result = self._record(
+            objname, objmethod, self.indirection_api.object_action,
+            context, objinst, objmethod, args, kwargs)
+        if profile is not None:
+            # The updates of the object are returned with the result
+            profile.add_objects(objname, objmethod, result[1])
+        return result
+
+
+def profile_periodic_task(task, name, spacing, notifier):
+    """Wraps a periodic task so that each of its runs is profiled.
+
+    The attributes set by the periodic_task decorator are kept on the
+    wrapper.
+    """
+    @functools.wraps(task)
+    def profiled_task(manager, context):
+        profile = TaskProfile(name, spacing)
+        previous_profile = get_current_profile()
+        _local.profile = profile
+        try:
+            return task(manager, context)
+        finally:
+            _local.profile = previous_profile
+            profile.finish()
+            _report(context, notifier, manager.host, profile)
+
+    return profiled_task
+
+
+def _report(context, notifier, host, profile):
+    payload = profile.to_dict()
+    payload['host'] = host
+    LOG.debug("Periodic task %(task)s took %(elapsed_ms).2f ms and made "
+              "%(conductor_calls)d conductor calls returning %(objects)d "
+              "objects", payload)
+    if profile.overrun:
+        LOG.warning(_LW("Periodic task %(task)s took %(elapsed).2f seconds, "
+                        "longer than its spacing of %(spacing)d seconds"),
+                    {'task': profile.name, 'elapsed': profile.elapsed,
+                     'spacing': profile.spacing})
+    notifier.info(context, 'compute.periodic_task.profile', payload)
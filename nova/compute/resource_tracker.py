@@ -18,12 +18,11 @@ Track resources like memory and disk for a compute host.  Provides the
 scheduler with useful information about availability through the ComputeNode
 model.
 """
-import copy
-
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import importutils
+from oslo_utils import timeutils
 
 from nova.compute import claims
 from nova.compute import monitors
@@ -62,6 +61,31 @@ resource_tracker_opts = [
                      'openstack-dev mailing list. There is no future planned '
                      'support for the tracking of custom resources.',
                 deprecated_for_removal=True),
+    cfg.IntOpt('resource_audit_interval',
+               default=0,
+               help='Interval in seconds between two full audits of the '
+                    'resources used on a compute node. A full audit loads '
+                    'all the instances and in-progress migrations of the node '
+                    'from the database and recomputes their usage from '
+                    'scratch. Between two full audits, the periodic resource '
+                    'update only refreshes the resources reported by the '
+                    'hypervisor, and the usage is kept up to date by the '
+                    'claims and usage updates of the instances of the node. '
+                    'The full audit then reconciles that usage with the '
+                    'database and logs any drift found. Usage changes which '
+                    'do not go through the resource tracker, like instances '
+                    'evacuated from the node or orphaned instances, are only '
+                    'accounted for by the full audits. Leaving this at the '
+                    'default of 0 runs a full audit on every periodic '
+                    'resource update.'),
+    cfg.BoolOpt('resource_tracker_batch_nodes',
+                default=False,
+                help='Whether the periodic resource update of a compute '
+                     'service managing several nodes, like the Ironic one, '
+                     'reads the instances and in-progress migrations of all '
+                     'its nodes with a single query each, and saves the '
+                     'compute nodes which changed with a single call, '
+                     'instead of doing so for each node.'),
 ]
 
 allocation_ratio_opts = [
@@ -108,9 +132,36 @@ CONF.register_opts(allocation_ratio_opts)
 LOG = logging.getLogger(__name__)
 COMPUTE_RESOURCE_SEMAPHORE = "compute_resources"
 
+# Fields of the compute node accounting for the usage of the instances, which
+# are kept between two full audits
+USAGE_FIELDS = ('vcpus_used', 'memory_mb_used', 'local_gb_used',
+                'numa_topology')
+
+# Fields of the compute node compared with the recomputed ones to report the
+# drift found by a full audit
+AUDITED_FIELDS = ('vcpus_used', 'memory_mb_used', 'local_gb_used',
+                  'running_vms')
+
+# Attributes of the instances loaded by a full audit
+AUDIT_INSTANCE_ATTRS = ['system_metadata', 'numa_topology', 'flavor',
+                        'migration_context']
+
 CONF.import_opt('my_ip', 'nova.netconf')
 
 
+def _get_fingerprint(value):
+    """Returns a comparable fingerprint of the value of a compute node
+    field, which does not share any state with the value.
+    """
+    if isinstance(value, list):
+        value = [obj_base.obj_to_primitive(item) for item in value]
+    else:
+        value = obj_base.obj_to_primitive(value)
+    if isinstance(value, (dict, list)):
+        return jsonutils.dumps(value, sort_keys=True)
+    return value
+
+
 def _instance_in_resize_state(instance):
     """Returns True if the instance is in one of the resizing states.
 
@@ -131,6 +182,53 @@ def _instance_in_resize_state(instance):
     return False
 
 
+def get_usage_by_node(context, host, nodenames):
+    """Returns the instances and the in-progress migrations of the nodes of a
+    host, read with a single query each, by node name.
+
+    A migration between two nodes of the host is returned for both. The
+    resource trackers of the nodes must record the claims made from before
+    the usage is read, see ResourceTracker.record_claims().
+    """
+    instances_by_node = {nodename: [] for nodename in nodenames}
+    migrations_by_node = {nodename: [] for nodename in nodenames}
+
+    instances = objects.InstanceList.get_by_host(
+        context, host, expected_attrs=AUDIT_INSTANCE_ATTRS)
+    for instance in instances:
+        if instance.node in instances_by_node:
+            instances_by_node[instance.node].append(instance)
+
+    migrations = objects.MigrationList.get_in_progress_by_host(context, host)
+    for migration in migrations:
+        nodes = set()
+        if migration.source_compute == host:
+            nodes.add(migration.source_node)
+        if migration.dest_compute == host:
+            nodes.add(migration.dest_node)
+        for node in nodes:
+            if node in migrations_by_node:
+                migrations_by_node[node].append(migration)
+
+    return instances_by_node, migrations_by_node
+
+
+@utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+def update_compute_nodes(context, trackers):
+    """Saves the compute nodes of the resource trackers whose update was
+    deferred, with a single call to the scheduler client.
+    """
+    trackers = [rt for rt in trackers if rt.pending_update]
+    if not trackers:
+        return
+    compute_nodes = objects.ComputeNodeList(
+        objects=[rt.compute_node for rt in trackers])
+    trackers[0].scheduler_client.update_resource_stats_multi(context,
+                                                             compute_nodes)
+    for rt in trackers:
+        rt._compute_node_saved(context)
+
+
 class ResourceTracker(object):
     """Compute helper class for keeping track of resource usage as instances
     are built and destroyed.
@@ -149,11 +247,32 @@ class ResourceTracker(object):
         self.monitors = monitor_handler.monitors
         self.ext_resources_handler = \
             ext_resources.ResourceHandler(CONF.compute_resources)
-        self.old_resources = objects.ComputeNode()
+        self.old_fingerprints = {}
+        # The fingerprints of the changes not saved yet
+        self.new_fingerprints = {}
         self.scheduler_client = scheduler_client.SchedulerClient()
         self.ram_allocation_ratio = CONF.ram_allocation_ratio
         self.cpu_allocation_ratio = CONF.cpu_allocation_ratio
         self.disk_allocation_ratio = CONF.disk_allocation_ratio
+        self.last_full_audit = None
+        self.pending_update = False
+        # The (instance, migration) pairs claimed since record_claims(), the
+        # migration is None for an instance claim
+        self.recorded_claims = None
+
+    def record_claims(self):
+        """Records the claims made from now on, until the next update of the
+        available resource.
+
+        The usage of the node given to update_available_resource() is read
+        from the database before it holds COMPUTE_RESOURCE_SEMAPHORE, and
+        misses the claims made in the meantime.
+        """
+        self.recorded_claims = []
+
+    def _record_claim(self, instance, migration=None):
+        if self.recorded_claims is not None:
+            self.recorded_claims.append((instance, migration))
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def instance_claim(self, context, instance_ref, limits=None):
@@ -216,6 +335,7 @@ class ResourceTracker(object):
 
         # Mark resources in-use and update stats
         self._update_usage_from_instance(context, instance_ref)
+        self._record_claim(instance_ref)
 
         elevated = context.elevated()
         # persist changes to the compute node:
@@ -293,6 +413,7 @@ class ResourceTracker(object):
         # compute host:
         self._update_usage_from_migration(context, instance, image_meta,
                                           migration)
+        self._record_claim(instance, migration)
         elevated = context.elevated()
         self._update(elevated)
 
@@ -414,7 +535,7 @@ class ResourceTracker(object):
     def disabled(self):
         return self.compute_node is None
 
-    def _init_compute_node(self, context, resources):
+    def _init_compute_node(self, context, resources, keep_usage=False):
         """Initialise the compute node if it does not already exist.
 
         The resource tracker will be inoperable if compute_node
@@ -427,12 +548,14 @@ class ResourceTracker(object):
 
         :param context: security context
         :param resources: initial values
+        :param keep_usage: whether the usage of the instances tracked by an
+                           existing compute node is kept
         """
 
         # if there is already a compute node just use resources
         # to initialize
         if self.compute_node:
-            self._copy_resources(resources)
+            self._copy_resources(resources, keep_usage=keep_usage)
             return
 
         # now try to get the compute node record from the
@@ -453,12 +576,21 @@ class ResourceTracker(object):
                      '%(host)s:%(node)s'),
                  {'host': self.host, 'node': self.nodename})
 
-    def _copy_resources(self, resources):
+    def _copy_resources(self, resources, keep_usage=False):
         """Copy resource values to initialise compute_node and related
         data structures.
+
+        If keep_usage is True, the usage of the tracked instances and their
+        stats are kept, and only the resources of the hypervisor are updated.
         """
-        # purge old stats and init with anything passed in by the driver
-        self.stats.clear()
+        usage = {}
+        if keep_usage:
+            usage = {key: self.compute_node[key] for key in USAGE_FIELDS
+                     if self.compute_node.obj_attr_is_set(key)}
+        else:
+            # purge old stats
+            self.stats.clear()
+        # init with anything passed in by the driver
         self.stats.digest_stats(resources.get('stats'))
 
         # update the allocation ratios for the related ComputeNode object
@@ -469,6 +601,14 @@ class ResourceTracker(object):
         # now copy rest to compute_node
         self.compute_node.update_from_virt_driver(resources)
 
+        if usage:
+            for key, value in usage.items():
+                self.compute_node[key] = value
+            self.compute_node.free_ram_mb = (self.compute_node.memory_mb -
+                                             self.compute_node.memory_mb_used)
+            self.compute_node.free_disk_gb = (self.compute_node.local_gb -
+                                              self.compute_node.local_gb_used)
+
     def _get_host_metrics(self, context, nodename):
         """Get the metrics from monitors and
         notify information to message bus.
@@ -494,13 +634,21 @@ class ResourceTracker(object):
             notifier.info(context, 'compute.metrics.update', metrics_info)
         return metrics
 
-    def update_available_resource(self, context):
+    def update_available_resource(self, context, instances=None,
+                                  migrations=None, defer_update=False):
         """Override in-memory calculations of compute node resource usage based
         on data audited from the hypervisor layer.
 
         Add in resource claims in progress to account for operations that have
         declared a need for resources, but not necessarily retrieved them from
         the hypervisor layer yet.
+
+        :param instances: the instances of the node, when already read by the
+                          caller
+        :param migrations: the in-progress migrations of the node, when
+                           already read by the caller
+        :param defer_update: whether the changes of the compute node are left
+                             to be saved by update_compute_nodes()
         """
         LOG.info(_LI("Auditing locally available compute resources for "
                      "node %(node)s"),
@@ -525,7 +673,10 @@ class ResourceTracker(object):
 
         self._report_hypervisor_resource_view(resources)
 
-        self._update_available_resource(context, resources)
+        self._update_available_resource(context, resources,
+                                        instances=instances,
+                                        migrations=migrations,
+                                        defer_update=defer_update)
 
     def _pair_instances_to_migrations(self, migrations, instances):
         instance_by_uuid = {inst.uuid: inst for inst in instances}
@@ -541,12 +692,86 @@ class ResourceTracker(object):
                               'another host\'s instance!'),
                           {'uuid': migration.instance_uuid})
 
+    def _is_full_audit_due(self):
+        """Returns whether the usage of the instances must be recomputed
+        from the database, or can be kept from the previous update.
+        """
+        interval = CONF.resource_audit_interval
+        if interval <= 0 or self.disabled or self.last_full_audit is None:
+            return True
+        return timeutils.is_older_than(self.last_full_audit, interval)
+
+    def _get_usage_ledger(self):
+        """Returns the usage accounted since the last full audit."""
+        if self.disabled or self.last_full_audit is None:
+            return None
+        ledger = {key: self.compute_node[key] for key in AUDITED_FIELDS
+                  if self.compute_node.obj_attr_is_set(key)}
+        ledger['instances'] = set(self.tracked_instances)
+        ledger['migrations'] = set(self.tracked_migrations)
+        return ledger
+
+    def _report_usage_drift(self, ledger):
+        """Log the differences between the usage accounted since the last
+        full audit and the one it recomputed.
+        """
+        current = self._get_usage_ledger()
+        drift = {}
+        for key in AUDITED_FIELDS:
+            if key in ledger and ledger[key] != current.get(key):
+                drift[key] = current.get(key, 0) - ledger[key]
+        for key in ('instances', 'migrations'):
+            added = sorted(current[key] - ledger[key])
+            removed = sorted(ledger[key] - current[key])
+            if added:
+                drift['untracked_' + key] = added
+            if removed:
+                drift['stale_' + key] = removed
+        if drift:
+            LOG.warning(_LW("Resource audit of node %(node)s found a drift "
+                            "from the tracked usage: %(drift)s"),
+                        {'node': self.nodename, 'drift': drift})
+        return drift
+
+    def _add_recorded_claims(self, claims, instances, migrations):
+        """Adds the instances and migrations claimed since the usage of the
+        node was read, which are missing from it and still tracked.
+        """
+        instances = list(instances)
+        migrations = list(migrations)
+        instance_uuids = set(instance.uuid for instance in instances)
+        migration_ids = set(migration.id for migration in migrations)
+        for instance, migration in claims:
+            if migration is None:
+                if (instance.uuid not in instance_uuids and
+                        instance.uuid in self.tracked_instances):
+                    instances.append(instance)
+                    instance_uuids.add(instance.uuid)
+            elif (migration.id not in migration_ids and
+                    instance.uuid in self.tracked_migrations):
+                migration.instance = instance
+                migrations.append(migration)
+                migration_ids.add(migration.id)
+        return instances, migrations
+
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
-    def _update_available_resource(self, context, resources):
+    def _update_available_resource(self, context, resources, instances=None,
+                                   migrations=None, defer_update=False):
+
+        # The claims recorded since the usage of the node was read are only
+        # needed by this update
+        claims = self.recorded_claims
+        self.recorded_claims = None
+
+        full_audit = self._is_full_audit_due()
+        ledger = None
+        if full_audit and CONF.resource_audit_interval > 0:
+            ledger = self._get_usage_ledger()
 
         # initialise the compute node object, creating it
         # if it does not already exist.
-        self._init_compute_node(context, resources)
+        self._init_compute_node(context, resources,
+                                keep_usage=not full_audit)
 
         # if we could not init the compute node the tracker will be
         # disabled and we should quit now
@@ -562,19 +787,55 @@ class ResourceTracker(object):
             dev_json = resources.pop('pci_passthrough_devices')
             self.pci_tracker.update_devices_from_hypervisor_resources(dev_json)
 
+        if full_audit:
+            if instances is not None and claims:
+                instances, migrations = self._add_recorded_claims(
+                    claims, instances, migrations)
+            self._audit_instance_usage(context, instances=instances,
+                                       migrations=migrations)
+            self.last_full_audit = timeutils.utcnow()
+            if ledger is not None:
+                self._report_usage_drift(ledger)
+        else:
+            LOG.debug("Keeping the tracked usage of %(count)d instances on "
+                      "node %(node)s until the next full audit",
+                      {'count': len(self.tracked_instances),
+                       'node': self.nodename})
+            if self.pci_tracker:
+                dev_pools_obj = self.pci_tracker.stats.to_device_pools_obj()
+                self.compute_node.pci_device_pools = dev_pools_obj
+
+        self._report_final_resource_view()
+
+        metrics = self._get_host_metrics(context, self.nodename)
+        # TODO(pmurray): metrics should not be a json string in ComputeNode,
+        # but it is. This should be changed in ComputeNode
+        self.compute_node.metrics = jsonutils.dumps(metrics)
+
+        # update the compute_node
+        self._update(context, defer=defer_update)
+        LOG.info(_LI('Compute_service record updated for %(host)s:%(node)s'),
+                     {'host': self.host, 'node': self.nodename})
+
+    def _audit_instance_usage(self, context, instances=None,
+                              migrations=None):
+        """Recompute the usage of the node from its instances and
+        in-progress migrations in the database, unless they are given.
+        """
         # Grab all instances assigned to this node:
-        instances = objects.InstanceList.get_by_host_and_node(
-            context, self.host, self.nodename,
-            expected_attrs=['system_metadata',
-                            'numa_topology',
-                            'flavor', 'migration_context'])
+        if instances is None:
+            instances = objects.InstanceList.get_by_host_and_node(
+                context, self.host, self.nodename,
+                expected_attrs=AUDIT_INSTANCE_ATTRS)
 
         # Now calculate usage based on instance utilization:
         self._update_usage_from_instances(context, instances)
 
         # Grab all in-progress migrations:
-        migrations = objects.MigrationList.get_in_progress_by_host_and_node(
-                context, self.host, self.nodename)
+        if migrations is None:
+            migrations = (
+                objects.MigrationList.get_in_progress_by_host_and_node(
+                    context, self.host, self.nodename))
 
         self._pair_instances_to_migrations(migrations, instances)
         self._update_usage_from_migrations(context, migrations)
@@ -595,18 +856,6 @@ class ResourceTracker(object):
         else:
             self.compute_node.pci_device_pools = objects.PciDevicePoolList()
 
-        self._report_final_resource_view()
-
-        metrics = self._get_host_metrics(context, self.nodename)
-        # TODO(pmurray): metrics should not be a json string in ComputeNode,
-        # but it is. This should be changed in ComputeNode
-        self.compute_node.metrics = jsonutils.dumps(metrics)
-
-        # update the compute_node
-        self._update(context)
-        LOG.info(_LI('Compute_service record updated for %(host)s:%(node)s'),
-                     {'host': self.host, 'node': self.nodename})
-
     def _get_compute_node(self, context):
         """Returns compute node for the host and nodename."""
         try:
@@ -617,7 +866,9 @@ class ResourceTracker(object):
                         {'host': self.host, 'node': self.nodename})
 
     def _write_ext_resources(self, resources):
-        resources.stats = copy.deepcopy(self.stats)
+        # NOTE: setting the stats field coerces them into a new dict, so the
+        # compute node never shares them with the tracker
+        resources.stats = self.stats
         self.ext_resources_handler.write_resources(resources)
 
     def _report_hypervisor_resource_view(self, resources):
@@ -698,22 +949,52 @@ class ResourceTracker(object):
                   'used_vcpus': ucpu,
                   'pci_stats': pci_stats})
 
+    def _get_resource_fingerprints(self):
+        """Returns the fingerprints of the fields set on the compute node."""
+        return {field: _get_fingerprint(self.compute_node[field])
+                for field in self.compute_node.obj_fields
+                if self.compute_node.obj_attr_is_set(field)}
+
     def _resource_change(self):
-        """Check to see if any resources have changed."""
-        if not obj_base.obj_equal_prims(self.compute_node, self.old_resources):
-            self.old_resources = copy.deepcopy(self.compute_node)
-            return True
-        return False
+        """Check to see if any resources have changed.
+
+        The fields of the compute node which did not change since it was
+        last saved are not marked as changed anymore, so that only the
+        changed ones are saved. The fields changed by a deferred update
+        remain changed until the compute node is saved.
+        """
+        fingerprints = self._get_resource_fingerprints()
+        changed = set(field for field, fingerprint in fingerprints.items()
+                      if field not in self.old_fingerprints or
+                      self.old_fingerprints[field] != fingerprint)
+        if not changed:
+            return False
+        unchanged = set(fingerprints) - changed
+        if unchanged:
+            self.compute_node.obj_reset_changes(unchanged, recursive=True)
+        self.new_fingerprints = fingerprints
+        return True
+
+    def _compute_node_saved(self, context):
+        """Called once the changes of the compute node are saved."""
+        self.old_fingerprints = self.new_fingerprints
+        self.pending_update = False
+        if self.pci_tracker:
+            self.pci_tracker.save(context)
 
-    def _update(self, context):
+    def _update(self, context, defer=False):
         """Update partial stats locally and populate them to Scheduler."""
         self._write_ext_resources(self.compute_node)
         if not self._resource_change():
             return
+        if defer:
+            # Persisted by update_compute_nodes() along with the other nodes
+            # of the host
+            self.pending_update = True
+            return
         # Persist the stats to the Scheduler
         self.scheduler_client.update_resource_stats(self.compute_node)
-        if self.pci_tracker:
-            self.pci_tracker.save(context)
+        self._compute_node_saved(context)
 
     def _update_usage(self, usage, sign=1):
         mem_usage = usage['memory_mb']
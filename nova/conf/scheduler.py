@@ -45,7 +45,7 @@ a different scheduler, this option has no effect.
 
 * Related options:
 
-    None
+    scheduler_batch_weighers
 """)
 
 bm_default_filter_opt = cfg.ListOpt("baremetal_scheduler_default_filters",
@@ -156,6 +156,117 @@ a different scheduler, this option has no effect.
     exception will be raised.
 """)
 
+host_mgr_batch_filters_opt = cfg.BoolOpt("scheduler_batch_filters",
+        default=False,
+        help="""
+By default, each filter checks the hosts one at a time. When this option is set
+to True, the filters which support it check all the hosts at once, using array
+operations on the resources of the hosts. This greatly reduces the time spent
+filtering on large deployments. The other filters still check the hosts one at
+a time.
+
+The filters which support this are RamFilter, CoreFilter, DiskFilter,
+NumInstancesFilter and IoOpsFilter, and their aggregate variants.
+
+This option requires the numpy library to be installed; it has no effect
+otherwise.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_default_filters
+""")
+
+host_mgr_batch_weighers_opt = cfg.BoolOpt("scheduler_batch_weighers",
+        default=False,
+        help="""
+By default, each weigher weighs the hosts one at a time, and all the weighed
+hosts are sorted. When this option is set to True, the weighers which support
+it weigh all the hosts at once, the weights are normalized and summed using
+array operations, and only the best 'scheduler_host_subset_size' hosts are
+selected and returned, instead of sorting all of them. This greatly reduces the
+time spent weighing on large deployments. The other weighers still weigh the
+hosts one at a time.
+
+The weighers which support this are RAMWeigher, DiskWeigher, IoOpsWeigher and
+MetricsWeigher.
+
+This option requires the numpy library to be installed; it has no effect
+otherwise.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_weight_classes
+    scheduler_host_subset_size
+""")
+
+host_mgr_incremental_placement_opt = cfg.BoolOpt(
+        "scheduler_incremental_placement",
+        default=False,
+        help="""
+By default, when a request is for several instances, all the hosts are filtered
+and weighed again for each instance. When this option is set to True, all the
+hosts are filtered and weighed for the first instance only; for each next
+instance, only the host selected for the previous one is filtered and weighed
+again, as it is the only one whose resources changed, and the weighed hosts are
+kept ordered in a heap. The filters depending on the hosts selected for the
+previous instances, like the server group affinity filters, are still run on
+all the remaining hosts. The selected hosts are the same as with the default
+behavior, but large multiple-instance requests are scheduled much faster.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_default_filters
+    scheduler_weight_classes
+""")
+
+host_mgr_profiling_opt = cfg.BoolOpt("scheduler_profiling",
+        default=False,
+        help="""
+When this option is set to True, the time spent by each filter and weigher on
+each scheduling request, and the number of hosts they were given and returned,
+are recorded. They are sent in a 'scheduler.select_destinations.profile'
+notification for each request, and aggregated into histograms which are
+periodically stored in the cache, from where they can be displayed with the
+'nova-manage scheduler profile' command. The cache must be shared between the
+schedulers and nova-manage, i.e. memcached must be configured, for the
+statistics of all the schedulers to be displayed.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_default_filters
+    scheduler_weight_classes
+    [cache] enabled
+    [cache] memcache_servers
+""")
+
 host_mgr_sched_wgt_cls_opt = cfg.ListOpt("scheduler_weight_classes",
         default=["nova.scheduler.weights.all_weighers"],
         help="""
@@ -208,6 +319,51 @@ a different scheduler, this option has no effect.
     None
 """)
 
+host_mgr_delta_sync_opt = cfg.BoolOpt("scheduler_host_state_delta_sync",
+        default=False,
+        help="""
+By default, the scheduler reads every compute node and nova-compute service
+record from the database and refreshes the state of every host on each
+scheduling request. When this option is set to True, only the records which
+were created, updated or deleted since the previous request are read, and only
+the states of the corresponding hosts are refreshed. This greatly reduces the
+database load and the request latency on large deployments.
+
+A full refresh is still periodically done, as configured by the
+'scheduler_host_state_full_sync_interval' option.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_host_state_full_sync_interval
+""")
+
+host_mgr_full_sync_interval_opt = cfg.IntOpt(
+        "scheduler_host_state_full_sync_interval",
+        default=300,
+        min=0,
+        help="""
+When 'scheduler_host_state_delta_sync' is enabled, this is the interval, in
+seconds, after which the scheduler reads all the compute node and service
+records again instead of only the changed ones. This guards against changes
+missed because of clock skew between the services writing those records. Set
+this to 0 to only do a full refresh when the scheduler starts.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_host_state_delta_sync
+""")
+
 rpc_sched_topic_opt = cfg.StrOpt("scheduler_topic",
         default="scheduler",
         help="""
@@ -322,6 +478,39 @@ be sure to test this with your selected scheduler.
     ``nova-service service_down_time``
 """)
 
+driver_shared_host_state_opt = cfg.BoolOpt("scheduler_shared_host_state",
+        default=False,
+        help="""
+This option is only used by the CachingScheduler. By default, each scheduler
+worker keeps its own copy of the host states, and the resources it consumes
+when selecting hosts are not seen by the other workers until their next
+refresh of that copy, which causes retries when several workers are run.
+
+When this option is set to True, the resources consumed by each worker are
+published to a cache shared by all the workers, and each worker applies the
+ones published by the others to its own copy of the host states before
+handling a request. Published consumptions are dropped once the compute node
+of the host reported its resources again, or after two periods of the
+scheduler driver periodic task.
+
+The workers of all the schedulers sharing the cache must be running on the
+same host, as the publication is serialized with an external lock. For workers
+of a scheduler to share the cache, memcached has to be configured in the
+[cache] section, otherwise an in-process cache is used, which only makes the
+consumption survive the refreshes of the host states.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    scheduler_driver
+    scheduler_driver_task_period
+    [cache] enabled
+    [cache] memcache_servers
+""")
+
 isolated_img_opt = cfg.ListOpt("isolated_images",
         default=[],
         help="""
@@ -554,6 +743,10 @@ The value is in seconds. Valid values must be positive integers for any
 caching; setting this to zero or a negative value will result in calls to the
 attestation_server for every request, which may impact performance.
 
+The trust levels are also stored in the cache configured in the [cache]
+section, where the other schedulers and the restarted ones find them when
+using a shared backend like memcached.
+
 This option is only used by the FilterScheduler and its subclasses; if you use
 a different scheduler, this option has no effect. Also note that this setting
 only affects scheduling if the 'TrustedFilter' filter is enabled.
@@ -596,6 +789,72 @@ only affects scheduling if the 'TrustedFilter' filter is enabled.
     attestation_api_url
     attestation_auth_blob
     attestation_auth_timeout
+"""),
+    cfg.IntOpt("attestation_workers",
+            default=4,
+            min=1,
+            help="""
+The number of concurrent requests to the attestation server. The hosts are
+attested in the background, in batches, and their cached trust level keeps
+being used while they are attested again. See the `attestation_server` help
+text for more information about host verification.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect. Also note that this setting
+only affects scheduling if the 'TrustedFilter' filter is enabled.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    attestation_server
+    attestation_auth_timeout
+    attestation_wait_timeout
+"""),
+    cfg.FloatOpt("attestation_wait_timeout",
+            default=5.0,
+            help="""
+The maximum time, in seconds, a scheduling request waits for the attestation
+of the hosts without a usable cached trust level. A cached trust level is
+usable until it is twice as old as the attestation_auth_timeout option,
+although it is refreshed once older than that option. The hosts whose
+attestation does not complete in time are considered as not trusted for the
+request, and are still attested in the background.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect. Also note that this setting
+only affects scheduling if the 'TrustedFilter' filter is enabled.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    attestation_auth_timeout
+    attestation_workers
+    attestation_request_timeout
+"""),
+    cfg.IntOpt("attestation_request_timeout",
+            default=30,
+            min=1,
+            help="""
+The timeout, in seconds, of the requests to the attestation server.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect. Also note that this setting
+only affects scheduling if the 'TrustedFilter' filter is enabled.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    attestation_server
+    attestation_wait_timeout
 """),
 ]
 
@@ -918,12 +1177,19 @@ default_opts = [host_subset_size_opt,
                use_bm_filters_opt,
                host_mgr_avail_filt_opt,
                host_mgr_default_filt_opt,
+               host_mgr_batch_filters_opt,
+               host_mgr_batch_weighers_opt,
+               host_mgr_incremental_placement_opt,
+               host_mgr_profiling_opt,
                host_mgr_sched_wgt_cls_opt,
                host_mgr_tracks_inst_chg_opt,
+               host_mgr_delta_sync_opt,
+               host_mgr_full_sync_interval_opt,
                rpc_sched_topic_opt,
                sched_driver_host_mgr_opt,
                driver_opt,
                driver_period_opt,
+               driver_shared_host_state_opt,
                scheduler_json_config_location_opt,
                isolated_img_opt,
                isolated_host_opt,
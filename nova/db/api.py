@@ -150,6 +150,16 @@ def service_get_all_by_binary(context, binary, include_disabled=False):
                                           include_disabled=include_disabled)
 
 
+def service_get_all_by_binary_changed_since(context, binary, changes_since):
+    """Get services for a given binary created, updated or deleted since a
+    given time.
+
+    Includes disabled and soft-deleted services.
+    """
+    return IMPL.service_get_all_by_binary_changed_since(context, binary,
+                                                        changes_since)
+
+
 def service_get_all_by_host(context, host):
     """Get all services for a given host."""
     return IMPL.service_get_all_by_host(context, host)
@@ -248,6 +258,19 @@ def compute_node_get_all(context):
     return IMPL.compute_node_get_all(context)
 
 
+def compute_node_get_all_changed_since(context, changes_since):
+    """Get all compute nodes created, updated or deleted since a given time.
+
+    :param context: The security context
+    :param changes_since: datetime from which changed compute nodes are
+                          returned
+
+    :returns: List of dictionaries each containing compute node properties,
+              including soft-deleted compute nodes
+    """
+    return IMPL.compute_node_get_all_changed_since(context, changes_since)
+
+
 def compute_node_get_all_by_host(context, host):
     """Get compute nodes by host name
 
@@ -525,6 +548,13 @@ def migration_get_in_progress_by_host_and_node(context, host, node):
     return IMPL.migration_get_in_progress_by_host_and_node(context, host, node)
 
 
+def migration_get_in_progress_by_host(context, host):
+    """Finds all migrations from or to any node of the given host that are
+    not yet confirmed or reverted.
+    """
+    return IMPL.migration_get_in_progress_by_host(context, host)
+
+
 def migration_get_all_by_filters(context, filters):
     """Finds all migrations in progress."""
     return IMPL.migration_get_all_by_filters(context, filters)
@@ -734,6 +764,20 @@ def instance_get_all_by_filters_sort(context, filters, limit=None,
         sort_dirs=sort_dirs)
 
 
+def instance_get_all_by_filters_batched(context, filters, batch_size,
+                                        columns_to_join=None, sort_keys=None,
+                                        sort_dirs=None):
+    """Get all instances that match all filters sorted by multiple keys, by
+    batches of at most batch_size instances.
+
+    This is a generator, which fetches each batch of instances when the
+    previous one was consumed.
+    """
+    return IMPL.instance_get_all_by_filters_batched(
+        context, filters, batch_size, columns_to_join=columns_to_join,
+        sort_keys=sort_keys, sort_dirs=sort_dirs)
+
+
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None,
                                          columns_to_join=None):
@@ -1157,6 +1201,19 @@ def quota_reserve(context, resources, quotas, user_quotas, deltas, expire,
                               project_id=project_id, user_id=user_id)
 
 
+def quota_reserve_conditional(context, resources, quotas, user_quotas, deltas,
+                              expire, until_refresh, max_age, project_id=None,
+                              user_id=None):
+    """Check quotas and create appropriate reservations without locking
+    the quota usages.
+    """
+    return IMPL.quota_reserve_conditional(context, resources, quotas,
+                                          user_quotas, deltas, expire,
+                                          until_refresh, max_age,
+                                          project_id=project_id,
+                                          user_id=user_id)
+
+
 def reservation_commit(context, reservations, project_id=None, user_id=None):
     """Commit quota reservations."""
     return IMPL.reservation_commit(context, reservations,
@@ -1171,6 +1228,16 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
                                      user_id=user_id)
 
 
+def reservation_commit_conditional(context, reservations):
+    """Commit quota reservations without locking the quota usages."""
+    return IMPL.reservation_commit_conditional(context, reservations)
+
+
+def reservation_rollback_conditional(context, reservations):
+    """Roll back quota reservations without locking the quota usages."""
+    return IMPL.reservation_rollback_conditional(context, reservations)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     """Destroy all quotas associated with a given project and user."""
     return IMPL.quota_destroy_all_by_project_and_user(context,
@@ -1187,6 +1254,13 @@ def reservation_expire(context):
     return IMPL.reservation_expire(context)
 
 
+def reservation_expire_conditional(context):
+    """Roll back any expired reservations without locking the quota
+    usages.
+    """
+    return IMPL.reservation_expire_conditional(context)
+
+
 ###################
 
 
@@ -1693,6 +1767,12 @@ def bw_usage_get_by_uuids(context, uuids, start_period):
     return IMPL.bw_usage_get_by_uuids(context, uuids, start_period)
 
 
+def bw_usage_get_by_uuids_and_periods(context, uuids, start_periods):
+    """Return bw usages for instance(s) in any of the given audit periods."""
+    return IMPL.bw_usage_get_by_uuids_and_periods(context, uuids,
+                                                  start_periods)
+
+
 def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
                     last_ctr_in, last_ctr_out, last_refreshed=None,
                     update_cells=True):
@@ -1711,6 +1791,30 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
     return rv
 
 
+def bw_usage_update_multi(context, start_period, usages, last_refreshed=None,
+                          update_cells=True):
+    """Update cached bandwidth usages of instances' networks in a given
+    audit period, in a single transaction.  Creates new records if needed.
+
+    :param usages: list of dicts with the uuid, mac, bw_in, bw_out,
+                   last_ctr_in and last_ctr_out of each usage
+    """
+    IMPL.bw_usage_update_multi(context, start_period, usages,
+                               last_refreshed=last_refreshed)
+    if update_cells:
+        cells_api = cells_rpcapi.CellsAPI()
+        for usage in usages:
+            try:
+                cells_api.bw_usage_update_at_top(context,
+                        usage['uuid'], usage['mac'], start_period,
+                        usage['bw_in'], usage['bw_out'],
+                        usage['last_ctr_in'], usage['last_ctr_out'],
+                        last_refreshed)
+            except Exception:
+                LOG.exception(_LE("Failed to notify cells of bw_usage "
+                                  "update"))
+
+
 ###################
 
 
@@ -1732,6 +1836,18 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
                                  update_totals=update_totals)
 
 
+def vol_usage_update_multi(context, usages):
+    """Update the cached current usage of several volumes at once.
+
+       Creates new records if needed.
+
+       :param usages: list of dicts with the volume_id, rd_req, rd_bytes,
+                      wr_req, wr_bytes, instance_id, project_id, user_id and
+                      availability_zone of each volume
+    """
+    return IMPL.vol_usage_update_multi(context, usages)
+
+
 ###################
 
 
@@ -1745,6 +1861,11 @@ def s3_image_get_by_uuid(context, image_uuid):
     return IMPL.s3_image_get_by_uuid(context, image_uuid)
 
 
+def s3_image_get_by_uuids(context, image_uuids):
+    """Find the local s3 images represented by the provided uuids."""
+    return IMPL.s3_image_get_by_uuids(context, image_uuids)
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid."""
     return IMPL.s3_image_create(context, image_uuid)
@@ -1911,6 +2032,11 @@ def ec2_instance_get_by_uuid(context, instance_uuid):
     return IMPL.ec2_instance_get_by_uuid(context, instance_uuid)
 
 
+def ec2_instance_get_by_uuids(context, instance_uuids):
+    """Get the ec2 ids of the instances with the provided uuids."""
+    return IMPL.ec2_instance_get_by_uuids(context, instance_uuids)
+
+
 def ec2_instance_get_by_id(context, instance_id):
     return IMPL.ec2_instance_get_by_id(context, instance_id)
 
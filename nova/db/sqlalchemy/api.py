@@ -553,6 +553,17 @@ def service_get_all_by_binary(context, binary, include_disabled=False):
     return query.all()
 
 
+@pick_context_manager_reader
+def service_get_all_by_binary_changed_since(context, binary, changes_since):
+    changes_since = timeutils.normalize_time(changes_since)
+    return model_query(context, models.Service, read_deleted="yes").\
+                filter_by(binary=binary).\
+                filter(or_(models.Service.created_at >= changes_since,
+                           models.Service.updated_at >= changes_since,
+                           models.Service.deleted_at >= changes_since)).\
+                all()
+
+
 @pick_context_manager_reader
 def service_get_by_host_and_binary(context, host, binary):
     result = model_query(context, models.Service, read_deleted="no").\
@@ -566,6 +577,16 @@ def service_get_by_host_and_binary(context, host, binary):
     return result
 
 
+def _instance_services_get_multi(context, hosts):
+    if not hosts:
+        return []
+    # NOTE: like the instances.services relationship, the deleted services
+    # are joined too
+    return model_query(context, models.Service, read_deleted="yes").\
+        filter(models.Service.host.in_(hosts)).\
+        filter_by(binary='nova-compute')
+
+
 @pick_context_manager_reader
 def service_get_all_by_host(context, host):
     return model_query(context, models.Service, read_deleted="no").\
@@ -781,6 +802,11 @@ def _compute_node_select(context, filters=None):
     if "hypervisor_hostname" in filters:
         hyp_hostname = filters["hypervisor_hostname"]
         select = select.where(cn_tbl.c.hypervisor_hostname == hyp_hostname)
+    if "changes_since" in filters:
+        changes_since = timeutils.normalize_time(filters["changes_since"])
+        select = select.where(or_(cn_tbl.c.created_at >= changes_since,
+                                  cn_tbl.c.updated_at >= changes_since,
+                                  cn_tbl.c.deleted_at >= changes_since))
 
     engine = get_engine(context)
     conn = engine.connect()
@@ -843,6 +869,14 @@ def compute_node_get_all(context):
     return _compute_node_select(context)
 
 
+@pick_context_manager_reader
+def compute_node_get_all_changed_since(context, changes_since):
+    # NOTE: Soft-deleted compute nodes are returned as well, so that callers
+    # caching compute node records know which ones to expire.
+    return _compute_node_select(context.elevated(read_deleted='yes'),
+                                {"changes_since": changes_since})
+
+
 @pick_context_manager_reader
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
@@ -2029,8 +2063,10 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
     :param context: security context
     :param instances: list of instances to fill
     :param manual_joins: list of tables to manually join (can be any
-                         combination of 'metadata' and 'system_metadata' or
-                         None to take the default of both)
+                         combination of 'metadata', 'system_metadata',
+                         'pci_devices', 'tags' and 'services' or None to
+                         take the default of 'metadata' and
+                         'system_metadata')
     """
     uuids = [inst['uuid'] for inst in instances]
 
@@ -2052,6 +2088,17 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
         for row in _instance_pcidevs_get_multi(context, uuids):
             pcidevs[row['instance_uuid']].append(row)
 
+    tags = collections.defaultdict(list)
+    if 'tags' in manual_joins:
+        for row in _instance_tags_get_multi(context, uuids):
+            tags[row['resource_id']].append(row)
+
+    services = collections.defaultdict(list)
+    if 'services' in manual_joins:
+        hosts = set(inst['host'] for inst in instances if inst['host'])
+        for row in _instance_services_get_multi(context, hosts):
+            services[row['host']].append(row)
+
     filled_instances = []
     for inst in instances:
         inst = dict(inst)
@@ -2059,6 +2106,13 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
         inst['metadata'] = meta[inst['uuid']]
         if 'pci_devices' in manual_joins:
             inst['pci_devices'] = pcidevs[inst['uuid']]
+        # NOTE: like the relationships of the data model, the tags and
+        # services are only joined to the instances which are not deleted
+        if 'tags' in manual_joins:
+            inst['tags'] = [] if inst['deleted'] else tags[inst['uuid']]
+        if 'services' in manual_joins:
+            inst['services'] = ([] if inst['deleted'] else
+                                services[inst['host']])
         filled_instances.append(inst)
 
     return filled_instances
@@ -2067,9 +2121,10 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
 def _manual_join_columns(columns_to_join):
     """Separate manually joined columns from columns_to_join
 
-    If columns_to_join contains 'metadata', 'system_metadata', or
-    'pci_devices' those columns are removed from columns_to_join and added
-    to a manual_joins list to be used with the _instances_fill_metadata method.
+    If columns_to_join contains 'metadata', 'system_metadata', 'pci_devices',
+    'tags' or 'services' those columns are removed from columns_to_join and
+    added to a manual_joins list to be used with the _instances_fill_metadata
+    method.
 
     The columns_to_join formal parameter is copied and not modified, the return
     tuple has the modified columns_to_join list to be used with joinedload in
@@ -2080,7 +2135,8 @@ def _manual_join_columns(columns_to_join):
     """
     manual_joins = []
     columns_to_join_new = copy.copy(columns_to_join)
-    for column in ('metadata', 'system_metadata', 'pci_devices'):
+    for column in ('metadata', 'system_metadata', 'pci_devices', 'tags',
+                   'services'):
         if column in columns_to_join_new:
             columns_to_join_new.remove(column)
             manual_joins.append(column)
@@ -2126,6 +2182,30 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                             sort_dirs=[sort_dir])
 
 
+@require_context
+def instance_get_all_by_filters_batched(context, filters, batch_size,
+                                        columns_to_join=None, sort_keys=None,
+                                        sort_dirs=None):
+    """Yields the instances matching all filters sorted by the given keys,
+    by batches of at most batch_size instances.
+
+    Each batch is read in its own transaction, from the last instance of the
+    previous batch, so that only one batch of instances is held in memory
+    at a time. See instance_get_all_by_filters_sort for the filters.
+    """
+    marker = None
+    while True:
+        instances = instance_get_all_by_filters_sort(
+            context, filters, limit=batch_size, marker=marker,
+            columns_to_join=columns_to_join, sort_keys=sort_keys,
+            sort_dirs=sort_dirs)
+        if instances:
+            yield instances
+        if len(instances) < batch_size:
+            return
+        marker = instances[-1]['uuid']
+
+
 @require_context
 @pick_context_manager_reader_allow_async
 def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
@@ -2255,11 +2335,11 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
         # We build a JOIN ladder expression for each tag, JOIN'ing
         # the first tag to the instances table, and each subsequent
         # tag to the last JOIN'd tags table
-        first_tag = tags.pop(0)
+        first_tag = tags[0]
         query_prefix = query_prefix.join(models.Instance.tags)
         query_prefix = query_prefix.filter(models.Tag.tag == first_tag)
 
-        for tag in tags:
+        for tag in tags[1:]:
             tag_alias = aliased(models.Tag)
             query_prefix = query_prefix.join(tag_alias,
                                              models.Instance.tags)
@@ -2295,11 +2375,9 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
 
     # paginate query
     if marker is not None:
-        try:
-            marker = _instance_get_by_uuid(
-                    context.elevated(read_deleted='yes'), marker)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
+        marker = _instance_get_marker(context, marker, sort_keys)
+        query_prefix = _instance_seek_filter(query_prefix, marker,
+                                             sort_keys, sort_dirs)
     try:
         query_prefix = sqlalchemyutils.paginate_query(query_prefix,
                                models.Instance, limit,
@@ -2312,6 +2390,45 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
 
 
+def _instance_get_marker(context, marker, sort_keys):
+    """Returns the values of the sort keys of the marker instance.
+
+    Only these values are needed to paginate a query, so the marker instance
+    is not loaded with its joined tables.
+    """
+    columns = models.Instance.__table__.columns
+    for sort_key in sort_keys:
+        if sort_key not in columns:
+            raise exception.InvalidSortKey()
+    result = model_query(context, models.Instance,
+                         [getattr(models.Instance, sort_key)
+                          for sort_key in sort_keys],
+                         read_deleted='yes').\
+                filter(models.Instance.uuid == marker).\
+                first()
+    if not result:
+        raise exception.MarkerNotFound(marker)
+    return result
+
+
+def _instance_seek_filter(query, marker, sort_keys, sort_dirs):
+    """Restricts a query paginated from a marker to the range of its first
+    sort key starting at the marker.
+
+    paginate_query selects the rows after the marker with an OR of
+    conditions on the sort keys, for which the databases do not use an index.
+    All these rows are in that range, so restricting the query to it selects
+    the same rows, and lets the database seek to the marker in an index
+    starting with the first sort key, like the ones on (deleted, created_at)
+    and (project_id, deleted, created_at) for the default sort keys.
+    """
+    value = getattr(marker, sort_keys[0])
+    column = getattr(models.Instance, sort_keys[0])
+    if sort_dirs[0].startswith('desc'):
+        return query.filter(column <= value)
+    return query.filter(column >= value)
+
+
 def _tag_instance_filter(context, query, filters):
     """Applies tag filtering to an Instance query.
 
@@ -2611,7 +2728,7 @@ def instance_get_all_by_host_and_node(context, host, node,
     if columns_to_join is None:
         manual_joins = []
     else:
-        candidates = ['system_metadata', 'metadata']
+        candidates = ['system_metadata', 'metadata', 'tags', 'services']
         manual_joins = [x for x in columns_to_join if x in candidates]
         columns_to_join = list(set(columns_to_join) - set(candidates))
     return _instances_fill_metadata(context,
@@ -3640,13 +3757,14 @@ def _reservation_create(uuid, usage, project_id, user_id, resource,
 # code always acquires the lock on quota_usages before acquiring the lock
 # on reservations.
 
-def _get_project_user_quota_usages(context, project_id, user_id):
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no").\
+def _get_project_user_quota_usages(context, project_id, user_id, lock=True):
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no").\
         filter_by(project_id=project_id).\
-        order_by(models.QuotaUsage.id.asc()).\
-        with_lockmode('update').\
-        all()
+        order_by(models.QuotaUsage.id.asc())
+    if lock:
+        query = query.with_lockmode('update')
+    rows = query.all()
     proj_result = dict()
     user_result = dict()
     # Get the total count of in_use,reserved
@@ -3932,6 +4050,147 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
     return reservations
 
 
+# NOTE: The conditional quota reservation below doesn't lock the quota
+# usages. The usages of the resources are reserved by UPDATE statements which
+# only match when the usages stay within their quotas, and which are
+# committed right away, so that the reservations of the concurrent requests
+# are seen by the checks of the project quotas.
+
+@main_context_manager.reader
+def _quota_usages_get_unlocked(context, project_id, user_id):
+    return _get_project_user_quota_usages(context, project_id, user_id,
+                                          lock=False)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def _quota_usages_reserve(context, usages, limits, deltas, expire,
+                          project_id, user_id):
+    """Reserves the deltas on the quota usages when they stay within their
+    limits, returning the uuids of the reservations.
+
+    Raises OverQuota with the resources going over their limits, none of
+    the deltas being reserved.
+    """
+    overs = []
+    # The usages are always updated in the same order to avoid deadlocks
+    for res, delta in sorted(deltas.items()):
+        values = {'until_refresh': models.QuotaUsage.until_refresh - 1}
+        query = model_query(context, models.QuotaUsage, read_deleted="no").\
+            filter_by(id=usages[res].id)
+        # NOTE: Only the positive increments are reserved, but a usage
+        # already over its limit is over quota for a null delta too, see
+        # quota_reserve().
+        if delta > 0:
+            values['reserved'] = models.QuotaUsage.reserved + delta
+        if delta >= 0 and limits[res] >= 0:
+            query = query.filter(models.QuotaUsage.in_use +
+                                 models.QuotaUsage.reserved + delta <=
+                                 limits[res])
+        if not query.update(values, synchronize_session=False):
+            LOG.debug('Request is over quota for resource "%(res)s". '
+                      'Limit: %(limit)s, delta: %(delta)s',
+                      {'res': res, 'limit': limits[res], 'delta': delta})
+            overs.append(res)
+    if overs:
+        raise exception.OverQuota(overs=overs, quotas=limits, usages={})
+
+    return [_reservation_create(str(uuid.uuid4()), usages[res], project_id,
+                                user_id, res, delta, expire,
+                                context.session).uuid
+            for res, delta in deltas.items()]
+
+
+@main_context_manager.reader
+def _quota_usages_get_project_totals(context, project_id, resources):
+    rows = model_query(context, models.QuotaUsage,
+                       (models.QuotaUsage.resource,
+                        func.sum(models.QuotaUsage.in_use +
+                                 models.QuotaUsage.reserved)),
+                       read_deleted="no").\
+        filter_by(project_id=project_id).\
+        filter(models.QuotaUsage.resource.in_(resources)).\
+        group_by(models.QuotaUsage.resource).\
+        all()
+    return dict(rows)
+
+
+@require_context
+def quota_reserve_conditional(context, resources, project_quotas, user_quotas,
+                              deltas, expire, until_refresh, max_age,
+                              project_id=None, user_id=None):
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    project_usages, user_usages = _quota_usages_get_unlocked(
+            context, project_id, user_id)
+
+    # The usages are created and refreshed by the locking reservation
+    if any(res not in user_usages or
+           _is_quota_refresh_needed(user_usages[res], max_age)
+           for res in deltas):
+        return quota_reserve(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=project_id, user_id=user_id)
+
+    # The usage of a per project resource is the one of the project
+    limits = {res: project_quotas[res] if user_usages[res].user_id is None
+              else user_quotas[res]
+              for res in deltas}
+    try:
+        reservations = _quota_usages_reserve(context, user_usages, limits,
+                                             deltas, expire, project_id,
+                                             user_id)
+    except exception.OverQuota as exc:
+        overs = exc.kwargs['overs']
+    else:
+        # The usages of the other users of the project are only checked once
+        # the resources are reserved, so that of two concurrent requests, at
+        # least the last one to check sees the reservations of the other.
+        checked = [res for res, delta in deltas.items()
+                   if delta >= 0 and project_quotas[res] >= 0 and
+                   user_usages[res].user_id is not None]
+        try:
+            totals = (_quota_usages_get_project_totals(context, project_id,
+                                                       checked)
+                      if checked else {})
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                reservation_rollback_conditional(context, reservations)
+        overs = [res for res in checked
+                 if totals[res] > project_quotas[res]]
+        if overs:
+            LOG.debug('Request is over project quota for resources '
+                      '%(overs)s. Project limits: %(limits)s, deltas: '
+                      '%(deltas)s, total project usages: %(totals)s',
+                      {'overs': overs, 'limits': project_quotas,
+                       'deltas': deltas, 'totals': totals})
+            reservation_rollback_conditional(context, reservations)
+
+    unders = [res for res, delta in deltas.items()
+              if delta < 0 and delta + user_usages[res].in_use < 0]
+    if unders:
+        LOG.warning(_LW("Change will make usage less than 0 for the following "
+                        "resources: %s"), unders)
+
+    if overs:
+        project_usages, user_usages = _quota_usages_get_unlocked(
+                context, project_id, user_id)
+        if project_quotas == user_quotas:
+            usages = project_usages
+        else:
+            usages = {k: dict(in_use=v.in_use, reserved=v.reserved)
+                      for k, v in user_usages.items()}
+        usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
+                  for k, v in usages.items()}
+        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                                  usages=usages)
+
+    return reservations
+
+
 def _quota_reservations_query(context, reservations):
     """Return the relevant reservations."""
 
@@ -3970,6 +4229,43 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
     reservation_query.soft_delete(synchronize_session=False)
 
 
+def _reservations_apply_conditional(context, reservations, commit):
+    reservation_query = model_query(context, models.Reservation,
+                                    read_deleted="no").\
+        filter(models.Reservation.uuid.in_(reservations)).\
+        order_by(models.Reservation.usage_id.asc())
+    for reservation in reservation_query.all():
+        # Only the request which deleted the reservation applies it
+        if not model_query(context, models.Reservation, read_deleted="no").\
+                filter_by(id=reservation.id).\
+                soft_delete(synchronize_session=False):
+            continue
+        values = {}
+        if reservation.delta >= 0:
+            values['reserved'] = (models.QuotaUsage.reserved -
+                                  reservation.delta)
+        if commit:
+            values['in_use'] = models.QuotaUsage.in_use + reservation.delta
+        if values:
+            model_query(context, models.QuotaUsage, read_deleted="no").\
+                filter_by(id=reservation.usage_id).\
+                update(values, synchronize_session=False)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def reservation_commit_conditional(context, reservations):
+    _reservations_apply_conditional(context, reservations, commit=True)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def reservation_rollback_conditional(context, reservations):
+    _reservations_apply_conditional(context, reservations, commit=False)
+
+
 @main_context_manager.writer
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     model_query(context, models.ProjectUserQuota, read_deleted="no").\
@@ -4023,6 +4319,19 @@ def reservation_expire(context):
     reservation_query.soft_delete(synchronize_session=False)
 
 
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def reservation_expire_conditional(context):
+    current_time = timeutils.utcnow()
+    rows = model_query(context, models.Reservation, (models.Reservation.uuid,),
+                       read_deleted="no").\
+        filter(models.Reservation.expire < current_time).\
+        all()
+    if rows:
+        _reservations_apply_conditional(context, [row[0] for row in rows],
+                                        commit=False)
+
+
 ###################
 
 
@@ -4781,6 +5090,19 @@ def migration_get_in_progress_by_host_and_node(context, host, node):
             all()
 
 
+@pick_context_manager_reader
+def migration_get_in_progress_by_host(context, host):
+
+    return model_query(context, models.Migration).\
+            filter(or_(models.Migration.source_compute == host,
+                       models.Migration.dest_compute == host)).\
+            filter(~models.Migration.status.in_(['accepted', 'confirmed',
+                                                 'reverted', 'error',
+                                                 'failed', 'completed'])).\
+            options(joinedload_all('instance.system_metadata')).\
+            all()
+
+
 @pick_context_manager_reader
 def migration_get_in_progress_by_instance(context, instance_uuid,
                                           migration_type=None):
@@ -5485,6 +5807,21 @@ def bw_usage_get_by_uuids(context, uuids, start_period):
     )
 
 
+@require_context
+@pick_context_manager_reader_allow_async
+def bw_usage_get_by_uuids_and_periods(context, uuids, start_periods):
+    start_periods = [
+        convert_objects_related_datetimes({'start_period': start_period},
+                                          'start_period')['start_period']
+        for start_period in start_periods]
+    return (
+        model_query(context, models.BandwidthUsage, read_deleted="yes").
+        filter(models.BandwidthUsage.uuid.in_(uuids)).
+        filter(models.BandwidthUsage.start_period.in_(start_periods)).
+        all()
+    )
+
+
 @require_context
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 @pick_context_manager_writer
@@ -5534,6 +5871,52 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
     return bwusage
 
 
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@pick_context_manager_writer
+def bw_usage_update_multi(context, start_period, usages, last_refreshed=None):
+    if not usages:
+        return
+
+    if last_refreshed is None:
+        last_refreshed = timeutils.utcnow()
+
+    ts_values = {'last_refreshed': last_refreshed,
+                 'start_period': start_period}
+    ts_keys = ('start_period', 'last_refreshed')
+    ts_values = convert_objects_related_datetimes(ts_values, *ts_keys)
+
+    values_by_key = {}
+    for usage in usages:
+        values_by_key[(usage['uuid'], usage['mac'])] = {
+            'last_refreshed': ts_values['last_refreshed'],
+            'last_ctr_in': usage['last_ctr_in'],
+            'last_ctr_out': usage['last_ctr_out'],
+            'bw_in': usage['bw_in'],
+            'bw_out': usage['bw_out']}
+
+    # NOTE: the existing records are updated in memory and flushed together,
+    # and the missing ones are created with a single multi-row insert.
+    uuids = set(instance_uuid for instance_uuid, mac in values_by_key)
+    bw_usages = model_query(context, models.BandwidthUsage,
+            read_deleted='yes').\
+                    filter_by(start_period=ts_values['start_period']).\
+                    filter(models.BandwidthUsage.uuid.in_(uuids)).all()
+    for bw_usage in bw_usages:
+        values = values_by_key.pop((bw_usage.uuid, bw_usage.mac), None)
+        if values is not None:
+            bw_usage.update(values)
+
+    new_entries = []
+    for (instance_uuid, mac), values in values_by_key.items():
+        values.update(uuid=instance_uuid, mac=mac,
+                      start_period=ts_values['start_period'])
+        new_entries.append(values)
+    if new_entries:
+        context.session.execute(models.BandwidthUsage.__table__.insert(),
+                                new_entries)
+
+
 ####################
 
 
@@ -5654,6 +6037,63 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
     return vol_usage
 
 
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@pick_context_manager_writer
+def vol_usage_update_multi(context, usages):
+    refreshed = timeutils.utcnow()
+
+    usages_by_volume = {usage['volume_id']: usage for usage in usages}
+    if not usages_by_volume:
+        return []
+
+    current_usages = {}
+    query = model_query(context, models.VolumeUsage, read_deleted="yes").\
+        filter(models.VolumeUsage.volume_id.in_(list(usages_by_volume)))
+    for current_usage in query.all():
+        # NOTE: like vol_usage_update(), only the first record of a volume is
+        # updated.
+        current_usages.setdefault(current_usage.volume_id, current_usage)
+
+    vol_usages = []
+    for volume_id, usage in usages_by_volume.items():
+        values = {'curr_last_refreshed': refreshed,
+                  'curr_reads': usage['rd_req'],
+                  'curr_read_bytes': usage['rd_bytes'],
+                  'curr_writes': usage['wr_req'],
+                  'curr_write_bytes': usage['wr_bytes'],
+                  'instance_uuid': usage['instance_id'],
+                  'project_id': usage['project_id'],
+                  'user_id': usage['user_id'],
+                  'availability_zone': usage['availability_zone']}
+        vol_usage = current_usages.get(volume_id)
+        if vol_usage is None:
+            vol_usage = models.VolumeUsage()
+            vol_usage.volume_id = volume_id
+            context.session.add(vol_usage)
+        elif (usage['rd_req'] < vol_usage.curr_reads or
+              usage['rd_bytes'] < vol_usage.curr_read_bytes or
+              usage['wr_req'] < vol_usage.curr_writes or
+              usage['wr_bytes'] < vol_usage.curr_write_bytes):
+            LOG.info(_LI("Volume(%s) has lower stats then what is in "
+                         "the database. Instance must have been rebooted "
+                         "or crashed. Updating totals."), volume_id)
+            values['tot_reads'] = (vol_usage.tot_reads +
+                                   vol_usage.curr_reads)
+            values['tot_read_bytes'] = (vol_usage.tot_read_bytes +
+                                        vol_usage.curr_read_bytes)
+            values['tot_writes'] = (vol_usage.tot_writes +
+                                    vol_usage.curr_writes)
+            values['tot_write_bytes'] = (vol_usage.tot_write_bytes +
+                                         vol_usage.curr_write_bytes)
+        vol_usage.update(values)
+        vol_usages.append(vol_usage)
+
+    # NOTE: the updated and new records are all written by a single flush
+    context.session.flush()
+    return vol_usages
+
+
 ####################
 
 
@@ -5683,6 +6123,16 @@ def s3_image_get_by_uuid(context, image_uuid):
     return result
 
 
+@main_context_manager.reader
+def s3_image_get_by_uuids(context, image_uuids):
+    """Find the local s3 images represented by the provided uuids."""
+    if not image_uuids:
+        return []
+    return model_query(context, models.S3Image, read_deleted="yes").\
+                filter(models.S3Image.uuid.in_(image_uuids)).\
+                all()
+
+
 @main_context_manager.writer
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid."""
@@ -6204,6 +6654,16 @@ def ec2_instance_get_by_uuid(context, instance_uuid):
     return result
 
 
+@require_context
+@pick_context_manager_reader
+def ec2_instance_get_by_uuids(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return _ec2_instance_get_query(context).\
+                    filter(models.InstanceIdMapping.uuid.in_(instance_uuids)).\
+                    all()
+
+
 @require_context
 @pick_context_manager_reader
 def ec2_instance_get_by_id(context, instance_id):
@@ -6926,6 +7386,13 @@ def instance_tag_set(context, instance_uuid, tags):
         resource_id=instance_uuid).all()
 
 
+def _instance_tags_get_multi(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return context.session.query(models.Tag).filter(
+        models.Tag.resource_id.in_(instance_uuids))
+
+
 @pick_context_manager_reader
 def instance_tag_get_by_instance_uuid(context, instance_uuid):
     _check_instance_exists_in_project(context, instance_uuid)
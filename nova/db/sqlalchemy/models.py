@@ -214,6 +214,10 @@ class Instance(BASE, NovaBase, models.SoftDeleteMixin):
               'host', 'deleted', 'cleaned'),
         Index('instances_deleted_created_at_idx',
               'deleted', 'created_at'),
+        Index('instances_project_id_deleted_created_at_idx',
+              'project_id', 'deleted', 'created_at'),
+        Index('instances_updated_at_idx',
+              'updated_at'),
         schema.UniqueConstraint('uuid', name='uniq_instances0uuid'),
     )
     injected_files = []
@@ -17,6 +17,8 @@
 Filter support
 """
 
+import time
+
 from oslo_log import log as logging
 
 from nova.i18n import _LI
@@ -48,6 +50,11 @@ class BaseFilter(object):
     # for each request rather than for each instance
     run_filter_once_per_request = False
 
+    # Set to true in a subclass if the result of a filter for an object may
+    # change when another object is selected for a previous instance of the
+    # request, and not only when that object itself is selected
+    depends_on_previous_selections = False
+
     def run_filter_for_index(self, index):
         """Return True if the filter needs to be run for the "index-th"
         instance in a request.  Only need to override this if a filter
@@ -65,7 +72,23 @@ class BaseFilterHandler(loadables.BaseLoader):
     This class should be subclassed where one needs to use filters.
     """
 
-    def get_filtered_objects(self, filters, objs, spec_obj, index=0):
+    def _get_batch(self, objs):
+        """Return an object filtering all the objects at once, or None.
+
+        The returned object must have a filter_all(filter_, objs, spec_obj)
+        method, called in place of filter_.filter_all(objs, spec_obj). Override
+        this in a subclass if some filters can process the objects in batch.
+        """
+        return None
+
+    def get_filtered_objects(self, filters, objs, spec_obj, index=0,
+                             profile=None):
+        """Return the objects passing all the filters run for this index.
+
+        If a profile is given, the time spent by each filter and the numbers
+        of objects it was given and returned are added to it with its
+        add_filter(name, elapsed, start_count, end_count) method.
+        """
         list_objs = list(objs)
         LOG.debug("Starting with %d host(s)", len(list_objs))
         # Track the hosts as they are removed. The 'full_filter_results' list
@@ -73,28 +96,34 @@ class BaseFilterHandler(loadables.BaseLoader):
         # filter, while the 'part_filter_results' list just tracks the number
         # removed by each filter, unless the filter returns zero hosts, in
         # which case it records the host/nodename for the last batch that was
-        # removed. Since the full_filter_results can be very large, it is only
-        # recorded if the LOG level is set to debug.
+        # removed. Since the full_filter_results can be very large, the
+        # host/nodename info is only extracted from the remaining objects if
+        # all the hosts are removed.
         part_filter_results = []
         full_filter_results = []
         log_msg = "%(cls_name)s: (start: %(start)s, end: %(end)s)"
+        batch = self._get_batch(list_objs)
         for filter_ in filters:
             if filter_.run_filter_for_index(index):
                 cls_name = filter_.__class__.__name__
                 start_count = len(list_objs)
-                objs = filter_.filter_all(list_objs, spec_obj)
+                start_time = time.time()
+                if batch is not None:
+                    objs = batch.filter_all(filter_, list_objs, spec_obj)
+                else:
+                    objs = filter_.filter_all(list_objs, spec_obj)
                 if objs is None:
                     LOG.debug("Filter %s says to stop filtering", cls_name)
                     return
                 list_objs = list(objs)
                 end_count = len(list_objs)
+                if profile is not None:
+                    profile.add_filter(cls_name, time.time() - start_time,
+                                       start_count, end_count)
                 part_filter_results.append(log_msg % {"cls_name": cls_name,
                         "start": start_count, "end": end_count})
                 if list_objs:
-                    remaining = [(getattr(obj, "host", obj),
-                                  getattr(obj, "nodename", ""))
-                                 for obj in list_objs]
-                    full_filter_results.append((cls_name, remaining))
+                    full_filter_results.append((cls_name, list_objs))
                 else:
                     LOG.info(_LI("Filter %s returned 0 hosts"), cls_name)
                     full_filter_results.append((cls_name, None))
@@ -114,6 +143,11 @@ class BaseFilterHandler(loadables.BaseLoader):
                 inst_uuid = inst_props.get("uuid", "")
             else:
                 inst_uuid = spec_obj.instance_uuid
+            full_filter_results = [
+                (name, remaining if remaining is None else
+                 [(getattr(obj, "host", obj), getattr(obj, "nodename", ""))
+                  for obj in remaining])
+                for name, remaining in full_filter_results]
             msg_dict = {"inst_uuid": inst_uuid,
                         "str_results": str(full_filter_results),
                        }
@@ -230,6 +230,13 @@ class NetworkAPI(base.Base):
         """Show specific port."""
         raise NotImplementedError()
 
+    def get_ports_by_instance(self, context, instances):
+        """Returns the ports of the instances, by instance uuid, listed in
+        bulk so that they can be passed to get_instance_nw_info() with the
+        ports argument.
+        """
+        raise NotImplementedError()
+
     def add_fixed_ip_to_instance(self, context, instance, network_id):
         """Adds a fixed IP to instance from specified network."""
         raise NotImplementedError()
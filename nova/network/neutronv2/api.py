@@ -92,6 +92,10 @@ _ADMIN_AUTH = None
 
 DEFAULT_SECGROUP = 'default'
 
+# Maximum number of device ids in a single port listing, so that the URL of
+# the request remains of a reasonable size
+MAX_DEVICE_IDS_PER_PORT_LISTING = 100
+
 
 def list_opts():
     opts = copy.deepcopy(_neutron_options)
@@ -902,6 +906,30 @@ class API(base_api.NetworkAPI):
         """List ports for the client based on search options."""
         return get_client(context).list_ports(**search_opts)
 
+    def get_ports_by_instance(self, context, instances):
+        """Return the ports of the instances, by instance uuid.
+
+        The ports of up to MAX_DEVICE_IDS_PER_PORT_LISTING instances are
+        listed with a single request, instead of one request per instance
+        in _build_network_info_model().
+        """
+        project_ids = {instance.uuid: instance.project_id
+                       for instance in instances}
+        ports = {instance_uuid: [] for instance_uuid in project_ids}
+        instance_uuids = list(project_ids)
+        client = get_client(context, admin=True)
+        for i in range(0, len(instance_uuids),
+                       MAX_DEVICE_IDS_PER_PORT_LISTING):
+            data = client.list_ports(device_id=instance_uuids[
+                i:i + MAX_DEVICE_IDS_PER_PORT_LISTING])
+            for port in data.get('ports', []):
+                instance_uuid = port['device_id']
+                # Same filter as _build_network_info_model()
+                if (instance_uuid in ports and
+                        port['tenant_id'] == project_ids[instance_uuid]):
+                    ports[instance_uuid].append(port)
+        return ports
+
     def show_port(self, context, port_id):
         """Return the port for the client given the port id.
 
@@ -945,7 +973,8 @@ class API(base_api.NetworkAPI):
 
     def _get_instance_nw_info(self, context, instance, networks=None,
                               port_ids=None, admin_client=None,
-                              preexisting_port_ids=None, **kwargs):
+                              preexisting_port_ids=None, ports=None,
+                              **kwargs):
         # NOTE(danms): This is an inner method intended to be called
         # by other code that updates instance nwinfo. It *must* be
         # called with the refresh_cache-%(instance_uuid) lock held!
@@ -956,7 +985,7 @@ class API(base_api.NetworkAPI):
         compute_utils.refresh_info_cache_for_instance(context, instance)
         nw_info = self._build_network_info_model(context, instance, networks,
                                                  port_ids, admin_client,
-                                                 preexisting_port_ids)
+                                                 preexisting_port_ids, ports)
         return network_model.NetworkInfo.hydrate(nw_info)
 
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
@@ -1731,7 +1760,7 @@ class API(base_api.NetworkAPI):
 
     def _build_network_info_model(self, context, instance, networks=None,
                                   port_ids=None, admin_client=None,
-                                  preexisting_port_ids=None):
+                                  preexisting_port_ids=None, ports=None):
         """Return list of ordered VIFs attached to instance.
 
         :param context: Request context.
@@ -1749,18 +1778,35 @@ class API(base_api.NetworkAPI):
                         an instance is de-allocated. Supplied list will
                         be added to the cached list of preexisting port
                         IDs for this instance.
+        :param ports: The ports of the instance in Neutron, as returned by
+                      get_ports_by_instance(). If value is None, or if they
+                      do not match the ports of the info cache, they are
+                      listed from Neutron.
         """
 
-        search_opts = {'tenant_id': instance.project_id,
-                       'device_id': instance.uuid, }
         if admin_client is None:
             client = get_client(context, admin=True)
         else:
             client = admin_client
 
-        data = client.list_ports(**search_opts)
-
-        current_neutron_ports = data.get('ports', [])
+        if ports is not None:
+            # NOTE: The ports may have been listed before the
+            # refresh_cache lock was taken, and a port attached or detached
+            # since then. The info cache has been refreshed under the lock,
+            # so list the ports again unless it has the same ones.
+            cached_port_ids = set(
+                vif['id'] for vif in
+                compute_utils.get_nw_info_for_instance(instance))
+            if cached_port_ids != set(port['id'] for port in ports):
+                ports = None
+
+        if ports is None:
+            search_opts = {'tenant_id': instance.project_id,
+                           'device_id': instance.uuid, }
+            data = client.list_ports(**search_opts)
+            ports = data.get('ports', [])
+
+        current_neutron_ports = ports
         nw_info_refresh = networks is None and port_ids is None
         networks, port_ids = self._gather_port_ids_and_networks(
                 context, instance, networks, port_ids)
@@ -80,7 +80,8 @@ class BandwidthUsageList(base.ObjectListBase, base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Add use_slave to get_by_uuids
     # Version 1.2: BandwidthUsage <= version 1.2
-    VERSION = '1.2'
+    # Version 1.3: Add get_by_uuids_and_periods() and update_multi()
+    VERSION = '1.3'
     fields = {
         'objects': fields.ListOfObjectsField('BandwidthUsage'),
     }
@@ -99,3 +100,31 @@ class BandwidthUsageList(base.ObjectListBase, base.NovaObject):
                                                 start_period=start_period,
                                                 use_slave=use_slave)
         return base.obj_make_list(context, cls(), BandwidthUsage, db_bw_usages)
+
+    @staticmethod
+    @db.select_db_reader_mode
+    def _db_bw_usage_get_by_uuids_and_periods(context, uuids, start_periods,
+                                              use_slave=False):
+        return db.bw_usage_get_by_uuids_and_periods(
+            context, uuids=uuids, start_periods=start_periods)
+
+    @base.remotable_classmethod
+    def get_by_uuids_and_periods(cls, context, uuids, start_periods,
+                                 use_slave=False):
+        db_bw_usages = cls._db_bw_usage_get_by_uuids_and_periods(
+            context, uuids=uuids, start_periods=start_periods,
+            use_slave=use_slave)
+        return base.obj_make_list(context, cls(), BandwidthUsage, db_bw_usages)
+
+    @base.serialize_args
+    @base.remotable_classmethod
+    def update_multi(cls, context, start_period, usages, last_refreshed=None,
+                     update_cells=True):
+        """Creates or updates the usages of an audit period at once.
+
+        :param usages: list of dicts with the uuid, mac, bw_in, bw_out,
+                       last_ctr_in and last_ctr_out of each usage
+        """
+        db.bw_usage_update_multi(context, start_period, usages,
+                                 last_refreshed=last_refreshed,
+                                 update_cells=update_cells)
@@ -15,6 +15,7 @@
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 from oslo_utils import versionutils
 
@@ -24,6 +25,7 @@ from nova import objects
 from nova.objects import base
 from nova.objects import fields
 from nova.objects import pci_device_pool
+from nova import utils
 
 CONF = cfg.CONF
 CONF.import_opt('cpu_allocation_ratio', 'nova.compute.resource_tracker')
@@ -380,7 +382,9 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
     # Version 1.12 ComputeNode version 1.12
     # Version 1.13 ComputeNode version 1.13
     # Version 1.14 ComputeNode version 1.14
-    VERSION = '1.14'
+    # Version 1.15 Added get_all_changed_since()
+    # Version 1.16 Added save_all()
+    VERSION = '1.16'
     fields = {
         'objects': fields.ListOfObjectsField('ComputeNode'),
         }
@@ -391,6 +395,42 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.ComputeNode,
                                   db_computes)
 
+    @base.remotable_classmethod
+    def _get_all_changed_since(cls, context, changes_since):
+        # NOTE: We need to convert the timestamp string to a
+        # timezone-aware datetime object for the DB API call.
+        changes_since = timeutils.parse_isotime(changes_since)
+        db_computes = db.compute_node_get_all_changed_since(context,
+                                                            changes_since)
+        return base.obj_make_list(context, cls(context), objects.ComputeNode,
+                                  db_computes)
+
+    @classmethod
+    def get_all_changed_since(cls, context, changes_since):
+        """Get the compute nodes created, updated or deleted since a time.
+
+        :param context: nova request context
+        :param changes_since: datetime from which changed compute nodes are
+                              returned
+        :returns: ComputeNodeList, including soft-deleted compute nodes
+        """
+        # NOTE: We have to convert the datetime object to a string
+        # primitive for the remote call.
+        return cls._get_all_changed_since(context,
+                                          utils.isotime(changes_since))
+
+    @base.remotable_classmethod
+    def save_all(cls, context, compute_nodes):
+        """Save the changes of several compute nodes with a single call.
+
+        :param context: nova request context
+        :param compute_nodes: ComputeNodeList of the compute nodes to save
+        :returns: ComputeNodeList of the saved compute nodes
+        """
+        for compute_node in compute_nodes:
+            compute_node.save()
+        return compute_nodes
+
     @base.remotable_classmethod
     def get_by_hypervisor(cls, context, hypervisor_match):
         db_computes = db.compute_node_search_by_hypervisor(context,
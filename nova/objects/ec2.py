@@ -217,3 +217,46 @@ class EC2Ids(base.NovaObject):
     def get_by_instance(cls, context, instance):
         ec2_ids = cls._get_ec2_ids(context, instance)
         return cls._from_dict(cls(context), ec2_ids)
+
+    @classmethod
+    def _get_by_instances(cls, context, instances):
+        """Returns the ec2 ids of the instances by instance uuid.
+
+        The ids of all the instances, and of all their images, are looked up
+        with a single query each, the missing ones being created.
+        """
+        inst_ids = {db_imap['uuid']: db_imap['id'] for db_imap in
+                    db.ec2_instance_get_by_uuids(
+                        context, [inst.uuid for inst in instances])}
+        image_uuids = set()
+        for instance in instances:
+            image_uuids.update(image_uuid for image_uuid in
+                               (instance.image_ref, instance.kernel_id,
+                                instance.ramdisk_id) if image_uuid)
+        image_ids = {db_s3imap['uuid']: db_s3imap['id'] for db_s3imap in
+                     db.s3_image_get_by_uuids(context, list(image_uuids))}
+
+        def _get_image_ec2_id(image_uuid, image_type):
+            if not image_uuid:
+                return None
+            if image_uuid not in image_ids:
+                db_s3imap = db.s3_image_create(context, image_uuid)
+                image_ids[image_uuid] = db_s3imap['id']
+            return ec2utils.image_ec2_id(image_ids[image_uuid],
+                                         ec2utils.image_type(image_type))
+
+        ec2_ids_by_uuid = {}
+        for instance in instances:
+            if instance.uuid not in inst_ids:
+                db_imap = db.ec2_instance_create(context, instance.uuid)
+                inst_ids[instance.uuid] = db_imap['id']
+            ec2_ids = {
+                'instance_id': ec2utils.id_to_ec2_id(inst_ids[instance.uuid]),
+                'ami_id': _get_image_ec2_id(instance.image_ref, 'ami'),
+                'kernel_id': _get_image_ec2_id(instance.kernel_id, 'kernel'),
+                'ramdisk_id': _get_image_ec2_id(instance.ramdisk_id,
+                                                'ramdisk'),
+            }
+            ec2_ids_by_uuid[instance.uuid] = cls._from_dict(cls(context),
+                                                            ec2_ids)
+        return ec2_ids_by_uuid
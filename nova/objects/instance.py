@@ -12,7 +12,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import contextlib
+import weakref
 
 from oslo_config import cfg
 from oslo_db import exception as db_exc
@@ -58,6 +60,32 @@ INSTANCE_OPTIONAL_ATTRS = (_INSTANCE_OPTIONAL_JOINED_FIELDS +
 INSTANCE_DEFAULT_FIELDS = ['metadata', 'system_metadata',
                            'info_cache', 'security_groups']
 
+# These are fields that an InstanceList lazy-loads for all its instances at
+# once when one of them lazy-loads it
+_INSTANCE_LIST_LOADABLE_FIELDS = (['fault', 'old_flavor', 'new_flavor',
+                                   'ec2_ids'] +
+                                  _INSTANCE_OPTIONAL_JOINED_FIELDS +
+                                  _INSTANCE_EXTRA_FIELDS)
+
+# Number of lazy-loads done by this process per field, one instance at a
+# time, or by an InstanceList along with the number of instances loaded
+_lazy_load_counts = collections.defaultdict(collections.Counter)
+
+
+def get_lazy_load_counts():
+    """Returns the number of lazy-loads of each field of the instances.
+
+    :returns: a dict of dicts counting per field the 'single' lazy-loads of
+              an instance, the 'list' lazy-loads of all the instances of an
+              InstanceList, and the 'list_instances' loaded by the latter
+    """
+    return {attrname: dict(counts)
+            for attrname, counts in _lazy_load_counts.items()}
+
+
+def reset_lazy_load_counts():
+    _lazy_load_counts.clear()
+
 
 def _expected_cols(expected_attrs):
     """Return expected_attrs that are columns needing joining.
@@ -201,6 +229,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
     def __init__(self, *args, **kwargs):
         super(Instance, self).__init__(*args, **kwargs)
         self._reset_metadata_tracking()
+        # A weak reference to the InstanceList this instance was loaded in
+        self._instance_list = None
 
     @property
     def image_meta(self):
@@ -797,10 +827,11 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 objects.InstancePCIRequests.get_by_instance_uuid(
                     self._context, self.uuid)
 
-    def _load_flavor(self):
-        instance = self.__class__.get_by_uuid(
-            self._context, uuid=self.uuid,
-            expected_attrs=['flavor', 'system_metadata'])
+    def _load_flavor(self, instance=None):
+        if instance is None:
+            instance = self.__class__.get_by_uuid(
+                self._context, uuid=self.uuid,
+                expected_attrs=['flavor', 'system_metadata'])
 
         # NOTE(danms): Orphan the instance to make sure we don't lazy-load
         # anything below
@@ -899,11 +930,20 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             raise exception.OrphanedObjectError(method='obj_load_attr',
                                                 objtype=self.obj_name())
 
+        instance_list = self._instance_list and self._instance_list()
+        if (instance_list is not None and
+                attrname in _INSTANCE_LIST_LOADABLE_FIELDS and
+                not (attrname == 'services' and self.deleted)):
+            instance_list._load_attr(self._context, attrname, self)
+            if self.obj_attr_is_set(attrname):
+                return
+
         LOG.debug("Lazy-loading '%(attr)s' on %(name)s uuid %(uuid)s",
                   {'attr': attrname,
                    'name': self.obj_name(),
                    'uuid': self.uuid,
                    })
+        _lazy_load_counts[attrname]['single'] += 1
 
         # NOTE(danms): We handle some fields differently here so that we
         # can be more efficient
@@ -1010,18 +1050,31 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             self._normalize_cell_name()
 
 
+def _get_latest_faults(context, instance_uuids):
+    """Returns the latest fault of the instances which have one, by
+    instance uuid.
+    """
+    faults = objects.InstanceFaultList.get_by_instance_uuids(
+        context, instance_uuids)
+    faults_by_uuid = {}
+    for fault in faults:
+        if fault.instance_uuid not in faults_by_uuid:
+            faults_by_uuid[fault.instance_uuid] = fault
+    return faults_by_uuid
+
+
 def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
     get_fault = expected_attrs and 'fault' in expected_attrs
     inst_faults = {}
     if get_fault:
         # Build an instance_uuid:latest-fault mapping
         expected_attrs.remove('fault')
-        instance_uuids = [inst['uuid'] for inst in db_inst_list]
-        faults = objects.InstanceFaultList.get_by_instance_uuids(
-            context, instance_uuids)
-        for fault in faults:
-            if fault.instance_uuid not in inst_faults:
-                inst_faults[fault.instance_uuid] = fault
+        inst_faults = _get_latest_faults(
+            context, [inst['uuid'] for inst in db_inst_list])
+    get_ec2_ids = expected_attrs and 'ec2_ids' in expected_attrs
+    if get_ec2_ids:
+        # The ec2 ids are looked up for the whole list once it is built
+        expected_attrs.remove('ec2_ids')
 
     inst_cls = objects.Instance
 
@@ -1033,7 +1086,14 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
         if get_fault:
             inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
         inst_list.objects.append(inst_obj)
+    if get_ec2_ids:
+        ec2_ids_by_uuid = objects.EC2Ids._get_by_instances(
+            context, inst_list.objects)
+        for inst_obj in inst_list.objects:
+            inst_obj.ec2_ids = ec2_ids_by_uuid[inst_obj.uuid]
+            inst_obj.obj_reset_changes(['ec2_ids'], recursive=True)
     inst_list.obj_reset_changes()
+    inst_list._link_instances()
     return inst_list
 
 
@@ -1046,6 +1106,74 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         'objects': fields.ListOfObjectsField('Instance'),
     }
 
+    def __init__(self, *args, **kwargs):
+        super(InstanceList, self).__init__(*args, **kwargs)
+        self._link_instances()
+
+    @classmethod
+    def _obj_from_primitive(cls, context, objver, primitive):
+        self = super(InstanceList, cls)._obj_from_primitive(context, objver,
+                                                            primitive)
+        self._link_instances()
+        return self
+
+    def _link_instances(self):
+        """Lets the instances of the list lazy-load their attributes along
+        with the other instances of the list.
+        """
+        ref = weakref.ref(self)
+        for instance in self.objects:
+            instance._instance_list = ref
+
+    def _load_attr(self, context, attrname, instance):
+        """Lazy-loads an attribute for all the instances of the list which
+        do not have it, with a single query.
+
+        Nothing is loaded if the instance lazy-loading the attribute was
+        removed from the list, it then lazy-loads the attribute on its own.
+        """
+        if not any(inst is instance for inst in self.objects):
+            return
+        instances = [inst for inst in self.objects
+                     if not inst.obj_attr_is_set(attrname) and
+                     not (attrname == 'services' and inst.deleted)]
+        LOG.debug("Lazy-loading '%(attr)s' on %(count)d instances of "
+                  "%(name)s", {'attr': attrname, 'count': len(instances),
+                               'name': self.obj_name()})
+        counts = _lazy_load_counts[attrname]
+        counts['list'] += 1
+        counts['list_instances'] += len(instances)
+
+        uuids = [inst.uuid for inst in instances]
+        if attrname == 'fault':
+            faults_by_uuid = _get_latest_faults(context, uuids)
+            for inst in instances:
+                inst.fault = faults_by_uuid.get(inst.uuid)
+                inst.obj_reset_changes(['fault'])
+            return
+
+        load_flavor = 'flavor' in attrname
+        if load_flavor:
+            expected_attrs = ['flavor', 'system_metadata']
+        else:
+            expected_attrs = [attrname]
+        loaded_instances = self.__class__.get_by_filters(
+            context, {'uuid': uuids}, expected_attrs=expected_attrs)
+        loaded_by_uuid = {inst.uuid: inst for inst in loaded_instances}
+        for inst in instances:
+            loaded_inst = loaded_by_uuid.get(inst.uuid)
+            # NOTE: the instances which were not loaded, like the deleted
+            # ones, are left to be lazy-loaded on their own
+            if load_flavor:
+                if loaded_inst is None or 'flavor' not in loaded_inst:
+                    continue
+                inst._load_flavor(loaded_inst)
+            else:
+                if loaded_inst is None or attrname not in loaded_inst:
+                    continue
+                inst[attrname] = loaded_inst[attrname]
+            inst.obj_reset_changes([attrname], recursive=True)
+
     @classmethod
     @db.select_db_reader_mode
     def _get_by_filters_impl(cls, context, filters,
@@ -1074,6 +1202,34 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
             limit=limit, marker=marker, expected_attrs=expected_attrs,
             use_slave=use_slave, sort_keys=sort_keys, sort_dirs=sort_dirs)
 
+    @classmethod
+    def iter_by_filters(cls, context, filters, batch_size,
+                        sort_key='created_at', sort_dir='desc',
+                        expected_attrs=None, use_slave=False,
+                        sort_keys=None, sort_dirs=None):
+        """Yields the instances matching the filters by InstanceLists of at
+        most batch_size instances.
+
+        Each batch is fetched with get_by_filters from the last instance of
+        the previous batch, when the previous batch was consumed, so that
+        only one batch of instances is held in memory at a time.
+        """
+        marker = None
+        while True:
+            # NOTE: the expected attributes are consumed when building a list
+            instances = cls.get_by_filters(
+                context, filters, sort_key=sort_key, sort_dir=sort_dir,
+                limit=batch_size, marker=marker,
+                expected_attrs=(list(expected_attrs) if expected_attrs
+                                else expected_attrs),
+                use_slave=use_slave, sort_keys=sort_keys,
+                sort_dirs=sort_dirs)
+            if instances:
+                yield instances
+            if len(instances) < batch_size:
+                return
+            marker = instances[-1].uuid
+
     @staticmethod
     @db.select_db_reader_mode
     def _db_instance_get_all_by_host(context, host, columns_to_join,
@@ -1198,12 +1354,7 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         :returns: A list of instance uuids for which faults were found.
         """
         uuids = [inst.uuid for inst in self]
-        faults = objects.InstanceFaultList.get_by_instance_uuids(
-            self._context, uuids)
-        faults_by_uuid = {}
-        for fault in faults:
-            if fault.instance_uuid not in faults_by_uuid:
-                faults_by_uuid[fault.instance_uuid] = fault
+        faults_by_uuid = _get_latest_faults(self._context, uuids)
 
         for instance in self:
             if instance.uuid in faults_by_uuid:
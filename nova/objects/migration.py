@@ -159,7 +159,8 @@ class MigrationList(base.ObjectListBase, base.NovaObject):
     # Version 1.2: Migration version 1.2
     # Version 1.3: Added a new function to get in progress migrations
     #              for an instance.
-    VERSION = '1.3'
+    # Version 1.4: Added get_in_progress_by_host()
+    VERSION = '1.4'
 
     fields = {
         'objects': fields.ListOfObjectsField('Migration'),
@@ -187,6 +188,12 @@ class MigrationList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.Migration,
                                   db_migrations)
 
+    @base.remotable_classmethod
+    def get_in_progress_by_host(cls, context, host):
+        db_migrations = db.migration_get_in_progress_by_host(context, host)
+        return base.obj_make_list(context, cls(context), objects.Migration,
+                                  db_migrations)
+
     @base.remotable_classmethod
     def get_by_filters(cls, context, filters):
         db_migrations = db.migration_get_all_by_filters(context, filters)
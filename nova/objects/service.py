@@ -13,6 +13,7 @@
 #    under the License.
 
 from oslo_log import log as logging
+from oslo_utils import timeutils
 from oslo_utils import versionutils
 
 from nova import availability_zones
@@ -23,6 +24,7 @@ from nova import objects
 from nova.objects import base
 from nova.objects import fields
 from nova.objects import notification
+from nova import utils
 
 
 LOG = logging.getLogger(__name__)
@@ -374,7 +376,8 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
     # Version 1.16: Service version 1.18
     # Version 1.17: Service version 1.19
     # Version 1.18: Added include_disabled parameter to get_by_binary()
-    VERSION = '1.18'
+    # Version 1.19: Added get_by_binary_changed_since()
+    VERSION = '1.19'
 
     fields = {
         'objects': fields.ListOfObjectsField('Service'),
@@ -395,6 +398,22 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.Service,
                                   db_services)
 
+    @base.remotable_classmethod
+    def _get_by_binary_changed_since(cls, context, binary, changes_since):
+        changes_since = timeutils.parse_isotime(changes_since)
+        db_services = db.service_get_all_by_binary_changed_since(
+            context, binary, changes_since)
+        return base.obj_make_list(context, cls(context), objects.Service,
+                                  db_services)
+
+    @classmethod
+    def get_by_binary_changed_since(cls, context, binary, changes_since):
+        """Get the services for a binary created, updated or deleted since a
+        given time, including the disabled and soft-deleted ones.
+        """
+        return cls._get_by_binary_changed_since(context, binary,
+                                                utils.isotime(changes_since))
+
     @base.remotable_classmethod
     def get_by_host(cls, context, host):
         db_services = db.service_get_all_by_host(context, host)
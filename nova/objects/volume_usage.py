@@ -57,3 +57,35 @@ class VolumeUsage(base.NovaPersistentObject, base.NovaObject):
             self.instance_uuid, self.project_id, self.user_id,
             self.availability_zone, update_totals=update_totals)
         self._from_db_object(self._context, self, db_vol_usage)
+
+
+@base.NovaObjectRegistry.register
+class VolumeUsageList(base.ObjectListBase, base.NovaObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    fields = {
+        'objects': fields.ListOfObjectsField('VolumeUsage'),
+    }
+
+    @base.remotable_classmethod
+    def update_multi(cls, context, vol_usages):
+        """Saves the current usage of several volumes at once.
+
+        :param vol_usages: list of VolumeUsage objects with their current
+                           usage set
+        :returns: a VolumeUsageList of the saved usages
+        """
+        usages = [{'volume_id': vol_usage.volume_id,
+                   'rd_req': vol_usage.curr_reads,
+                   'rd_bytes': vol_usage.curr_read_bytes,
+                   'wr_req': vol_usage.curr_writes,
+                   'wr_bytes': vol_usage.curr_write_bytes,
+                   'instance_id': vol_usage.instance_uuid,
+                   'project_id': vol_usage.project_id,
+                   'user_id': vol_usage.user_id,
+                   'availability_zone': vol_usage.availability_zone}
+                  for vol_usage in vol_usages]
+        db_vol_usages = db.vol_usage_update_multi(context, usages)
+        return base.obj_make_list(context, cls(context), VolumeUsage,
+                                  db_vol_usages)
@@ -95,7 +95,10 @@ quota_opts = [
                     'passed since the last reservation'),
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
-               help='Default driver to use for quota checks'),
+               help='Default driver to use for quota checks. '
+                    'nova.quota.ConditionalUpdateQuotaDriver reserves the '
+                    'resources without locking the quota usages of the '
+                    'project'),
     ]
 
 CONF = cfg.CONF
@@ -572,6 +575,11 @@ class DbQuotaDriver(object):
                   {'project_id': project_id, 'user_id': user_id,
                    'quotas': quotas})
 
+        return self._quota_reserve(context, resources, quotas, user_quotas,
+                                   deltas, expire, project_id, user_id)
+
+    def _quota_reserve(self, context, resources, quotas, user_quotas, deltas,
+                       expire, project_id, user_id):
         # NOTE(Vek): Most of the work here has to be done in the DB
         #            API, because we have to do it in a transaction,
         #            which means access to the session.  Since the
@@ -690,6 +698,65 @@ class DbQuotaDriver(object):
         db.reservation_expire(context)
 
 
+class ConditionalUpdateQuotaDriver(DbQuotaDriver):
+    """Driver enforcing the quotas like the DbQuotaDriver, without locking
+    the quota usages of a project to reserve, commit and roll back its
+    resources.
+
+    The usage of each resource is reserved by a conditional UPDATE statement,
+    which only updates it when it stays within the quota, so that concurrent
+    requests in the same project are no longer serialized by the database.
+    A request can be found over quota because of the reservations of a
+    concurrent request which is itself over quota and rolled back, and the
+    usages are still created and refreshed by the locking reservation of the
+    DbQuotaDriver.
+    """
+
+    def _quota_reserve(self, context, resources, quotas, user_quotas, deltas,
+                       expire, project_id, user_id):
+        return db.quota_reserve_conditional(context, resources, quotas,
+                                            user_quotas, deltas, expire,
+                                            CONF.until_refresh, CONF.max_age,
+                                            project_id=project_id,
+                                            user_id=user_id)
+
+    def commit(self, context, reservations, project_id=None, user_id=None):
+        """Commit reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, the reservations are applied to the
+                           usages they were made on.
+        :param user_id: Unused, the reservations are applied to the
+                        usages they were made on.
+        """
+        db.reservation_commit_conditional(context, reservations)
+
+    def rollback(self, context, reservations, project_id=None, user_id=None):
+        """Roll back reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, the reservations are applied to the
+                           usages they were made on.
+        :param user_id: Unused, the reservations are applied to the
+                        usages they were made on.
+        """
+        db.reservation_rollback_conditional(context, reservations)
+
+    def expire(self, context):
+        """Expire reservations.
+
+        Explores all currently existing reservations and rolls back
+        any that have expired.
+
+        :param context: The request context, for access checks.
+        """
+        db.reservation_expire_conditional(context)
+
+
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
     for all resources are unlimited.  This can be used if you do not
@@ -296,6 +296,7 @@ class LegacyValidatingNotifier(object):
         'compute.instance.volume.attach',
         'compute.instance.volume.detach',
         'compute.libvirt.error',
+        'compute.periodic_task.profile',
         'compute_task.build_instances',
         'compute_task.migrate_server',
         'compute_task.rebuild_server',
@@ -316,11 +317,13 @@ class LegacyValidatingNotifier(object):
         'network.floating_ip.deallocate',
         'network.floating_ip.disassociate',
         'scheduler.select_destinations.end',
+        'scheduler.select_destinations.profile',
         'scheduler.select_destinations.start',
         'servergroup.addmember',
         'servergroup.create',
         'servergroup.delete',
         'volume.usage',
+        'volume.usage.host',
     ]
 
     message = _('%(event_type)s is not a versioned notification and not '
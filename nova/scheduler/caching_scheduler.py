@@ -13,7 +13,118 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+from oslo_utils import uuidutils
+
+from nova import cache_utils
+import nova.conf
+from nova.i18n import _LW
+from nova import objects
+from nova.objects import base
 from nova.scheduler import filter_scheduler
+from nova import utils
+
+CONF = nova.conf.CONF
+
+LOG = logging.getLogger(__name__)
+
+SHARED_CLAIMS_KEY = 'nova-scheduler-host-state-claims'
+
+# Largest value stored by memcached, which silently drops the larger ones
+MAX_CLAIMS_SIZE = 1024 * 1024 - 1024
+
+
+class SharedHostClaims(object):
+    """Resources consumed on the hosts, shared by the scheduler workers.
+
+    Each claim records the host and node it was made on, the resources of
+    the flavor and the NUMA and PCI requests needed to consume it again from
+    a HostState. The claims of a host and node are stored under their own
+    cache key, which expires with them and is only written with an external
+    lock held, so that concurrent workers do not overwrite each other's
+    claims. The claims of all the hosts are read with a single call.
+    """
+
+    def __init__(self):
+        self.ttl = CONF.scheduler_driver_task_period * 2
+        self._mc = None
+
+    @property
+    def mc(self):
+        if self._mc is None:
+            self._mc = cache_utils.get_client(self.ttl)
+        return self._mc
+
+    @staticmethod
+    def _get_key(host, node):
+        return '%s-%s-%s' % (SHARED_CLAIMS_KEY, host, node)
+
+    def _get_live(self, value):
+        if not value:
+            return []
+        return [claim for claim in jsonutils.loads(value)
+                if not timeutils.is_older_than(claim['created_at'],
+                                               self.ttl)]
+
+    def get_all(self, host_nodes):
+        """Returns the claims made on the given (host, node) pairs."""
+        values = self.mc.get_multi([self._get_key(host, node)
+                                    for host, node in host_nodes])
+        return [claim for value in values for claim in self._get_live(value)]
+
+    def add(self, host, node, spec_obj):
+        """Publishes a claim and returns it."""
+        claim = {'id': uuidutils.generate_uuid(),
+                 'host': host,
+                 'node': node,
+                 'created_at': timeutils.utcnow().isoformat()}
+        for field in ('memory_mb', 'vcpus', 'root_gb', 'ephemeral_gb'):
+            claim[field] = getattr(spec_obj, field)
+        for field in ('numa_topology', 'pci_requests'):
+            value = None
+            if spec_obj.obj_attr_is_set(field):
+                value = getattr(spec_obj, field)
+            claim[field] = value.obj_to_primitive() if value else None
+        key = self._get_key(host, node)
+
+        @utils.synchronized(key, external=True)
+        def _locked_add():
+            claims = self._get_live(self.mc.get(key))
+            claims.append(claim)
+            value = jsonutils.dumps(claims)
+            if len(value) > MAX_CLAIMS_SIZE:
+                LOG.warning(_LW('The %(count)d claims on host %(host)s node '
+                                '%(node)s are too large to be shared with '
+                                'the other scheduler workers'),
+                            {'count': len(claims), 'host': host,
+                             'node': node})
+                return
+            try:
+                self.mc.set(key, value)
+            except Exception:
+                LOG.warning(_LW('Unable to share the claims on host %(host)s '
+                                'node %(node)s with the other scheduler '
+                                'workers'), {'host': host, 'node': node},
+                            exc_info=True)
+
+        _locked_add()
+        return claim
+
+    @staticmethod
+    def get_request_spec(claim):
+        flavor = objects.Flavor(memory_mb=claim['memory_mb'],
+                                vcpus=claim['vcpus'],
+                                root_gb=claim['root_gb'],
+                                ephemeral_gb=claim['ephemeral_gb'])
+        spec_obj = objects.RequestSpec(flavor=flavor, numa_topology=None,
+                                       pci_requests=None)
+        for field in ('numa_topology', 'pci_requests'):
+            if claim[field]:
+                setattr(spec_obj, field, base.NovaObject.obj_from_primitive(
+                    claim[field]))
+        return spec_obj
 
 
 class CachingScheduler(filter_scheduler.FilterScheduler):
@@ -45,6 +156,11 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
     more retries, because the data stored on any additional scheduler will
     be more out of date, than if it was fetched from the database.
 
+    To reduce those retries, the scheduler_shared_host_state option makes
+    each worker publish the resources it consumes to a cache shared with the
+    other workers, which consume them from their own copy before processing
+    the next request.
+
     In a similar way, if you have a high number of server deletes, the
     extra capacity from those deletes will not show up until the cache is
     refreshed.
@@ -53,9 +169,18 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
     def __init__(self, *args, **kwargs):
         super(CachingScheduler, self).__init__(*args, **kwargs)
         self.all_host_states = None
+        self.shared_claims = None
+        if CONF.scheduler_shared_host_state:
+            self.shared_claims = SharedHostClaims()
+        # Maps (host, node) to the update time of the host state when it was
+        # last refreshed from its compute node, its update time after we
+        # last consumed from it, and the ids of the shared claims consumed
+        # since the refresh.
+        self._consumed_claims = {}
 
     def run_periodic_tasks(self, context):
         """Called from a periodic tasks in the manager."""
+        super(CachingScheduler, self).run_periodic_tasks(context)
         elevated = context.elevated()
         # NOTE(johngarbutt) Fetching the list of hosts before we get
         # a user request, so no user requests have to wait while we
@@ -70,8 +195,54 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
             # Rather than raise an error, we fetch the list of hosts.
             self.all_host_states = self._get_up_hosts(context)
 
+        if self.shared_claims is not None:
+            self._consume_shared_claims()
         return self.all_host_states
 
+    def _consume_from_request(self, host_state, spec_obj):
+        """Called from the filter scheduler, in a template pattern."""
+        if self.shared_claims is None:
+            host_state.consume_from_request(spec_obj)
+            return
+
+        claim = self.shared_claims.add(host_state.host, host_state.nodename,
+                                       spec_obj)
+        self._consume_claim(host_state, claim, spec_obj)
+
+    def _consume_claim(self, host_state, claim, spec_obj=None):
+        key = (host_state.host, host_state.nodename)
+        refreshed, updated, consumed = self._consumed_claims.get(
+            key, (None, None, None))
+        if consumed is None or updated != host_state.updated:
+            # The host state has been refreshed from its compute node since
+            # we last consumed from it.
+            refreshed = host_state.updated
+            consumed = set()
+
+        if claim['id'] in consumed:
+            return
+        # The resources consumed before the compute node last reported its
+        # resources are already accounted for.
+        if (spec_obj is None and refreshed is not None and
+                timeutils.parse_isotime(claim['created_at']) <= refreshed):
+            return
+
+        if spec_obj is None:
+            spec_obj = self.shared_claims.get_request_spec(claim)
+        host_state.consume_from_request(spec_obj)
+        consumed.add(claim['id'])
+        self._consumed_claims[key] = (refreshed, host_state.updated, consumed)
+
+    def _consume_shared_claims(self):
+        """Consumes the claims published by all the workers."""
+        host_states = {(state.host, state.nodename): state
+                       for state in self.all_host_states}
+        claims = self.shared_claims.get_all(host_states)
+        for claim in claims:
+            host_state = host_states.get((claim['host'], claim['node']))
+            if host_state is not None:
+                self._consume_claim(host_state, claim)
+
     def _get_up_hosts(self, context):
         all_hosts_iterator = self.host_manager.get_all_host_states(context)
         return list(all_hosts_iterator)
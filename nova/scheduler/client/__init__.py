@@ -59,6 +59,9 @@ class SchedulerClient(object):
     def update_resource_stats(self, compute_node):
         self.reportclient.update_resource_stats(compute_node)
 
+    def update_resource_stats_multi(self, context, compute_nodes):
+        self.reportclient.update_resource_stats_multi(context, compute_nodes)
+
     def update_instance_info(self, context, host_name, instance_info):
         self.queryclient.update_instance_info(context, host_name,
                                               instance_info)
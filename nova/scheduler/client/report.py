@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from nova import objects
+
 
 class SchedulerReportClient(object):
     """Client class for updating the scheduler."""
@@ -23,3 +25,14 @@ class SchedulerReportClient(object):
         :param compute_node: updated nova.objects.ComputeNode to report
         """
         compute_node.save()
+
+    def update_resource_stats_multi(self, context, compute_nodes):
+        """Updates the stats of several compute nodes at once.
+
+        :param context: nova request context
+        :param compute_nodes: updated nova.objects.ComputeNodeList to report
+        """
+        objects.ComputeNodeList.save_all(context, compute_nodes)
+        # NOTE: the nodes saved remotely are not updated in place
+        for compute_node in compute_nodes:
+            compute_node.obj_reset_changes(recursive=True)
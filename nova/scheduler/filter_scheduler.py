@@ -19,6 +19,7 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import random
 
 from oslo_log import log as logging
@@ -29,10 +30,13 @@ from nova import exception
 from nova.i18n import _
 from nova import rpc
 from nova.scheduler import driver
+from nova.scheduler import profiler
 from nova.scheduler import scheduler_options
+from nova.scheduler import weights
 
 
 CONF = nova.conf.CONF
+CONF.import_opt('host', 'nova.netconf')
 LOG = logging.getLogger(__name__)
 
 
@@ -42,6 +46,14 @@ class FilterScheduler(driver.Scheduler):
         super(FilterScheduler, self).__init__(*args, **kwargs)
         self.options = scheduler_options.SchedulerOptions()
         self.notifier = rpc.get_notifier('scheduler')
+        self.profiler = None
+        if CONF.scheduler_profiling:
+            self.profiler = profiler.SchedulerProfiler(CONF.host)
+
+    def run_periodic_tasks(self, context):
+        """Called from a periodic tasks in the manager."""
+        if self.profiler is not None:
+            self.profiler.publish()
 
     def select_destinations(self, context, spec_obj):
         """Selects a filtered set of hosts and nodes."""
@@ -50,7 +62,12 @@ class FilterScheduler(driver.Scheduler):
             dict(request_spec=spec_obj.to_legacy_request_spec_dict()))
 
         num_instances = spec_obj.num_instances
-        selected_hosts = self._schedule(context, spec_obj)
+        profile = None
+        if self.profiler is not None:
+            profile = profiler.RequestProfile()
+        selected_hosts = self._schedule(context, spec_obj, profile=profile)
+        if profile is not None:
+            self._record_profile(context, spec_obj, profile)
 
         # Couldn't fulfill the request_spec
         if len(selected_hosts) < num_instances:
@@ -81,13 +98,30 @@ class FilterScheduler(driver.Scheduler):
             dict(request_spec=spec_obj.to_legacy_request_spec_dict()))
         return dests
 
+    def _record_profile(self, context, spec_obj, profile):
+        """Notifies the time spent by the filters and weighers on a request,
+        and adds it to the statistics of the scheduler.
+        """
+        profile.finish()
+        payload = profile.to_dict()
+        payload['instance_uuid'] = None
+        if spec_obj.obj_attr_is_set('instance_uuid'):
+            payload['instance_uuid'] = spec_obj.instance_uuid
+        payload['num_instances'] = spec_obj.num_instances
+        self.notifier.info(context, 'scheduler.select_destinations.profile',
+                           payload)
+        self.profiler.record(profile)
+
     def _get_configuration_options(self):
         """Fetch options dictionary. Broken out for testing."""
         return self.options.get_configuration()
 
-    def _schedule(self, context, spec_obj):
+    def _schedule(self, context, spec_obj, profile=None):
         """Returns a list of hosts that meet the required specs,
         ordered by their fitness.
+
+        The time spent by the filters and weighers is added to the profile,
+        if one is given.
         """
         elevated = context.elevated()
 
@@ -107,10 +141,14 @@ class FilterScheduler(driver.Scheduler):
         num_instances = spec_obj.num_instances
         # NOTE(sbauza): Adding one field for any out-of-tree need
         spec_obj.config_options = config_options
+        if CONF.scheduler_incremental_placement and num_instances > 1:
+            return self._schedule_incrementally(spec_obj, hosts,
+                                                profile=profile)
+
         for num in range(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
-                    spec_obj, index=num)
+                    spec_obj, index=num, profile=profile)
             if not hosts:
                 # Can't get any more locally.
                 break
@@ -118,7 +156,7 @@ class FilterScheduler(driver.Scheduler):
             LOG.debug("Filtered %(hosts)s", {'hosts': hosts})
 
             weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
-                    spec_obj)
+                    spec_obj, profile=profile)
 
             LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
 
@@ -127,19 +165,160 @@ class FilterScheduler(driver.Scheduler):
             if scheduler_host_subset_size < len(weighed_hosts):
                 weighed_hosts = weighed_hosts[0:scheduler_host_subset_size]
             chosen_host = random.choice(weighed_hosts)
-
-            LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+            self._select_host(chosen_host, spec_obj)
             selected_hosts.append(chosen_host)
+        return selected_hosts
 
-            # Now consume the resources so the filter/weights
-            # will change for the next instance.
-            chosen_host.obj.consume_from_request(spec_obj)
-            if spec_obj.instance_group is not None:
-                spec_obj.instance_group.hosts.append(chosen_host.obj.host)
-                # hosts has to be not part of the updates when saving
-                spec_obj.instance_group.obj_reset_changes(['hosts'])
+    def _schedule_incrementally(self, spec_obj, hosts, profile=None):
+        """Selects the hosts for all the instances of the request, filtering
+        and weighing all the hosts only for the first instance.
+
+        Selecting a host for an instance only changes the state of that host,
+        so for the next instances only that host is filtered and weighed
+        again, while the other hosts keep their place in a heap. The filters
+        whose results depend on the hosts selected for the previous
+        instances are still run on all the remaining hosts, and all of them
+        are weighed again when the selected host widens the range used to
+        normalize the weights, so the result is the same as when every host
+        is filtered and weighed for each instance.
+        """
+        hosts = list(self.host_manager.get_filtered_hosts(hosts, spec_obj,
+                                                          index=0,
+                                                          profile=profile))
+        if not hosts:
+            return []
+        LOG.debug("Filtered %(hosts)s", {'hosts': hosts})
+        ranking = _HostRanking(hosts,
+                               self.host_manager.get_host_weights(
+                                   hosts, spec_obj, profile=profile))
+
+        selected_hosts = []
+        scheduler_host_subset_size = max(1, CONF.scheduler_host_subset_size)
+        for num in range(spec_obj.num_instances):
+            if num:
+                self._update_ranking(ranking, selected_hosts[-1].obj,
+                                     spec_obj, num, profile=profile)
+            weighed_hosts = ranking.best(scheduler_host_subset_size)
+            if not weighed_hosts:
+                break
+            LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
+
+            chosen_host = random.choice(weighed_hosts)
+            self._select_host(chosen_host, spec_obj)
+            selected_hosts.append(chosen_host)
         return selected_hosts
 
+    def _update_ranking(self, ranking, host_state, spec_obj, index,
+                        profile=None):
+        """Updates the ranking after host_state was selected for the previous
+        instance of the request.
+        """
+        class_names = [filter_.__class__.__name__
+                       for filter_ in self.host_manager.default_filters
+                       if filter_.depends_on_previous_selections and
+                       filter_.run_filter_for_index(index)]
+        if class_names:
+            # No host is left when a filter stopped the run
+            ranking.keep(self.host_manager.get_filtered_hosts(
+                ranking.hosts(), spec_obj, filter_class_names=class_names,
+                index=index, profile=profile) or [])
+
+        if host_state not in ranking:
+            return
+        if not self.host_manager.get_filtered_hosts([host_state], spec_obj,
+                                                    index=index,
+                                                    profile=profile):
+            ranking.remove(host_state)
+            return
+
+        ranges = self.host_manager.get_weigher_ranges()
+        weight = self.host_manager.get_host_weights([host_state], spec_obj,
+                                                    profile=profile)[0]
+        if ranges == self.host_manager.get_weigher_ranges():
+            ranking.update(host_state, weight)
+        else:
+            hosts = ranking.hosts()
+            ranking.reset(hosts,
+                          self.host_manager.get_host_weights(
+                              hosts, spec_obj, profile=profile))
+
+    def _select_host(self, chosen_host, spec_obj):
+        """Consumes the resources of the request on the chosen host."""
+        LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+
+        # Now consume the resources so the filter/weights
+        # will change for the next instance.
+        self._consume_from_request(chosen_host.obj, spec_obj)
+        if spec_obj.instance_group is not None:
+            spec_obj.instance_group.hosts.append(chosen_host.obj.host)
+            # hosts has to be not part of the updates when saving
+            spec_obj.instance_group.obj_reset_changes(['hosts'])
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
+
+    def _consume_from_request(self, host_state, spec_obj):
+        """Template method, so a subclass can track the consumed resources."""
+        host_state.consume_from_request(spec_obj)
+
+
+class _HostRanking(object):
+    """The weighed hosts still eligible for a request, kept in a heap.
+
+    Updating the weight of a host pushes a new entry into the heap, the stale
+    ones being skipped when they reach its top. Hosts with the same weight
+    are ranked in their original order, like with the stable sort done by
+    the weight handlers.
+    """
+
+    def __init__(self, hosts, weights):
+        self._hosts = list(hosts)
+        self._positions = {id(host): position
+                           for position, host in enumerate(self._hosts)}
+        self.reset(self._hosts, weights)
+
+    def __contains__(self, host):
+        return self._positions.get(id(host)) in self._versions
+
+    def hosts(self):
+        """Returns the remaining hosts, in their original order."""
+        return [self._hosts[position] for position in sorted(self._versions)]
+
+    def reset(self, hosts, weights):
+        """Ranks again the given hosts, dropping the other ones."""
+        self._versions = {}
+        self._heap = []
+        for host, weight in zip(hosts, weights):
+            position = self._positions[id(host)]
+            self._versions[position] = 0
+            self._heap.append((-weight, position, 0))
+        heapq.heapify(self._heap)
+
+    def update(self, host, weight):
+        position = self._positions[id(host)]
+        version = self._versions[position] + 1
+        self._versions[position] = version
+        heapq.heappush(self._heap, (-weight, position, version))
+
+    def remove(self, host):
+        self._versions.pop(self._positions[id(host)], None)
+
+    def keep(self, hosts):
+        """Removes the hosts which are not in the given ones."""
+        kept = {self._positions[id(host)] for host in hosts}
+        for position in list(self._versions):
+            if position not in kept:
+                del self._versions[position]
+
+    def best(self, count):
+        """Returns the WeighedHosts of the count best hosts."""
+        best = []
+        while self._heap and len(best) < count:
+            entry = heapq.heappop(self._heap)
+            if self._versions.get(entry[1]) == entry[2]:
+                best.append(entry)
+        for entry in best:
+            heapq.heappush(self._heap, entry)
+        return [weights.WeighedHost(self._hosts[position], -weight)
+                for weight, position, version in best]
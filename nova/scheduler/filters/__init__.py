@@ -16,8 +16,18 @@
 """
 Scheduler host filters
 """
+import operator
+
+from oslo_utils import importutils
+import six
+
+import nova.conf
 from nova import filters
 
+numpy = importutils.try_import('numpy')
+
+CONF = nova.conf.CONF
+
 
 class BaseHostFilter(filters.BaseFilter):
     """Base class for host filters."""
@@ -31,11 +41,95 @@ class BaseHostFilter(filters.BaseFilter):
         """
         raise NotImplementedError()
 
+    def batch_host_passes(self, columns, filter_properties):
+        """Return an array of booleans telling which hosts pass the filter.
+
+        :param columns: a HostStateColumns of the hosts to filter.
+
+        Return None if the hosts have to be filtered one by one with
+        host_passes(). Override this in a subclass which can filter all the
+        hosts at once with array operations on the columns.
+        """
+        return None
+
+
+class HostStateColumns(object):
+    """Columnar view of a list of HostStates.
+
+    Each column is a numpy array of the values of a HostState attribute,
+    which is only built the first time it is requested.
+    """
+
+    def __init__(self, host_states):
+        self.host_states = host_states
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.host_states)
+
+    def get(self, name):
+        """Return the array of the values of a HostState attribute."""
+        column = self._columns.get(name)
+        if column is None:
+            column = numpy.fromiter(
+                six.moves.map(operator.attrgetter(name), self.host_states),
+                dtype=float, count=len(self.host_states))
+            self._columns[name] = column
+        return column
+
+    def map(self, func, *args):
+        """Return the array of the values returned by a function called
+        with each HostState.
+        """
+        return numpy.array([func(host_state, *args)
+                            for host_state in self.host_states],
+                           dtype=float)
+
+    def set_limits(self, name, values, mask):
+        """Set a limit of the HostStates selected by an array of booleans.
+
+        :param name: the key of the limit in HostState.limits
+        :param values: an array of the values of the limit for each HostState
+        :param mask: an array of booleans telling which HostStates to update
+        """
+        values = values.tolist()
+        for i in numpy.flatnonzero(mask).tolist():
+            self.host_states[i].limits[name] = values[i]
+
+    def select(self, host_states):
+        """Restrict the columns to a subset of the HostStates.
+
+        The subset must be in the same order as the current HostStates, which
+        is always the case for the hosts returned by filters.
+        """
+        if len(host_states) == len(self.host_states):
+            return
+        selected = set(six.moves.map(id, host_states))
+        mask = numpy.fromiter((id(host_state) in selected
+                               for host_state in self.host_states),
+                              dtype=bool, count=len(self.host_states))
+        self.host_states = host_states
+        self._columns = {name: column[mask]
+                         for name, column in self._columns.items()}
+
+    def filter_all(self, filter_, host_states, spec_obj):
+        """Return the HostStates passing the filter."""
+        self.select(host_states)
+        passes = filter_.batch_host_passes(self, spec_obj)
+        if passes is None:
+            return filter_.filter_all(host_states, spec_obj)
+        return [host_states[i] for i in numpy.flatnonzero(passes)]
+
 
 class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
 
+    def _get_batch(self, host_states):
+        if numpy is None or not CONF.scheduler_batch_filters:
+            return None
+        return HostStateColumns(host_states)
+
 
 def all_filters():
     """Return a list of filter classes found in this directory.
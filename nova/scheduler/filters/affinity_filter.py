@@ -81,6 +81,10 @@ class _GroupAntiAffinityFilter(filters.BaseHostFilter):
     """Schedule the instance on a different host from a set of group
     hosts.
     """
+
+    # The group hosts are updated with the host selected for each instance
+    depends_on_previous_selections = True
+
     def host_passes(self, host_state, spec_obj):
         # Only invoke the filter is 'anti-affinity' is configured
         policies = (spec_obj.instance_group.policies
@@ -109,6 +113,10 @@ class ServerGroupAntiAffinityFilter(_GroupAntiAffinityFilter):
 class _GroupAffinityFilter(filters.BaseHostFilter):
     """Schedule the instance on to host from a set of group hosts.
     """
+
+    # The group hosts are updated with the host selected for each instance
+    depends_on_previous_selections = True
+
     def host_passes(self, host_state, spec_obj):
         # Only invoke the filter is 'affinity' is configured
         policies = (spec_obj.instance_group.policies
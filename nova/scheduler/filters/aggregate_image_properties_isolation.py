@@ -67,3 +67,41 @@ class AggregateImagePropertiesIsolation(filters.BaseHostFilter):
                            'options': options})
                 return False
         return True
+
+    def filter_all(self, filter_obj_list, spec_obj):
+        host_states = list(filter_obj_list)
+        index = utils.get_aggregate_index(host_states)
+        if index is None:
+            return super(AggregateImagePropertiesIsolation, self).filter_all(
+                host_states, spec_obj)
+        cfg_namespace = CONF.aggregate_image_properties_isolation_namespace
+        cfg_separator = CONF.aggregate_image_properties_isolation_separator
+
+        image_props = spec_obj.image.properties if spec_obj.image else {}
+        failing = set()
+        for key in index.keys():
+            if (cfg_namespace and
+                    not key.startswith(cfg_namespace + cfg_separator)):
+                continue
+            try:
+                prop = image_props.get(key)
+            except AttributeError:
+                LOG.warning(_LW("Hosts %(hosts)s have a metadata key "
+                                "'%(key)s' that is not present in the image "
+                                "metadata."),
+                            {"hosts": sorted(index.hosts_with_key(key)),
+                             "key": key})
+                continue
+            if prop:
+                failing |= (index.hosts_with_key(key) -
+                            index.hosts_with_value(key, str(prop)))
+        if not failing:
+            return host_states
+        passing = []
+        for host_state in host_states:
+            if host_state.host in failing:
+                LOG.debug("%(host_state)s fails image aggregate properties "
+                          "requirements.", {'host_state': host_state})
+            else:
+                passing.append(host_state)
+        return passing
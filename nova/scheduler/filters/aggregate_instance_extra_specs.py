@@ -27,6 +27,20 @@ LOG = logging.getLogger(__name__)
 _SCOPE = 'aggregate_instance_extra_specs'
 
 
+def _get_aggregate_key(key):
+    """Returns the aggregate metadata key matched by an extra spec, or None
+    if the extra spec is scoped for another filter.
+    """
+    # Either not scope format, or aggregate_instance_extra_specs scope
+    scope = key.split(':', 1)
+    if len(scope) > 1:
+        if scope[0] != _SCOPE:
+            return None
+        else:
+            del scope[0]
+    return scope[0]
+
+
 class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
     """AggregateInstanceExtraSpecsFilter works with InstanceType records."""
 
@@ -49,14 +63,9 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
         metadata = utils.aggregate_metadata_get_by_host(host_state)
 
         for key, req in six.iteritems(instance_type.extra_specs):
-            # Either not scope format, or aggregate_instance_extra_specs scope
-            scope = key.split(':', 1)
-            if len(scope) > 1:
-                if scope[0] != _SCOPE:
-                    continue
-                else:
-                    del scope[0]
-            key = scope[0]
+            key = _get_aggregate_key(key)
+            if key is None:
+                continue
             aggregate_vals = metadata.get(key, None)
             if not aggregate_vals:
                 LOG.debug("%(host_state)s fails instance_type extra_specs "
@@ -74,3 +83,43 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
                            'aggregate_vals': aggregate_vals})
                 return False
         return True
+
+    def filter_all(self, filter_obj_list, spec_obj):
+        host_states = list(filter_obj_list)
+        index = utils.get_aggregate_index(host_states)
+        instance_type = spec_obj.flavor
+        if (index is None or not instance_type.obj_attr_is_set('extra_specs')
+                or not instance_type.extra_specs):
+            return super(AggregateInstanceExtraSpecsFilter, self).filter_all(
+                host_states, spec_obj)
+
+        # Each requirement is matched once against each distinct value of
+        # the key in the aggregates, the hosts passing being the ones with a
+        # matching value for all the requirements
+        passing_hosts = None
+        for key, req in six.iteritems(instance_type.extra_specs):
+            key = _get_aggregate_key(key)
+            if key is None:
+                continue
+            hosts = set()
+            for value, value_hosts in six.iteritems(
+                    index.hosts_by_value(key)):
+                if extra_specs_ops.match(value, req):
+                    hosts |= value_hosts
+            if passing_hosts is None:
+                passing_hosts = hosts
+            else:
+                passing_hosts &= hosts
+            if not passing_hosts:
+                break
+        if passing_hosts is None:
+            return host_states
+
+        passing = []
+        for host_state in host_states:
+            if host_state.host in passing_hosts:
+                passing.append(host_state)
+            else:
+                LOG.debug("%(host_state)s fails instance_type extra_specs "
+                          "requirements.", {'host_state': host_state})
+        return passing
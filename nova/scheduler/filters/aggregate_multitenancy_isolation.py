@@ -51,3 +51,23 @@ class AggregateMultiTenancyIsolation(filters.BaseHostFilter):
             else:
                 LOG.debug("No tenant id's defined on host. Host passes.")
         return True
+
+    def filter_all(self, filter_obj_list, spec_obj):
+        host_states = list(filter_obj_list)
+        index = utils.get_aggregate_index(host_states)
+        if index is None:
+            return super(AggregateMultiTenancyIsolation, self).filter_all(
+                host_states, spec_obj)
+        # Hosts in an aggregate isolated for other tenants only
+        isolated = (index.hosts_with_key('filter_tenant_id') -
+                    index.hosts_with_value('filter_tenant_id',
+                                           spec_obj.project_id))
+        if not isolated:
+            return host_states
+        passing = []
+        for host_state in host_states:
+            if host_state.host in isolated:
+                LOG.debug("%s fails tenant id on aggregate", host_state)
+            else:
+                passing.append(host_state)
+        return passing
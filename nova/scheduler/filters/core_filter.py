@@ -29,6 +29,9 @@ class BaseCoreFilter(filters.BaseHostFilter):
     def _get_cpu_allocation_ratio(self, host_state, spec_obj):
         raise NotImplementedError
 
+    def _get_cpu_allocation_ratios(self, columns, spec_obj):
+        return columns.map(self._get_cpu_allocation_ratio, spec_obj)
+
     def host_passes(self, host_state, spec_obj):
         """Return True if host has sufficient CPU cores."""
         if not host_state.vcpus_total:
@@ -68,6 +71,30 @@ class BaseCoreFilter(filters.BaseHostFilter):
 
         return True
 
+    def batch_host_passes(self, columns, spec_obj):
+        """Return True for the hosts which have sufficient CPU cores."""
+        host_vcpus_total = columns.get('vcpus_total')
+        # Fail safe
+        unset = host_vcpus_total == 0
+        if unset.any():
+            LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
+
+        instance_vcpus = spec_obj.vcpus
+        vcpus_total = host_vcpus_total * self._get_cpu_allocation_ratios(
+            columns, spec_obj)
+
+        # Only provide a VCPU limit to compute if the virt driver is reporting
+        # an accurate count of installed VCPUs. (XenServer driver does not)
+        has_limit = ~unset & (vcpus_total > 0)
+        columns.set_limits('vcpu', vcpus_total, has_limit)
+
+        # Do not allow an instance to overcommit against itself, only
+        # against other instances.
+        passes = ~has_limit | (host_vcpus_total >= instance_vcpus)
+        free_vcpus = vcpus_total - columns.get('vcpus_used')
+        passes &= free_vcpus >= instance_vcpus
+        return unset | passes
+
 
 class CoreFilter(BaseCoreFilter):
     """CoreFilter filters based on CPU core utilization."""
@@ -75,6 +102,9 @@ class CoreFilter(BaseCoreFilter):
     def _get_cpu_allocation_ratio(self, host_state, spec_obj):
         return host_state.cpu_allocation_ratio
 
+    def _get_cpu_allocation_ratios(self, columns, spec_obj):
+        return columns.get('cpu_allocation_ratio')
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
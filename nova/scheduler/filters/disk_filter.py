@@ -31,6 +31,9 @@ class DiskFilter(filters.BaseHostFilter):
     def _get_disk_allocation_ratio(self, host_state, spec_obj):
         return host_state.disk_allocation_ratio
 
+    def _get_disk_allocation_ratios(self, columns, spec_obj):
+        return columns.get('disk_allocation_ratio')
+
     def host_passes(self, host_state, spec_obj):
         """Filter based on disk usage."""
         requested_disk = (1024 * (spec_obj.root_gb +
@@ -59,6 +62,23 @@ class DiskFilter(filters.BaseHostFilter):
         host_state.limits['disk_gb'] = disk_gb_limit
         return True
 
+    def batch_host_passes(self, columns, spec_obj):
+        """Filter based on disk usage."""
+        requested_disk = (1024 * (spec_obj.root_gb +
+                                  spec_obj.ephemeral_gb) +
+                          spec_obj.swap)
+
+        total_usable_disk_mb = columns.get('total_usable_disk_gb') * 1024
+        disk_allocation_ratio = self._get_disk_allocation_ratios(
+            columns, spec_obj)
+        disk_mb_limit = total_usable_disk_mb * disk_allocation_ratio
+        used_disk_mb = total_usable_disk_mb - columns.get('free_disk_mb')
+        usable_disk_mb = disk_mb_limit - used_disk_mb
+        passes = usable_disk_mb >= requested_disk
+
+        columns.set_limits('disk_gb', disk_mb_limit / 1024, passes)
+        return passes
+
 
 class AggregateDiskFilter(DiskFilter):
     """AggregateDiskFilter with per-aggregate disk allocation ratio flag.
@@ -80,3 +100,6 @@ class AggregateDiskFilter(DiskFilter):
             ratio = host_state.disk_allocation_ratio
 
         return ratio
+
+    def _get_disk_allocation_ratios(self, columns, spec_obj):
+        return columns.map(self._get_disk_allocation_ratio, spec_obj)
@@ -31,6 +31,9 @@ class NumInstancesFilter(filters.BaseHostFilter):
     def _get_max_instances_per_host(self, host_state, spec_obj):
         return CONF.max_instances_per_host
 
+    def _get_max_instances_per_hosts(self, columns, spec_obj):
+        return CONF.max_instances_per_host
+
     def host_passes(self, host_state, spec_obj):
         num_instances = host_state.num_instances
         max_instances = self._get_max_instances_per_host(
@@ -43,6 +46,10 @@ class NumInstancesFilter(filters.BaseHostFilter):
                          'max_instances': max_instances})
         return passes
 
+    def batch_host_passes(self, columns, spec_obj):
+        max_instances = self._get_max_instances_per_hosts(columns, spec_obj)
+        return columns.get('num_instances') < max_instances
+
 
 class AggregateNumInstancesFilter(NumInstancesFilter):
     """AggregateNumInstancesFilter with per-aggregate the max num instances.
@@ -64,3 +71,6 @@ class AggregateNumInstancesFilter(NumInstancesFilter):
             value = CONF.max_instances_per_host
 
         return value
+
+    def _get_max_instances_per_hosts(self, columns, spec_obj):
+        return columns.map(self._get_max_instances_per_host, spec_obj)
@@ -28,6 +28,9 @@ class BaseRamFilter(filters.BaseHostFilter):
     def _get_ram_allocation_ratio(self, host_state, spec_obj):
         raise NotImplementedError
 
+    def _get_ram_allocation_ratios(self, columns, spec_obj):
+        return columns.map(self._get_ram_allocation_ratio, spec_obj)
+
     def host_passes(self, host_state, spec_obj):
         """Only return hosts with sufficient available RAM."""
         requested_ram = spec_obj.memory_mb
@@ -63,6 +66,25 @@ class BaseRamFilter(filters.BaseHostFilter):
         host_state.limits['memory_mb'] = memory_mb_limit
         return True
 
+    def batch_host_passes(self, columns, spec_obj):
+        """Only return hosts with sufficient available RAM."""
+        requested_ram = spec_obj.memory_mb
+        total_usable_ram_mb = columns.get('total_usable_ram_mb')
+
+        ram_allocation_ratio = self._get_ram_allocation_ratios(columns,
+                                                               spec_obj)
+        memory_mb_limit = total_usable_ram_mb * ram_allocation_ratio
+        used_ram_mb = total_usable_ram_mb - columns.get('free_ram_mb')
+        usable_ram = memory_mb_limit - used_ram_mb
+        # Do not allow an instance to overcommit against itself, only against
+        # other instances.
+        passes = ((total_usable_ram_mb >= requested_ram) &
+                  (usable_ram >= requested_ram))
+
+        # save oversubscription limit for compute node to test against:
+        columns.set_limits('memory_mb', memory_mb_limit, passes)
+        return passes
+
 
 class RamFilter(BaseRamFilter):
     """Ram Filter with over subscription flag."""
@@ -70,6 +92,9 @@ class RamFilter(BaseRamFilter):
     def _get_ram_allocation_ratio(self, host_state, spec_obj):
         return host_state.ram_allocation_ratio
 
+    def _get_ram_allocation_ratios(self, columns, spec_obj):
+        return columns.get('ram_allocation_ratio')
+
 
 class AggregateRamFilter(BaseRamFilter):
     """AggregateRamFilter with per-aggregate ram subscription flag.
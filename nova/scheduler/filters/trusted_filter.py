@@ -43,21 +43,26 @@ the Open Attestation project at:
     https://github.com/OpenAttestation/OpenAttestation
 """
 
+import eventlet.event
+import eventlet.semaphore
+import eventlet.timeout
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import timeutils
 import requests
 
+from nova import cache_utils
 import nova.conf
-from nova import context
-from nova.i18n import _LW
-from nova import objects
+from nova.i18n import _LE, _LW
 from nova.scheduler import filters
+from nova import utils
 
 LOG = logging.getLogger(__name__)
 
 CONF = nova.conf.CONF
 
+ATTESTATION_KEY_PREFIX = 'nova-attestation-'
+
 
 class AttestationService(object):
     # Provide access wrapper to attestation server to get integrity report.
@@ -76,6 +81,7 @@ class AttestationService(object):
         self.verify = (not CONF.trusted_computing.attestation_insecure_ssl
                        and self.ca_file or True)
         self.cert = (self.cert_file, self.key_file)
+        self.timeout = CONF.trusted_computing.attestation_request_timeout
 
     def _do_request(self, method, action_url, body, headers):
         # Connects to the server and issues a request.
@@ -87,7 +93,7 @@ class AttestationService(object):
         try:
             res = requests.request(method, action_url, data=body,
                                    headers=headers, cert=self.cert,
-                                   verify=self.verify)
+                                   verify=self.verify, timeout=self.timeout)
             status_code = res.status_code
             if status_code in (requests.codes.OK,
                                requests.codes.CREATED,
@@ -133,9 +139,17 @@ class AttestationService(object):
 class ComputeAttestationCache(object):
     """Cache for compute node attestation
 
-    Cache compute node's trust level for sometime,
-    if the cache is out of date, poll OAT service to flush the
-    cache.
+    Cache compute node's trust level for sometime. Once it is out of date,
+    the host is attested again by the OAT service in the background, and its
+    previous trust level is still used until it is twice as old as
+    attestation_auth_timeout. A request only waits for the attestation of
+    the hosts without such a trust level, and for attestation_wait_timeout
+    seconds at most, after which they are considered untrusted.
+
+    The hosts are attested in batches, by attestation_workers greenthreads
+    at most. The trust levels are also stored in the cache shared with the
+    other schedulers, from where they are read when they are not known
+    locally, for instance after a restart.
 
     OAT service may have cache also. OAT service's cache valid time
     should be set shorter than trusted filter's cache valid time.
@@ -144,35 +158,31 @@ class ComputeAttestationCache(object):
     def __init__(self):
         self.attestservice = AttestationService()
         self.compute_nodes = {}
-        admin = context.get_admin_context()
-
-        # Fetch compute node list to initialize the compute_nodes,
-        # so that we don't need poll OAT service one by one for each
-        # host in the first round that scheduler invokes us.
-        computes = objects.ComputeNodeList.get_all(admin)
-        for compute in computes:
-            host = compute.hypervisor_hostname
-            self._init_cache_entry(host)
+        # Events sent once the running attestations complete, keyed by host
+        self._attesting = {}
+        self._semaphore = eventlet.semaphore.Semaphore(
+            CONF.trusted_computing.attestation_workers)
+        self._mc = None
+
+    @property
+    def mc(self):
+        if self._mc is None:
+            self._mc = cache_utils.get_client()
+        return self._mc
+
+    def _is_older_than(self, host, periods):
+        node_stats = self.compute_nodes.get(host)
+        if node_stats is None:
+            return True
+        return timeutils.is_older_than(
+            node_stats['vtime'],
+            periods * CONF.trusted_computing.attestation_auth_timeout)
 
     def _cache_valid(self, host):
-        cachevalid = False
-        if host in self.compute_nodes:
-            node_stats = self.compute_nodes.get(host)
-            if not timeutils.is_older_than(
-                             node_stats['vtime'],
-                             CONF.trusted_computing.attestation_auth_timeout):
-                cachevalid = True
-        return cachevalid
-
-    def _init_cache_entry(self, host):
-        self.compute_nodes[host] = {
-            'trust_lvl': 'unknown',
-            'vtime': timeutils.normalize_time(
-                        timeutils.parse_isotime("1970-01-01T00:00:00Z"))}
-
-    def _invalidate_caches(self):
-        for host in self.compute_nodes:
-            self._init_cache_entry(host)
+        return not self._is_older_than(host, 1)
+
+    def _cache_usable(self, host):
+        return not self._is_older_than(host, 2)
 
     def _update_cache_entry(self, state):
         entry = {}
@@ -197,24 +207,102 @@ class ComputeAttestationCache(object):
                 entry['vtime'] = timeutils.utcnow()
 
         self.compute_nodes[host] = entry
+        return host, entry
 
-    def _update_cache(self):
-        self._invalidate_caches()
-        states = self.attestservice.do_attestation(
-            list(self.compute_nodes.keys()))
-        if states is None:
+    def _load_shared_entries(self, hosts):
+        """Updates the trust levels of the hosts from the shared cache, when
+        they are more recent there.
+        """
+        if not hosts:
             return
-        for state in states:
-            self._update_cache_entry(state)
+        values = self.mc.get_multi([ATTESTATION_KEY_PREFIX + host
+                                    for host in hosts])
+        for host, value in zip(hosts, values):
+            if not value:
+                continue
+            entry = jsonutils.loads(value)
+            entry['vtime'] = timeutils.normalize_time(
+                timeutils.parse_isotime(entry['vtime']))
+            node_stats = self.compute_nodes.get(host)
+            if node_stats is None or node_stats['vtime'] < entry['vtime']:
+                self.compute_nodes[host] = entry
+
+    def _store_shared_entries(self, entries):
+        self.mc.set_multi({
+            ATTESTATION_KEY_PREFIX + host: jsonutils.dumps(
+                {'trust_lvl': entry['trust_lvl'],
+                 'vtime': utils.isotime(entry['vtime'])})
+            for host, entry in entries.items()})
+
+    def _attest(self, hosts, event):
+        try:
+            with self._semaphore:
+                # Another scheduler may have attested them in the meantime
+                self._load_shared_entries(hosts)
+                expired = [host for host in hosts
+                           if not self._cache_valid(host)]
+                if not expired:
+                    return
+                states = self.attestservice.do_attestation(expired)
+                if states is None:
+                    LOG.warning(_LW("Failed to attest hosts %s"), expired)
+                    return
+                self._store_shared_entries(
+                    dict(self._update_cache_entry(state)
+                         for state in states))
+        except Exception:
+            LOG.exception(_LE("Error while attesting hosts %s"), hosts)
+        finally:
+            for host in hosts:
+                self._attesting.pop(host, None)
+            event.send()
+
+    def _refresh(self, hosts):
+        """Starts attesting the hosts in the background, unless they are
+        already being attested.
+        """
+        hosts = sorted(host for host in hosts if host not in self._attesting)
+        count = self.attestservice.request_count
+        for i in range(0, len(hosts), count):
+            batch = hosts[i:i + count]
+            event = eventlet.event.Event()
+            for host in batch:
+                self._attesting[host] = event
+            utils.spawn_n(self._attest, batch, event)
+
+    def get_host_attestations(self, hosts):
+        """Returns a dict of the trust levels of the hosts."""
+        hosts = set(hosts)
+        self._load_shared_entries(
+            [host for host in hosts if not self._cache_usable(host)])
+        missing = [host for host in hosts if not self._cache_usable(host)]
+        previous = {host: self.compute_nodes.get(host) for host in missing}
+        self._refresh(host for host in hosts if not self._cache_valid(host))
+
+        events = set(self._attesting[host] for host in missing
+                     if host in self._attesting)
+        if events:
+            with eventlet.timeout.Timeout(
+                    CONF.trusted_computing.attestation_wait_timeout, False):
+                for event in events:
+                    event.wait()
+
+        levels = {}
+        for host in hosts:
+            node_stats = self.compute_nodes.get(host)
+            # The level of a host just attested is used even if the OAT
+            # service returned an old validation time
+            if node_stats is not None and (
+                    host not in previous or
+                    node_stats is not previous[host]):
+                levels[host] = node_stats['trust_lvl']
+            else:
+                levels[host] = 'unknown'
+        return levels
 
     def get_host_attestation(self, host):
         """Check host's trust level."""
-        if host not in self.compute_nodes:
-            self._init_cache_entry(host)
-        if not self._cache_valid(host):
-            self._update_cache()
-        level = self.compute_nodes.get(host).get('trust_lvl')
-        return level
+        return self.get_host_attestations([host])[host]
 
 
 class ComputeAttestation(object):
@@ -225,6 +313,11 @@ class ComputeAttestation(object):
         level = self.caches.get_host_attestation(host)
         return trust == level
 
+    def get_trusted_hosts(self, hosts, trust):
+        """Returns the set of the hosts whose trust level matches trust."""
+        levels = self.caches.get_host_attestations(hosts)
+        return set(host for host, level in levels.items() if level == trust)
+
 
 class TrustedFilter(filters.BaseHostFilter):
     """Trusted filter to support Trusted Compute Pools."""
@@ -241,12 +334,28 @@ class TrustedFilter(filters.BaseHostFilter):
     # The hosts the instances are running on doesn't change within a request
     run_filter_once_per_request = True
 
-    def host_passes(self, host_state, spec_obj):
+    @staticmethod
+    def _get_trust(spec_obj):
         instance_type = spec_obj.flavor
         extra = (instance_type.extra_specs
                  if 'extra_specs' in instance_type else {})
-        trust = extra.get('trust:trusted_host')
+        return extra.get('trust:trusted_host')
+
+    def host_passes(self, host_state, spec_obj):
+        trust = self._get_trust(spec_obj)
         host = host_state.nodename
         if trust:
             return self.compute_attestation.is_trusted(host, trust)
         return True
+
+    def filter_all(self, filter_obj_list, spec_obj):
+        # Attest all the hosts at once, so that they can be attested in
+        # batches and the request waits for them only once
+        host_states = list(filter_obj_list)
+        trust = self._get_trust(spec_obj)
+        if not trust:
+            return host_states
+        trusted = self.compute_attestation.get_trusted_hosts(
+            [host_state.nodename for host_state in host_states], trust)
+        return [host_state for host_state in host_states
+                if host_state.nodename in trusted]
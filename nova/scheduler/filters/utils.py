@@ -24,8 +24,24 @@ from nova.i18n import _LI
 LOG = logging.getLogger(__name__)
 
 
+def get_aggregate_index(host_states):
+    """Returns the AggregateMetadataIndex shared by a list of HostStates, or
+    None if they are not indexed.
+    """
+    if not host_states:
+        return None
+    index = host_states[0].aggregate_index
+    if index is None or any(host_state.aggregate_index is not index
+                            for host_state in host_states):
+        return None
+    return index
+
+
 def aggregate_values_from_key(host_state, key_name):
     """Returns a set of values based on a metadata key for a specific host."""
+    if host_state.aggregate_index is not None:
+        return set(host_state.aggregate_index.get_values(host_state.host,
+                                                         key_name))
     aggrlist = host_state.aggregates
     return {aggr.metadata[key_name]
               for aggr in aggrlist
@@ -37,6 +53,9 @@ def aggregate_metadata_get_by_host(host_state, key=None):
     """Returns a dict of all metadata based on a metadata key for a specific
     host. If the key is not provided, returns a dict of all metadata.
     """
+    if key is None and host_state.aggregate_index is not None:
+        return collections.defaultdict(
+            set, host_state.aggregate_index.get_metadata(host_state.host))
     aggrlist = host_state.aggregates
     metadata = collections.defaultdict(set)
     for aggr in aggrlist:
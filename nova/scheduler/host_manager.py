@@ -18,8 +18,8 @@ Manage hosts in the current zone.
 """
 
 import collections
+import datetime
 import functools
-import time
 try:
     from collections import UserDict as IterableUserDict   # Python 3
 except ImportError:
@@ -47,6 +47,21 @@ CONF = nova.conf.CONF
 
 LOG = logging.getLogger(__name__)
 HOST_INSTANCE_SEMAPHORE = "host_instance"
+# Number of seconds the changed records lookups overlap with the previous
+# refresh, so that records written concurrently with it, or stored with a
+# truncated timestamp, are not missed.
+HOST_STATE_SYNC_OVERLAP = 2
+
+
+def _latest_change(records):
+    """Returns the most recent creation, update or deletion time of the
+    given records, or None if there is none.
+    """
+    timestamps = [getattr(record, field)
+                  for record in records
+                  for field in ('created_at', 'updated_at', 'deleted_at')
+                  if record.obj_attr_is_set(field) and getattr(record, field)]
+    return max(timestamps) if timestamps else None
 
 
 class ReadOnlyDict(IterableUserDict):
@@ -143,6 +158,9 @@ class HostState(object):
 
         # List of aggregates the host belongs to
         self.aggregates = []
+        # Index of the metadata of the aggregates of all the hosts, shared
+        # with the HostManager
+        self.aggregate_index = None
 
         # Instances on this host
         self.instances = {}
@@ -319,6 +337,97 @@ class HostState(object):
                  'num_instances': self.num_instances})
 
 
+class AggregateMetadataIndex(object):
+    """Inverted index of the metadata of the aggregates.
+
+    Maps each aggregate metadata key, and each of its comma-separated values,
+    to the names of the hosts belonging to an aggregate with that metadata,
+    so that the aggregate filters can select the hosts matching a request
+    with set operations instead of reading the aggregates of each host.
+    The metadata of each host is also kept, with the raw and the split
+    values of each key.
+    """
+
+    def __init__(self):
+        self._raw_metadata_by_host = {}
+        self._metadata_by_host = {}
+        self._hosts_by_key = {}
+        self._hosts_by_value = {}
+
+    def update_host(self, host, aggregates):
+        """Re-indexes a host from the list of its aggregates."""
+        self._remove_host(host)
+        raw_metadata = collections.defaultdict(set)
+        metadata = collections.defaultdict(set)
+        for aggregate in aggregates:
+            if not aggregate.obj_attr_is_set('metadata'):
+                continue
+            for key, value in six.iteritems(aggregate.metadata):
+                raw_metadata[key].add(value)
+                metadata[key].update(x.strip() for x in value.split(','))
+        if not metadata:
+            return
+        self._raw_metadata_by_host[host] = {
+            key: frozenset(values)
+            for key, values in six.iteritems(raw_metadata)}
+        self._metadata_by_host[host] = {
+            key: frozenset(values) for key, values in six.iteritems(metadata)}
+        for key, values in six.iteritems(metadata):
+            self._hosts_by_key.setdefault(key, set()).add(host)
+            hosts_by_value = self._hosts_by_value.setdefault(key, {})
+            for value in values:
+                hosts_by_value.setdefault(value, set()).add(host)
+
+    def _remove_host(self, host):
+        self._raw_metadata_by_host.pop(host, None)
+        metadata = self._metadata_by_host.pop(host, {})
+        for key, values in six.iteritems(metadata):
+            hosts = self._hosts_by_key[key]
+            hosts.discard(host)
+            if not hosts:
+                del self._hosts_by_key[key]
+            hosts_by_value = self._hosts_by_value[key]
+            for value in values:
+                hosts = hosts_by_value[value]
+                hosts.discard(host)
+                if not hosts:
+                    del hosts_by_value[value]
+            if not hosts_by_value:
+                del self._hosts_by_value[key]
+
+    def get_values(self, host, key):
+        """Returns the set of the values of a metadata key in the aggregates
+        of a host, not split on commas.
+        """
+        return self._raw_metadata_by_host.get(host, {}).get(key, frozenset())
+
+    def get_metadata(self, host):
+        """Returns a dict of the sets of the comma-separated values of each
+        metadata key in the aggregates of a host.
+        """
+        return self._metadata_by_host.get(host, {})
+
+    def keys(self):
+        """Returns the metadata keys of all the aggregates with hosts."""
+        return list(self._hosts_by_key)
+
+    def hosts_with_key(self, key):
+        """Returns the set of the hosts in an aggregate with a metadata key."""
+        return self._hosts_by_key.get(key, frozenset())
+
+    def hosts_with_value(self, key, value):
+        """Returns the set of the hosts in an aggregate with a metadata key
+        whose comma-separated values include the given value.
+        """
+        return self._hosts_by_value.get(key, {}).get(value, frozenset())
+
+    def hosts_by_value(self, key):
+        """Returns a dict of the sets of the hosts in an aggregate with a
+        metadata key, keyed by the comma-separated values of the key.
+        """
+        return self._hosts_by_value.get(key, {})
+
+
 class HostManager(object):
     """Base HostManager class."""
 
@@ -343,7 +452,18 @@ class HostManager(object):
         # Dict of set of aggregate IDs keyed by the name of the host belonging
         # to those aggregates
         self.host_aggregates_map = collections.defaultdict(set)
+        # Index of the hosts by aggregate metadata, used by the aggregate
+        # filters
+        self.aggregate_index = AggregateMetadataIndex()
         self._init_aggregates()
+        # Compute nodes keyed by (host, node) and nova-compute services keyed
+        # by host, cached when refreshing the host states incrementally
+        self._compute_nodes = {}
+        self._service_refs = {}
+        # Latest change time of the cached records and local time of the last
+        # full refresh
+        self._last_change = None
+        self._last_full_sync = None
         self.tracks_instance_changes = CONF.scheduler_tracks_instance_changes
         # Dict of instances and status, keyed by host
         self._instance_info = {}
@@ -360,6 +480,7 @@ class HostManager(object):
             self.aggs_by_id[agg.id] = agg
             for host in agg.hosts:
                 self.host_aggregates_map[host].add(agg.id)
+        self._index_aggregates(list(self.host_aggregates_map))
 
     def update_aggregates(self, aggregates):
         """Updates internal HostManager information about aggregates."""
@@ -375,10 +496,13 @@ class HostManager(object):
             self.host_aggregates_map[host].add(aggregate.id)
         # Refreshing the mapping dict to remove all hosts that are no longer
         # part of the aggregate
+        removed_hosts = []
         for host in self.host_aggregates_map:
             if (aggregate.id in self.host_aggregates_map[host]
                     and host not in aggregate.hosts):
                 self.host_aggregates_map[host].remove(aggregate.id)
+                removed_hosts.append(host)
+        self._index_aggregates(list(aggregate.hosts) + removed_hosts)
 
     def delete_aggregate(self, aggregate):
         """Deletes internal HostManager information about a specific aggregate.
@@ -388,6 +512,13 @@ class HostManager(object):
         for host in aggregate.hosts:
             if aggregate.id in self.host_aggregates_map[host]:
                 self.host_aggregates_map[host].remove(aggregate.id)
+        self._index_aggregates(aggregate.hosts)
+
+    def _index_aggregates(self, hosts):
+        """Refreshes the aggregate metadata index of the given hosts."""
+        for host in set(hosts):
+            self.aggregate_index.update_host(
+                host, self._get_aggregates_info(host))
 
     def _init_instance_info(self, compute_nodes=None):
         """Creates the initial view of instances for all hosts.
@@ -411,37 +542,34 @@ class HostManager(object):
                     context).objects
 
             LOG.debug("Total number of compute nodes: %s", len(compute_nodes))
-            # Break the queries into batches of 10 to reduce the total number
-            # of calls to the DB.
-            batch_size = 10
-            start_node = 0
-            end_node = batch_size
-            while start_node <= len(compute_nodes):
-                curr_nodes = compute_nodes[start_node:end_node]
-                start_node += batch_size
-                end_node += batch_size
-                filters = {"host": [curr_node.host
-                                    for curr_node in curr_nodes],
-                           "deleted": False}
-                result = objects.InstanceList.get_by_filters(
-                    context.elevated(), filters)
-                instances = result.objects
-                LOG.debug("Adding %s instances for hosts %s-%s",
-                          len(instances), start_node, end_node)
-                for instance in instances:
-                    host = instance.host
-                    if host not in self._instance_info:
-                        self._instance_info[host] = {"instances": {},
-                                                     "updated": False}
-                    inst_dict = self._instance_info[host]
-                    inst_dict["instances"][instance.uuid] = instance
-                # Call sleep() to cooperatively yield
-                time.sleep(0)
+            # Load the instances of all the hosts with a single query
+            instances_by_host = self._get_instances_by_host(
+                context.elevated(), [node.host for node in compute_nodes])
+            for host, inst_dict in six.iteritems(instances_by_host):
+                self._instance_info[host] = {"instances": inst_dict,
+                                             "updated": False}
             LOG.debug("END:_async_init_instance_info")
 
         # Run this async so that we don't block the scheduler start-up
         utils.spawn_n(_async_init_instance_info, compute_nodes)
 
+    @staticmethod
+    def _get_instances_by_host(context, host_names):
+        """Returns the dicts of the instances keyed by uuid of the given hosts,
+        loaded with a single query, keyed by host.
+        """
+        instances_by_host = {}
+        if not host_names:
+            return instances_by_host
+        # Only the instance columns are needed by the filters and weighers
+        instances = objects.InstanceList.get_by_filters(
+            context, {"host": sorted(set(host_names)), "deleted": False},
+            expected_attrs=[])
+        for instance in instances:
+            instances_by_host.setdefault(instance.host, {})[
+                instance.uuid] = instance
+        return instances_by_host
+
     def _choose_host_filters(self, filter_cls_names):
         """Since the caller may specify which filters to use we need
         to have an authoritative list of what is permissible. This
@@ -467,7 +595,7 @@ class HostManager(object):
         return good_filters
 
     def get_filtered_hosts(self, hosts, spec_obj,
-            filter_class_names=None, index=0):
+            filter_class_names=None, index=0, profile=None):
         """Filter hosts and return only ones passing all filters."""
 
         def _strip_ignore_hosts(host_map, hosts_to_ignore):
@@ -543,12 +671,23 @@ class HostManager(object):
             hosts = six.itervalues(name_to_cls_map)
 
         return self.filter_handler.get_filtered_objects(filters,
-                hosts, spec_obj, index)
+                hosts, spec_obj, index, profile=profile)
 
-    def get_weighed_hosts(self, hosts, spec_obj):
+    def get_weighed_hosts(self, hosts, spec_obj, profile=None):
         """Weigh the hosts."""
         return self.weight_handler.get_weighed_objects(self.weighers,
-                hosts, spec_obj)
+                hosts, spec_obj, profile=profile)
+
+    def get_host_weights(self, hosts, spec_obj, profile=None):
+        """Return the list of the weights of the hosts, in their order."""
+        return self.weight_handler.get_weights(self.weighers, hosts, spec_obj,
+                                               profile=profile)
+
+    def get_weigher_ranges(self):
+        """Return the minimum and maximum values recorded by each weigher,
+        which are used to normalize the weights.
+        """
+        return [(weigher.minval, weigher.maxval) for weigher in self.weighers]
 
     def get_all_host_states(self, context):
         """Returns a list of HostStates that represents all the hosts
@@ -556,11 +695,12 @@ class HostManager(object):
         in HostState are pre-populated and adjusted based on data in the db.
         """
 
-        service_refs = {service.host: service
-                        for service in objects.ServiceList.get_by_binary(
-                            context, 'nova-compute', include_disabled=True)}
         # Get resource usage across the available compute nodes:
-        compute_nodes = objects.ComputeNodeList.get_all(context)
+        service_refs, compute_nodes, changed_hosts, changed_nodes = (
+            self._get_compute_nodes_and_services(context))
+        instances_by_host = self._get_not_updated_instance_info(
+            context, [compute for compute in compute_nodes
+                      if compute.host in service_refs])
         seen_nodes = set()
         for compute in compute_nodes:
             service = service_refs.get(compute.host)
@@ -576,14 +716,28 @@ class HostManager(object):
             host_state = self.host_state_map.get(state_key)
             if not host_state:
                 host_state = self.host_state_cls(host, node, compute=compute)
+                host_state.aggregate_index = self.aggregate_index
                 self.host_state_map[state_key] = host_state
+                new_host_state = True
+            else:
+                new_host_state = False
+            # Only refresh the host state from the compute node and service
+            # records if they changed since the last refresh
+            compute_update = service_update = None
+            if (new_host_state or changed_nodes is None or
+                    state_key in changed_nodes):
+                compute_update = compute
+            if (new_host_state or changed_hosts is None or
+                    host in changed_hosts):
+                service_update = dict(service)
             # We force to update the aggregates info each time a new request
             # comes in, because some changes on the aggregates could have been
             # happening after setting this field for the first time
-            host_state.update(compute,
-                              dict(service),
+            host_state.update(compute_update,
+                              service_update,
                               self._get_aggregates_info(host),
-                              self._get_instance_info(context, compute))
+                              self._get_instance_info(context, compute,
+                                                      instances_by_host))
 
             seen_nodes.add(state_key)
 
@@ -597,11 +751,97 @@ class HostManager(object):
 
         return six.itervalues(self.host_state_map)
 
+    def _get_compute_nodes_and_services(self, context):
+        """Returns the nova-compute services keyed by host and the compute
+        nodes to refresh the host states from, along with the set of hosts
+        whose service changed and the set of (host, node) keys whose compute
+        node changed since the previous call. Those sets are None when all the
+        host states need to be refreshed.
+
+        Unless scheduler_host_state_delta_sync is set, all the records are
+        read from the database on each call. Otherwise only the records
+        created, updated or deleted since the previous call are read, and
+        merged into the cached ones.
+        """
+        if not CONF.scheduler_host_state_delta_sync:
+            service_refs = {service.host: service
+                            for service in objects.ServiceList.get_by_binary(
+                                context, 'nova-compute',
+                                include_disabled=True)}
+            compute_nodes = objects.ComputeNodeList.get_all(context)
+            return service_refs, compute_nodes, None, None
+
+        full_sync_interval = CONF.scheduler_host_state_full_sync_interval
+        if (self._last_change is None or (full_sync_interval and
+                timeutils.is_older_than(self._last_full_sync,
+                                        full_sync_interval))):
+            services = objects.ServiceList.get_by_binary(
+                context, 'nova-compute', include_disabled=True)
+            compute_nodes = objects.ComputeNodeList.get_all(context)
+            self._service_refs = {service.host: service
+                                  for service in services}
+            self._compute_nodes = {
+                (compute.host, compute.hypervisor_hostname): compute
+                for compute in compute_nodes}
+            self._last_change = _latest_change(
+                list(services) + list(compute_nodes))
+            self._last_full_sync = timeutils.utcnow()
+            return self._service_refs, compute_nodes, None, None
+
+        changes_since = self._last_change - datetime.timedelta(
+            seconds=HOST_STATE_SYNC_OVERLAP)
+        services = objects.ServiceList.get_by_binary_changed_since(
+            context, 'nova-compute', changes_since)
+        compute_nodes = objects.ComputeNodeList.get_all_changed_since(
+            context, changes_since)
+        LOG.debug("Read %(services)d service(s) and %(nodes)d compute "
+                  "node(s) changed since %(since)s",
+                  {'services': len(services), 'nodes': len(compute_nodes),
+                   'since': changes_since})
+
+        # NOTE: A deleted record may have been replaced by a new one, so the
+        # deleted records are expired first.
+        changed_hosts = set()
+        for service in sorted(services, key=lambda s: not s.deleted):
+            changed_hosts.add(service.host)
+            if service.deleted:
+                self._service_refs.pop(service.host, None)
+            else:
+                self._service_refs[service.host] = service
+        changed_nodes = set()
+        for compute in sorted(compute_nodes, key=lambda c: not c.deleted):
+            state_key = (compute.host, compute.hypervisor_hostname)
+            changed_nodes.add(state_key)
+            if compute.deleted:
+                self._compute_nodes.pop(state_key, None)
+            else:
+                self._compute_nodes[state_key] = compute
+
+        last_change = _latest_change(list(services) + list(compute_nodes))
+        if last_change and last_change > self._last_change:
+            self._last_change = last_change
+        return (self._service_refs, list(self._compute_nodes.values()),
+                changed_hosts, changed_nodes)
+
     def _get_aggregates_info(self, host):
         return [self.aggs_by_id[agg_id] for agg_id in
                 self.host_aggregates_map[host]]
 
-    def _get_instance_info(self, context, compute):
+    def _get_not_updated_instance_info(self, context, compute_nodes):
+        """Loads the instances of the hosts whose compute services do not send
+        their instance info, keyed by host.
+
+        The instances of all these hosts are loaded with a single query,
+        rather than one query per host in _get_instance_info().
+        """
+        host_names = []
+        for compute in compute_nodes:
+            host_info = self._instance_info.get(compute.host)
+            if not (host_info and host_info.get("updated")):
+                host_names.append(compute.host)
+        return self._get_instances_by_host(context, host_names)
+
+    def _get_instance_info(self, context, compute, instances_by_host=None):
         """Gets the host instance info from the compute host.
 
         Some older compute nodes may not be sending instance change updates to
@@ -609,12 +849,15 @@ class HostManager(object):
         reasons. In either of these cases, there will either be no information
         for the host, or the 'updated' value for that host dict will be False.
         In those cases, we need to grab the current InstanceList instead of
-        relying on the version in _instance_info.
+        relying on the version in _instance_info, unless it was already loaded
+        in instances_by_host.
         """
         host_name = compute.host
         host_info = self._instance_info.get(host_name)
         if host_info and host_info.get("updated"):
             inst_dict = host_info["instances"]
+        elif instances_by_host is not None:
+            inst_dict = instances_by_host.get(host_name, {})
         else:
             # Host is running old version, or updates aren't flowing.
             inst_list = objects.InstanceList.get_by_host(context, host_name)
@@ -689,12 +932,27 @@ class HostManager(object):
         """
         host_info = self._instance_info.get(host_name)
         if host_info:
-            local_set = set(host_info["instances"].keys())
+            inst_dict = host_info["instances"]
+            local_set = set(inst_dict.keys())
             compute_set = set(instance_uuids)
             if not local_set == compute_set:
-                self._recreate_instance_info(context, host_name)
-                LOG.info(_LI("The instance sync for host '%s' did not match. "
-                             "Re-created its InstanceList."), host_name)
+                # Only load the instances missing from the local view
+                missing = compute_set - local_set
+                if missing:
+                    instances = objects.InstanceList.get_by_filters(
+                        context, {"uuid": sorted(missing), "deleted": False},
+                        expected_attrs=[])
+                    for instance in instances:
+                        inst_dict[instance.uuid] = instance
+                extra = local_set - compute_set
+                for instance_uuid in extra:
+                    del inst_dict[instance_uuid]
+                host_info["updated"] = True
+                LOG.info(_LI("The instance sync for host '%(host)s' did not "
+                             "match. Added %(added)d and removed %(removed)d "
+                             "instances."),
+                         {'host': host_name, 'added': len(missing),
+                          'removed': len(extra)})
                 return
             host_info["updated"] = True
             LOG.info(_LI("Successfully synced instances from host '%s'."),
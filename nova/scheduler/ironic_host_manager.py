@@ -103,11 +103,18 @@ class IronicHostManager(host_manager.HostManager):
                                if not self._is_ironic_compute(c)]
         super(IronicHostManager, self)._init_instance_info(non_ironic_computes)
 
-    def _get_instance_info(self, context, compute):
+    def _get_not_updated_instance_info(self, context, compute_nodes):
+        """Ironic hosts should not pass instance info."""
+        non_ironic_computes = [c for c in compute_nodes
+                               if not self._is_ironic_compute(c)]
+        return super(IronicHostManager, self)._get_not_updated_instance_info(
+            context, non_ironic_computes)
+
+    def _get_instance_info(self, context, compute, instances_by_host=None):
         """Ironic hosts should not pass instance info."""
 
         if compute and self._is_ironic_compute(compute):
             return {}
         else:
-            return super(IronicHostManager, self)._get_instance_info(context,
-                                                                     compute)
+            return super(IronicHostManager, self)._get_instance_info(
+                context, compute, instances_by_host)
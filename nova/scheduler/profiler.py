@@ -0,0 +1,203 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Profiling of the scheduler filters and weighers.
+
+A RequestProfile records the time spent by each filter and weigher on a
+scheduling request, and the number of hosts they were given and returned.
+The SchedulerProfiler of each scheduler aggregates these profiles into
+histograms of the time spent per request, and periodically adds them to the
+statistics of its host in the cache, from where they are read by
+'nova-manage scheduler profile'.
+"""
+
+import bisect
+import collections
+import time
+
+from oslo_serialization import jsonutils
+
+from nova import cache_utils
+from nova import utils
+
+PROFILE_KEY_PREFIX = 'nova-scheduler-profile-'
+
+# Upper bounds, in milliseconds, of the buckets of the histograms, the last
+# bucket counting the requests which took longer
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Seconds between two publications of the statistics of a scheduler
+PUBLISH_INTERVAL = 10
+
+REQUEST = 'request'
+FILTER = 'filter'
+WEIGHER = 'weigher'
+
+
+class RequestProfile(object):
+    """The time spent by the filters and weighers on a scheduling request.
+
+    The calls of a filter or weigher for the different instances of the
+    request are summed. The number of hosts given to a filter is the one of
+    its first call, and the number of hosts it returned the one of its last
+    call.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.elapsed = None
+        self.filters = collections.OrderedDict()
+        self.weighers = collections.OrderedDict()
+
+    def add_filter(self, name, elapsed, hosts_in, hosts_out):
+        self._add(self.filters, name, elapsed, hosts_in, hosts_out)
+
+    def add_weigher(self, name, elapsed, hosts):
+        self._add(self.weighers, name, elapsed, hosts, hosts)
+
+    @staticmethod
+    def _add(entries, name, elapsed, hosts_in, hosts_out):
+        entry = entries.get(name)
+        if entry is None:
+            entry = entries[name] = {'name': name, 'calls': 0,
+                                     'elapsed_ms': 0.0, 'hosts_in': hosts_in}
+        entry['calls'] += 1
+        entry['elapsed_ms'] += elapsed * 1000
+        entry['hosts_out'] = hosts_out
+
+    def finish(self):
+        self.elapsed = time.time() - self.started_at
+
+    def to_dict(self):
+        return {'elapsed_ms': (self.elapsed or 0.0) * 1000,
+                'filters': list(self.filters.values()),
+                'weighers': list(self.weighers.values())}
+
+
+def _get_stat(stats, kind, name):
+    key = '%s:%s' % (kind, name)
+    stat = stats.get(key)
+    if stat is None:
+        stat = stats[key] = {'type': kind, 'name': name, 'requests': 0,
+                             'calls': 0, 'elapsed_ms': 0.0, 'max_ms': 0.0,
+                             'hosts_in': 0, 'hosts_out': 0,
+                             'histogram': [0] * (len(HISTOGRAM_BOUNDS) + 1)}
+    return stat
+
+
+def add_profile(stats, profile):
+    """Adds a RequestProfile to the statistics, a dict of histograms of the
+    time spent per request by each filter and weigher, and by the whole
+    requests.
+    """
+    entries = [(REQUEST, {'name': 'total', 'calls': 1,
+                          'elapsed_ms': (profile.elapsed or 0.0) * 1000,
+                          'hosts_in': 0, 'hosts_out': 0})]
+    entries += [(FILTER, entry) for entry in profile.filters.values()]
+    entries += [(WEIGHER, entry) for entry in profile.weighers.values()]
+    for kind, entry in entries:
+        stat = _get_stat(stats, kind, entry['name'])
+        elapsed_ms = entry['elapsed_ms']
+        stat['requests'] += 1
+        stat['calls'] += entry['calls']
+        stat['elapsed_ms'] += elapsed_ms
+        stat['max_ms'] = max(stat['max_ms'], elapsed_ms)
+        stat['hosts_in'] += entry['hosts_in']
+        stat['hosts_out'] += entry['hosts_out']
+        stat['histogram'][bisect.bisect_left(HISTOGRAM_BOUNDS,
+                                             elapsed_ms)] += 1
+
+
+def merge_stats(stats, other_stats):
+    """Adds the statistics of other_stats to stats."""
+    for other in other_stats.values():
+        stat = _get_stat(stats, other['type'], other['name'])
+        for field in ('requests', 'calls', 'elapsed_ms', 'hosts_in',
+                      'hosts_out'):
+            stat[field] += other[field]
+        stat['max_ms'] = max(stat['max_ms'], other['max_ms'])
+        stat['histogram'] = [count + other_count for count, other_count in
+                             zip(stat['histogram'], other['histogram'])]
+
+
+def _get_key(host):
+    return PROFILE_KEY_PREFIX + host
+
+
+def _get_host_stats(mc, host):
+    stats = mc.get(_get_key(host))
+    if not stats:
+        return {}
+    return jsonutils.loads(stats)
+
+
+def get_stats(hosts):
+    """Returns the statistics published by the schedulers of the hosts,
+    merged.
+    """
+    mc = cache_utils.get_client()
+    stats = {}
+    for host in hosts:
+        merge_stats(stats, _get_host_stats(mc, host))
+    return stats
+
+
+def reset_stats(hosts):
+    """Deletes the statistics published by the schedulers of the hosts."""
+    cache_utils.get_client().delete_multi([_get_key(host) for host in hosts])
+
+
+class SchedulerProfiler(object):
+    """Aggregates the profiles of the requests processed by a scheduler.
+
+    The statistics are added to the ones of the host in the cache by the
+    first request recorded PUBLISH_INTERVAL seconds after the last
+    publication, and by the periodic task of the scheduler driver, so that
+    the statistics of an idle scheduler are published too. They are added
+    with an external lock held, so that the scheduler workers of a host do
+    not overwrite each other's statistics.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self._pending = {}
+        self._published_at = time.time()
+        self._mc = None
+
+    @property
+    def mc(self):
+        if self._mc is None:
+            self._mc = cache_utils.get_client()
+        return self._mc
+
+    def record(self, profile):
+        add_profile(self._pending, profile)
+        if time.time() - self._published_at >= PUBLISH_INTERVAL:
+            self.publish()
+
+    def publish(self):
+        pending, self._pending = self._pending, {}
+        self._published_at = time.time()
+        if not pending:
+            return
+
+        @utils.synchronized(_get_key(self.host), external=True)
+        def _locked_publish():
+            stats = _get_host_stats(self.mc, self.host)
+            merge_stats(stats, pending)
+            self.mc.set(_get_key(self.host), jsonutils.dumps(stats))
+
+        _locked_publish()
@@ -17,8 +17,55 @@
 Scheduler host weights
 """
 
+import time
+
+import nova.conf
+from nova.scheduler import filters
 from nova import weights
 
+CONF = nova.conf.CONF
+
+
+def normalize(weights, minval=None, maxval=None):
+    """Normalize the values of an array between 0 and 1.0.
+
+    This is the same as nova.weights.normalize(), for numpy arrays.
+    """
+    if maxval is None:
+        maxval = weights.max()
+
+    if minval is None:
+        minval = weights.min()
+
+    maxval = float(maxval)
+    minval = float(minval)
+
+    if minval == maxval:
+        return filters.numpy.zeros(len(weights))
+
+    range_ = maxval - minval
+    return (weights - minval) / range_
+
+
+def best_indexes(weights, count):
+    """Return the indexes of the greatest values of an array, in descending
+    order of the values.
+
+    Like with a stable sort, equal values are returned in the order of their
+    indexes. Only the greatest values are sorted.
+    """
+    numpy = filters.numpy
+    if count < len(weights):
+        # NOTE: All the values equal to the count-th greatest one are kept
+        # before sorting, so that they are selected in the order of their
+        # indexes.
+        kth = numpy.partition(weights, len(weights) - count)[-count]
+        indexes = numpy.flatnonzero(weights >= kth)
+    else:
+        indexes = numpy.arange(len(weights))
+    order = numpy.argsort(-weights[indexes], kind='mergesort')
+    return indexes[order[:count]]
+
 
 class WeighedHost(weights.WeighedObject):
     def to_dict(self):
@@ -33,7 +80,36 @@ class WeighedHost(weights.WeighedObject):
 
 class BaseHostWeigher(weights.BaseWeigher):
     """Base class for host weights."""
-    pass
+
+    def _batch_weigh_objects(self, columns, weight_properties):
+        """Return an array of the weights of all the hosts, or None.
+
+        :param columns: a HostStateColumns of the hosts to weigh.
+
+        Override this in a subclass which can weigh all the hosts at once with
+        array operations on the columns.
+        """
+        return None
+
+    def batch_weigh_objects(self, columns, weight_properties):
+        """Weigh all the hosts at once.
+
+        Return an array of weights like weigh_objects() returns a list of
+        weights, or None if the hosts have to be weighed with weigh_objects().
+        """
+        weights = self._batch_weigh_objects(columns, weight_properties)
+        if weights is None or not len(weights):
+            return weights
+
+        # Record the min and max values like weigh_objects()
+        minval = weights.min().item()
+        maxval = weights.max().item()
+        if self.minval is None or minval < self.minval:
+            self.minval = minval
+        if self.maxval is None or maxval > self.maxval:
+            self.maxval = maxval
+
+        return weights
 
 
 class HostWeightHandler(weights.BaseWeightHandler):
@@ -42,6 +118,71 @@ class HostWeightHandler(weights.BaseWeightHandler):
     def __init__(self):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
 
+    def get_weighed_objects(self, weighers, obj_list, weighing_properties,
+                            profile=None):
+        if filters.numpy is None or not CONF.scheduler_batch_weighers:
+            return super(HostWeightHandler, self).get_weighed_objects(
+                weighers, obj_list, weighing_properties, profile=profile)
+
+        # NOTE: Only the best hosts, from which the FilterScheduler picks one,
+        # are sorted and returned.
+        hosts = list(obj_list)
+        if len(hosts) <= 1:
+            return [self.object_class(obj, 0.0) for obj in hosts]
+
+        totals = self._batch_weigh_hosts(weighers, hosts, weighing_properties,
+                                         profile=profile)
+        count = max(1, CONF.scheduler_host_subset_size)
+        totals_list = totals.tolist()
+        return [self.object_class(hosts[i], totals_list[i])
+                for i in best_indexes(totals, count).tolist()]
+
+    def get_weights(self, weighers, hosts, weighing_properties,
+                    profile=None):
+        """Return the list of the weights of the hosts, in their order.
+
+        Unlike get_weighed_objects(), the hosts are weighed even if there is
+        only one of them.
+        """
+        if not hosts:
+            return []
+        if filters.numpy is not None and CONF.scheduler_batch_weighers:
+            return self._batch_weigh_hosts(weighers, hosts,
+                                           weighing_properties,
+                                           profile=profile).tolist()
+
+        weighed_objs = [self.object_class(obj, 0.0) for obj in hosts]
+        self._weigh_objects(weighers, weighed_objs, weighing_properties,
+                            profile=profile)
+        return [weighed_obj.weight for weighed_obj in weighed_objs]
+
+    def _batch_weigh_hosts(self, weighers, hosts, weighing_properties,
+                           profile=None):
+        """Return the array of the sums of the normalized weights."""
+        columns = filters.HostStateColumns(hosts)
+        totals = filters.numpy.zeros(len(hosts))
+        weighed_objs = None
+        for weigher in weighers:
+            start_time = time.time()
+            weights = weigher.batch_weigh_objects(columns, weighing_properties)
+            if weights is None:
+                if weighed_objs is None:
+                    weighed_objs = [self.object_class(obj, 0.0)
+                                    for obj in hosts]
+                weights = filters.numpy.array(
+                    weigher.weigh_objects(weighed_objs, weighing_properties),
+                    dtype=float)
+
+            # Normalize the weights
+            weights = normalize(weights,
+                                minval=weigher.minval,
+                                maxval=weigher.maxval)
+            totals += weigher.weight_multiplier() * weights
+            if profile is not None:
+                profile.add_weigher(weigher.__class__.__name__,
+                                    time.time() - start_time, len(hosts))
+        return totals
+
 
 def all_weighers():
     """Return a list of weight plugin classes found in this directory."""
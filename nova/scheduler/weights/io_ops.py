@@ -39,3 +39,6 @@ class IoOpsWeigher(weights.BaseHostWeigher):
         to be the default.
         """
         return host_state.num_io_ops
+
+    def _batch_weigh_objects(self, columns, weight_properties):
+        return columns.get('num_io_ops')
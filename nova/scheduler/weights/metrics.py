@@ -73,3 +73,9 @@ class MetricsWeigher(weights.BaseHostWeigher):
                         return CONF.metrics.weight_of_unavailable
 
         return value
+
+    def _batch_weigh_objects(self, columns, weight_properties):
+        # NOTE: The metrics are stored in a list per host, so they can not be
+        # read as columns, but the weights can be normalized and summed
+        # with the other ones.
+        return columns.map(self._weigh_object, weight_properties)
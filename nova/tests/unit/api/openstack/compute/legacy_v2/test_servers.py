@@ -1056,7 +1056,7 @@ class ServersControllerTest(ControllerTest):
         mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=expected_search_opts, limit=mock.ANY,
             marker=mock.ANY, want_objects=mock.ANY,
-            expected_attrs=['flavor', 'info_cache', 'metadata'],
+            expected_attrs=['fault', 'flavor', 'info_cache', 'metadata'],
             sort_keys=mock.ANY, sort_dirs=mock.ANY)
 
     @mock.patch.object(compute_api.API, 'get_all')
@@ -1080,7 +1080,7 @@ class ServersControllerTest(ControllerTest):
         mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=expected_search_opts, limit=mock.ANY,
             marker=mock.ANY, want_objects=mock.ANY,
-            expected_attrs=['flavor', 'info_cache', 'metadata'],
+            expected_attrs=['fault', 'flavor', 'info_cache', 'metadata'],
             sort_keys=mock.ANY, sort_dirs=mock.ANY)
 
     def test_get_servers_allows_name(self):
@@ -1017,7 +1017,8 @@ class ServersControllerTest(ControllerTest):
         expected_search_opts = {'deleted': True, 'project_id': 'fake'}
         mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=expected_search_opts, limit=mock.ANY,
-            expected_attrs=['flavor', 'info_cache', 'metadata', 'pci_devices'],
+            expected_attrs=['fault', 'flavor', 'info_cache', 'metadata',
+                            'pci_devices'],
             marker=mock.ANY, want_objects=mock.ANY,
             sort_keys=mock.ANY, sort_dirs=mock.ANY)
 
@@ -1041,7 +1042,8 @@ class ServersControllerTest(ControllerTest):
         expected_search_opts = {'deleted': False, 'project_id': 'fake'}
         mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=expected_search_opts, limit=mock.ANY,
-            expected_attrs=['flavor', 'info_cache', 'metadata', 'pci_devices'],
+            expected_attrs=['fault', 'flavor', 'info_cache', 'metadata',
+                            'pci_devices'],
             marker=mock.ANY, want_objects=mock.ANY,
             sort_keys=mock.ANY, sort_dirs=mock.ANY)
 
@@ -38,11 +38,9 @@ class CellsUtilsTestCase(test.NoDBTestCase):
 
         @staticmethod
         def instance_get_all_by_filters(context, filters,
-                sort_key, sort_dir, limit, marker):
-            # Pretend we return a full list the first time otherwise we loop
-            # infinitely
-            if marker is not None:
-                return []
+                sort_key, sort_dir, limit, marker, **kwargs):
+            # The batch is not full, so it is the last one
+            self.assertIsNone(marker)
             self.assertEqual(fake_context, context)
             self.assertEqual('deleted', sort_key)
             self.assertEqual('asc', sort_dir)
@@ -95,6 +93,7 @@ class CellsUtilsTestCase(test.NoDBTestCase):
             mock_get_by_filters, shuffle=False, updated_since=None,
             project_id=None):
         fake_context = 'fake_context'
+        self.flags(instance_update_sync_database_limit=3, group='cells')
 
         instances0 = objects.instance._make_instance_list(fake_context,
                 objects.InstanceList(),
@@ -118,13 +117,11 @@ class CellsUtilsTestCase(test.NoDBTestCase):
             filters['changes-since'] = updated_since
         if project_id is not None:
             filters['project_id'] = project_id
-        limit = 100
         expected_calls = [mock.call(fake_context, filters, sort_key='deleted',
-                              sort_dir='asc', limit=limit, marker=None),
-                          mock.call(fake_context, filters, sort_key='deleted',
-                              sort_dir='asc', limit=limit, marker=marker0),
-                          mock.call(fake_context, filters, sort_key='deleted',
-                              sort_dir='asc', limit=limit, marker=marker1)]
+                              sort_dir='asc', limit=3, marker=marker,
+                              expected_attrs=None, use_slave=False,
+                              sort_keys=None, sort_dirs=None)
+                          for marker in (None, marker0, marker1)]
         mock_get_by_filters.assert_has_calls(expected_calls)
         self.assertEqual(3, mock_get_by_filters.call_count)
 
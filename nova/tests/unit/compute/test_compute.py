@@ -655,6 +655,7 @@ class ComputeVolumeTestCase(BaseTestCase):
         time.time().AndReturn(20)
         time.time().AndReturn(21)
         objects.InstanceList.get_by_host(ctxt, 'fake-mini',
+                                         expected_attrs=[],
                                          use_slave=True).AndReturn([])
         self.compute.driver.get_all_bw_counters([]).AndRaise(
             NotImplementedError)
@@ -669,27 +670,90 @@ class ComputeVolumeTestCase(BaseTestCase):
 
     @mock.patch.object(objects.InstanceList, 'get_by_host')
     @mock.patch.object(objects.BlockDeviceMappingList,
-                       'get_by_instance_uuid')
+                       'get_by_instance_uuids')
     def test_get_host_volume_bdms(self, mock_get_by_inst, mock_get_by_host):
         fake_instance = mock.Mock(uuid=uuids.volume_instance)
-        mock_get_by_host.return_value = [fake_instance]
+        other_instance = mock.Mock(uuid=uuids.other_instance)
+        mock_get_by_host.return_value = [fake_instance, other_instance]
 
-        volume_bdm = mock.Mock(id=1, is_volume=True)
-        not_volume_bdm = mock.Mock(id=2, is_volume=False)
+        volume_bdm = mock.Mock(id=1, is_volume=True,
+                               instance_uuid=uuids.volume_instance)
+        not_volume_bdm = mock.Mock(id=2, is_volume=False,
+                                   instance_uuid=uuids.volume_instance)
         mock_get_by_inst.return_value = [volume_bdm, not_volume_bdm]
 
         expected_host_bdms = [{'instance': fake_instance,
-                               'instance_bdms': [volume_bdm]}]
+                               'instance_bdms': [volume_bdm]},
+                              {'instance': other_instance,
+                               'instance_bdms': []}]
 
         got_host_bdms = self.compute._get_host_volume_bdms('fake-context')
         mock_get_by_host.assert_called_once_with('fake-context',
                                                  self.compute.host,
+                                                 expected_attrs=[],
                                                  use_slave=False)
         mock_get_by_inst.assert_called_once_with('fake-context',
-                                                 uuids.volume_instance,
+                                                 [uuids.volume_instance,
+                                                  uuids.other_instance],
                                                  use_slave=False)
         self.assertEqual(expected_host_bdms, got_host_bdms)
 
+    @mock.patch.object(objects.BlockDeviceMappingList,
+                       'get_by_instance_uuids')
+    def test_get_host_volume_bdms_use_slave(self, mock_get_by_inst):
+        fake_instance = mock.Mock(uuid=uuids.volume_instance)
+        mock_get_by_inst.return_value = []
+
+        with mock.patch.object(self.compute, '_get_host_instances',
+                               return_value=[fake_instance]) as mock_get:
+            got_host_bdms = self.compute._get_host_volume_bdms(
+                'fake-context', use_slave=True)
+
+        mock_get.assert_called_once_with('fake-context', expected_attrs=[])
+        mock_get_by_inst.assert_called_once_with('fake-context',
+                                                 [uuids.volume_instance],
+                                                 use_slave=True)
+        self.assertEqual([{'instance': fake_instance, 'instance_bdms': []}],
+                         got_host_bdms)
+
+    def _get_volume_usages(self, instance):
+        return [{'volume': volume_id, 'rd_req': 1, 'rd_bytes': 10,
+                 'wr_req': 2, 'wr_bytes': 20, 'instance': instance}
+                for volume_id in (uuids.volume_id, uuids.other_volume_id)]
+
+    def test_update_volume_usage_cache(self):
+        instance = self._create_fake_instance_obj()
+
+        self.compute._update_volume_usage_cache(
+            self.context, self._get_volume_usages(instance))
+
+        self.assertEqual(['volume.usage', 'volume.usage'],
+                         [msg.event_type
+                          for msg in fake_notifier.NOTIFICATIONS])
+        self.assertEqual(
+            sorted([uuids.volume_id, uuids.other_volume_id]),
+            sorted(msg.payload['volume_id']
+                   for msg in fake_notifier.NOTIFICATIONS))
+        volume_usages = db.vol_get_usage_by_time(self.context, 0)
+        self.assertEqual(2, len(volume_usages))
+
+    def test_update_volume_usage_cache_aggregated_notification(self):
+        self.flags(volume_usage_aggregated_notification=True)
+        instance = self._create_fake_instance_obj()
+
+        self.compute._update_volume_usage_cache(
+            self.context, self._get_volume_usages(instance))
+
+        self.assertEqual(1, len(fake_notifier.NOTIFICATIONS))
+        msg = fake_notifier.NOTIFICATIONS[0]
+        self.assertEqual('volume.usage.host', msg.event_type)
+        self.assertEqual(self.compute.host, msg.payload['host'])
+        usages = msg.payload['volume_usages']
+        self.assertEqual(
+            sorted([uuids.volume_id, uuids.other_volume_id]),
+            sorted(usage['volume_id'] for usage in usages))
+        self.assertEqual([10, 10], [usage['read_bytes'] for usage in usages])
+
     def test_poll_volume_usage_disabled(self):
         ctxt = 'MockContext'
         self.mox.StubOutWithMock(self.compute, '_get_host_volume_bdms')
@@ -6316,8 +6380,10 @@ class ComputeTestCase(BaseTestCase):
     def _heal_instance_info_cache(self,
                                   _get_instance_nw_info_raise=False,
                                   _get_instance_nw_info_raise_cache=False):
-        # Update on every call for the test
-        self.flags(heal_instance_info_cache_interval=-1)
+        # Update on every call for the test, and read the instances of the
+        # host again whenever the list of instances to heal is empty
+        self.flags(heal_instance_info_cache_interval=-1,
+                   host_instance_cache_ttl=0)
         ctxt = context.get_admin_context()
 
         instance_map = {}
@@ -17,6 +17,7 @@ import time
 import uuid
 
 from cinderclient import exceptions as cinder_exception
+import eventlet
 from eventlet import event as eventlet_event
 import mock
 from mox3 import mox
@@ -24,6 +25,7 @@ import netaddr
 from oslo_config import cfg
 import oslo_messaging as messaging
 from oslo_serialization import jsonutils
+from oslo_utils import fixture as utils_fixture
 from oslo_utils import importutils
 from oslo_utils import timeutils
 from oslo_utils import uuidutils
@@ -218,6 +220,80 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             else:
                 self.assertFalse(db_node.destroy.called)
 
+    @mock.patch('nova.compute.resource_tracker.update_compute_nodes')
+    @mock.patch('nova.compute.resource_tracker.get_usage_by_node')
+    @mock.patch.object(manager.ComputeManager, '_get_resource_tracker')
+    @mock.patch.object(fake_driver.FakeDriver, 'get_available_nodes')
+    @mock.patch.object(manager.ComputeManager, '_get_compute_nodes_in_db')
+    def test_update_available_resource_batch_nodes(self, get_db_nodes,
+                                                   get_avail_nodes, get_rt,
+                                                   get_usage, update_nodes):
+        self.flags(resource_tracker_batch_nodes=True)
+        ctxt = mock.Mock()
+        get_db_nodes.return_value = []
+        get_avail_nodes.return_value = set(['node1', 'node2'])
+        rts = {}
+
+        def _get_rt_side_effect(nodename):
+            return rts.setdefault(nodename, mock.Mock(nodename=nodename))
+
+        get_rt.side_effect = _get_rt_side_effect
+        get_usage.return_value = (
+            {'node1': mock.sentinel.instances1,
+             'node2': mock.sentinel.instances2},
+            {'node1': mock.sentinel.migrations1,
+             'node2': mock.sentinel.migrations2})
+        # The compute nodes are still saved if one of the nodes failed
+        rts['node2'] = mock.Mock(nodename='node2')
+        rts['node2'].update_available_resource.side_effect = (
+            test.TestingException())
+
+        self.compute.update_available_resource(ctxt)
+
+        get_usage.assert_called_once_with(ctxt, self.compute.host,
+                                          set(['node1', 'node2']))
+        for rt in rts.values():
+            rt.record_claims.assert_called_once_with()
+        rts['node1'].update_available_resource.assert_called_once_with(
+            ctxt, instances=mock.sentinel.instances1,
+            migrations=mock.sentinel.migrations1, defer_update=True)
+        rts['node2'].update_available_resource.assert_called_once_with(
+            ctxt, instances=mock.sentinel.instances2,
+            migrations=mock.sentinel.migrations2, defer_update=True)
+        update_nodes.assert_called_once_with(ctxt, mock.ANY)
+        self.assertEqual(set(rts.values()),
+                         set(update_nodes.call_args[0][1]))
+
+    @mock.patch('nova.compute.resource_tracker.update_compute_nodes')
+    @mock.patch('nova.compute.resource_tracker.get_usage_by_node',
+                side_effect=test.TestingException)
+    @mock.patch.object(manager.ComputeManager, '_get_resource_tracker')
+    @mock.patch.object(fake_driver.FakeDriver, 'get_available_nodes')
+    @mock.patch.object(manager.ComputeManager, '_get_compute_nodes_in_db')
+    def test_update_available_resource_batch_nodes_usage_error(
+            self, get_db_nodes, get_avail_nodes, get_rt, get_usage,
+            update_nodes):
+        self.flags(resource_tracker_batch_nodes=True)
+        ctxt = mock.Mock()
+        orphan = mock.Mock(hypervisor_hostname='node3')
+        get_db_nodes.return_value = [orphan]
+        get_avail_nodes.return_value = set(['node1', 'node2'])
+        rts = {}
+
+        def _get_rt_side_effect(nodename):
+            return rts.setdefault(nodename, mock.Mock(nodename=nodename))
+
+        get_rt.side_effect = _get_rt_side_effect
+
+        self.compute.update_available_resource(ctxt)
+
+        # Each node is audited with its own usage instead
+        for rt in rts.values():
+            rt.update_available_resource.assert_called_once_with(ctxt)
+            self.assertIsNone(rt.recorded_claims)
+        self.assertFalse(update_nodes.called)
+        orphan.destroy.assert_called_once_with()
+
     def test_delete_instance_without_info_cache(self):
         instance = fake_instance.fake_instance_obj(
                 self.context,
@@ -394,6 +470,28 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         self.assertIsInstance(compute._build_semaphore,
                               compute_utils.UnlimitedSemaphore)
 
+    @mock.patch('nova.compute.profiler._report')
+    def test_periodic_task_profiling(self, mock_report):
+        self.flags(periodic_task_profiling=True)
+        compute = manager.ComputeManager()
+        task = dict(compute._periodic_tasks)['_sync_scheduler_instance_info']
+        # The wrapper keeps the attributes set by the periodic_task decorator
+        self.assertTrue(task._periodic_task)
+        self.assertEqual(CONF.scheduler_instance_sync_interval,
+                         task._periodic_spacing)
+        self.assertIsNot(task, dict(manager.ComputeManager._periodic_tasks)[
+            '_sync_scheduler_instance_info'])
+
+        with mock.patch.object(compute, '_get_host_instances',
+                               return_value=[]):
+            task(compute, self.context)
+        mock_report.assert_called_once_with(
+            self.context, compute.notifier, compute.host, mock.ANY)
+        profile = mock_report.call_args[0][3]
+        self.assertEqual('_sync_scheduler_instance_info', profile.name)
+        self.assertEqual(CONF.scheduler_instance_sync_interval,
+                         profile.spacing)
+
     def test_nil_out_inst_obj_host_and_node_sets_nil(self):
         instance = fake_instance.fake_instance_obj(self.context,
                                                    uuid=uuids.instance,
@@ -465,6 +563,97 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         self.mox.VerifyAll()
         self.mox.UnsetStubs()
 
+    def _test_init_host_instances(self, instances,
+                                  init_instance_side_effect=None):
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'init_host'),
+            mock.patch.object(self.compute.driver, 'filter_defer_apply_off'),
+            mock.patch.object(objects.InstanceList, 'get_by_host',
+                              return_value=instances),
+            mock.patch.object(self.compute, 'init_virt_events'),
+            mock.patch.object(self.compute, '_destroy_evacuated_instances'),
+            mock.patch.object(self.compute, '_init_instance',
+                              side_effect=init_instance_side_effect),
+            mock.patch.object(self.compute, '_update_scheduler_instance_info'),
+            mock.patch.object(utils, 'spawn_n')
+        ) as (mock_init_host, mock_apply_off, mock_get_by_host,
+              mock_init_virt_events, mock_destroy_evacuated,
+              mock_init_instance, mock_update_scheduler, mock_spawn):
+            self.flags(defer_iptables_apply=True)
+            self.compute.init_host()
+            return (mock_init_instance, mock_spawn, mock_apply_off,
+                    mock_update_scheduler)
+
+    def test_init_host_concurrent(self):
+        self.flags(init_host_instance_concurrency=2)
+        instances = [objects.Instance(uuid=uuids.instance_1, task_state=None),
+                     objects.Instance(uuid=uuids.instance_2, task_state=None),
+                     objects.Instance(uuid=uuids.instance_3, task_state=None)]
+        mock_init_instance, mock_spawn, mock_apply_off, mock_update = (
+            self._test_init_host_instances(instances))
+
+        mock_init_instance.assert_has_calls(
+            [mock.call(mock.ANY, instance) for instance in instances],
+            any_order=True)
+        self.assertEqual(3, mock_init_instance.call_count)
+        self.assertFalse(mock_spawn.called)
+        mock_apply_off.assert_called_once_with()
+        mock_update.assert_called_once_with(mock.ANY, instances)
+
+    def test_init_host_instances_in_background(self):
+        self.flags(init_host_instances_in_background=True)
+        interrupted = objects.Instance(uuid=uuids.interrupted,
+                                       task_state=task_states.REBOOTING)
+        idle = objects.Instance(uuid=uuids.idle, task_state=None)
+        mock_init_instance, mock_spawn, mock_apply_off, mock_update = (
+            self._test_init_host_instances([interrupted, idle]))
+
+        # Only the interrupted instance is initialized before returning
+        mock_init_instance.assert_called_once_with(mock.ANY, interrupted)
+        mock_spawn.assert_called_once_with(
+            self.compute._init_instances_in_background, mock.ANY, [idle],
+            [interrupted, idle])
+        # The deferred rules are applied before returning
+        mock_apply_off.assert_called_once_with()
+        self.assertFalse(mock_update.called)
+
+    def test_init_host_instance_error(self):
+        self.flags(init_host_instance_concurrency=2)
+        instances = [objects.Instance(uuid=uuids.instance_1, task_state=None),
+                     objects.Instance(uuid=uuids.instance_2, task_state=None),
+                     objects.Instance(uuid=uuids.instance_3, task_state=None)]
+        initialized = []
+
+        def fake_init_instance(context, instance):
+            if instance.uuid == uuids.instance_1:
+                raise test.TestingException()
+            # Let the first instance fail while the others are initialized
+            eventlet.sleep(0)
+            initialized.append(instance)
+
+        self.assertRaises(test.TestingException,
+                          self._test_init_host_instances, instances,
+                          init_instance_side_effect=fake_init_instance)
+        # The host is only finished once all the instances are initialized
+        self.assertEqual(instances[1:], initialized)
+
+    @mock.patch.object(manager.ComputeManager,
+                       '_update_scheduler_instance_info')
+    @mock.patch.object(manager.ComputeManager, '_init_instance',
+                       side_effect=test.TestingException)
+    def test_init_instances_in_background_error(self, mock_init_instance,
+                                                mock_update):
+        self.flags(defer_iptables_apply=True)
+        instance = objects.Instance(uuid=uuids.instance, task_state=None)
+        with mock.patch.object(self.compute.driver,
+                               'filter_defer_apply_off') as mock_apply_off:
+            self.compute._init_instances_in_background(
+                self.context, [instance], mock.sentinel.instances)
+        mock_init_instance.assert_called_once_with(self.context, instance)
+        mock_update.assert_called_once_with(self.context,
+                                            mock.sentinel.instances)
+        self.assertFalse(mock_apply_off.called)
+
     @mock.patch('nova.objects.InstanceList')
     @mock.patch('nova.objects.MigrationList.get_by_filters')
     def test_cleanup_host(self, mock_miglist_get, mock_instance_list):
@@ -1374,14 +1563,122 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
     def test_sync_power_states(self, mock_get):
         instance = mock.Mock()
         mock_get.return_value = [instance]
-        with mock.patch.object(self.compute._sync_power_pool,
-                               'spawn_n') as mock_spawn:
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'get_power_states',
+                              side_effect=NotImplementedError),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n')
+        ) as (mock_power_states, mock_spawn):
             self.compute._sync_power_states(mock.sentinel.context)
             mock_get.assert_called_with(mock.sentinel.context,
                                         self.compute.host, expected_attrs=[],
                                         use_slave=True)
             mock_spawn.assert_called_once_with(mock.ANY, instance)
 
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_bulk(self, mock_get):
+        def _instance(uuid, vm_state, power_state, task_state=None):
+            return objects.Instance(uuid=uuid, vm_state=vm_state,
+                                    power_state=power_state,
+                                    task_state=task_state)
+
+        in_sync = _instance(uuids.in_sync, vm_states.ACTIVE,
+                            power_state.RUNNING)
+        changed = _instance(uuids.changed, vm_states.ACTIVE,
+                            power_state.RUNNING)
+        missing = _instance(uuids.missing, vm_states.STOPPED,
+                            power_state.NOSTATE)
+        vanished = _instance(uuids.vanished, vm_states.ACTIVE,
+                             power_state.RUNNING)
+        not_stopped = _instance(uuids.not_stopped, vm_states.STOPPED,
+                                power_state.RUNNING)
+        busy = _instance(uuids.busy, vm_states.ACTIVE, power_state.RUNNING,
+                         task_state=task_states.REBOOTING)
+        mock_get.return_value = [in_sync, changed, missing, vanished,
+                                 not_stopped, busy]
+        power_states = {uuids.in_sync: power_state.RUNNING,
+                        uuids.changed: power_state.SHUTDOWN,
+                        uuids.not_stopped: power_state.RUNNING,
+                        uuids.busy: power_state.SHUTDOWN}
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'get_power_states',
+                              return_value=power_states),
+            mock.patch.object(self.compute.driver, 'get_num_instances'),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n')
+        ) as (mock_power_states, mock_num_instances, mock_spawn):
+            self.compute._sync_power_states(mock.sentinel.context)
+
+        self.assertFalse(mock_num_instances.called)
+        # Only the instances whose power state needs to be synced are
+        # locked and queried again
+        self.assertEqual([changed, vanished, not_stopped],
+                         [call[0][1] for call in mock_spawn.call_args_list])
+
+    def test_power_state_needs_sync(self):
+        cases = [
+            (vm_states.ACTIVE, power_state.RUNNING, power_state.RUNNING,
+             False),
+            (vm_states.ACTIVE, power_state.RUNNING, power_state.SHUTDOWN,
+             True),
+            (vm_states.ACTIVE, power_state.PAUSED, power_state.PAUSED, True),
+            (vm_states.STOPPED, power_state.SHUTDOWN, power_state.SHUTDOWN,
+             False),
+            (vm_states.STOPPED, power_state.NOSTATE, power_state.NOSTATE,
+             False),
+            (vm_states.STOPPED, power_state.RUNNING, power_state.RUNNING,
+             True),
+            (vm_states.PAUSED, power_state.PAUSED, power_state.PAUSED, False),
+            (vm_states.PAUSED, power_state.CRASHED, power_state.CRASHED,
+             True),
+            (vm_states.SOFT_DELETED, power_state.SHUTDOWN,
+             power_state.SHUTDOWN, False),
+            (vm_states.DELETED, power_state.RUNNING, power_state.RUNNING,
+             True),
+            (vm_states.ERROR, power_state.RUNNING, power_state.RUNNING,
+             False),
+        ]
+        for vm_state, db_power_state, vm_power_state, expected in cases:
+            instance = objects.Instance(vm_state=vm_state,
+                                        power_state=db_power_state,
+                                        task_state=None)
+            self.assertEqual(expected,
+                             self.compute._power_state_needs_sync(
+                                 instance, vm_power_state),
+                             (vm_state, db_power_state, vm_power_state))
+
+    @mock.patch.object(manager, 'LOG')
+    def test_power_state_needs_sync_matches_sync(self, mock_log):
+        # Every (vm_state, power_state) pair is run through the sync, which
+        # must do something whenever _power_state_needs_sync() says so, and
+        # only then
+        all_vm_states = [getattr(vm_states, name) for name in dir(vm_states)
+                         if name.isupper() and
+                         isinstance(getattr(vm_states, name), str)]
+        all_power_states = power_state.STATE_MAP.keys()
+        for vm_state in all_vm_states:
+            for db_power_state in all_power_states:
+                for vm_power_state in all_power_states:
+                    instance = objects.Instance(vm_state=vm_state,
+                                                power_state=db_power_state,
+                                                task_state=None,
+                                                host=self.compute.host,
+                                                shutdown_terminate=False)
+                    mock_log.reset_mock()
+                    with test.nested(
+                        mock.patch.object(instance, 'refresh'),
+                        mock.patch.object(instance, 'save'),
+                        mock.patch.object(self.compute, 'compute_api'),
+                    ) as (mock_refresh, mock_save, mock_api):
+                        expected = self.compute._power_state_needs_sync(
+                            instance, vm_power_state)
+                        self.compute._sync_instance_power_state(
+                            self.context, instance, vm_power_state)
+                        synced = (mock_save.called or
+                                  mock_log.warning.called or
+                                  bool(mock_api.method_calls))
+                    self.assertEqual(expected, synced,
+                                     (vm_state, db_power_state,
+                                      vm_power_state))
+
     def _get_sync_instance(self, power_state, vm_state, task_state=None,
                            shutdown_terminate=False):
         instance = objects.Instance()
@@ -2830,39 +3127,59 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             mock_power_off.assert_called_once_with(
                 self.context, instance, clean_shutdown=True)
 
-    @mock.patch.object(utils, 'last_completed_audit_period',
-            return_value=(0, 0))
+    @mock.patch.object(utils, 'last_completed_audit_period')
     @mock.patch.object(time, 'time', side_effect=[10, 20, 21])
     @mock.patch.object(objects.InstanceList, 'get_by_host', return_value=[])
-    @mock.patch.object(objects.BandwidthUsage, 'get_by_instance_uuid_and_mac')
-    @mock.patch.object(db, 'bw_usage_update')
-    def test_poll_bandwidth_usage(self, bw_usage_update, get_by_uuid_mac,
-            get_by_host, time, last_completed_audit):
+    @mock.patch.object(objects.BandwidthUsageList, 'get_by_uuids_and_periods')
+    @mock.patch.object(db, 'bw_usage_update_multi')
+    def test_poll_bandwidth_usage(self, bw_usage_update_multi,
+            get_by_uuids_and_periods, get_by_host, time,
+            last_completed_audit):
+        prev_time = datetime.datetime(2016, 1, 1)
+        start_time = datetime.datetime(2016, 1, 2)
+        last_completed_audit.return_value = (prev_time, start_time)
         bw_counters = [{'uuid': uuids.instance, 'mac_address': 'fake-mac',
-                        'bw_in': 1, 'bw_out': 2}]
-        usage = objects.BandwidthUsage()
-        usage.bw_in = 3
-        usage.bw_out = 4
-        usage.last_ctr_in = 0
-        usage.last_ctr_out = 0
+                        'bw_in': 1, 'bw_out': 2},
+                       {'uuid': uuids.instance, 'mac_address': 'fake-mac2',
+                        'bw_in': 10, 'bw_out': 20},
+                       {'uuid': uuids.instance2, 'mac_address': 'fake-mac3',
+                        'bw_in': 30, 'bw_out': 40}]
+
+        def _usage(mac, start_period, bw_in, bw_out, last_ctr_in,
+                   last_ctr_out):
+            return objects.BandwidthUsage(
+                instance_uuid=uuids.instance, mac=mac,
+                start_period=start_period, bw_in=bw_in, bw_out=bw_out,
+                last_ctr_in=last_ctr_in, last_ctr_out=last_ctr_out)
+
+        # The counters of the first mac rolled over in the current period,
+        # the second mac only has a usage in the previous period and the
+        # third one is new
+        get_by_uuids_and_periods.return_value = [
+            _usage('fake-mac', start_time, 3, 4, 5, 6),
+            _usage('fake-mac2', prev_time, 100, 100, 4, 5)]
         self.flags(bandwidth_poll_interval=1)
-        get_by_uuid_mac.return_value = usage
-        _time = timeutils.utcnow()
-        bw_usage_update.return_value = {'uuid': uuids.instance, 'mac': '',
-                'start_period': _time, 'last_refreshed': _time, 'bw_in': 0,
-                'bw_out': 0, 'last_ctr_in': 0, 'last_ctr_out': 0, 'deleted': 0,
-                'created_at': _time, 'updated_at': _time, 'deleted_at': _time}
         with mock.patch.object(self.compute.driver,
                 'get_all_bw_counters', return_value=bw_counters):
             self.compute._poll_bandwidth_usage(self.context)
-            get_by_uuid_mac.assert_called_once_with(self.context,
-                    uuids.instance, 'fake-mac',
-                    start_period=0, use_slave=True)
+            get_by_uuids_and_periods.assert_called_once_with(self.context,
+                    mock.ANY, [prev_time, start_time], use_slave=True)
+            self.assertEqual(
+                sorted([uuids.instance, uuids.instance2]),
+                sorted(get_by_uuids_and_periods.call_args[0][1]))
             # NOTE(sdague): bw_usage_update happens at some time in
             # the future, so what last_refreshed is irrelevant.
-            bw_usage_update.assert_called_once_with(self.context,
-                    uuids.instance,
-                    'fake-mac', 0, 4, 6, 1, 2,
+            bw_usage_update_multi.assert_called_once_with(self.context,
+                    utils.strtime(start_time),
+                    [{'uuid': uuids.instance, 'mac': 'fake-mac',
+                      'bw_in': 4, 'bw_out': 6,
+                      'last_ctr_in': 1, 'last_ctr_out': 2},
+                     {'uuid': uuids.instance, 'mac': 'fake-mac2',
+                      'bw_in': 6, 'bw_out': 15,
+                      'last_ctr_in': 10, 'last_ctr_out': 20},
+                     {'uuid': uuids.instance2, 'mac': 'fake-mac3',
+                      'bw_in': 0, 'bw_out': 0,
+                      'last_ctr_in': 30, 'last_ctr_out': 40}],
                     last_refreshed=mock.ANY,
                     update_cells=False)
 
@@ -2934,6 +3251,107 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         mock_sync.assert_called_once_with(fake_elevated, self.compute.host,
                                           exp_uuids)
 
+    def _test_heal_instance_info_cache_batch(self, ports=None,
+                                             ports_exc=None):
+        self.flags(heal_instance_info_cache_interval=60,
+                   heal_instance_info_cache_batch_size=3)
+        instances = [objects.Instance(uuid=getattr(uuids, 'instance_%d' % i),
+                                      vm_state=vm_states.ACTIVE,
+                                      task_state=None)
+                     for i in range(5)]
+        # A building instance is skipped
+        instances[1].vm_state = vm_states.BUILDING
+
+        with test.nested(
+            mock.patch.object(self.compute, '_get_host_instances',
+                              return_value=instances),
+            mock.patch.object(self.compute.network_api,
+                              'get_ports_by_instance',
+                              return_value=ports, side_effect=ports_exc),
+            mock.patch.object(self.compute.network_api,
+                              'get_instance_nw_info')
+        ) as (mock_get_host_instances, mock_get_ports, mock_get_nw_info):
+            self.compute._heal_instance_info_cache(self.context)
+
+        healed = [instances[0], instances[2], instances[3]]
+        mock_get_ports.assert_called_once_with(self.context, healed)
+        self.assertEqual([uuids.instance_4],
+                         self.compute._instance_uuids_to_heal)
+        return healed, mock_get_nw_info
+
+    def test_heal_instance_info_cache_batch(self):
+        ports = {uuids.instance_0: [mock.sentinel.port_0],
+                 uuids.instance_2: [mock.sentinel.port_2]}
+        healed, mock_get_nw_info = self._test_heal_instance_info_cache_batch(
+            ports=ports)
+        mock_get_nw_info.assert_has_calls([
+            mock.call(self.context, healed[0], ports=[mock.sentinel.port_0]),
+            mock.call(self.context, healed[1], ports=[mock.sentinel.port_2]),
+            mock.call(self.context, healed[2], ports=[])], any_order=True)
+        self.assertEqual(3, mock_get_nw_info.call_count)
+
+    def test_heal_instance_info_cache_batch_no_bulk_ports(self):
+        healed, mock_get_nw_info = self._test_heal_instance_info_cache_batch(
+            ports_exc=NotImplementedError)
+        mock_get_nw_info.assert_has_calls(
+            [mock.call(self.context, instance) for instance in healed],
+            any_order=True)
+        self.assertEqual(3, mock_get_nw_info.call_count)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_get_host_instances_shared(self, mock_get_by_host):
+        time_fixture = self.useFixture(utils_fixture.TimeFixture())
+        self.flags(host_instance_cache_ttl=30)
+
+        instances = self.compute._get_host_instances(self.context,
+                                                     expected_attrs=[])
+        self.assertEqual(mock_get_by_host.return_value, instances)
+        self.compute._get_host_instances(self.context)
+        mock_get_by_host.assert_called_once_with(
+            self.context, self.compute.host, expected_attrs=[],
+            use_slave=True)
+
+        # The attributes expected by the tasks are merged
+        mock_get_by_host.reset_mock()
+        self.compute._get_host_instances(self.context,
+                                         expected_attrs=['info_cache'])
+        self.compute._get_host_instances(self.context, expected_attrs=[])
+        mock_get_by_host.assert_called_once_with(
+            self.context, self.compute.host, expected_attrs=['info_cache'],
+            use_slave=True)
+
+        mock_get_by_host.reset_mock()
+        time_fixture.advance_time_seconds(31)
+        self.compute._get_host_instances(self.context, expected_attrs=[])
+        mock_get_by_host.assert_called_once_with(
+            self.context, self.compute.host, expected_attrs=['info_cache'],
+            use_slave=True)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_get_host_instances_disabled(self, mock_get_by_host):
+        self.flags(host_instance_cache_ttl=0)
+        for i in range(2):
+            self.compute._get_host_instances(self.context,
+                                             expected_attrs=[])
+        self.assertEqual(2, mock_get_by_host.call_count)
+
+    @mock.patch.object(objects.InstanceActionEvent, 'event_start')
+    @mock.patch.object(objects.InstanceActionEvent,
+                       'event_finish_with_failure')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_get_host_instances_invalidated(self, mock_get_by_host,
+                                            mock_finish, mock_start):
+        @manager.wrap_instance_event
+        def fake_event(self, context, instance):
+            raise exception.NovaException()
+
+        self.compute._get_host_instances(self.context, expected_attrs=[])
+        self.assertRaises(exception.NovaException, fake_event,
+                          self.compute, self.context,
+                          instance={'uuid': uuids.instance})
+        self.compute._get_host_instances(self.context, expected_attrs=[])
+        self.assertEqual(2, mock_get_by_host.call_count)
+
     @mock.patch.object(nova.scheduler.client.SchedulerClient,
                        'sync_instance_info')
     @mock.patch.object(nova.scheduler.client.SchedulerClient,
@@ -0,0 +1,133 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the compute periodic task profiler.
+"""
+
+import itertools
+
+import mock
+
+from nova.compute import profiler
+from nova import objects
+from nova import test
+
+
+class TaskProfileTestCase(test.NoDBTestCase):
+
+    def test_to_dict(self):
+        profile = profiler.TaskProfile('_poll_things', 60)
+        profile.add_call('InstanceList', 'get_by_host', 0.002)
+        profile.add_objects('InstanceList', 'get_by_host',
+                            objects.InstanceList(objects=[objects.Instance(),
+                                                          objects.Instance()]))
+        profile.add_call('Instance', 'save', 0.001)
+        profile.add_objects('Instance', 'save', objects.Instance())
+        profile.add_call('Instance', 'save', 0.001)
+        profile.add_objects('Instance', 'save', None)
+        profile.elapsed = 0.01
+
+        self.assertEqual(
+            {'task': '_poll_things', 'spacing': 60, 'elapsed_ms': 10.0,
+             'conductor_calls': 3, 'objects': 3,
+             'calls': [{'name': 'InstanceList.get_by_host', 'calls': 1,
+                        'elapsed_ms': 2.0, 'objects': 2},
+                       {'name': 'Instance.save', 'calls': 2,
+                        'elapsed_ms': 2.0, 'objects': 1}]},
+            profile.to_dict())
+
+    @mock.patch('time.time')
+    def test_overrun(self, mock_time):
+        mock_time.side_effect = [10.0, 70.5]
+        profile = profiler.TaskProfile('_poll_things', 60)
+        self.assertFalse(profile.overrun)
+        profile.finish()
+        self.assertTrue(profile.overrun)
+
+
+class CountingIndirectionAPITestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(CountingIndirectionAPITestCase, self).setUp()
+        self.indirection_api = mock.Mock()
+        self.api = profiler.CountingIndirectionAPI(self.indirection_api)
+        self.notifier = mock.Mock()
+
+    def _run_task(self, task):
+        manager = mock.Mock(host='fake-host')
+        profiled_task = profiler.profile_periodic_task(
+            task, task.__name__, 60, self.notifier)
+        profiled_task(manager, mock.sentinel.ctx)
+        self.assertIsNone(profiler.get_current_profile())
+        return self.notifier.info.call_args[0][2]
+
+    def test_calls_counted(self):
+        instances = objects.InstanceList(objects=[objects.Instance()])
+        self.indirection_api.object_class_action_versions.return_value = (
+            instances)
+        self.indirection_api.object_action.return_value = ({}, None)
+        instance = objects.Instance()
+
+        def _task(manager, context):
+            self.assertEqual(instances,
+                             self.api.object_class_action_versions(
+                                 context, 'InstanceList', 'get_by_host',
+                                 {}, (), {}))
+            self.assertEqual(({}, None), self.api.object_action(
+                context, instance, 'save', (), {}))
+
+        payload = self._run_task(_task)
+
+        self.assertEqual('fake-host', payload['host'])
+        self.assertEqual(2, payload['conductor_calls'])
+        self.assertEqual(1, payload['objects'])
+        self.assertEqual(['InstanceList.get_by_host', 'Instance.save'],
+                         [call['name'] for call in payload['calls']])
+        self.indirection_api.object_action.assert_called_once_with(
+            mock.sentinel.ctx, instance, 'save', (), {})
+
+    def test_calls_outside_task_not_counted(self):
+        self.api.object_class_action_versions(
+            mock.sentinel.ctx, 'InstanceList', 'get_by_host', {}, (), {})
+        self.assertEqual(
+            1, self.indirection_api.object_class_action_versions.call_count)
+
+        payload = self._run_task(lambda manager, context: None)
+        self.assertEqual(0, payload['conductor_calls'])
+
+    def test_other_calls_passed_on(self):
+        self.api.object_backport_versions(mock.sentinel.ctx,
+                                          mock.sentinel.obj, {})
+        self.indirection_api.object_backport_versions.assert_called_once_with(
+            mock.sentinel.ctx, mock.sentinel.obj, {})
+
+
+class ProfilePeriodicTaskTestCase(test.NoDBTestCase):
+
+    @mock.patch.object(profiler.LOG, 'warning')
+    @mock.patch('time.time')
+    def test_overrun_warned(self, mock_time, mock_warning):
+        # The log records also get the time
+        mock_time.side_effect = itertools.chain([10.0], itertools.repeat(75.0))
+        notifier = mock.Mock()
+        task = mock.Mock(__name__='_poll_things', side_effect=ValueError)
+        profiled_task = profiler.profile_periodic_task(
+            task, '_poll_things', 60, notifier)
+
+        self.assertRaises(ValueError, profiled_task,
+                          mock.Mock(host='fake-host'), mock.sentinel.ctx)
+
+        self.assertEqual(1, mock_warning.call_count)
+        notifier.info.assert_called_once_with(
+            mock.sentinel.ctx, 'compute.periodic_task.profile', mock.ANY)
+        self.assertEqual(65000.0,
+                         notifier.info.call_args[0][2]['elapsed_ms'])
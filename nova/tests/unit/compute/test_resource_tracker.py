@@ -1298,7 +1298,9 @@ class TrackerPeriodicTestCase(BaseTrackerTestCase):
             resources = {'there is someone in my head': 'but it\'s not me'}
             mock_driver.get_available_resource.return_value = resources
             self.tracker.update_available_resource(self.context)
-            mock_uar.assert_called_once_with(self.context, resources)
+            mock_uar.assert_called_once_with(self.context, resources,
+                                             instances=None, migrations=None,
+                                             defer_update=False)
 
         _test()
 
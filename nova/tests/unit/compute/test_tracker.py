@@ -13,6 +13,7 @@
 import copy
 
 import mock
+from oslo_utils import fixture as utils_fixture
 from oslo_utils import units
 
 from nova.compute import arch
@@ -28,6 +29,7 @@ from nova import objects
 from nova.objects import base as obj_base
 from nova.pci import manager as pci_manager
 from nova import test
+from nova.tests import uuidsentinel as uuids
 
 _VIRT_DRIVER_AVAIL_RESOURCES = {
     'vcpus': 4,
@@ -486,7 +488,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, defer=False)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -531,7 +533,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, defer=False)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -583,7 +585,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 1  # One active instance
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, defer=False)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -655,7 +657,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             # as running VMs...
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, defer=False)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -725,7 +727,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, defer=False)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -792,7 +794,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, defer=False)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -856,7 +858,7 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 0
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, defer=False)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
@@ -931,11 +933,117 @@ class TestUpdateAvailableResources(BaseTestCase):
             'vcpus': 4,
             'running_vms': 2
         })
-        update_mock.assert_called_once_with(mock.sentinel.ctx)
+        update_mock.assert_called_once_with(mock.sentinel.ctx, defer=False)
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
 
+@mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node',
+            return_value=[])
+@mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+class TestIncrementalAudit(BaseTestCase):
+
+    def setUp(self):
+        super(TestIncrementalAudit, self).setUp()
+        self.flags(reserved_host_disk_mb=0,
+                   reserved_host_memory_mb=0,
+                   resource_audit_interval=600)
+        self.time_fixture = self.useFixture(utils_fixture.TimeFixture())
+        # The usage kept between two full audits must not leak to the
+        # compute node fixture
+        patcher = mock.patch(
+            'nova.objects.ComputeNode.get_by_host_and_nodename',
+            return_value=copy.deepcopy(_COMPUTE_NODE_FIXTURES[0]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self._setup_rt()
+
+    def _update_available_resources(self):
+        with mock.patch.object(self.rt, '_update'):
+            self.rt.update_available_resource(mock.sentinel.ctx)
+
+    def test_usage_kept_until_full_audit(self, get_mock, migr_mock):
+        get_mock.return_value = _INSTANCE_FIXTURES
+
+        self._update_available_resources()
+        self.assertEqual(1, get_mock.call_count)
+        self.assertEqual(128, self.rt.compute_node.memory_mb_used)
+
+        # The hypervisor does not report the usage of the instance, but
+        # the tracked one is kept
+        self.time_fixture.advance_time_seconds(599)
+        self._update_available_resources()
+        self.assertEqual(1, get_mock.call_count)
+        self.assertEqual(1, migr_mock.call_count)
+        self.assertEqual(128, self.rt.compute_node.memory_mb_used)
+        self.assertEqual(1, self.rt.compute_node.vcpus_used)
+        self.assertEqual(384, self.rt.compute_node.free_ram_mb)
+        self.assertEqual(1, self.rt.compute_node.running_vms)
+
+        self.time_fixture.advance_time_seconds(2)
+        self._update_available_resources()
+        self.assertEqual(2, get_mock.call_count)
+        self.assertEqual(2, migr_mock.call_count)
+
+    def test_hypervisor_resources_updated(self, get_mock, migr_mock):
+        get_mock.return_value = _INSTANCE_FIXTURES
+        self._update_available_resources()
+
+        self.driver_mock.get_available_resource.return_value.update(
+            memory_mb=1024)
+        self._update_available_resources()
+        self.assertEqual(1024, self.rt.compute_node.memory_mb)
+        self.assertEqual(128, self.rt.compute_node.memory_mb_used)
+        self.assertEqual(896, self.rt.compute_node.free_ram_mb)
+
+    def test_tracked_changes_no_drift(self, get_mock, migr_mock):
+        get_mock.return_value = _INSTANCE_FIXTURES
+        self._update_available_resources()
+
+        # The instance is removed through the resource tracker between
+        # two full audits
+        self.rt._update_usage_from_instance(mock.sentinel.ctx,
+                                            _INSTANCE_FIXTURES[0],
+                                            is_removed=True)
+        self._update_available_resources()
+        self.assertEqual(0, self.rt.compute_node.memory_mb_used)
+
+        get_mock.return_value = []
+        self.time_fixture.advance_time_seconds(601)
+        with mock.patch.object(resource_tracker.LOG, 'warning') as warn_mock:
+            self._update_available_resources()
+        self.assertFalse(warn_mock.called)
+        self.assertEqual(0, self.rt.compute_node.memory_mb_used)
+
+    @mock.patch.object(resource_tracker.LOG, 'warning')
+    def test_full_audit_reports_drift(self, warn_mock, get_mock, migr_mock):
+        get_mock.return_value = _INSTANCE_FIXTURES
+        self._update_available_resources()
+
+        # The instance left the node without the resource tracker knowing
+        get_mock.return_value = []
+        self.time_fixture.advance_time_seconds(601)
+        self._update_available_resources()
+
+        self.assertEqual(0, self.rt.compute_node.memory_mb_used)
+        self.assertEqual(1, warn_mock.call_count)
+        drift = warn_mock.call_args[0][1]['drift']
+        self.assertEqual({'vcpus_used': -1,
+                          'memory_mb_used': -128,
+                          'local_gb_used': -1,
+                          'running_vms': -1,
+                          'stale_instances': [_INSTANCE_FIXTURES[0].uuid]},
+                         drift)
+
+    def test_full_audit_every_run_by_default(self, get_mock, migr_mock):
+        self.flags(resource_audit_interval=0)
+        get_mock.return_value = _INSTANCE_FIXTURES
+
+        self._update_available_resources()
+        self._update_available_resources()
+        self.assertEqual(2, get_mock.call_count)
+
+
 class TestInitComputeNode(BaseTestCase):
 
     @mock.patch('nova.objects.ComputeNode.create')
@@ -1097,8 +1205,8 @@ class TestUpdateComputeNode(BaseTestCase):
         self.assertFalse(service_mock.called)
 
         # The above call to _update() will populate the
-        # RT.old_resources collection with the resources. Here, we check that
-        # if we call _update() again with the same resources, that
+        # RT.old_fingerprints collection with the resources. Here, we check
+        # that if we call _update() again with the same resources, that
         # the scheduler client won't be called again to update those
         # (unchanged) resources for the compute node
         self.sched_client_mock.reset_mock()
@@ -1146,6 +1254,219 @@ class TestUpdateComputeNode(BaseTestCase):
         urs_mock = self.sched_client_mock.update_resource_stats
         urs_mock.assert_called_once_with(self.rt.compute_node)
 
+    def _update_and_get_changes(self):
+        changes = []
+        urs_mock = self.sched_client_mock.update_resource_stats
+        urs_mock.reset_mock()
+        urs_mock.side_effect = lambda compute_node: changes.append(
+            compute_node.obj_what_changed())
+        self.rt._update(mock.sentinel.ctx)
+        return changes[0] if changes else None
+
+    def test_only_changed_resources_saved(self):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.assertIn('memory_mb', self._update_and_get_changes())
+
+        # The resources are set again on every update, but only the ones
+        # whose value changed are saved
+        self.rt.compute_node.memory_mb = 512
+        self.rt.compute_node.memory_mb_used = 128
+        self.rt.compute_node.free_ram_mb = 384
+        self.assertEqual(set(['memory_mb_used', 'free_ram_mb']),
+                         self._update_and_get_changes())
+
+        self.rt.compute_node.memory_mb_used = 128
+        self.assertIsNone(self._update_and_get_changes())
+
+    def test_changed_pci_pools_and_stats_saved(self):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt.compute_node.pci_device_pools = objects.PciDevicePoolList(
+            objects=[objects.PciDevicePool(product_id='p1', vendor_id='v1',
+                                           numa_node=0, tags={}, count=2)])
+        self._update_and_get_changes()
+
+        self.rt.compute_node.pci_device_pools[0].count = 1
+        self.rt.stats['num_instances'] = 1
+        self.assertEqual(set(['pci_device_pools', 'stats']),
+                         self._update_and_get_changes())
+
+    def test_deferred_update(self):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt.pci_tracker = mock.MagicMock()
+        self.rt._update(mock.sentinel.ctx, defer=True)
+
+        self.assertTrue(self.rt.pending_update)
+        self.assertFalse(self.sched_client_mock.update_resource_stats.called)
+        self.assertFalse(self.rt.pci_tracker.save.called)
+
+    @mock.patch('nova.objects.InstancePCIRequests.get_by_instance_uuid',
+                return_value=objects.InstancePCIRequests(requests=[]))
+    def test_claim_after_deferred_update(self, pci_mock):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        saved = set()
+
+        def _save(compute_node):
+            saved.update(compute_node.obj_what_changed())
+            compute_node.obj_reset_changes(recursive=True)
+
+        self.sched_client_mock.update_resource_stats.side_effect = _save
+        self.sched_client_mock.update_resource_stats_multi.side_effect = (
+            lambda context, compute_nodes: [_save(cn) for cn in compute_nodes])
+        self.rt._update(mock.sentinel.ctx)
+        saved.clear()
+
+        # The audit of the node defers saving its changes
+        self.rt.compute_node.hypervisor_version = 42
+        self.rt._update(mock.sentinel.ctx, defer=True)
+        # A claim on the node saves it before the other nodes are audited
+        instance = _INSTANCE_FIXTURES[0].obj_clone()
+        with mock.patch.object(instance, 'save'):
+            self.rt.instance_claim(mock.MagicMock(), instance, None)
+        resource_tracker.update_compute_nodes(mock.sentinel.ctx, [self.rt])
+
+        self.assertIn('hypervisor_version', saved)
+        self.assertIn('memory_mb_used', saved)
+        self.assertFalse(self.rt.pending_update)
+
+    def test_update_compute_nodes(self):
+        trackers = []
+        for nodename in ('node1', 'node2', 'node3'):
+            rt, sched_client_mock, _ = setup_rt('fake-host', nodename)
+            rt.compute_node = objects.ComputeNode(
+                hypervisor_hostname=nodename)
+            rt.pci_tracker = mock.MagicMock()
+            trackers.append(rt)
+        trackers[0].pending_update = True
+        trackers[2].pending_update = True
+        urs_mock = sched_client_mock.update_resource_stats_multi
+        trackers[0].scheduler_client = sched_client_mock
+
+        resource_tracker.update_compute_nodes(mock.sentinel.ctx, trackers)
+
+        urs_mock.assert_called_once_with(mock.sentinel.ctx, mock.ANY)
+        self.assertEqual(['node1', 'node3'],
+                         [cn.hypervisor_hostname
+                          for cn in urs_mock.call_args[0][1]])
+        self.assertFalse(any(rt.pending_update for rt in trackers))
+        trackers[0].pci_tracker.save.assert_called_once_with(
+            mock.sentinel.ctx)
+        self.assertFalse(trackers[1].pci_tracker.save.called)
+
+    def test_update_compute_nodes_none_pending(self):
+        self._setup_rt()
+        resource_tracker.update_compute_nodes(mock.sentinel.ctx, [self.rt])
+        self.assertFalse(
+            self.sched_client_mock.update_resource_stats_multi.called)
+
+
+class TestRecordedClaims(BaseTestCase):
+
+    def setUp(self):
+        super(TestRecordedClaims, self).setUp()
+        self.flags(reserved_host_disk_mb=0, reserved_host_memory_mb=0)
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.ctx = mock.MagicMock()
+        self.instance = _INSTANCE_FIXTURES[0].obj_clone()
+        self.instance.host = None
+        self.instance.node = None
+
+        patcher = mock.patch(
+            'nova.objects.InstancePCIRequests.get_by_instance_uuid',
+            return_value=objects.InstancePCIRequests(requests=[]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _claim_and_audit(self, abort=False):
+        # The usage of the node is read before the instance is claimed
+        self.rt.record_claims()
+        instances = []
+        migrations = []
+
+        with test.nested(
+            mock.patch.object(self.rt, '_update'),
+            mock.patch.object(self.instance, 'save')
+        ):
+            self.rt.instance_claim(self.ctx, self.instance, None)
+            if abort:
+                self.rt.abort_instance_claim(self.ctx, self.instance)
+            self.rt.update_available_resource(
+                self.ctx, instances=instances, migrations=migrations,
+                defer_update=True)
+
+        self.assertIsNone(self.rt.recorded_claims)
+        # The usage read by the caller is left alone
+        self.assertEqual([], instances)
+
+    def test_claim_after_usage_read(self):
+        self._claim_and_audit()
+
+        self.assertEqual([self.instance.uuid],
+                         list(self.rt.tracked_instances))
+        self.assertEqual(self.instance.memory_mb,
+                         self.rt.compute_node.memory_mb_used)
+        self.assertEqual(1, self.rt.compute_node.running_vms)
+
+    def test_aborted_claim_after_usage_read(self):
+        self._claim_and_audit(abort=True)
+
+        self.assertEqual({}, self.rt.tracked_instances)
+        self.assertEqual(0, self.rt.compute_node.memory_mb_used)
+        self.assertEqual(0, self.rt.compute_node.running_vms)
+
+    def test_claims_not_recorded(self):
+        with test.nested(
+            mock.patch.object(self.rt, '_update'),
+            mock.patch.object(self.instance, 'save')
+        ):
+            self.rt.instance_claim(self.ctx, self.instance, None)
+        self.assertIsNone(self.rt.recorded_claims)
+
+
+class TestGetUsageByNode(test.NoDBTestCase):
+
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_host')
+    def test_get_usage_by_node(self, get_mock, migr_mock):
+        instances = [objects.Instance(uuid=uuids.inst1, node='node1'),
+                     objects.Instance(uuid=uuids.inst2, node='node2'),
+                     objects.Instance(uuid=uuids.inst3, node='node1'),
+                     objects.Instance(uuid=uuids.inst4, node='gone')]
+        get_mock.return_value = instances
+        # A migration between two nodes of the host, one from the host and
+        # one to the host
+        migrations = [objects.Migration(source_compute='fake-host',
+                                        source_node='node1',
+                                        dest_compute='fake-host',
+                                        dest_node='node2'),
+                      objects.Migration(source_compute='fake-host',
+                                        source_node='node2',
+                                        dest_compute='other-host',
+                                        dest_node='node1'),
+                      objects.Migration(source_compute='other-host',
+                                        source_node='node2',
+                                        dest_compute='fake-host',
+                                        dest_node='node1')]
+        migr_mock.return_value = migrations
+
+        instances_by_node, migrations_by_node = (
+            resource_tracker.get_usage_by_node(
+                mock.sentinel.ctx, 'fake-host', ['node1', 'node2']))
+
+        get_mock.assert_called_once_with(
+            mock.sentinel.ctx, 'fake-host',
+            expected_attrs=resource_tracker.AUDIT_INSTANCE_ATTRS)
+        migr_mock.assert_called_once_with(mock.sentinel.ctx, 'fake-host')
+        self.assertEqual({'node1': [instances[0], instances[2]],
+                          'node2': [instances[1]]}, instances_by_node)
+        self.assertEqual({'node1': [migrations[0], migrations[2]],
+                          'node2': [migrations[0], migrations[1]]},
+                         migrations_by_node)
+
 
 class TestInstanceClaim(BaseTestCase):
 
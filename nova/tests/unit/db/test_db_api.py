@@ -1088,16 +1088,15 @@ class SqlAlchemyDbApiNoDbTestCase(test.NoDBTestCase):
         mock_create_facade.assert_called_once_with()
         mock_facade.get_engine.assert_called_once_with()
 
-    @mock.patch.object(sqlalchemy_api, '_instance_get_by_uuid')
+    @mock.patch.object(sqlalchemy_api, 'model_query')
     @mock.patch.object(sqlalchemy_api, '_instances_fill_metadata')
     @mock.patch('oslo_db.sqlalchemy.utils.paginate_query')
     def test_instance_get_all_by_filters_paginated_allows_deleted_marker(
-            self, mock_paginate, mock_fill, mock_get):
+            self, mock_paginate, mock_fill, mock_query):
         ctxt = mock.MagicMock()
-        ctxt.elevated.return_value = mock.sentinel.elevated
         sqlalchemy_api.instance_get_all_by_filters_sort(ctxt, {}, marker='foo')
-        mock_get.assert_called_once_with(mock.sentinel.elevated, 'foo')
-        ctxt.elevated.assert_called_once_with(read_deleted='yes')
+        mock_query.assert_called_once_with(ctxt, models.Instance, mock.ANY,
+                                           read_deleted='yes')
 
 
 class SqlAlchemyDbApiTestCase(DbTestCase):
@@ -1394,6 +1393,15 @@ class MigrationTestCase(test.TestCase):
         self.assertEqual(3, len(migrations))
         self._assert_in_progress(migrations)
 
+    def test_in_progress_by_host(self):
+        migrations = db.migration_get_in_progress_by_host(self.ctxt, 'host2')
+        # 2 as dest, 2 as source on different nodes
+        self.assertEqual(4, len(migrations))
+        self._assert_in_progress(migrations)
+        self.assertEqual(set(['a', 'b']),
+                         set(m['source_node'] for m in migrations
+                             if m['source_compute'] == 'host2'))
+
     def test_instance_join(self):
         migrations = db.migration_get_in_progress_by_host_and_node(self.ctxt,
                 'host2', 'b')
@@ -2458,6 +2466,80 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                           'deleted', 'deleted_at', 'info_cache',
                           'pci_devices', 'extra'])
 
+    def _get_pages(self, limit, **kwargs):
+        pages = []
+        marker = None
+        while True:
+            page = db.instance_get_all_by_filters_sort(
+                self.ctxt, {}, limit=limit, marker=marker,
+                columns_to_join=[], **kwargs)
+            if not page:
+                return pages
+            pages.append([inst['uuid'] for inst in page])
+            marker = page[-1]['uuid']
+
+    def test_instance_get_all_by_filters_sort_paginate_same_created_at(self):
+        created_at = timeutils.utcnow()
+        insts = [self.create_instance_with_args(created_at=created_at)
+                 for i in range(5)]
+        insts.append(self.create_instance_with_args(
+            created_at=created_at - datetime.timedelta(seconds=1)))
+
+        pages = self._get_pages(2)
+
+        # The instances with the same created_at are sorted by id
+        self.assertEqual([inst['uuid'] for inst in reversed(insts[:5])] +
+                         [insts[5]['uuid']], sum(pages, []))
+        self.assertEqual([2, 2, 2], [len(page) for page in pages])
+
+    def test_instance_get_all_by_filters_batched(self):
+        insts = [self.create_instance_with_args() for i in range(5)]
+        expected = self._get_pages(2, sort_keys=['id'], sort_dirs=['asc'])
+
+        batches = db.instance_get_all_by_filters_batched(
+            self.ctxt, {}, 2, columns_to_join=[], sort_keys=['id'],
+            sort_dirs=['asc'])
+
+        self.assertEqual(expected,
+                         [[inst['uuid'] for inst in batch]
+                          for batch in batches])
+        self.assertEqual([inst['uuid'] for inst in insts], sum(expected, []))
+
+    @mock.patch.object(sqlalchemy_api, 'instance_get_all_by_filters_sort',
+                       wraps=sqlalchemy_api.instance_get_all_by_filters_sort)
+    def test_instance_get_all_by_filters_batched_stops(self, mock_get):
+        for i in range(3):
+            self.create_instance_with_args()
+
+        batches = list(db.instance_get_all_by_filters_batched(
+            self.ctxt, {}, 2, columns_to_join=[]))
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual(2, mock_get.call_count)
+
+        # A last full batch is followed by an empty one
+        mock_get.reset_mock()
+        batches = list(db.instance_get_all_by_filters_batched(
+            self.ctxt, {}, 3, columns_to_join=[]))
+        self.assertEqual([3], [len(batch) for batch in batches])
+        self.assertEqual(2, mock_get.call_count)
+
+    def test_instance_get_all_by_filters_sort_marker_invalid_sort_key(self):
+        inst = self.create_instance_with_args()
+        self.assertRaises(exception.InvalidSortKey,
+                          db.instance_get_all_by_filters_sort,
+                          self.ctxt, {}, marker=inst['uuid'],
+                          sort_keys=['foo'])
+
+    def test_instance_get_all_by_filters_sort_marker_not_loaded(self):
+        insts = [self.create_instance_with_args() for i in range(2)]
+        with mock.patch.object(sqlalchemy_api,
+                               '_instance_get_by_uuid') as mock_get:
+            result = db.instance_get_all_by_filters_sort(
+                self.ctxt, {}, marker=insts[1]['uuid'])
+        self.assertFalse(mock_get.called)
+        self.assertEqual([insts[0]['uuid']],
+                         [inst['uuid'] for inst in result])
+
     def test_instance_get_all_by_filters_deleted_and_soft_deleted(self):
         inst1 = self.create_instance_with_args()
         inst2 = self.create_instance_with_args(vm_state=vm_states.SOFT_DELETED)
@@ -2628,10 +2710,11 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         db.instance_tag_set(context1, inst2.uuid, [t1, t2, t4])
         db.instance_tag_set(context2, inst3.uuid, [t1, t2, t3, t4])
 
-        result = db.instance_get_all_by_filters(self.ctxt,
-                                                {'tags': [t1, t2],
-                                                 'tags-any': [t3, t4],
-                                                 'project_id': 'p1'})
+        filters = {'tags': [t1, t2], 'tags-any': [t3, t4],
+                   'project_id': 'p1'}
+        result = db.instance_get_all_by_filters(self.ctxt, filters)
+        # The filters can be used again
+        self.assertEqual([t1, t2], filters['tags'])
         self._assertEqualListsOfObjects([inst2], result,
                 ignored_keys=['deleted', 'deleted_at', 'metadata', 'extra',
                               'system_metadata', 'info_cache', 'pci_devices'])
@@ -2665,6 +2748,37 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual(sorted(['metadata', 'system_metadata']),
                          sorted(mock_fill.call_args[1]['manual_joins']))
 
+    def test_instance_get_all_by_filters_tags_and_services(self):
+        inst1 = self.create_instance_with_args(host='h1')
+        inst2 = self.create_instance_with_args(host='h2')
+        inst3 = self.create_instance_with_args(host='h1')
+        db.instance_tag_add(self.ctxt, inst1['uuid'], u'tag1')
+        db.instance_tag_add(self.ctxt, inst3['uuid'], u'tag3')
+        db.instance_destroy(self.ctxt, inst3['uuid'])
+        for host, binary in (('h1', 'nova-compute'), ('h1', 'nova-network'),
+                             ('h3', 'nova-compute')):
+            db.service_create(self.ctxt, {'host': host, 'binary': binary,
+                                          'topic': binary[5:]})
+
+        with mock.patch.object(sqlalchemy_api, '_instances_fill_metadata',
+                wraps=sqlalchemy_api._instances_fill_metadata) as mock_fill:
+            result = db.instance_get_all_by_filters(
+                self.ctxt, {}, columns_to_join=['tags', 'services'])
+        mock_fill.assert_called_once_with(mock.ANY, mock.ANY,
+                                          ['tags', 'services'])
+
+        result = {inst['uuid']: inst for inst in result}
+        self.assertEqual([u'tag1'],
+                         [tag['tag'] for tag in result[inst1['uuid']]['tags']])
+        self.assertEqual([('h1', 'nova-compute')],
+                         [(service['host'], service['binary'])
+                          for service in result[inst1['uuid']]['services']])
+        self.assertEqual([], result[inst2['uuid']]['tags'])
+        self.assertEqual([], result[inst2['uuid']]['services'])
+        # The deleted instances are joined to nothing
+        self.assertEqual([], result[inst3['uuid']]['tags'])
+        self.assertEqual([], result[inst3['uuid']]['services'])
+
     def _get_base_values(self):
         return {
             'name': 'fake_sec_group',
@@ -3512,6 +3626,27 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                             include_disabled=True)
         self._assertEqualListsOfObjects(expected, real)
 
+    def test_service_get_all_by_binary_changed_since(self):
+        self.addCleanup(timeutils.clear_time_override)
+        self._create_service({'host': 'host1', 'binary': 'b1'})
+        changes_since = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        timeutils.set_time_override(changes_since +
+                                    datetime.timedelta(minutes=1))
+        values = [
+            {'host': 'host2', 'binary': 'b1'},
+            {'host': 'host3', 'binary': 'b1', 'disabled': True},
+            {'host': 'host4', 'binary': 'b1'},
+            {'host': 'host5', 'binary': 'b2'}
+        ]
+        services = [self._create_service(vals) for vals in values]
+        db.service_destroy(self.ctxt, services[2]['id'])
+        real = db.service_get_all_by_binary_changed_since(self.ctxt, 'b1',
+                                                          changes_since)
+        self.assertEqual(['host2', 'host3', 'host4'],
+                         sorted(service['host'] for service in real))
+        self.assertEqual(['host4'], [service['host'] for service in real
+                                     if service['deleted']])
+
     def test_service_get_all_by_host(self):
         values = [
             {'host': 'host1', 'topic': 't11', 'binary': 'b11'},
@@ -5986,6 +6121,69 @@ class VolumeUsageDBApiTestCase(test.TestCase):
         for key, value in expected_vol_usage.items():
             self.assertEqual(vol_usage[key], value, key)
 
+    def _get_multi_usage(self, volume_id, rd_req, rd_bytes, wr_req,
+                         wr_bytes):
+        return {'volume_id': volume_id,
+                'rd_req': rd_req, 'rd_bytes': rd_bytes,
+                'wr_req': wr_req, 'wr_bytes': wr_bytes,
+                'instance_id': 'fake-instance-uuid1',
+                'project_id': 'fake-project-uuid1',
+                'user_id': 'fake-user-uuid1',
+                'availability_zone': 'fake-az'}
+
+    def test_vol_usage_update_multi(self):
+        ctxt = context.get_admin_context()
+        now = timeutils.utcnow()
+        self.useFixture(utils_fixture.TimeFixture(now))
+        start_time = now - datetime.timedelta(seconds=10)
+
+        db.vol_usage_update(ctxt, u'1', rd_req=100, rd_bytes=200,
+                            wr_req=300, wr_bytes=400,
+                            instance_id='fake-instance-uuid1',
+                            project_id='fake-project-uuid1',
+                            user_id='fake-user-uuid1',
+                            availability_zone='fake-az')
+        db.vol_usage_update(ctxt, u'2', rd_req=100, rd_bytes=200,
+                            wr_req=300, wr_bytes=400,
+                            instance_id='fake-instance-uuid1',
+                            project_id='fake-project-uuid1',
+                            user_id='fake-user-uuid1',
+                            availability_zone='fake-az')
+
+        # The counters of the second volume went back, its current usage is
+        # moved to the totals
+        vol_usages = db.vol_usage_update_multi(ctxt, [
+            self._get_multi_usage(u'1', 110, 220, 330, 440),
+            self._get_multi_usage(u'2', 10, 20, 30, 40),
+            self._get_multi_usage(u'3', 1, 2, 3, 4)])
+
+        self.assertEqual([u'1', u'2', u'3'],
+                         sorted(usage['volume_id'] for usage in vol_usages))
+        expected_vol_usages = {
+            u'1': {'curr_reads': 110, 'curr_read_bytes': 220,
+                   'curr_writes': 330, 'curr_write_bytes': 440,
+                   'tot_reads': 0, 'tot_read_bytes': 0,
+                   'tot_writes': 0, 'tot_write_bytes': 0},
+            u'2': {'curr_reads': 10, 'curr_read_bytes': 20,
+                   'curr_writes': 30, 'curr_write_bytes': 40,
+                   'tot_reads': 100, 'tot_read_bytes': 200,
+                   'tot_writes': 300, 'tot_write_bytes': 400},
+            u'3': {'curr_reads': 1, 'curr_read_bytes': 2,
+                   'curr_writes': 3, 'curr_write_bytes': 4,
+                   'tot_reads': 0, 'tot_read_bytes': 0,
+                   'tot_writes': 0, 'tot_write_bytes': 0}}
+        for usages in (vol_usages,
+                       db.vol_get_usage_by_time(ctxt, start_time)):
+            for usage in usages:
+                expected = expected_vol_usages[usage['volume_id']]
+                for key, value in expected.items():
+                    self.assertEqual(value, usage[key], key)
+                self.assertEqual(now, usage['curr_last_refreshed'])
+                self.assertEqual('fake-az', usage['availability_zone'])
+
+    def test_vol_usage_update_multi_empty(self):
+        self.assertEqual([], db.vol_usage_update_multi(self.context, []))
+
 
 class TaskLogTestCase(test.TestCase):
 
@@ -7294,6 +7492,185 @@ class QuotaReserveNoDbTestCase(test.NoDBTestCase):
         self._test_calculate_overquota(resource, project_usages, user_usages)
 
 
+class QuotaReserveConditionalTestCase(test.TestCase):
+    """Tests for the quota reservation without locks."""
+
+    def setUp(self):
+        super(QuotaReserveConditionalTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.resources = {name: quota.QUOTAS._resources[name]
+                          for name in ('instances', 'cores', 'fixed_ips')}
+        self.project_quotas = {'instances': 3, 'cores': 10, 'fixed_ips': 2}
+        self.user_quotas = {'instances': 2, 'cores': 10, 'fixed_ips': 2}
+
+    def _reserve(self, deltas, user_id='u1', expire=None):
+        if expire is None:
+            expire = timeutils.utcnow() + datetime.timedelta(days=1)
+        return db.quota_reserve_conditional(
+            self.ctxt, self.resources, self.project_quotas, self.user_quotas,
+            deltas, expire, None, None, project_id='p1', user_id=user_id)
+
+    def _get_usage(self, resource, user_id='u1'):
+        usage = db.quota_usage_get(self.ctxt, 'p1', resource, user_id)
+        return usage['in_use'], usage['reserved']
+
+    def test_reserve_creates_usages(self):
+        with mock.patch.object(sqlalchemy_api, 'quota_reserve',
+                               wraps=sqlalchemy_api.quota_reserve) as reserve:
+            self._reserve({'instances': 1, 'cores': 2})
+            self.assertEqual(1, reserve.call_count)
+            reservations = self._reserve({'instances': 1, 'cores': 2})
+            self.assertEqual(1, reserve.call_count)
+
+        self.assertEqual(2, len(reservations))
+        self.assertEqual((0, 2), self._get_usage('instances'))
+        self.assertEqual((0, 4), self._get_usage('cores'))
+
+    def test_reserve_refreshed_usages(self):
+        self._reserve({'instances': 1})
+        db.quota_usage_update(self.ctxt, 'p1', 'u1', 'instances', in_use=-1)
+        with mock.patch.object(sqlalchemy_api, 'quota_reserve',
+                               wraps=sqlalchemy_api.quota_reserve) as reserve:
+            self._reserve({'instances': 1})
+        self.assertEqual(1, reserve.call_count)
+        self.assertEqual((0, 2), self._get_usage('instances'))
+
+    def test_reserve_over_user_quota(self):
+        self._reserve({'instances': 1, 'cores': 1})
+        self._reserve({'instances': 1, 'cores': 1})
+
+        exc = self.assertRaises(exception.OverQuota, self._reserve,
+                                {'instances': 1, 'cores': 1})
+
+        self.assertEqual(['instances'], exc.kwargs['overs'])
+        self.assertEqual({'in_use': 0, 'reserved': 2},
+                         exc.kwargs['usages']['instances'])
+        # The cores reserved by the request are released
+        self.assertEqual((0, 2), self._get_usage('cores'))
+        with sqlalchemy_api.main_context_manager.reader.using(self.ctxt):
+            self.assertEqual(4, sqlalchemy_api.model_query(
+                self.ctxt, models.Reservation, read_deleted="no").count())
+
+    def test_reserve_over_project_quota(self):
+        self._reserve({'instances': 2}, user_id='u1')
+        self._reserve({'instances': 1}, user_id='u2')
+
+        exc = self.assertRaises(exception.OverQuota, self._reserve,
+                                {'instances': 1}, user_id='u2')
+
+        self.assertEqual(['instances'], exc.kwargs['overs'])
+        self.assertEqual((0, 1), self._get_usage('instances', 'u2'))
+
+    def test_reserve_null_delta_over_quota(self):
+        # The usage went over the quota lowered since it was reserved
+        db.reservation_commit_conditional(
+            self.ctxt, self._reserve({'instances': 2}))
+        self.user_quotas['instances'] = 1
+
+        # Like quota_reserve()
+        self.assertRaises(exception.OverQuota, sqlalchemy_api.quota_reserve,
+                          self.ctxt, self.resources, self.project_quotas,
+                          self.user_quotas, {'instances': 0},
+                          timeutils.utcnow(), None, None, project_id='p1',
+                          user_id='u1')
+        exc = self.assertRaises(exception.OverQuota, self._reserve,
+                                {'instances': 0, 'cores': 1})
+        self.assertEqual(['instances'], exc.kwargs['overs'])
+        self.assertEqual((0, 0), self._get_usage('cores'))
+
+    def test_reserve_null_delta_over_project_quota(self):
+        db.reservation_commit_conditional(
+            self.ctxt, self._reserve({'instances': 2}, user_id='u1'))
+        db.reservation_commit_conditional(
+            self.ctxt, self._reserve({'instances': 1}, user_id='u2'))
+        self.project_quotas['instances'] = 2
+
+        exc = self.assertRaises(exception.OverQuota, self._reserve,
+                                {'instances': 0}, user_id='u2')
+        self.assertEqual(['instances'], exc.kwargs['overs'])
+
+    def test_reserve_released_on_error(self):
+        self._reserve({'instances': 1})
+        with mock.patch.object(sqlalchemy_api,
+                               '_quota_usages_get_project_totals',
+                               side_effect=db_exc.DBError):
+            self.assertRaises(db_exc.DBError, self._reserve,
+                              {'instances': 1})
+        self.assertEqual((0, 1), self._get_usage('instances'))
+
+    def test_reserve_over_per_project_quota(self):
+        self._reserve({'fixed_ips': 1}, user_id='u1')
+        self._reserve({'fixed_ips': 1}, user_id='u2')
+
+        self.assertRaises(exception.OverQuota, self._reserve,
+                          {'fixed_ips': 1}, user_id='u1')
+        self.assertEqual((0, 2), self._get_usage('fixed_ips', None))
+
+    def test_commit(self):
+        reservations = self._reserve({'instances': 1, 'cores': 2})
+
+        db.reservation_commit_conditional(self.ctxt, reservations)
+        # The reservations are only applied once
+        db.reservation_commit_conditional(self.ctxt, reservations)
+
+        self.assertEqual((1, 0), self._get_usage('instances'))
+        self.assertEqual((2, 0), self._get_usage('cores'))
+        for reservation in reservations:
+            self.assertRaises(exception.ReservationNotFound,
+                              _reservation_get, self.ctxt, reservation)
+
+    def test_commit_negative_delta(self):
+        db.reservation_commit_conditional(
+            self.ctxt, self._reserve({'instances': 2}))
+
+        reservations = self._reserve({'instances': -1})
+        self.assertEqual((2, 0), self._get_usage('instances'))
+        db.reservation_commit_conditional(self.ctxt, reservations)
+        self.assertEqual((1, 0), self._get_usage('instances'))
+
+    def test_rollback(self):
+        reservations = self._reserve({'instances': 1, 'cores': 2})
+
+        db.reservation_rollback_conditional(self.ctxt, reservations)
+        db.reservation_commit_conditional(self.ctxt, reservations)
+
+        self.assertEqual((0, 0), self._get_usage('instances'))
+        self.assertEqual((0, 0), self._get_usage('cores'))
+
+    def test_expire(self):
+        expired = self._reserve({'instances': 1, 'cores': 2},
+                                expire=timeutils.utcnow() -
+                                datetime.timedelta(seconds=1))
+        self._reserve({'instances': 1})
+
+        db.reservation_expire_conditional(self.ctxt)
+
+        self.assertEqual((0, 1), self._get_usage('instances'))
+        self.assertEqual((0, 0), self._get_usage('cores'))
+        for reservation in expired:
+            self.assertRaises(exception.ReservationNotFound,
+                              _reservation_get, self.ctxt, reservation)
+
+    def test_expire_committed_concurrently(self):
+        reservations = self._reserve({'instances': 1},
+                                     expire=timeutils.utcnow() -
+                                     datetime.timedelta(seconds=1))
+        apply_conditional = sqlalchemy_api._reservations_apply_conditional
+
+        def _apply(context, expired, commit):
+            # The reservations are committed once found expired
+            apply_conditional(context, reservations, commit=True)
+            apply_conditional(context, expired, commit)
+
+        with mock.patch.object(sqlalchemy_api,
+                               '_reservations_apply_conditional',
+                               side_effect=_apply):
+            db.reservation_expire_conditional(self.ctxt)
+
+        # The reservation is only applied by the commit
+        self.assertEqual((1, 0), self._get_usage('instances'))
+
+
 class QuotaClassTestCase(test.TestCase, ModelsObjectComparatorMixin):
 
     def setUp(self):
@@ -7377,6 +7754,15 @@ class S3ImageTestCase(test.TestCase):
             self.assertTrue(uuidutils.is_uuid_like(ref.uuid))
             self.assertEqual(uuid, ref.uuid)
 
+    def test_s3_image_get_by_uuids(self):
+        refs = db.s3_image_get_by_uuids(
+            self.ctxt, self.values[:2] + [uuidutils.generate_uuid()])
+        self.assertEqual(sorted(self.values[:2]),
+                         sorted([ref.uuid for ref in refs]))
+
+    def test_s3_image_get_by_uuids_empty(self):
+        self.assertEqual([], db.s3_image_get_by_uuids(self.ctxt, []))
+
     def test_s3_image_get(self):
         self.assertEqual(sorted(self.values),
                          sorted([db.s3_image_get(self.ctxt, ref.id).uuid
@@ -7463,6 +7849,32 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         new_stats = jsonutils.loads(node['stats'])
         self.assertEqual(self.stats, new_stats)
 
+    def test_compute_node_get_all_changed_since(self):
+        self.addCleanup(timeutils.clear_time_override)
+        changes_since = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        timeutils.set_time_override(changes_since +
+                                    datetime.timedelta(minutes=1))
+        nodes = []
+        for name in ['node2', 'node3']:
+            compute_node_data = self.compute_node_dict.copy()
+            compute_node_data['hypervisor_hostname'] = name
+            nodes.append(db.compute_node_create(self.ctxt,
+                                                compute_node_data))
+        db.compute_node_delete(self.ctxt, nodes[1]['id'])
+
+        result = db.compute_node_get_all_changed_since(self.ctxt,
+                                                       changes_since)
+        self.assertEqual(['node2', 'node3'],
+                         sorted(n['hypervisor_hostname'] for n in result))
+        self.assertEqual(['node3'], [n['hypervisor_hostname'] for n in result
+                                     if n['deleted']])
+
+        db.compute_node_update(self.ctxt, self.item['id'], {'vcpus_used': 1})
+        result = db.compute_node_get_all_changed_since(self.ctxt,
+                                                       changes_since)
+        self.assertEqual(['abracadabra104', 'node2', 'node3'],
+                         sorted(n['hypervisor_hostname'] for n in result))
+
     def test_compute_node_select_schema(self):
         # We here test that compute nodes that have inventory and allocation
         # entries under the new resource-providers schema return non-None
@@ -8453,6 +8865,75 @@ class BwUsageTestCase(test.TestCase, ModelsObjectComparatorMixin):
 
         self._test_bw_usage_update(**expected_bw_usage)
 
+    def test_bw_usage_get_by_uuids_and_periods(self):
+        now = timeutils.utcnow()
+        prev_period = now - datetime.timedelta(seconds=20)
+        start_period = now - datetime.timedelta(seconds=10)
+        old_period = now - datetime.timedelta(seconds=30)
+
+        for uuid, period in (('fake_uuid1', prev_period),
+                             ('fake_uuid1', start_period),
+                             ('fake_uuid2', start_period),
+                             ('fake_uuid1', old_period),
+                             ('fake_uuid3', start_period)):
+            db.bw_usage_update(self.ctxt, uuid, 'fake_mac', period,
+                               100, 200, 12345, 67890)
+
+        bw_usages = db.bw_usage_get_by_uuids_and_periods(self.ctxt,
+                ['fake_uuid1', 'fake_uuid2'],
+                [prev_period, start_period.isoformat()])
+        self.assertEqual(
+            [('fake_uuid1', prev_period), ('fake_uuid1', start_period),
+             ('fake_uuid2', start_period)],
+            sorted((usage['uuid'], usage['start_period'])
+                   for usage in bw_usages))
+
+    def test_bw_usage_update_multi(self):
+        now = timeutils.utcnow()
+        start_period = now - datetime.timedelta(seconds=10)
+        other_period = now - datetime.timedelta(seconds=20)
+
+        db.bw_usage_update(self.ctxt, 'fake_uuid1', 'fake_mac1',
+                           start_period, 1, 2, 3, 4)
+        db.bw_usage_update(self.ctxt, 'fake_uuid1', 'fake_mac1',
+                           other_period, 1, 2, 3, 4)
+        usages = [{'uuid': 'fake_uuid1', 'mac': 'fake_mac1',
+                   'bw_in': 100, 'bw_out': 200,
+                   'last_ctr_in': 12345, 'last_ctr_out': 67890},
+                  {'uuid': 'fake_uuid1', 'mac': 'fake_mac2',
+                   'bw_in': 300, 'bw_out': 400,
+                   'last_ctr_in': 22345, 'last_ctr_out': 77890},
+                  {'uuid': 'fake_uuid2', 'mac': 'fake_mac3',
+                   'bw_in': 500, 'bw_out': 600,
+                   'last_ctr_in': 32345, 'last_ctr_out': 87890}]
+
+        db.bw_usage_update_multi(self.ctxt, start_period.isoformat(),
+                                 usages, update_cells=False)
+
+        for usage in usages:
+            expected_bw_usage = dict(usage, start_period=start_period,
+                                     last_refreshed=now)
+            bw_usage = db.bw_usage_get(self.ctxt, usage['uuid'],
+                                       start_period, usage['mac'])
+            self._assertEqualObjects(expected_bw_usage, bw_usage,
+                                     ignored_keys=self._ignored_keys)
+        # The usage of the other period is left alone
+        bw_usage = db.bw_usage_get(self.ctxt, 'fake_uuid1', other_period,
+                                   'fake_mac1')
+        self.assertEqual(1, bw_usage['bw_in'])
+
+    @mock.patch('nova.cells.rpcapi.CellsAPI.bw_usage_update_at_top')
+    def test_bw_usage_update_multi_update_cells(self, mock_update_at_top):
+        start_period = timeutils.utcnow()
+        usage = {'uuid': 'fake_uuid1', 'mac': 'fake_mac1',
+                 'bw_in': 100, 'bw_out': 200,
+                 'last_ctr_in': 12345, 'last_ctr_out': 67890}
+
+        db.bw_usage_update_multi(self.ctxt, start_period, [usage])
+
+        mock_update_at_top.assert_called_once_with(self.ctxt, 'fake_uuid1',
+            'fake_mac1', start_period, 100, 200, 12345, 67890, None)
+
 
 class Ec2TestCase(test.TestCase):
 
@@ -8521,6 +9002,15 @@ class Ec2TestCase(test.TestCase):
         inst2 = db.ec2_instance_get_by_uuid(self.ctxt, 'fake-uuid')
         self.assertEqual(inst['id'], inst2['id'])
 
+    def test_ec2_instance_get_by_uuids(self):
+        inst1 = db.ec2_instance_create(self.ctxt, 'fake-uuid1')
+        inst2 = db.ec2_instance_create(self.ctxt, 'fake-uuid2')
+        db.ec2_instance_create(self.ctxt, 'fake-uuid3')
+        insts = db.ec2_instance_get_by_uuids(
+            self.ctxt, ['fake-uuid1', 'fake-uuid2', 'uuid-not-present'])
+        self.assertEqual(sorted([inst1['id'], inst2['id']]),
+                         sorted([inst['id'] for inst in insts]))
+
     def test_ec2_instance_get_by_id(self):
         inst = db.ec2_instance_create(self.ctxt, 'fake-uuid')
         inst2 = db.ec2_instance_get_by_id(self.ctxt, inst['id'])
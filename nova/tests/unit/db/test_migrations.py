@@ -885,6 +885,14 @@ class NovaMigrationsCheckers(test_migrations.ModelsMigrationsSync,
                                 'instances_deleted_created_at_idx',
                                 ['deleted', 'created_at'])
 
+    def _check_320(self, engine, data):
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_project_id_deleted_created_at_idx',
+                                ['project_id', 'deleted', 'created_at'])
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_updated_at_idx',
+                                ['updated_at'])
+
 
 class TestNovaMigrationsSQLite(NovaMigrationsCheckers,
                                test_base.DbTestCase,
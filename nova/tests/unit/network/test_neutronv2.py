@@ -3064,6 +3064,97 @@ class TestNeutronv2WithMock(test.TestCase):
                                             update_cells=False)
         self.assertEqual(fake_result, result)
 
+    @mock.patch.object(neutronapi, 'MAX_DEVICE_IDS_PER_PORT_LISTING', 2)
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_get_ports_by_instance(self, mock_get_client):
+        instances = [objects.Instance(uuid=uuids.instance_1,
+                                      project_id='fake-project'),
+                     objects.Instance(uuid=uuids.instance_2,
+                                      project_id='fake-project'),
+                     objects.Instance(uuid=uuids.instance_3,
+                                      project_id='fake-project')]
+        port1 = {'id': 'port1', 'device_id': uuids.instance_1,
+                 'tenant_id': 'fake-project'}
+        port2 = {'id': 'port2', 'device_id': uuids.instance_1,
+                 'tenant_id': 'other-project'}
+        port3 = {'id': 'port3', 'device_id': uuids.instance_3,
+                 'tenant_id': 'fake-project'}
+        mock_client = mock_get_client.return_value
+        mock_client.list_ports.side_effect = [{'ports': [port1, port2]},
+                                              {'ports': [port3]}]
+
+        ports = self.api.get_ports_by_instance(self.context, instances)
+
+        self.assertEqual({uuids.instance_1: [port1],
+                          uuids.instance_2: [],
+                          uuids.instance_3: [port3]}, ports)
+        mock_get_client.assert_called_once_with(self.context, admin=True)
+        self.assertEqual(2, mock_client.list_ports.call_count)
+        device_ids = [call[1]['device_id']
+                      for call in mock_client.list_ports.call_args_list]
+        self.assertEqual(sorted([uuids.instance_1, uuids.instance_2,
+                                 uuids.instance_3]),
+                         sorted(device_ids[0] + device_ids[1]))
+
+    @mock.patch.object(neutronapi.API, '_nw_info_get_subnets',
+                       return_value=[])
+    @mock.patch.object(neutronapi.API, '_nw_info_get_ips', return_value=[])
+    @mock.patch.object(neutronapi.API, '_nw_info_build_network',
+                       return_value=(None, None))
+    @mock.patch.object(neutronapi.API, '_get_preexisting_port_ids',
+                       return_value=[])
+    @mock.patch.object(neutronapi.API, '_gather_port_ids_and_networks',
+                       return_value=([], ['port1']))
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_build_network_info_model_with_ports(self, mock_get_client,
+                                                 *args):
+        info_cache = objects.InstanceInfoCache(
+            network_info=model.NetworkInfo([model.VIF(id='port1')]))
+        instance = objects.Instance(uuid=uuids.instance,
+                                    project_id='fake-project',
+                                    info_cache=info_cache)
+        port = {'id': 'port1', 'admin_state_up': True, 'status': 'ACTIVE',
+                'mac_address': 'de:ad:be:ef:00:01'}
+
+        nw_info = self.api._build_network_info_model(self.context, instance,
+                                                     ports=[port])
+
+        self.assertEqual(['port1'], [vif['id'] for vif in nw_info])
+        self.assertFalse(mock_get_client.return_value.list_ports.called)
+
+    @mock.patch.object(neutronapi.API, '_nw_info_get_subnets',
+                       return_value=[])
+    @mock.patch.object(neutronapi.API, '_nw_info_get_ips', return_value=[])
+    @mock.patch.object(neutronapi.API, '_nw_info_build_network',
+                       return_value=(None, None))
+    @mock.patch.object(neutronapi.API, '_get_preexisting_port_ids',
+                       return_value=[])
+    @mock.patch.object(neutronapi.API, '_gather_port_ids_and_networks',
+                       return_value=([], ['port1', 'port2']))
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_build_network_info_model_with_stale_ports(self, mock_get_client,
+                                                       *args):
+        # port2 was attached since the ports were listed
+        info_cache = objects.InstanceInfoCache(
+            network_info=model.NetworkInfo([model.VIF(id='port1'),
+                                            model.VIF(id='port2')]))
+        instance = objects.Instance(uuid=uuids.instance,
+                                    project_id='fake-project',
+                                    info_cache=info_cache)
+        port1 = {'id': 'port1', 'admin_state_up': True, 'status': 'ACTIVE',
+                 'mac_address': 'de:ad:be:ef:00:01'}
+        port2 = {'id': 'port2', 'admin_state_up': True, 'status': 'ACTIVE',
+                 'mac_address': 'de:ad:be:ef:00:02'}
+        mock_client = mock_get_client.return_value
+        mock_client.list_ports.return_value = {'ports': [port1, port2]}
+
+        nw_info = self.api._build_network_info_model(self.context, instance,
+                                                     ports=[port1])
+
+        self.assertEqual(['port1', 'port2'], [vif['id'] for vif in nw_info])
+        mock_client.list_ports.assert_called_once_with(
+            tenant_id='fake-project', device_id=uuids.instance)
+
     def _test_validate_networks_fixed_ip_no_dup(self, nets, requested_networks,
                                                 ids, list_port_values):
 
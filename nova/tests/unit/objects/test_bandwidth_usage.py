@@ -91,6 +91,36 @@ class _TestBandwidthUsage(test.TestCase):
         self.assertEqual(1, len(bw_usages))
         self._compare(self, self.expected_bw_usage, bw_usages[0])
 
+    @mock.patch.object(db, 'bw_usage_get_by_uuids_and_periods')
+    def test_get_by_uuids_and_periods(self, mock_get):
+        mock_get.return_value = [self.expected_bw_usage]
+        start_period = self.expected_bw_usage['start_period']
+
+        bw_usages = bandwidth_usage.BandwidthUsageList.\
+            get_by_uuids_and_periods(self.context, ['fake_uuid'],
+                                     [start_period])
+        self.assertEqual(1, len(bw_usages))
+        self._compare(self, self.expected_bw_usage, bw_usages[0])
+        mock_get.assert_called_once_with(self.context, uuids=['fake_uuid'],
+                                         start_periods=mock.ANY)
+
+    def test_update_multi_with_db(self):
+        start_period = self.expected_bw_usage['start_period']
+        usages = [{'uuid': 'fake_uuid1', 'mac': 'fake_mac1',
+                   'bw_in': 100, 'bw_out': 200,
+                   'last_ctr_in': 12345, 'last_ctr_out': 67890}]
+
+        bandwidth_usage.BandwidthUsageList.update_multi(
+            self.context, start_period, usages,
+            last_refreshed=self.expected_bw_usage['last_refreshed'])
+
+        bw_usages = bandwidth_usage.BandwidthUsageList.\
+            get_by_uuids_and_periods(self.context, ['fake_uuid1'],
+                                     [start_period])
+        self.assertEqual(1, len(bw_usages))
+        self._compare(self, self.expected_bw_usage, bw_usages[0],
+                      ignored_fields=['created_at'])
+
     @mock.patch.object(db, 'bw_usage_update')
     def test_create(self, mock_create):
         mock_create.return_value = self.expected_bw_usage
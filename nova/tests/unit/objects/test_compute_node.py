@@ -381,6 +381,20 @@ class _TestComputeNodeObject(object):
                          subs=self.subs(),
                          comparators=self.comparators())
 
+    @mock.patch('nova.db.compute_node_get_all_changed_since')
+    def test_get_all_changed_since(self, cn_get_all_changed_since):
+        cn_get_all_changed_since.return_value = [fake_compute_node]
+        computes = compute_node.ComputeNodeList.get_all_changed_since(
+            self.context, NOW)
+        self.assertEqual(1, len(computes))
+        self.compare_obj(computes[0], fake_compute_node,
+                         subs=self.subs(),
+                         comparators=self.comparators())
+        cn_get_all_changed_since.assert_called_once_with(self.context,
+                                                         mock.ANY)
+        changes_since = cn_get_all_changed_since.call_args[0][1]
+        self.assertEqual(NOW, changes_since.replace(tzinfo=None))
+
     def test_get_by_hypervisor(self):
         self.mox.StubOutWithMock(db, 'compute_node_search_by_hypervisor')
         db.compute_node_search_by_hypervisor(self.context, 'hyper').AndReturn(
@@ -413,6 +427,14 @@ class _TestComputeNodeObject(object):
                          subs=self.subs(),
                          comparators=self.comparators())
 
+    @mock.patch.object(compute_node.ComputeNode, 'save')
+    def test_save_all(self, mock_save):
+        computes = compute_node.ComputeNodeList(objects=[
+            compute_node.ComputeNode(id=1), compute_node.ComputeNode(id=2)])
+        saved = compute_node.ComputeNodeList.save_all(self.context, computes)
+        self.assertEqual(2, mock_save.call_count)
+        self.assertEqual([1, 2], [compute.id for compute in saved])
+
     def test_compat_numa_topology(self):
         compute = compute_node.ComputeNode()
         versions = ovo_base.obj_tree_get_versions('ComputeNode')
@@ -18,6 +18,7 @@ from nova import db
 from nova import objects
 from nova.objects import ec2 as ec2_obj
 from nova.tests.unit.objects import test_objects
+from nova.tests import uuidsentinel as uuids
 
 
 fake_map = {
@@ -268,6 +269,42 @@ class _TestEC2Ids(object):
         self.assertEqual('fake-ec2-kernel-id', result.kernel_id)
         self.assertIsNone(result.ramdisk_id)
 
+    def test_get_by_instances(self):
+        imap = objects.EC2InstanceMapping(self.context, uuid=uuids.instance1)
+        imap.create()
+        s3imap = objects.S3ImageMapping(self.context, uuid=uuids.image)
+        s3imap.create()
+        instances = [
+            objects.Instance(uuid=uuids.instance1, image_ref=uuids.image,
+                             kernel_id=uuids.kernel, ramdisk_id=None),
+            objects.Instance(uuid=uuids.instance2, image_ref='',
+                             kernel_id=None, ramdisk_id=None)]
+
+        result = ec2_obj.EC2Ids._get_by_instances(self.context, instances)
+
+        self.assertEqual(sorted([uuids.instance1, uuids.instance2]),
+                         sorted(result))
+        ec2_ids = result[uuids.instance1]
+        self.assertEqual('i-%08x' % imap.id, ec2_ids.instance_id)
+        self.assertEqual('ami-%08x' % s3imap.id, ec2_ids.ami_id)
+        kernel_s3imap = objects.S3ImageMapping.get_by_uuid(self.context,
+                                                           uuids.kernel)
+        self.assertEqual('aki-%08x' % kernel_s3imap.id, ec2_ids.kernel_id)
+        self.assertIsNone(ec2_ids.ramdisk_id)
+        # The missing mappings are created
+        ec2_ids = result[uuids.instance2]
+        imap2 = objects.EC2InstanceMapping.get_by_uuid(self.context,
+                                                       uuids.instance2)
+        self.assertEqual('i-%08x' % imap2.id, ec2_ids.instance_id)
+        self.assertIsNone(ec2_ids.ami_id)
+        self.assertIsNone(ec2_ids.kernel_id)
+        # They match the ones looked up one instance at a time
+        for instance in instances:
+            self.assertEqual(
+                ec2_obj.EC2Ids._get_ec2_ids(self.context, instance),
+                {field: getattr(result[instance.uuid], field)
+                 for field in ec2_obj.EC2Ids.fields})
+
 
 class TestEC2Ids(test_objects._LocalTest, _TestEC2Ids):
     pass
@@ -1413,6 +1413,44 @@ class _TestInstanceListObject(object):
             self.assertIsInstance(inst_list.objects[i], instance.Instance)
             self.assertEqual(fakes[i]['uuid'], inst_list.objects[i].uuid)
 
+    @mock.patch.object(db, 'instance_fault_get_by_instance_uuids',
+                       return_value={})
+    @mock.patch.object(db, 'instance_get_all_by_filters_sort')
+    def test_iter_by_filters(self, mock_get, mock_faults):
+        fakes = [self.fake_instance(i) for i in range(3)]
+        mock_get.side_effect = [fakes[:2], fakes[2:]]
+
+        batches = list(objects.InstanceList.iter_by_filters(
+            self.context, {'foo': 'bar'}, 2, expected_attrs=['fault'],
+            sort_keys=['uuid'], sort_dirs=['asc']))
+
+        self.assertEqual([[fake['uuid'] for fake in fakes[:2]],
+                          [fakes[2]['uuid']]],
+                         [[inst.uuid for inst in batch] for batch in batches])
+        self.assertIsInstance(batches[0], objects.InstanceList)
+        # The faults are loaded for each batch
+        self.assertEqual(2, mock_faults.call_count)
+        mock_get.assert_has_calls([
+            mock.call(self.context, {'foo': 'bar'}, limit=2, marker=None,
+                      columns_to_join=[], sort_keys=['uuid'],
+                      sort_dirs=['asc']),
+            mock.call(self.context, {'foo': 'bar'}, limit=2,
+                      marker=fakes[1]['uuid'], columns_to_join=[],
+                      sort_keys=['uuid'], sort_dirs=['asc'])])
+
+    @mock.patch.object(db, 'instance_get_all_by_filters')
+    def test_iter_by_filters_full_last_batch(self, mock_get):
+        fakes = [self.fake_instance(i) for i in range(2)]
+        mock_get.side_effect = [fakes, []]
+
+        batches = list(objects.InstanceList.iter_by_filters(
+            self.context, {}, 2))
+
+        self.assertEqual(1, len(batches))
+        self.assertEqual(2, mock_get.call_count)
+        self.assertEqual(fakes[1]['uuid'],
+                         mock_get.call_args[1]['marker'])
+
     @mock.patch.object(db, 'instance_get_all_by_filters_sort')
     @mock.patch.object(db, 'instance_get_all_by_filters')
     def test_get_all_by_filters_calls_non_sort(self,
@@ -1584,6 +1622,35 @@ class _TestInstanceListObject(object):
                          dict(instances[0].fault))
         self.assertIsNone(instances[1].fault)
 
+    @mock.patch('nova.objects.EC2Ids._get_by_instances')
+    @mock.patch.object(db, 'instance_get_all_by_host')
+    def test_with_ec2_ids(self, mock_get, mock_ec2):
+        fake_insts = [
+            fake_instance.fake_db_instance(uuid=uuids.ec2_instance1,
+                                           host='host'),
+            fake_instance.fake_db_instance(uuid=uuids.ec2_instance2,
+                                           host='host'),
+            ]
+        mock_get.return_value = fake_insts
+        fake_ec2_ids = {
+            uuids.ec2_instance1: objects.EC2Ids(instance_id='i-00000001'),
+            uuids.ec2_instance2: objects.EC2Ids(instance_id='i-00000002')}
+        mock_ec2.return_value = fake_ec2_ids
+
+        instances = objects.InstanceList.get_by_host(
+            self.context, 'host', expected_attrs=['ec2_ids'])
+
+        mock_get.assert_called_once_with(self.context, 'host',
+                                         columns_to_join=[])
+        # The ec2 ids of all the instances are looked up at once
+        mock_ec2.assert_called_once_with(self.context, mock.ANY)
+        self.assertEqual([uuids.ec2_instance1, uuids.ec2_instance2],
+                         [inst.uuid for inst in mock_ec2.call_args[0][1]])
+        self.assertEqual(['i-00000001', 'i-00000002'],
+                         [inst.ec2_ids.instance_id for inst in instances])
+        for inst in instances:
+            self.assertNotIn('ec2_ids', inst.obj_what_changed())
+
     def test_fill_faults(self):
         self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
 
@@ -1621,6 +1688,75 @@ class _TestInstanceListObject(object):
         for inst in inst_list:
             self.assertEqual(set(), inst.obj_what_changed())
 
+    def _get_list_by_host(self, count=3):
+        fakes = [self.fake_instance(i, updates={'uuid': getattr(
+                     uuids, 'list_inst_%d' % i)}) for i in range(count)]
+        with mock.patch.object(db, 'instance_get_all_by_host',
+                               return_value=fakes):
+            return objects.InstanceList.get_by_host(self.context, 'foo')
+
+    @mock.patch.object(db, 'instance_fault_get_by_instance_uuids')
+    def test_lazy_load_fault_on_list(self, mock_get_faults):
+        inst_list = self._get_list_by_host()
+        fault = dict(test_instance_fault.fake_faults['fake-uuid'][0],
+                     instance_uuid=inst_list[1].uuid)
+        mock_get_faults.return_value = {inst_list[1].uuid: [fault]}
+        instance.reset_lazy_load_counts()
+
+        self.assertIsNone(inst_list[0].fault)
+        self.assertEqual(fault['message'], inst_list[1].fault.message)
+        self.assertIsNone(inst_list[2].fault)
+
+        mock_get_faults.assert_called_once_with(
+            self.context, [inst.uuid for inst in inst_list])
+        for inst in inst_list:
+            self.assertEqual(set(), inst.obj_what_changed())
+        self.assertEqual({'fault': {'list': 1, 'list_instances': 3}},
+                         instance.get_lazy_load_counts())
+
+    @mock.patch.object(db, 'instance_get_all_by_filters')
+    def test_lazy_load_numa_topology_on_list(self, mock_get):
+        inst_list = self._get_list_by_host()
+        # The first instance has already loaded it
+        inst_list[0].numa_topology = None
+        inst_list[0].obj_reset_changes()
+        db_topology = test_instance_numa_topology.fake_db_topology
+        mock_get.return_value = [
+            self.fake_instance(i, updates={
+                'uuid': inst_list[i].uuid,
+                'extra': {'numa_topology': db_topology['numa_topology']}})
+            for i in (1, 2)]
+        instance.reset_lazy_load_counts()
+
+        self.assertEqual(2, len(inst_list[1].numa_topology.cells))
+        self.assertEqual(2, len(inst_list[2].numa_topology.cells))
+
+        mock_get.assert_called_once_with(
+            self.context, {'uuid': [inst_list[1].uuid, inst_list[2].uuid]},
+            'created_at', 'desc', limit=None, marker=None,
+            columns_to_join=['extra', 'extra.numa_topology'])
+        for inst in inst_list:
+            self.assertEqual(set(), inst.obj_what_changed())
+        self.assertEqual(
+            {'numa_topology': {'list': 1, 'list_instances': 2}},
+            instance.get_lazy_load_counts())
+
+    @mock.patch.object(objects.InstanceFault, 'get_latest_for_instance')
+    @mock.patch.object(db, 'instance_fault_get_by_instance_uuids')
+    def test_lazy_load_on_instance_removed_from_list(self, mock_get_faults,
+                                                     mock_get_latest):
+        inst_list = self._get_list_by_host()
+        inst = inst_list.objects.pop(0)
+        mock_get_latest.return_value = None
+        instance.reset_lazy_load_counts()
+
+        self.assertIsNone(inst.fault)
+
+        self.assertFalse(mock_get_faults.called)
+        mock_get_latest.assert_called_once_with(self.context, inst.uuid)
+        self.assertEqual({'fault': {'single': 1}},
+                         instance.get_lazy_load_counts())
+
     @mock.patch('nova.objects.instance.Instance.obj_make_compatible')
     def test_get_by_security_group(self, mock_compat):
         fake_secgroup = dict(test_security_group.fake_secgroup)
@@ -205,6 +205,19 @@ class _TestMigrationObject(object):
         for index, db_migration in enumerate(db_migrations):
             self.compare_obj(migrations[index], db_migration)
 
+    @mock.patch.object(db, 'migration_get_in_progress_by_host')
+    def test_get_in_progress_by_host(self, mock_get):
+        ctxt = context.get_admin_context()
+        fake_migration = fake_db_migration()
+        db_migrations = [fake_migration, dict(fake_migration, id=456)]
+        mock_get.return_value = db_migrations
+        migrations = migration.MigrationList.get_in_progress_by_host(
+            ctxt, 'host')
+        mock_get.assert_called_once_with(ctxt, 'host')
+        self.assertEqual(2, len(migrations))
+        for index, db_migration in enumerate(db_migrations):
+            self.compare_obj(migrations[index], db_migration)
+
     def test_get_by_filters(self):
         ctxt = context.get_admin_context()
         fake_migration = fake_db_migration()
@@ -1102,13 +1102,13 @@ object_data = {
     'Aggregate': '1.2-fe9d8c93feb37919753e9e44fe6818a7',
     'AggregateList': '1.2-fb6e19f3c3a3186b04eceb98b5dadbfa',
     'BandwidthUsage': '1.2-c6e4c779c7f40f2407e3d70022e3cd1c',
-    'BandwidthUsageList': '1.2-5fe7475ada6fe62413cbfcc06ec70746',
+    'BandwidthUsageList': '1.3-0997133956214ef331750995bd7ec221',
     'BlockDeviceMapping': '1.16-f0c172e902bc62f1cac05b17d7be7688',
     'BlockDeviceMappingList': '1.17-1e568eecb91d06d4112db9fd656de235',
     'BuildRequest': '1.0-e4ca475cabb07f73d8176f661afe8c55',
     'CellMapping': '1.0-7f1a7e85a22bbb7559fc730ab658b9bd',
     'ComputeNode': '1.16-2436e5b836fa0306a3c4e6d9e5ddacec',
-    'ComputeNodeList': '1.14-3b6f4f5ade621c40e70cb116db237844',
+    'ComputeNodeList': '1.16-5b086dda5956b15fba6537d029babbd5',
     'DNSDomain': '1.0-7b0b2dab778454b6a7b6c66afe163a1a',
     'DNSDomainList': '1.0-4ee0d9efdfd681fed822da88376e04d2',
     'EC2Ids': '1.0-474ee1094c7ec16f8ce657595d8c49d9',
@@ -1153,7 +1153,7 @@ object_data = {
     'KeyPairList': '1.2-58b94f96e776bedaf1e192ddb2a24c4e',
     'Migration': '1.4-17979b9f2ae7f28d97043a220b2a8350',
     'MigrationContext': '1.0-d8c2f10069e410f639c49082b5932c92',
-    'MigrationList': '1.3-55595bfc1a299a5962614d0821a3567e',
+    'MigrationList': '1.4-44ed1197aae9c7c0a3d985184a57c71a',
     'MonitorMetric': '1.1-53b1db7c4ae2c531db79761e7acc52ba',
     'MonitorMetricList': '1.1-15ecf022a68ddbb8c2a6739cfc9f8f5e',
     'NotificationPublisher': '1.0-bbbc1402fb0e443a3eb227cc52b61545',
@@ -1181,7 +1181,7 @@ object_data = {
     'SecurityGroupRule': '1.1-ae1da17b79970012e8536f88cb3c6b29',
     'SecurityGroupRuleList': '1.2-0005c47fcd0fb78dd6d7fd32a1409f5b',
     'Service': '1.19-8914320cbeb4ec29f252d72ce55d07e1',
-    'ServiceList': '1.18-6c52cb616621c1af2415dcc11faf5c1a',
+    'ServiceList': '1.19-df0cb4bea5078ea9122d43bb1a896fd0',
     'ServiceStatusNotification': '1.0-a73147b93b520ff0061865849d3dfa56',
     'ServiceStatusPayload': '1.0-a5e7b4fd6cc5581be45b31ff1f3a3f7f',
     'TaskLog': '1.0-78b0534366f29aa3eebb01860fbe18fe',
@@ -1194,6 +1194,7 @@ object_data = {
     'VirtualInterface': '1.0-19921e38cba320f355d56ecbf8f29587',
     'VirtualInterfaceList': '1.0-9750e2074437b3077e46359102779fc6',
     'VolumeUsage': '1.0-6c8190c46ce1469bb3286a1f21c2e475',
+    'VolumeUsageList': '1.0-44d65e76ce690848b68143973267fa68',
     'XenapiLiveMigrateData': '1.0-5f982bec68f066e194cd9ce53a24ac4c',
 }
 
@@ -222,6 +222,18 @@ class _TestServiceObject(object):
                                          'fake-binary',
                                          include_disabled=True)
 
+    @mock.patch('nova.db.service_get_all_by_binary_changed_since')
+    def test_get_by_binary_changed_since(self, mock_get):
+        mock_get.return_value = [_fake_service(deleted=True)]
+        services = service.ServiceList.get_by_binary_changed_since(
+            self.context, 'fake-binary', NOW)
+        self.assertEqual(1, len(services))
+        self.assertTrue(services[0].deleted)
+        mock_get.assert_called_once_with(self.context, 'fake-binary',
+                                         mock.ANY)
+        changes_since = mock_get.call_args[0][2]
+        self.assertEqual(NOW, changes_since.replace(tzinfo=None))
+
     def test_get_by_host(self):
         self.mox.StubOutWithMock(db, 'service_get_all_by_host')
         db.service_get_all_by_host(self.context, 'fake-host').AndReturn(
@@ -81,9 +81,46 @@ class _TestVolumeUsage(object):
         self.compare_obj(vol_usage, fake_vol_usage)
 
 
+class _TestVolumeUsageList(object):
+    @mock.patch('nova.db.vol_usage_update_multi',
+                return_value=[fake_vol_usage])
+    def test_update_multi(self, mock_upd):
+        vol_usage = objects.VolumeUsage(self.context)
+        vol_usage.volume_id = 'fake-vol-id'
+        vol_usage.instance_uuid = 'fake-inst-uuid'
+        vol_usage.project_id = 'fake-project-id'
+        vol_usage.user_id = 'fake-user-id'
+        vol_usage.availability_zone = None
+        vol_usage.curr_reads = 10
+        vol_usage.curr_read_bytes = 20
+        vol_usage.curr_writes = 30
+        vol_usage.curr_write_bytes = 40
+        vol_usages = objects.VolumeUsageList.update_multi(self.context,
+                                                          [vol_usage])
+        mock_upd.assert_called_once_with(
+            self.context, [{'volume_id': 'fake-vol-id',
+                            'rd_req': 10, 'rd_bytes': 20,
+                            'wr_req': 30, 'wr_bytes': 40,
+                            'instance_id': 'fake-inst-uuid',
+                            'project_id': 'fake-project-id',
+                            'user_id': 'fake-user-id',
+                            'availability_zone': None}])
+        self.assertEqual(1, len(vol_usages))
+        self.compare_obj(vol_usages[0], fake_vol_usage)
+
+
 class TestVolumeUsage(test_objects._LocalTest, _TestVolumeUsage):
     pass
 
 
 class TestRemoteVolumeUsage(test_objects._RemoteTest, _TestVolumeUsage):
     pass
+
+
+class TestVolumeUsageList(test_objects._LocalTest, _TestVolumeUsageList):
+    pass
+
+
+class TestRemoteVolumeUsageList(test_objects._RemoteTest,
+                                _TestVolumeUsageList):
+    pass
@@ -14,6 +14,7 @@ import mock
 
 from nova import objects
 from nova.scheduler.filters import aggregate_image_properties_isolation as aipi
+from nova.scheduler import host_manager
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -133,3 +134,48 @@ class TestAggImagePropsIsolationFilter(test.NoDBTestCase):
                 os_type='linux')))
         host = fakes.FakeHostState('host1', 'compute', {})
         self.assertFalse(self.filt_cls.host_passes(host, spec_obj))
+
+
+class TestAggImagePropsIsolationFilterIndexed(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestAggImagePropsIsolationFilterIndexed, self).setUp()
+        self.filt_cls = aipi.AggregateImagePropertiesIsolation()
+        aggs = {'host1': [objects.Aggregate(
+                    id=1, metadata={'hw_vm_mode': 'hvm, xen'})],
+                'host2': [objects.Aggregate(
+                    id=2, metadata={'hw_vm_mode': 'exe', 'os_type': 'linux'})],
+                'host3': [objects.Aggregate(id=3, metadata={'foo': 'bar'})],
+                'host4': []}
+        index = host_manager.AggregateMetadataIndex()
+        self.hosts = []
+        for host in sorted(aggs):
+            index.update_host(host, aggs[host])
+            self.hosts.append(fakes.FakeHostState(
+                host, 'node', {'aggregates': aggs[host],
+                               'aggregate_index': index}))
+
+    def _test_filter_all(self, props, expected):
+        spec_obj = objects.RequestSpec(
+            context=mock.sentinel.ctx,
+            image=objects.ImageMeta(properties=objects.ImageMetaProps(
+                **props)))
+        with mock.patch.object(self.filt_cls, 'host_passes') as mock_passes:
+            hosts = list(self.filt_cls.filter_all(self.hosts, spec_obj))
+            self.assertFalse(mock_passes.called)
+        self.assertEqual(expected, [host.host for host in hosts])
+        # Same result as when filtering the hosts one by one
+        self.assertEqual(expected,
+                         [host.host for host in self.hosts
+                          if self.filt_cls.host_passes(host, spec_obj)])
+
+    def test_filter_all_matching_prop(self):
+        self._test_filter_all({'hw_vm_mode': 'xen'},
+                              ['host1', 'host3', 'host4'])
+
+    def test_filter_all_multi_props(self):
+        self._test_filter_all({'hw_vm_mode': 'exe', 'os_type': 'windows'},
+                              ['host3', 'host4'])
+
+    def test_filter_all_no_props(self):
+        self._test_filter_all({}, ['host1', 'host2', 'host3', 'host4'])
@@ -14,6 +14,7 @@ import mock
 
 from nova import objects
 from nova.scheduler.filters import aggregate_instance_extra_specs as agg_specs
+from nova.scheduler import host_manager
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -95,3 +96,51 @@ class TestAggregateInstanceExtraSpecsFilter(test.NoDBTestCase):
             'trust:trusted_host': 'true'
         }
         self._do_test_aggregate_filter_extra_specs(especs, passes=False)
+
+
+class TestAggregateInstanceExtraSpecsFilterIndexed(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestAggregateInstanceExtraSpecsFilterIndexed, self).setUp()
+        self.filt_cls = agg_specs.AggregateInstanceExtraSpecsFilter()
+        aggs = {'host1': [objects.Aggregate(id=1, metadata={'opt1': '1'}),
+                          objects.Aggregate(id=2, metadata={'opt2': '2'})],
+                'host2': [objects.Aggregate(
+                    id=3, metadata={'opt1': '1', 'opt2': '4, 8'})],
+                'host3': [objects.Aggregate(id=4, metadata={'opt1': '2'})],
+                'host4': []}
+        index = host_manager.AggregateMetadataIndex()
+        self.hosts = []
+        for host in sorted(aggs):
+            index.update_host(host, aggs[host])
+            self.hosts.append(fakes.FakeHostState(
+                host, 'node', {'aggregates': aggs[host],
+                               'aggregate_index': index}))
+
+    def _test_filter_all(self, especs, expected):
+        spec_obj = objects.RequestSpec(
+            context=mock.sentinel.ctx,
+            flavor=objects.Flavor(memory_mb=1024, extra_specs=especs))
+        with mock.patch.object(self.filt_cls, 'host_passes') as mock_passes:
+            hosts = list(self.filt_cls.filter_all(self.hosts, spec_obj))
+            self.assertFalse(mock_passes.called)
+        self.assertEqual(expected, [host.host for host in hosts])
+        # Same result as when filtering the hosts one by one
+        self.assertEqual(expected,
+                         [host.host for host in self.hosts
+                          if self.filt_cls.host_passes(host, spec_obj)])
+
+    def test_filter_all_simple(self):
+        self._test_filter_all({'opt1': '1'}, ['host1', 'host2'])
+
+    def test_filter_all_scoped_and_ops(self):
+        self._test_filter_all({'aggregate_instance_extra_specs:opt1': '1',
+                               'opt2': '>= 4',
+                               'capabilities:opt3': '3'}, ['host2'])
+
+    def test_filter_all_missing_key(self):
+        self._test_filter_all({'opt3': '1'}, [])
+
+    def test_filter_all_other_scope_only(self):
+        self._test_filter_all({'capabilities:opt3': '3'},
+                              ['host1', 'host2', 'host3', 'host4'])
@@ -14,6 +14,7 @@ import mock
 
 from nova import objects
 from nova.scheduler.filters import aggregate_multitenancy_isolation as ami
+from nova.scheduler import host_manager
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -63,3 +64,41 @@ class TestAggregateMultitenancyIsolationFilter(test.NoDBTestCase):
             context=mock.sentinel.ctx, project_id='my_tenantid')
         host = fakes.FakeHostState('host1', 'compute', {})
         self.assertTrue(self.filt_cls.host_passes(host, spec_obj))
+
+
+class TestAggregateMultitenancyIsolationFilterIndexed(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestAggregateMultitenancyIsolationFilterIndexed, self).setUp()
+        self.filt_cls = ami.AggregateMultiTenancyIsolation()
+        aggs = {'host1': [objects.Aggregate(
+                    id=1, metadata={'filter_tenant_id': 'my_tenantid, t2'})],
+                'host2': [objects.Aggregate(
+                    id=2, metadata={'filter_tenant_id': 'other_tenantid'})],
+                'host3': [objects.Aggregate(id=3, metadata={'foo': 'bar'})],
+                'host4': []}
+        index = host_manager.AggregateMetadataIndex()
+        self.hosts = []
+        for host in sorted(aggs):
+            index.update_host(host, aggs[host])
+            self.hosts.append(fakes.FakeHostState(
+                host, 'node', {'aggregates': aggs[host],
+                               'aggregate_index': index}))
+
+    def _test_filter_all(self, project_id, expected):
+        spec_obj = objects.RequestSpec(
+            context=mock.sentinel.ctx, project_id=project_id)
+        with mock.patch.object(self.filt_cls, 'host_passes') as mock_passes:
+            hosts = list(self.filt_cls.filter_all(self.hosts, spec_obj))
+            self.assertFalse(mock_passes.called)
+        self.assertEqual(expected, [host.host for host in hosts])
+        # Same result as when filtering the hosts one by one
+        self.assertEqual(expected,
+                         [host.host for host in self.hosts
+                          if self.filt_cls.host_passes(host, spec_obj)])
+
+    def test_filter_all_isolated_tenant(self):
+        self._test_filter_all('t2', ['host1', 'host3', 'host4'])
+
+    def test_filter_all_other_tenant(self):
+        self._test_filter_all('another_tenantid', ['host3', 'host4'])
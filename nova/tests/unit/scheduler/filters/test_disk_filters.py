@@ -11,8 +11,10 @@
 #    under the License.
 
 import mock
+import testtools
 
 from nova import objects
+from nova.scheduler import filters
 from nova.scheduler.filters import disk_filter
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -65,6 +67,24 @@ class TestDiskFilter(test.NoDBTestCase):
                  'disk_allocation_ratio': 10.0})
         self.assertFalse(filt_cls.host_passes(host, spec_obj))
 
+    @testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+    def test_disk_filter_batch(self):
+        filt_cls = disk_filter.DiskFilter()
+        spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(
+                root_gb=100, ephemeral_gb=18, swap=1024))
+        hosts = [fakes.FakeHostState('host1', 'node1',
+                    {'free_disk_mb': 11 * 1024, 'total_usable_disk_gb': 12,
+                     'disk_allocation_ratio': 10.0}),
+                 fakes.FakeHostState('host2', 'node2',
+                    {'free_disk_mb': 11 * 1024, 'total_usable_disk_gb': 12,
+                     'disk_allocation_ratio': 1.0})]
+        columns = filters.HostStateColumns(hosts)
+        passes = filt_cls.batch_host_passes(columns, spec_obj)
+        self.assertEqual([True, False], passes.tolist())
+        self.assertEqual([{'disk_gb': 12 * 10.0}, {}],
+                         [host.limits for host in hosts])
+
     @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
     def test_aggregate_disk_filter_value_error(self, agg_mock):
         filt_cls = disk_filter.AggregateDiskFilter()
@@ -12,8 +12,10 @@
 
 
 import mock
+import testtools
 
 from nova import objects
+from nova.scheduler import filters
 from nova.scheduler.filters import io_ops_filter
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -37,6 +39,18 @@ class TestNumInstancesFilter(test.NoDBTestCase):
         spec_obj = objects.RequestSpec()
         self.assertFalse(self.filt_cls.host_passes(host, spec_obj))
 
+    @testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+    def test_filter_num_iops_batch(self):
+        self.flags(max_io_ops_per_host=8)
+        self.filt_cls = io_ops_filter.IoOpsFilter()
+        hosts = [fakes.FakeHostState('host1', 'node1', {'num_io_ops': 7}),
+                 fakes.FakeHostState('host2', 'node2', {'num_io_ops': 8})]
+        columns = filters.HostStateColumns(hosts)
+        spec_obj = objects.RequestSpec()
+        self.assertEqual([True, False],
+                         self.filt_cls.batch_host_passes(
+                             columns, spec_obj).tolist())
+
     @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
     def test_aggregate_filter_num_iops_value(self, agg_mock):
         self.flags(max_io_ops_per_host=7)
@@ -11,8 +11,10 @@
 #    under the License.
 
 import mock
+import testtools
 
 from nova import objects
+from nova.scheduler import filters
 from nova.scheduler.filters import num_instances_filter
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -36,6 +38,18 @@ class TestNumInstancesFilter(test.NoDBTestCase):
         spec_obj = objects.RequestSpec()
         self.assertFalse(self.filt_cls.host_passes(host, spec_obj))
 
+    @testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+    def test_filter_num_instances_batch(self):
+        self.flags(max_instances_per_host=5)
+        self.filt_cls = num_instances_filter.NumInstancesFilter()
+        hosts = [fakes.FakeHostState('host1', 'node1', {'num_instances': 4}),
+                 fakes.FakeHostState('host2', 'node2', {'num_instances': 5})]
+        columns = filters.HostStateColumns(hosts)
+        spec_obj = objects.RequestSpec()
+        self.assertEqual([True, False],
+                         self.filt_cls.batch_host_passes(
+                             columns, spec_obj).tolist())
+
     @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
     def test_filter_aggregate_num_instances_value(self, agg_mock):
         self.flags(max_instances_per_host=4)
@@ -11,8 +11,10 @@
 #    under the License.
 
 import mock
+import testtools
 
 from nova import objects
+from nova.scheduler import filters
 from nova.scheduler.filters import ram_filter
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -57,6 +59,29 @@ class TestRamFilter(test.NoDBTestCase):
                  'ram_allocation_ratio': 2.0})
         self.assertFalse(self.filt_cls.host_passes(host, spec_obj))
 
+    @testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+    def test_ram_filter_batch(self):
+        spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(memory_mb=1024))
+        hosts = [fakes.FakeHostState('host1', 'node1',
+                    {'free_ram_mb': 1023, 'total_usable_ram_mb': 1024,
+                     'ram_allocation_ratio': 1.0}),
+                 fakes.FakeHostState('host2', 'node2',
+                    {'free_ram_mb': 1024, 'total_usable_ram_mb': 1024,
+                     'ram_allocation_ratio': 1.0}),
+                 fakes.FakeHostState('host3', 'node3',
+                    {'free_ram_mb': -1024, 'total_usable_ram_mb': 2048,
+                     'ram_allocation_ratio': 2.0}),
+                 fakes.FakeHostState('host4', 'node4',
+                    {'free_ram_mb': 512, 'total_usable_ram_mb': 512,
+                     'ram_allocation_ratio': 2.0})]
+        columns = filters.HostStateColumns(hosts)
+        passes = self.filt_cls.batch_host_passes(columns, spec_obj)
+        self.assertEqual([False, True, True, False], passes.tolist())
+        self.assertEqual([{}, {'memory_mb': 1024.0},
+                          {'memory_mb': 2048 * 2.0}, {}],
+                         [host.limits for host in hosts])
+
 
 @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
 class TestAggregateRamFilter(test.NoDBTestCase):
@@ -102,3 +127,20 @@ class TestAggregateRamFilter(test.NoDBTestCase):
         # use the minimum ratio from aggregates
         self.assertTrue(self.filt_cls.host_passes(host, spec_obj))
         self.assertEqual(1024 * 1.5, host.limits['memory_mb'])
+
+    @testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+    def test_aggregate_ram_filter_batch(self, agg_mock):
+        spec_obj = objects.RequestSpec(
+            context=mock.sentinel.ctx,
+            flavor=objects.Flavor(memory_mb=1024))
+        hosts = [fakes.FakeHostState('host1', 'node1',
+                    {'free_ram_mb': 1023, 'total_usable_ram_mb': 1024,
+                     'ram_allocation_ratio': 1.0}),
+                 fakes.FakeHostState('host2', 'node2',
+                    {'free_ram_mb': 1023, 'total_usable_ram_mb': 1024,
+                     'ram_allocation_ratio': 1.0})]
+        agg_mock.side_effect = [set(), set(['2.0'])]
+        columns = filters.HostStateColumns(hosts)
+        passes = self.filt_cls.batch_host_passes(columns, spec_obj)
+        self.assertEqual([False, True], passes.tolist())
+        self.assertEqual({'memory_mb': 1024 * 2.0}, hosts[1].limits)
@@ -10,6 +10,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+import eventlet.event
 import mock
 from oslo_config import cfg
 from oslo_serialization import jsonutils
@@ -17,6 +19,7 @@ from oslo_utils import fixture as utils_fixture
 from oslo_utils import timeutils
 import requests
 
+from nova import cache_utils
 from nova import objects
 from nova.scheduler.filters import trusted_filter
 from nova import test
@@ -96,14 +99,7 @@ class TestTrustedFilter(test.NoDBTestCase):
 
     def setUp(self):
         super(TestTrustedFilter, self).setUp()
-        # TrustedFilter's constructor creates the attestation cache, which
-        # calls to get a list of all the compute nodes.
-        fake_compute_nodes = [
-            objects.ComputeNode(hypervisor_hostname='node1'),
-        ]
-        with mock.patch('nova.objects.ComputeNodeList.get_all') as mocked:
-            mocked.return_value = fake_compute_nodes
-            self.filt_cls = trusted_filter.TrustedFilter()
+        self.filt_cls = trusted_filter.TrustedFilter()
 
     def test_trusted_filter_default_passes(self, req_mock):
         spec_obj = objects.RequestSpec(
@@ -223,32 +219,37 @@ class TestTrustedFilter(test.NoDBTestCase):
         self.assertFalse(req_mock.called)
 
     def test_trusted_filter_combine_hosts(self, req_mock):
-        fake_compute_nodes = [
-            objects.ComputeNode(hypervisor_hostname='node1'),
-            objects.ComputeNode(hypervisor_hostname='node2')
-        ]
-        with mock.patch('nova.objects.ComputeNodeList.get_all') as mocked:
-            mocked.return_value = fake_compute_nodes
-            self.filt_cls = trusted_filter.TrustedFilter()
         oat_data = {"hosts": [{"host_name": "node1",
+                                    "trust_lvl": "trusted",
+                                    "vtime": utils.isotime()},
+                              {"host_name": "node2",
                                     "trust_lvl": "untrusted",
-                                    "vtime": "2012-09-09T05:10:40-04:00"}]}
+                                    "vtime": utils.isotime()}]}
         req_mock.return_value = requests.codes.OK, oat_data
         extra_specs = {'trust:trusted_host': 'trusted'}
         spec_obj = objects.RequestSpec(
             context=mock.sentinel.ctx,
             flavor=objects.Flavor(memory_mb=1024,
                                   extra_specs=extra_specs))
-        host = fakes.FakeHostState('host1', 'node1', {})
+        hosts = [fakes.FakeHostState('host1', 'node1', {}),
+                 fakes.FakeHostState('host2', 'node2', {})]
 
-        self.filt_cls.host_passes(host, spec_obj)  # Fill the caches
-        self.assertTrue(req_mock.called)
+        self.assertEqual([hosts[0]], self.filt_cls.filter_all(hosts,
+                                                              spec_obj))
         self.assertEqual(1, req_mock.call_count)
         call_args = list(req_mock.call_args[0])
 
         expected_call_args = ['POST', 'PollHosts', ['node2', 'node1']]
         self.assertJsonEqual(call_args, expected_call_args)
 
+    def test_trusted_filter_filter_all_default_passes(self, req_mock):
+        spec_obj = objects.RequestSpec(
+            context=mock.sentinel.ctx,
+            flavor=objects.Flavor(memory_mb=1024))
+        hosts = [fakes.FakeHostState('host1', 'node1', {})]
+        self.assertEqual(hosts, self.filt_cls.filter_all(hosts, spec_obj))
+        self.assertFalse(req_mock.called)
+
     def test_trusted_filter_trusted_and_locale_formated_vtime_passes(self,
             req_mock):
         oat_data = {"hosts": [{"host_name": "host1",
@@ -275,3 +276,142 @@ class TestTrustedFilter(test.NoDBTestCase):
         self.assertTrue(self.filt_cls.host_passes(host, spec_obj))
         self.assertFalse(self.filt_cls.host_passes(bad_host,
                                                    spec_obj))
+
+
+class FakeAttestationServer(object):
+    """Replies to the PollHosts requests of the AttestationService with the
+    trust levels of its hosts, optionally blocking until released.
+    """
+
+    def __init__(self, test, levels):
+        self.levels = levels
+        self.requests = []
+        self.running = 0
+        self.max_running = 0
+        self.released = eventlet.event.Event()
+        self.released.send()
+        test.stub_out('nova.scheduler.filters.trusted_filter.'
+                      'AttestationService._do_request', self._do_request)
+
+    def block(self):
+        self.released = eventlet.event.Event()
+
+    def release(self):
+        self.released.send()
+
+    def _do_request(self, service, method, action_url, body, headers):
+        hosts = jsonutils.loads(body)['hosts']
+        self.requests.append(hosts)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            eventlet.sleep(0)
+            self.released.wait()
+        finally:
+            self.running -= 1
+        return requests.codes.OK, {
+            'hosts': [{'host_name': host, 'trust_lvl': self.levels[host],
+                       'vtime': utils.isotime()}
+                      for host in hosts if host in self.levels]}
+
+
+class TestComputeAttestationCache(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestComputeAttestationCache, self).setUp()
+        self.time_fixture = self.useFixture(utils_fixture.TimeFixture())
+        self.server = FakeAttestationServer(
+            self, {'node%d' % i: 'trusted' for i in range(5)})
+        # The schedulers share the same cache
+        mc = cache_utils.get_client()
+        self.stub_out('nova.cache_utils.get_client',
+                      lambda expiration_time=0: mc)
+        self.cache = trusted_filter.ComputeAttestationCache()
+
+    def _wait_attestations(self):
+        while self.cache._attesting:
+            eventlet.sleep(0.01)
+
+    def test_stale_level_used_while_attesting(self):
+        self.assertEqual({'node1': 'trusted'},
+                         self.cache.get_host_attestations(['node1']))
+
+        self.server.levels['node1'] = 'untrusted'
+        self.server.block()
+        self.time_fixture.advance_time_seconds(
+            CONF.trusted_computing.attestation_auth_timeout + 10)
+        # The previous level is returned without waiting for the attestation
+        self.assertEqual({'node1': 'trusted'},
+                         self.cache.get_host_attestations(['node1']))
+        eventlet.sleep(0)
+        self.assertEqual(2, len(self.server.requests))
+        # It is only attested once
+        self.cache.get_host_attestations(['node1'])
+        eventlet.sleep(0)
+        self.assertEqual(2, len(self.server.requests))
+
+        self.server.release()
+        self._wait_attestations()
+        self.assertEqual({'node1': 'untrusted'},
+                         self.cache.get_host_attestations(['node1']))
+
+    def test_wait_timeout(self):
+        self.flags(attestation_wait_timeout=0.05, group='trusted_computing')
+        self.server.block()
+
+        self.assertEqual({'node1': 'unknown'},
+                         self.cache.get_host_attestations(['node1']))
+
+        self.server.release()
+        self._wait_attestations()
+        self.assertEqual({'node1': 'trusted'},
+                         self.cache.get_host_attestations(['node1']))
+        self.assertEqual([['node1']], self.server.requests)
+
+    def test_unusable_level_waits(self):
+        self.cache.get_host_attestations(['node1'])
+        self.server.levels['node1'] = 'untrusted'
+        self.time_fixture.advance_time_seconds(
+            2 * CONF.trusted_computing.attestation_auth_timeout + 10)
+
+        self.assertEqual({'node1': 'untrusted'},
+                         self.cache.get_host_attestations(['node1']))
+
+    def test_batches(self):
+        self.flags(attestation_workers=2, group='trusted_computing')
+        self.cache = trusted_filter.ComputeAttestationCache()
+        self.cache.attestservice.request_count = 2
+
+        levels = self.cache.get_host_attestations(
+            ['node%d' % i for i in range(5)] + ['unknown-node'])
+
+        self.assertEqual(dict({'node%d' % i: 'trusted' for i in range(5)},
+                              **{'unknown-node': 'unknown'}), levels)
+        self.assertEqual([['node0', 'node1'], ['node2', 'node3'],
+                          ['node4', 'unknown-node']],
+                         sorted(self.server.requests))
+        self.assertEqual(2, self.server.max_running)
+
+    def test_shared_levels(self):
+        self.cache.get_host_attestations(['node1'])
+
+        # A restarted scheduler finds the trust level in the shared cache
+        cache = trusted_filter.ComputeAttestationCache()
+        self.assertEqual({'node1': 'trusted'},
+                         cache.get_host_attestations(['node1']))
+        self.assertEqual([['node1']], self.server.requests)
+
+        # An expired level is refreshed from the shared cache when another
+        # scheduler attested the host in the meantime
+        self.time_fixture.advance_time_seconds(
+            CONF.trusted_computing.attestation_auth_timeout + 10)
+        self.server.levels['node1'] = 'untrusted'
+        cache.get_host_attestations(['node1'])
+        while cache._attesting:
+            eventlet.sleep(0.01)
+        self.assertEqual({'node1': 'trusted'},
+                         self.cache.get_host_attestations(['node1']))
+        self._wait_attestations()
+        self.assertEqual({'node1': 'untrusted'},
+                         self.cache.get_host_attestations(['node1']))
+        self.assertEqual([['node1'], ['node1']], self.server.requests)
@@ -15,6 +15,7 @@
 
 from nova import objects
 from nova.scheduler.filters import utils
+from nova.scheduler import host_manager
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -88,6 +89,43 @@ class TestUtils(test.NoDBTestCase):
 
         self.assertEqual({}, metadata)
 
+    def _get_indexed_host_state(self, host='fake'):
+        index = host_manager.AggregateMetadataIndex()
+        index.update_host(host, _AGGREGATE_FIXTURES)
+        # The aggregates of the host are read from the index
+        return fakes.FakeHostState(
+            host, 'node', {'aggregates': [], 'aggregate_index': index})
+
+    def test_aggregate_values_from_key_indexed(self):
+        host_state = self._get_indexed_host_state()
+
+        values = utils.aggregate_values_from_key(host_state, key_name='k1')
+
+        self.assertEqual(set(['1', '3', '6,7']), values)
+        self.assertEqual(set(), utils.aggregate_values_from_key(
+            host_state, key_name='k3'))
+
+    def test_aggregate_metadata_get_by_host_no_key_indexed(self):
+        host_state = self._get_indexed_host_state()
+
+        metadata = utils.aggregate_metadata_get_by_host(host_state)
+
+        self.assertEqual({'k1': set(['1', '3', '7', '6']),
+                          'k2': set(['9', '8', '2', '4'])}, metadata)
+        self.assertEqual(set(), metadata['k3'])
+
+    def test_get_aggregate_index(self):
+        host_state = self._get_indexed_host_state()
+        other_host_state = self._get_indexed_host_state('other')
+
+        self.assertIsNone(utils.get_aggregate_index([]))
+        self.assertIs(host_state.aggregate_index,
+                      utils.get_aggregate_index([host_state]))
+        self.assertIsNone(utils.get_aggregate_index(
+            [host_state, other_host_state]))
+        self.assertIsNone(utils.get_aggregate_index(
+            [fakes.FakeHostState('fake', 'node', {})]))
+
     def test_validate_num_values(self):
         f = utils.validate_num_values
 
@@ -13,7 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+import fixtures
+import iso8601
 import mock
+from oslo_concurrency import lockutils
+from oslo_config import fixture as config_fixture
 from oslo_utils import timeutils
 from six.moves import range
 
@@ -43,6 +49,16 @@ class CachingSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertEqual([], self.driver.all_host_states)
         context.elevated.assert_called_with()
 
+    @mock.patch.object(caching_scheduler.CachingScheduler,
+                       "_get_up_hosts")
+    def test_run_periodic_tasks_publishes_profile(self, mock_up_hosts):
+        mock_up_hosts.return_value = []
+        self.driver.profiler = mock.Mock()
+
+        self.driver.run_periodic_tasks(mock.Mock())
+
+        self.driver.profiler.publish.assert_called_once_with()
+
     @mock.patch.object(caching_scheduler.CachingScheduler,
                        "_get_up_hosts")
     def test_get_all_host_states_returns_cached_value(self, mock_up_hosts):
@@ -95,6 +111,135 @@ class CachingSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertEqual(1, len(result))
         self.assertEqual(result[0]["host"], fake_host.host)
 
+    def _enable_shared_host_state(self, driver):
+        lock_path = self.useFixture(fixtures.TempDir()).path
+        self.useFixture(config_fixture.Config(lockutils.CONF)).config(
+            lock_path=lock_path, group='oslo_concurrency')
+        driver.shared_claims = caching_scheduler.SharedHostClaims()
+
+    @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
+                return_value={'numa_topology': None,
+                              'pci_requests': None})
+    def test_select_destination_publishes_claim(self, mock_get_extra):
+        self._enable_shared_host_state(self.driver)
+        spec_obj = self._get_fake_request_spec()
+        fake_host = self._get_fake_host_state()
+        self.driver.all_host_states = [fake_host]
+
+        self._test_select_destinations(spec_obj)
+
+        claims = self.driver.shared_claims.get_all(
+            [(fake_host.host, fake_host.nodename)])
+        self.assertEqual(1, len(claims))
+        self.assertEqual(fake_host.host, claims[0]['host'])
+        self.assertEqual(fake_host.nodename, claims[0]['node'])
+        self.assertEqual(512, self.driver.shared_claims.get_request_spec(
+            claims[0]).memory_mb)
+        self.assertEqual(50000 - 512, fake_host.free_ram_mb)
+
+        # The claims of a worker are not consumed twice by that worker
+        self.driver._get_all_host_states(self.context)
+        self.assertEqual(50000 - 512, fake_host.free_ram_mb)
+
+    def test_shared_claims_per_host(self):
+        self._enable_shared_host_state(self.driver)
+        shared_claims = self.driver.shared_claims
+        spec_obj = self._get_fake_request_spec()
+        claim1 = shared_claims.add('host1', 'node1', spec_obj)
+        claim2 = shared_claims.add('host2', 'node2', spec_obj)
+
+        self.assertEqual([claim1], shared_claims.get_all([('host1', 'node1')]))
+        self.assertEqual([claim1, claim2], shared_claims.get_all(
+            [('host1', 'node1'), ('host2', 'node2'), ('host3', 'node3')]))
+        # Only the resources of the request are kept
+        self.assertEqual(['created_at', 'ephemeral_gb', 'host', 'id',
+                          'memory_mb', 'node', 'numa_topology',
+                          'pci_requests', 'root_gb', 'vcpus'], sorted(claim1))
+
+    def test_shared_claims_request_spec(self):
+        self._enable_shared_host_state(self.driver)
+        spec_obj = self._get_fake_request_spec()
+        spec_obj.numa_topology = objects.InstanceNUMATopology(
+            cells=[objects.InstanceNUMACell(id=0, cpuset=set([0]),
+                                            memory=512)])
+        claim = self.driver.shared_claims.add('host1', 'node1', spec_obj)
+
+        claim_spec = self.driver.shared_claims.get_request_spec(claim)
+        self.assertEqual(512, claim_spec.memory_mb)
+        self.assertEqual(spec_obj.vcpus, claim_spec.vcpus)
+        self.assertEqual(spec_obj.root_gb, claim_spec.root_gb)
+        self.assertEqual(512, claim_spec.numa_topology.cells[0].memory)
+        self.assertIsNone(claim_spec.pci_requests)
+
+    def test_shared_claims_expire(self):
+        self._enable_shared_host_state(self.driver)
+        shared_claims = self.driver.shared_claims
+        spec_obj = self._get_fake_request_spec()
+        with mock.patch.object(timeutils, 'utcnow',
+                               return_value=self._get_update_time(-3600)):
+            shared_claims.add('host1', 'node1', spec_obj)
+        claim = shared_claims.add('host1', 'node1', spec_obj)
+
+        self.assertEqual([claim], shared_claims.get_all([('host1', 'node1')]))
+
+    @mock.patch.object(caching_scheduler, 'MAX_CLAIMS_SIZE', 10)
+    @mock.patch.object(caching_scheduler.LOG, 'warning')
+    def test_shared_claims_too_large(self, mock_warning):
+        self._enable_shared_host_state(self.driver)
+        shared_claims = self.driver.shared_claims
+
+        shared_claims.add('host1', 'node1', self._get_fake_request_spec())
+
+        self.assertEqual(1, mock_warning.call_count)
+        self.assertEqual([], shared_claims.get_all([('host1', 'node1')]))
+
+    def test_get_all_host_states_consumes_shared_claims(self):
+        self._enable_shared_host_state(self.driver)
+        spec_obj = self._get_fake_request_spec()
+        fake_host = self._get_fake_host_state()
+        fake_host.updated = self._get_update_time(-60)
+        self.driver.all_host_states = [fake_host]
+        # Another worker consumes from its own copy of the host state
+        self.driver.shared_claims.add(fake_host.host, fake_host.nodename,
+                                      spec_obj)
+
+        self.driver._get_all_host_states(self.context)
+        self.assertEqual(50000 - 512, fake_host.free_ram_mb)
+        self.assertEqual(1, fake_host.num_instances)
+
+        # The claims are only consumed once
+        self.driver._get_all_host_states(self.context)
+        self.assertEqual(50000 - 512, fake_host.free_ram_mb)
+
+    def test_get_all_host_states_consumes_claims_after_refresh(self):
+        self._enable_shared_host_state(self.driver)
+        spec_obj = self._get_fake_request_spec()
+        fake_host = self._get_fake_host_state()
+        fake_host.updated = self._get_update_time(-60)
+        self.driver.all_host_states = [fake_host]
+        self.driver.shared_claims.add(fake_host.host, fake_host.nodename,
+                                      spec_obj)
+        self.driver._get_all_host_states(self.context)
+        self.assertEqual(50000 - 512, fake_host.free_ram_mb)
+
+        # The host state is refreshed from a compute node which did not
+        # report the claimed resources yet.
+        fake_host.free_ram_mb = 50000
+        fake_host.updated = self._get_update_time(-30)
+        self.driver._get_all_host_states(self.context)
+        self.assertEqual(50000 - 512, fake_host.free_ram_mb)
+
+        # The host state is refreshed from a compute node which reported the
+        # claimed resources.
+        fake_host.free_ram_mb = 50000 - 512
+        fake_host.updated = self._get_update_time(30)
+        self.driver._get_all_host_states(self.context)
+        self.assertEqual(50000 - 512, fake_host.free_ram_mb)
+
+    def _get_update_time(self, delta):
+        updated = timeutils.utcnow() + datetime.timedelta(seconds=delta)
+        return updated.replace(tzinfo=iso8601.iso8601.Utc())
+
     def _test_select_destinations(self, spec_obj):
         return self.driver.select_destinations(
                 self.context, spec_obj)
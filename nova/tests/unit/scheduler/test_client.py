@@ -50,6 +50,16 @@ class SchedulerReportClientTestCase(test.NoDBTestCase):
         self.client.update_resource_stats(cn)
         mock_save.assert_called_once_with()
 
+    @mock.patch.object(objects.ComputeNodeList, 'save_all')
+    def test_update_resource_stats_multi(self, mock_save_all):
+        cns = objects.ComputeNodeList(objects=[
+            objects.ComputeNode(host='fakehost', hypervisor_hostname=node)
+            for node in ('node1', 'node2')])
+        self.client.update_resource_stats_multi(self.context, cns)
+        mock_save_all.assert_called_once_with(self.context, cns)
+        for cn in cns:
+            self.assertEqual(set(), cn.obj_what_changed())
+
 
 class SchedulerQueryClientTestCase(test.NoDBTestCase):
 
@@ -162,3 +172,10 @@ class SchedulerClientTestCase(test.NoDBTestCase):
 
         self.assertIsNotNone(self.client.reportclient.instance)
         mock_update_resource_stats.assert_called_once_with(mock.sentinel.cn)
+
+    @mock.patch.object(scheduler_report_client.SchedulerReportClient,
+                       'update_resource_stats_multi')
+    def test_update_resource_stats_multi(self, mock_update):
+        self.client.update_resource_stats_multi('context',
+                                                mock.sentinel.cns)
+        mock_update.assert_called_once_with('context', mock.sentinel.cns)
@@ -17,11 +17,15 @@ Tests For Filter Scheduler.
 """
 
 import mock
+import testtools
 
+from nova import context
 from nova import exception
 from nova import objects
 from nova.scheduler import filter_scheduler
+from nova.scheduler import filters
 from nova.scheduler import host_manager
+from nova.scheduler import profiler
 from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
 from nova import test  # noqa
@@ -29,7 +33,7 @@ from nova.tests.unit.scheduler import fakes
 from nova.tests.unit.scheduler import test_scheduler
 
 
-def fake_get_filtered_hosts(hosts, filter_properties, index):
+def fake_get_filtered_hosts(hosts, filter_properties, index, profile=None):
     return list(hosts)
 
 
@@ -40,21 +44,22 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
-    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
     @mock.patch('nova.objects.ComputeNodeList.get_all',
                 return_value=fakes.COMPUTE_NODES)
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
                 return_value={'numa_topology': None,
                               'pci_requests': None})
     def test_schedule_happy_day(self, mock_get_extra, mock_get_all,
-                                mock_by_host, mock_get_by_binary):
+                                mock_by_filters, mock_get_by_binary):
         """Make sure there's nothing glaringly wrong with _schedule()
         by doing a happy day pass through.
         """
 
         self.next_weight = 1.0
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                profile=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             return [weights.WeighedHost(host_state, self.next_weight)]
@@ -113,14 +118,14 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
-    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
     @mock.patch('nova.objects.ComputeNodeList.get_all',
                 return_value=fakes.COMPUTE_NODES)
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
                 return_value={'numa_topology': None,
                               'pci_requests': None})
     def test_schedule_host_pool(self, mock_get_extra, mock_get_all,
-                                mock_by_host, mock_get_by_binary):
+                                mock_by_filters, mock_get_by_binary):
         """Make sure the scheduler_host_subset_size property works properly."""
 
         self.flags(scheduler_host_subset_size=2)
@@ -148,14 +153,14 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
-    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
     @mock.patch('nova.objects.ComputeNodeList.get_all',
                 return_value=fakes.COMPUTE_NODES)
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
                 return_value={'numa_topology': None,
                               'pci_requests': None})
     def test_schedule_large_host_pool(self, mock_get_extra, mock_get_all,
-                                      mock_by_host, mock_get_by_binary):
+                                      mock_by_filters, mock_get_by_binary):
         """Hosts should still be chosen if pool size
         is larger than number of filtered hosts.
         """
@@ -184,6 +189,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertEqual(len(hosts), 1)
 
     @mock.patch('nova.scheduler.host_manager.HostManager._get_instance_info')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
     @mock.patch('nova.objects.ComputeNodeList.get_all',
@@ -193,6 +199,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                               'pci_requests': None})
     def test_schedule_chooses_best_host(self, mock_get_extra, mock_cn_get_all,
                                         mock_get_by_binary,
+                                        mock_get_by_filters,
                                         mock_get_inst_info):
         """If scheduler_host_subset_size is 1, the largest host with greatest
         weight should be returned.
@@ -201,7 +208,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.flags(scheduler_host_subset_size=1)
         self.next_weight = 50
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                profile=None):
             this_weight = self.next_weight
             self.next_weight = 0
             host_state = hosts[0]
@@ -235,14 +243,14 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
-    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
     @mock.patch('nova.objects.ComputeNodeList.get_all',
                 return_value=fakes.COMPUTE_NODES)
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
                 return_value={'numa_topology': None,
                               'pci_requests': None})
     def test_select_destinations(self, mock_get_extra, mock_get_all,
-                                 mock_by_host, mock_get_by_binary):
+                                 mock_by_filters, mock_get_by_binary):
         """select_destinations is basically a wrapper around _schedule().
 
         Similar to the _schedule tests, this just does a happy path test to
@@ -254,7 +262,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         selected_hosts = []
         selected_nodes = []
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                profile=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             selected_hosts.append(host_state.host)
@@ -307,6 +316,48 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                  dict(request_spec=expected))]
             self.assertEqual(expected, mock_info.call_args_list)
 
+    @mock.patch.object(filter_scheduler.FilterScheduler, '_schedule')
+    def test_select_destinations_profile(self, mock_schedule):
+        def fake_schedule(context, spec_obj, profile=None):
+            profile.add_filter('RamFilter', 0.002, 10, 8)
+            profile.add_weigher('RAMWeigher', 0.001, 8)
+            return [mock.Mock()]
+
+        mock_schedule.side_effect = fake_schedule
+        self.driver.profiler = mock.Mock()
+        spec_obj = objects.RequestSpec(num_instances=1,
+                                       instance_uuid='uuid1')
+
+        with mock.patch.object(self.driver.notifier, 'info') as mock_info:
+            self.driver.select_destinations(self.context, spec_obj)
+
+        profile = mock_schedule.call_args[1]['profile']
+        self.driver.profiler.record.assert_called_once_with(profile)
+        self.assertIsNotNone(profile.elapsed)
+        self.assertEqual(3, mock_info.call_count)
+        payload = mock_info.call_args_list[1][0][2]
+        self.assertEqual('scheduler.select_destinations.profile',
+                         mock_info.call_args_list[1][0][1])
+        self.assertEqual('uuid1', payload['instance_uuid'])
+        self.assertEqual(1, payload['num_instances'])
+        self.assertEqual([{'name': 'RamFilter', 'calls': 1,
+                           'elapsed_ms': 2.0, 'hosts_in': 10,
+                           'hosts_out': 8}], payload['filters'])
+        self.assertEqual(['RAMWeigher'],
+                         [weigher['name'] for weigher in payload['weighers']])
+
+    def test_profiler_disabled(self):
+        self.assertIsNone(self.driver.profiler)
+
+    def test_run_periodic_tasks_publishes_profile(self):
+        self.driver.profiler = mock.Mock()
+        self.driver.run_periodic_tasks(self.context)
+        self.driver.profiler.publish.assert_called_once_with()
+
+    def test_run_periodic_tasks_profiler_disabled(self):
+        # Nothing to publish
+        self.driver.run_periodic_tasks(self.context)
+
     @mock.patch.object(filter_scheduler.FilterScheduler, '_schedule')
     def test_select_destinations_no_valid_host(self, mock_schedule):
         mock_schedule.return_value = []
@@ -331,3 +382,206 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                 # Make sure that the consumed hosts have chance to be reverted.
                 for host in consumed_hosts:
                     self.assertIsNone(host.obj.updated)
+
+
+class IncrementalFilterSchedulerTestCase(test.NoDBTestCase):
+    """Test case for the incremental placement of multiple instances."""
+
+    def setUp(self):
+        super(IncrementalFilterSchedulerTestCase, self).setUp()
+        self.context = context.RequestContext('fake_user', 'fake_project')
+        self.flags(scheduler_default_filters=['RamFilter', 'DiskFilter',
+                                              'ServerGroupAntiAffinityFilter'],
+                   scheduler_weight_classes=[
+                       'nova.scheduler.weights.ram.RAMWeigher',
+                       'nova.scheduler.weights.disk.DiskWeigher'],
+                   scheduler_host_subset_size=1)
+
+    def _get_driver(self):
+        with test.nested(
+                mock.patch.object(host_manager.HostManager,
+                                  '_init_instance_info'),
+                mock.patch.object(host_manager.HostManager,
+                                  '_init_aggregates')):
+            driver = filter_scheduler.FilterScheduler()
+        driver._get_all_host_states = lambda context: self._get_hosts()
+        return driver
+
+    def _get_hosts(self):
+        return [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                    {'free_ram_mb': 1024 * (i % 7 + 1),
+                                     'total_usable_ram_mb': 8192,
+                                     'free_disk_mb': 1024 * (40 - i),
+                                     'total_usable_disk_gb': 40,
+                                     'ram_allocation_ratio': 1.0,
+                                     'disk_allocation_ratio': 1.0})
+                for i in range(20)]
+
+    def _get_spec_obj(self, num_instances, instance_group=None):
+        return objects.RequestSpec(
+            num_instances=num_instances,
+            project_id=1,
+            instance_uuid='fake-uuid',
+            flavor=objects.Flavor(root_gb=1,
+                                  memory_mb=512,
+                                  ephemeral_gb=0,
+                                  swap=0,
+                                  vcpus=1),
+            pci_requests=None,
+            numa_topology=None,
+            instance_group=instance_group,
+            ignore_hosts=None,
+            force_hosts=None,
+            force_nodes=None)
+
+    def _schedule(self, incremental, spec_obj):
+        self.flags(scheduler_incremental_placement=incremental)
+        driver = self._get_driver()
+        return [(weighed_host.obj.host, weighed_host.weight)
+                for weighed_host in driver._schedule(self.context, spec_obj)]
+
+    def test_schedule_incrementally(self):
+        expected = self._schedule(False, self._get_spec_obj(25))
+        selected = self._schedule(True, self._get_spec_obj(25))
+
+        self.assertEqual(25, len(selected))
+        self.assertEqual([host for host, weight in expected],
+                         [host for host, weight in selected])
+        for (_host, expected_weight), (_host, weight) in zip(expected,
+                                                             selected):
+            self.assertAlmostEqual(expected_weight, weight)
+
+    def test_schedule_incrementally_not_enough_hosts(self):
+        # 154 instances of 512MB fit on the hosts
+        expected = self._schedule(False, self._get_spec_obj(160))
+        selected = self._schedule(True, self._get_spec_obj(160))
+
+        self.assertEqual(154, len(selected))
+        self.assertEqual([host for host, weight in expected],
+                         [host for host, weight in selected])
+
+    def test_schedule_incrementally_anti_affinity(self):
+        def get_spec_obj():
+            group = objects.InstanceGroup(policies=['anti-affinity'],
+                                          hosts=[], members=[])
+            return self._get_spec_obj(22, instance_group=group)
+
+        expected = self._schedule(False, get_spec_obj())
+        selected = self._schedule(True, get_spec_obj())
+
+        self.assertEqual(20, len(selected))
+        self.assertEqual(20, len(set(host for host, weight in selected)))
+        self.assertEqual([host for host, weight in expected],
+                         [host for host, weight in selected])
+
+    def test_schedule_incrementally_filters_selected_host(self):
+        self.flags(scheduler_incremental_placement=True,
+                   scheduler_default_filters=['RamFilter', 'DiskFilter'])
+        driver = self._get_driver()
+        spec_obj = self._get_spec_obj(5)
+
+        with mock.patch.object(driver.host_manager, 'get_filtered_hosts',
+                               wraps=driver.host_manager.get_filtered_hosts
+                               ) as mock_filter:
+            selected = driver._schedule(self.context, spec_obj)
+
+        self.assertEqual(5, len(selected))
+        self.assertEqual(5, mock_filter.call_count)
+        self.assertEqual(20, len(mock_filter.call_args_list[0][0][0]))
+        for num, call in enumerate(mock_filter.call_args_list[1:]):
+            self.assertEqual([selected[num].obj], call[0][0])
+            self.assertEqual(num + 1, call[1]['index'])
+
+    def test_schedule_incrementally_filter_stops_run(self):
+        self.flags(scheduler_incremental_placement=True)
+        driver = self._get_driver()
+        get_filtered_hosts = driver.host_manager.get_filtered_hosts
+        group = objects.InstanceGroup(policies=['anti-affinity'], hosts=[],
+                                      members=[])
+
+        def fake_get_filtered_hosts(hosts, spec_obj, **kwargs):
+            # The anti-affinity filter stops the run after the first host
+            if kwargs.get('filter_class_names'):
+                return None
+            return get_filtered_hosts(hosts, spec_obj, **kwargs)
+
+        with mock.patch.object(driver.host_manager, 'get_filtered_hosts',
+                               side_effect=fake_get_filtered_hosts):
+            selected = driver._schedule(
+                self.context, self._get_spec_obj(3, instance_group=group))
+
+        self.assertEqual(1, len(selected))
+
+    def test_schedule_incrementally_profile(self):
+        self.flags(scheduler_incremental_placement=True)
+        driver = self._get_driver()
+        profile = profiler.RequestProfile()
+
+        driver._schedule(self.context, self._get_spec_obj(5), profile=profile)
+
+        self.assertEqual(['RamFilter', 'DiskFilter',
+                          'ServerGroupAntiAffinityFilter'],
+                         list(profile.filters))
+        self.assertEqual(20, profile.filters['RamFilter']['hosts_in'])
+        self.assertEqual(5, profile.filters['RamFilter']['calls'])
+        self.assertEqual(['RAMWeigher', 'DiskWeigher'],
+                         list(profile.weighers))
+
+    def test_schedule_incrementally_single_instance(self):
+        self.flags(scheduler_incremental_placement=True)
+        driver = self._get_driver()
+
+        with mock.patch.object(driver,
+                               '_schedule_incrementally') as mock_schedule:
+            selected = driver._schedule(self.context, self._get_spec_obj(1))
+
+        self.assertEqual(1, len(selected))
+        self.assertFalse(mock_schedule.called)
+
+
+@testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+class BatchIncrementalFilterSchedulerTestCase(
+        IncrementalFilterSchedulerTestCase):
+
+    def setUp(self):
+        super(BatchIncrementalFilterSchedulerTestCase, self).setUp()
+        self.flags(scheduler_batch_filters=True,
+                   scheduler_batch_weighers=True)
+
+
+class HostRankingTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HostRankingTestCase, self).setUp()
+        self.hosts = [host_manager.HostState('host%d' % i, 'node')
+                      for i in range(4)]
+        self.ranking = filter_scheduler._HostRanking(self.hosts,
+                                                     [1.0, 2.0, 2.0, 0.5])
+
+    def _best(self, count):
+        return [(weighed_host.obj.host, weighed_host.weight)
+                for weighed_host in self.ranking.best(count)]
+
+    def test_best(self):
+        self.assertEqual([('host1', 2.0), ('host2', 2.0)], self._best(2))
+        self.assertEqual([('host1', 2.0), ('host2', 2.0), ('host0', 1.0),
+                          ('host3', 0.5)], self._best(10))
+
+    def test_update(self):
+        self.ranking.update(self.hosts[1], 0.1)
+        self.assertEqual([('host2', 2.0), ('host0', 1.0), ('host3', 0.5),
+                          ('host1', 0.1)], self._best(10))
+        self.ranking.update(self.hosts[1], 3.0)
+        self.assertEqual([('host1', 3.0), ('host2', 2.0)], self._best(2))
+
+    def test_remove_and_keep(self):
+        self.ranking.remove(self.hosts[1])
+        self.assertNotIn(self.hosts[1], self.ranking)
+        self.ranking.keep([self.hosts[0], self.hosts[1], self.hosts[3]])
+        self.assertEqual([self.hosts[0], self.hosts[3]], self.ranking.hosts())
+        self.assertEqual([('host0', 1.0), ('host3', 0.5)], self._best(10))
+
+    def test_reset(self):
+        self.ranking.reset([self.hosts[3], self.hosts[0]], [1.0, 1.0])
+        self.assertEqual([('host0', 1.0), ('host3', 1.0)], self._best(10))
+        self.assertEqual([], self.ranking.best(0))
@@ -119,6 +119,36 @@ class FiltersTestCase(test.NoDBTestCase):
         filt2_mock.filter_all.assert_called_once_with(filter_objs_second,
                                                       spec_obj)
 
+    def test_get_filtered_objects_profile(self):
+        filter_objs_initial = ['initial', 'filter1', 'objects1']
+        filter_objs_second = ['second', 'filter2']
+        spec_obj = objects.RequestSpec(instance_uuid='uuid1')
+        profile = mock.Mock()
+
+        def _fake_base_loader_init(*args, **kwargs):
+            pass
+
+        self.stub_out('nova.loadables.BaseLoader.__init__',
+                      _fake_base_loader_init)
+
+        filt1_mock = mock.Mock(Filter1)
+        filt1_mock.run_filter_for_index.return_value = True
+        filt1_mock.filter_all.return_value = filter_objs_second
+        filt2_mock = mock.Mock(Filter2)
+        filt2_mock.run_filter_for_index.return_value = True
+        filt2_mock.filter_all.return_value = []
+
+        filter_handler = filters.BaseFilterHandler(filters.BaseFilter)
+        filter_mocks = [filt1_mock, filt2_mock]
+        result = filter_handler.get_filtered_objects(filter_mocks,
+                                                     filter_objs_initial,
+                                                     spec_obj,
+                                                     profile=profile)
+        self.assertEqual([], result)
+        profile.add_filter.assert_has_calls([
+            mock.call('Filter1', mock.ANY, 3, 2),
+            mock.call('Filter2', mock.ANY, 2, 0)])
+
     def test_get_filtered_objects_for_index(self):
         """Test that we don't call a filter when its
         run_filter_for_index() method returns false
@@ -14,6 +14,9 @@
 """
 Tests For Scheduler Host Filters.
 """
+from six.moves import range
+import testtools
+
 from nova.scheduler import filters
 from nova.scheduler.filters import all_hosts_filter
 from nova.scheduler.filters import compute_filter
@@ -35,3 +38,58 @@ class HostFiltersTestCase(test.NoDBTestCase):
         filt_cls = all_hosts_filter.AllHostsFilter()
         host = fakes.FakeHostState('host1', 'node1', {})
         self.assertTrue(filt_cls.host_passes(host, {}))
+
+
+class FakeBatchFilter(filters.BaseHostFilter):
+    def host_passes(self, host_state, filter_properties):
+        raise AssertionError()
+
+    def batch_host_passes(self, columns, filter_properties):
+        return columns.get('free_ram_mb') >= 512
+
+
+class FakeFilter(filters.BaseHostFilter):
+    def host_passes(self, host_state, filter_properties):
+        return host_state.host != 'host3'
+
+
+@testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+class HostStateColumnsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HostStateColumnsTestCase, self).setUp()
+        self.hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                          {'free_ram_mb': 256 * i})
+                      for i in range(5)]
+
+    def test_get(self):
+        columns = filters.HostStateColumns(self.hosts)
+        self.assertEqual([0, 256, 512, 768, 1024],
+                         columns.get('free_ram_mb').tolist())
+
+    def test_select(self):
+        columns = filters.HostStateColumns(self.hosts)
+        columns.get('free_ram_mb')
+        columns.select(self.hosts[1::2])
+        self.assertEqual(self.hosts[1::2], columns.host_states)
+        self.assertEqual([256, 768], columns.get('free_ram_mb').tolist())
+
+    def test_set_limits(self):
+        columns = filters.HostStateColumns(self.hosts[:2])
+        columns.set_limits('memory_mb', columns.get('free_ram_mb') * 2,
+                           columns.get('free_ram_mb') > 0)
+        self.assertEqual({}, self.hosts[0].limits)
+        self.assertEqual({'memory_mb': 512}, self.hosts[1].limits)
+
+    def test_get_filtered_objects(self):
+        self.flags(scheduler_batch_filters=True)
+        filter_handler = filters.HostFilterHandler()
+        result = filter_handler.get_filtered_objects(
+            [FakeBatchFilter(), FakeFilter(), FakeBatchFilter()],
+            self.hosts, {})
+        self.assertEqual([self.hosts[2], self.hosts[4]], result)
+
+    def test_get_filtered_objects_disabled(self):
+        filter_handler = filters.HostFilterHandler()
+        self.assertRaises(AssertionError, filter_handler.get_filtered_objects,
+                          [FakeBatchFilter()], self.hosts, {})
@@ -22,6 +22,7 @@ import datetime
 import mock
 from oslo_config import cfg
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 from oslo_utils import versionutils
 import six
 
@@ -81,15 +82,15 @@ class HostManagerTestCase(test.NoDBTestCase):
 
     @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
     @mock.patch.object(nova.objects.ComputeNodeList, 'get_all')
-    def test_init_instance_info_batches(self, mock_get_all,
-                                        mock_get_by_filters):
+    def test_init_instance_info_single_query(self, mock_get_all,
+                                             mock_get_by_filters):
         cn_list = objects.ComputeNodeList()
         for num in range(22):
             host_name = 'host_%s' % num
             cn_list.objects.append(objects.ComputeNode(host=host_name))
         mock_get_all.return_value = cn_list
         self.host_manager._init_instance_info()
-        self.assertEqual(mock_get_by_filters.call_count, 3)
+        self.assertEqual(mock_get_by_filters.call_count, 1)
 
     @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
     @mock.patch.object(nova.objects.ComputeNodeList, 'get_all')
@@ -112,7 +113,8 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertIn('uuid2', fake_info['instances'])
         self.assertNotIn('uuid3', fake_info['instances'])
         exp_filters = {'deleted': False, 'host': [u'host1', u'host2']}
-        mock_get_by_filters.assert_called_once_with(mock.ANY, exp_filters)
+        mock_get_by_filters.assert_called_once_with(mock.ANY, exp_filters,
+                                                    expected_attrs=[])
 
     @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
     @mock.patch.object(nova.objects.ComputeNodeList, 'get_all')
@@ -134,7 +136,8 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertIn(uuids.instance_2, fake_info['instances'])
         self.assertNotIn(uuids.instance_3, fake_info['instances'])
         exp_filters = {'deleted': False, 'host': [u'host1', u'host2']}
-        mock_get_by_filters.assert_called_once_with(mock.ANY, exp_filters)
+        mock_get_by_filters.assert_called_once_with(mock.ANY, exp_filters,
+                                                    expected_attrs=[])
         # should not be called if the list of nodes was passed explicitly
         self.assertFalse(mock_get_all.called)
 
@@ -202,6 +205,39 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual({'fake-host': set([])},
                          self.host_manager.host_aggregates_map)
 
+    def test_update_aggregates_index(self):
+        fake_agg1 = objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                                      metadata={'foo': 'bar, baz'})
+        fake_agg2 = objects.Aggregate(id=2, hosts=['host2'],
+                                      metadata={'foo': 'qux', 'az': 'az1'})
+        self.host_manager.update_aggregates([fake_agg1, fake_agg2])
+        index = self.host_manager.aggregate_index
+        self.assertEqual(set(['host1', 'host2']), index.hosts_with_key('foo'))
+        self.assertEqual(set(['host2']), index.hosts_with_value('foo', 'qux'))
+        self.assertEqual({'foo': set(['bar', 'baz', 'qux']),
+                          'az': set(['az1'])}, index.get_metadata('host2'))
+        self.assertEqual(set(['bar, baz', 'qux']),
+                         index.get_values('host2', 'foo'))
+
+        # Let's remove a host and change the metadata
+        fake_agg1.hosts = ['host1']
+        fake_agg1.metadata = {'foo': 'bar'}
+        self.host_manager.update_aggregates([fake_agg1])
+        self.assertEqual(set(['host1']), index.hosts_with_value('foo', 'bar'))
+        self.assertEqual(set(), index.hosts_with_value('foo', 'baz'))
+        self.assertEqual({'foo': set(['qux']), 'az': set(['az1'])},
+                         index.get_metadata('host2'))
+
+    def test_delete_aggregate_index(self):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'],
+                                     metadata={'foo': 'bar'})
+        self.host_manager.update_aggregates([fake_agg])
+        self.host_manager.delete_aggregate(fake_agg)
+        index = self.host_manager.aggregate_index
+        self.assertEqual([], index.keys())
+        self.assertEqual(set(), index.hosts_with_key('foo'))
+        self.assertEqual({}, index.get_metadata('fake-host'))
+
     def test_choose_host_filters_not_found(self):
         self.assertRaises(exception.SchedulerHostFilterNotFound,
                           self.host_manager._choose_host_filters,
@@ -468,10 +504,10 @@ class HostManagerTestCase(test.NoDBTestCase):
     @mock.patch('nova.scheduler.host_manager.LOG')
     @mock.patch('nova.objects.ServiceList.get_by_binary')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
-    @mock.patch('nova.objects.InstanceList.get_by_host')
-    def test_get_all_host_states(self, mock_get_by_host, mock_get_all,
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_get_all_host_states(self, mock_get_by_filters, mock_get_all,
                                  mock_get_by_binary, mock_log):
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_filters.return_value = objects.InstanceList()
         mock_get_all.return_value = fakes.COMPUTE_NODES
         mock_get_by_binary.return_value = fakes.SERVICES
         context = 'fake_context'
@@ -528,35 +564,35 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual(host_states_map[('host4', 'node4')].free_disk_mb,
                          8388608)
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
     @mock.patch.object(host_manager.HostState, '_update_from_compute_node')
     @mock.patch.object(objects.ComputeNodeList, 'get_all')
     @mock.patch.object(objects.ServiceList, 'get_by_binary')
     def test_get_all_host_states_with_no_aggs(self, svc_get_by_binary,
                                               cn_get_all, update_from_cn,
-                                              mock_get_by_host):
+                                              mock_get_by_filters):
         svc_get_by_binary.return_value = [objects.Service(host='fake')]
         cn_get_all.return_value = [
             objects.ComputeNode(host='fake', hypervisor_hostname='fake')]
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_filters.return_value = objects.InstanceList()
         self.host_manager.host_aggregates_map = collections.defaultdict(set)
 
         self.host_manager.get_all_host_states('fake-context')
         host_state = self.host_manager.host_state_map[('fake', 'fake')]
         self.assertEqual([], host_state.aggregates)
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
     @mock.patch.object(host_manager.HostState, '_update_from_compute_node')
     @mock.patch.object(objects.ComputeNodeList, 'get_all')
     @mock.patch.object(objects.ServiceList, 'get_by_binary')
     def test_get_all_host_states_with_matching_aggs(self, svc_get_by_binary,
                                                     cn_get_all,
                                                     update_from_cn,
-                                                    mock_get_by_host):
+                                                    mock_get_by_filters):
         svc_get_by_binary.return_value = [objects.Service(host='fake')]
         cn_get_all.return_value = [
             objects.ComputeNode(host='fake', hypervisor_hostname='fake')]
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_filters.return_value = objects.InstanceList()
         fake_agg = objects.Aggregate(id=1)
         self.host_manager.host_aggregates_map = collections.defaultdict(
             set, {'fake': set([1])})
@@ -565,8 +601,10 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.host_manager.get_all_host_states('fake-context')
         host_state = self.host_manager.host_state_map[('fake', 'fake')]
         self.assertEqual([fake_agg], host_state.aggregates)
+        self.assertIs(self.host_manager.aggregate_index,
+                      host_state.aggregate_index)
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
     @mock.patch.object(host_manager.HostState, '_update_from_compute_node')
     @mock.patch.object(objects.ComputeNodeList, 'get_all')
     @mock.patch.object(objects.ServiceList, 'get_by_binary')
@@ -574,13 +612,13 @@ class HostManagerTestCase(test.NoDBTestCase):
                                                         svc_get_by_binary,
                                                         cn_get_all,
                                                         update_from_cn,
-                                                        mock_get_by_host):
+                                                        mock_get_by_filters):
         svc_get_by_binary.return_value = [objects.Service(host='fake'),
                                           objects.Service(host='other')]
         cn_get_all.return_value = [
             objects.ComputeNode(host='fake', hypervisor_hostname='fake'),
             objects.ComputeNode(host='other', hypervisor_hostname='other')]
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_filters.return_value = objects.InstanceList()
         fake_agg = objects.Aggregate(id=1)
         self.host_manager.host_aggregates_map = collections.defaultdict(
             set, {'other': set([1])})
@@ -636,6 +674,44 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertTrue(host_state.instances)
         self.assertEqual(host_state.instances['uuid1'], inst1)
 
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    @mock.patch('nova.objects.InstanceList.get_by_host')
+    def test_get_all_host_states_not_updated_single_query(
+            self, mock_get_by_host, mock_get_by_filters, mock_get_all_comp,
+            mock_get_svc_by_binary):
+        mock_get_all_comp.return_value = fakes.COMPUTE_NODES
+        mock_get_svc_by_binary.return_value = fakes.SERVICES
+        context = 'fake_context'
+        hm = self.host_manager
+        inst1 = objects.Instance(uuid='uuid1', host='host1')
+        inst2 = objects.Instance(uuid='uuid2', host='host2')
+        inst3 = objects.Instance(uuid='uuid3', host='host3')
+        hm._instance_info = {'host1': {'instances': {'uuid1': inst1},
+                                       'updated': True},
+                             'host2': {'instances': {},
+                                       'updated': False}}
+        mock_get_by_filters.return_value = objects.InstanceList(
+            objects=[inst2, inst3])
+
+        hm.get_all_host_states(context)
+
+        # The instances of the hosts which did not send their instance info
+        # are loaded with a single query
+        mock_get_by_filters.assert_called_once_with(
+            context, {'host': ['host2', 'host3', 'host4'], 'deleted': False},
+            expected_attrs=[])
+        self.assertFalse(mock_get_by_host.called)
+        host_states_map = hm.host_state_map
+        self.assertEqual({'uuid1': inst1},
+                         host_states_map[('host1', 'node1')].instances)
+        self.assertEqual({'uuid2': inst2},
+                         host_states_map[('host2', 'node2')].instances)
+        self.assertEqual({'uuid3': inst3},
+                         host_states_map[('host3', 'node3')].instances)
+        self.assertEqual({}, host_states_map[('host4', 'node4')].instances)
+
     @mock.patch('nova.objects.InstanceList.get_by_host')
     def test_recreate_instance_info(self, mock_get_by_host):
         host_name = 'fake_host'
@@ -762,7 +838,7 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertFalse(self.host_manager._recreate_instance_info.called)
         self.assertTrue(new_info['updated'])
 
-    def test_sync_instance_info_fail(self):
+    def test_sync_instance_info_mismatch(self):
         self.host_manager._recreate_instance_info = mock.MagicMock()
         host_name = 'fake_host'
         inst1 = fake_instance.fake_instance_obj('fake_context', uuid='aaa',
@@ -775,12 +851,43 @@ class HostManagerTestCase(test.NoDBTestCase):
                     'instances': orig_inst_dict,
                     'updated': False,
                 }}
-        self.host_manager.sync_instance_info('fake_context', host_name,
-                                             ['bbb', 'aaa', 'new'])
+        inst3 = fake_instance.fake_instance_obj('fake_context', uuid='new',
+                                                host=host_name)
+        with mock.patch.object(objects.InstanceList,
+                               'get_by_filters') as mock_get_by_filters:
+            mock_get_by_filters.return_value = objects.InstanceList(
+                objects=[inst3])
+            self.host_manager.sync_instance_info('fake_context', host_name,
+                                                 ['bbb', 'new'])
+        # Only the missing instance is loaded, and the extra one removed
+        mock_get_by_filters.assert_called_once_with(
+            'fake_context', {'uuid': ['new'], 'deleted': False},
+            expected_attrs=[])
         new_info = self.host_manager._instance_info[host_name]
-        self.host_manager._recreate_instance_info.assert_called_once_with(
-                'fake_context', host_name)
-        self.assertFalse(new_info['updated'])
+        self.assertFalse(self.host_manager._recreate_instance_info.called)
+        self.assertEqual({'bbb': inst2, 'new': inst3},
+                         new_info['instances'])
+        self.assertTrue(new_info['updated'])
+
+    def test_sync_instance_info_only_extra(self):
+        host_name = 'fake_host'
+        inst1 = fake_instance.fake_instance_obj('fake_context', uuid='aaa',
+                                                host=host_name)
+        inst2 = fake_instance.fake_instance_obj('fake_context', uuid='bbb',
+                                                host=host_name)
+        self.host_manager._instance_info = {
+                host_name: {
+                    'instances': {inst1.uuid: inst1, inst2.uuid: inst2},
+                    'updated': False,
+                }}
+        with mock.patch.object(objects.InstanceList,
+                               'get_by_filters') as mock_get_by_filters:
+            self.host_manager.sync_instance_info('fake_context', host_name,
+                                                 ['aaa'])
+        self.assertFalse(mock_get_by_filters.called)
+        new_info = self.host_manager._instance_info[host_name]
+        self.assertEqual({'aaa': inst1}, new_info['instances'])
+        self.assertTrue(new_info['updated'])
 
 
 class HostManagerChangedNodesTestCase(test.NoDBTestCase):
@@ -800,10 +907,10 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
-    @mock.patch('nova.objects.InstanceList.get_by_host')
-    def test_get_all_host_states(self, mock_get_by_host, mock_get_all,
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_get_all_host_states(self, mock_get_by_filters, mock_get_all,
                                  mock_get_by_binary):
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_filters.return_value = objects.InstanceList()
         mock_get_all.return_value = fakes.COMPUTE_NODES
         mock_get_by_binary.return_value = fakes.SERVICES
         context = 'fake_context'
@@ -814,14 +921,14 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
-    @mock.patch('nova.objects.InstanceList.get_by_host')
-    def test_get_all_host_states_after_delete_one(self, mock_get_by_host,
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_get_all_host_states_after_delete_one(self, mock_get_by_filters,
                                                   mock_get_all,
                                                   mock_get_by_binary):
         running_nodes = [n for n in fakes.COMPUTE_NODES
                          if n.get('hypervisor_hostname') != 'node4']
 
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_filters.return_value = objects.InstanceList()
         mock_get_all.side_effect = [fakes.COMPUTE_NODES, running_nodes]
         mock_get_by_binary.side_effect = [fakes.SERVICES, fakes.SERVICES]
         context = 'fake_context'
@@ -838,11 +945,11 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
-    @mock.patch('nova.objects.InstanceList.get_by_host')
-    def test_get_all_host_states_after_delete_all(self, mock_get_by_host,
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_get_all_host_states_after_delete_all(self, mock_get_by_filters,
                                                   mock_get_all,
                                                   mock_get_by_binary):
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_filters.return_value = objects.InstanceList()
         mock_get_all.side_effect = [fakes.COMPUTE_NODES, []]
         mock_get_by_binary.side_effect = [fakes.SERVICES, fakes.SERVICES]
         context = 'fake_context'
@@ -857,6 +964,134 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 0)
 
+    def _get_delta_sync_compute_nodes(self, updated_at):
+        compute_nodes = [node.obj_clone() for node in fakes.COMPUTE_NODES[:4]]
+        for node in compute_nodes:
+            node.updated_at = updated_at
+            node.deleted = False
+        return compute_nodes
+
+    @mock.patch('nova.objects.ServiceList.get_by_binary_changed_since')
+    @mock.patch('nova.objects.ComputeNodeList.get_all_changed_since')
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_get_all_host_states_delta_sync(self, mock_get_by_filters,
+                                            mock_get_all, mock_get_by_binary,
+                                            mock_get_all_changed,
+                                            mock_get_by_binary_changed):
+        self.flags(scheduler_host_state_delta_sync=True)
+        now = timeutils.utcnow()
+        compute_nodes = self._get_delta_sync_compute_nodes(now)
+        mock_get_by_filters.return_value = objects.InstanceList()
+        mock_get_all.return_value = compute_nodes
+        mock_get_by_binary.return_value = fakes.SERVICES
+        context = 'fake_context'
+
+        # first call: all nodes
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(4, len(host_states_map))
+        self.assertFalse(mock_get_all_changed.called)
+        # Simulate a consumption on an unchanged node
+        host_states_map[('host1', 'node1')].free_ram_mb = 256
+
+        # second call: node2 is updated and node4 is deleted
+        updated_node = compute_nodes[1].obj_clone()
+        updated_node.free_ram_mb = 2048
+        updated_node.updated_at = now + datetime.timedelta(minutes=1)
+        deleted_node = compute_nodes[3].obj_clone()
+        deleted_node.deleted = True
+        deleted_node.deleted_at = now + datetime.timedelta(minutes=1)
+        mock_get_all_changed.return_value = [updated_node, deleted_node]
+        mock_get_by_binary_changed.return_value = []
+
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(3, len(host_states_map))
+        self.assertEqual(256, host_states_map[('host1', 'node1')].free_ram_mb)
+        self.assertEqual(2048,
+                         host_states_map[('host2', 'node2')].free_ram_mb)
+        self.assertEqual(1, mock_get_all.call_count)
+        changes_since = compute_nodes[0].updated_at - datetime.timedelta(
+            seconds=host_manager.HOST_STATE_SYNC_OVERLAP)
+        mock_get_all_changed.assert_called_once_with(context, changes_since)
+        mock_get_by_binary_changed.assert_called_once_with(
+            context, 'nova-compute', changes_since)
+
+        # third call: the watermark moved to the latest change
+        mock_get_all_changed.reset_mock()
+        mock_get_all_changed.return_value = []
+        self.host_manager.get_all_host_states(context)
+        mock_get_all_changed.assert_called_once_with(
+            context, changes_since + datetime.timedelta(minutes=1))
+
+    @mock.patch('nova.objects.ServiceList.get_by_binary_changed_since')
+    @mock.patch('nova.objects.ComputeNodeList.get_all_changed_since')
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_get_all_host_states_delta_sync_service_changed(
+            self, mock_get_by_filters, mock_get_all, mock_get_by_binary,
+            mock_get_all_changed, mock_get_by_binary_changed):
+        self.flags(scheduler_host_state_delta_sync=True)
+        now = timeutils.utcnow()
+        mock_get_by_filters.return_value = objects.InstanceList()
+        mock_get_all.return_value = self._get_delta_sync_compute_nodes(now)
+        mock_get_by_binary.return_value = fakes.SERVICES
+        context = 'fake_context'
+
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertTrue(
+            host_states_map[('host2', 'node2')].service['disabled'])
+
+        # host2 is enabled and host3 service is deleted
+        mock_get_all_changed.return_value = []
+        mock_get_by_binary_changed.return_value = [
+            objects.Service(host='host2', disabled=False, deleted=False,
+                            updated_at=now),
+            objects.Service(host='host3', disabled=False, deleted=True,
+                            deleted_at=now)]
+
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(3, len(host_states_map))
+        self.assertNotIn(('host3', 'node3'), host_states_map)
+        self.assertFalse(
+            host_states_map[('host2', 'node2')].service['disabled'])
+
+    @mock.patch('nova.objects.ServiceList.get_by_binary_changed_since')
+    @mock.patch('nova.objects.ComputeNodeList.get_all_changed_since')
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_get_all_host_states_delta_sync_full_sync(
+            self, mock_get_by_filters, mock_get_all, mock_get_by_binary,
+            mock_get_all_changed, mock_get_by_binary_changed):
+        self.flags(scheduler_host_state_delta_sync=True,
+                   scheduler_host_state_full_sync_interval=60)
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override()
+        mock_get_by_filters.return_value = objects.InstanceList()
+        mock_get_all.return_value = self._get_delta_sync_compute_nodes(
+            timeutils.utcnow())
+        mock_get_by_binary.return_value = fakes.SERVICES
+        mock_get_all_changed.return_value = []
+        mock_get_by_binary_changed.return_value = []
+        context = 'fake_context'
+
+        self.host_manager.get_all_host_states(context)
+        timeutils.advance_time_seconds(30)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(1, mock_get_all.call_count)
+        self.assertEqual(1, mock_get_all_changed.call_count)
+
+        timeutils.advance_time_seconds(31)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, mock_get_all.call_count)
+        self.assertEqual(1, mock_get_all_changed.call_count)
+
 
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
@@ -67,15 +67,15 @@ class IronicHostManagerTestCase(test.NoDBTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
-    @mock.patch('nova.objects.InstanceList.get_by_host')
-    def test_get_all_host_states(self, mock_get_by_host, mock_get_all,
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_get_all_host_states(self, mock_get_by_filters, mock_get_all,
                                  mock_get_by_binary):
         mock_get_all.return_value = ironic_fakes.COMPUTE_NODES
         mock_get_by_binary.return_value = ironic_fakes.SERVICES
         context = 'fake_context'
 
         self.host_manager.get_all_host_states(context)
-        self.assertEqual(0, mock_get_by_host.call_count)
+        self.assertEqual(0, mock_get_by_filters.call_count)
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 4)
 
@@ -124,7 +124,7 @@ class IronicHostManagerTestCase(test.NoDBTestCase):
 
         # for a non-ironic compute we call the base class implementation
         mock_get_instance_info.assert_called_once_with('fake_context',
-                                                       compute_node)
+                                                       compute_node, None)
         # we return exactly what the base class implementation returned
         self.assertIs(expected_rv, rv)
 
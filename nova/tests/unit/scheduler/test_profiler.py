@@ -0,0 +1,159 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler profiler.
+"""
+
+import fixtures
+import mock
+from oslo_concurrency import lockutils
+from oslo_config import fixture as config_fixture
+
+from nova import cache_utils
+from nova.scheduler import profiler
+from nova import test
+
+
+def _get_profile(elapsed, filters=(), weighers=()):
+    profile = profiler.RequestProfile()
+    for name, elapsed_ms, hosts_in, hosts_out in filters:
+        profile.add_filter(name, elapsed_ms / 1000.0, hosts_in, hosts_out)
+    for name, elapsed_ms, hosts in weighers:
+        profile.add_weigher(name, elapsed_ms / 1000.0, hosts)
+    profile.elapsed = elapsed / 1000.0
+    return profile
+
+
+class RequestProfileTestCase(test.NoDBTestCase):
+
+    def test_to_dict(self):
+        profile = _get_profile(30.0,
+                               filters=[('RamFilter', 2.0, 10, 8),
+                                        ('CoreFilter', 1.0, 8, 8),
+                                        ('RamFilter', 2.0, 8, 7)],
+                               weighers=[('RAMWeigher', 4.0, 7)])
+
+        self.assertEqual(
+            {'elapsed_ms': 30.0,
+             'filters': [{'name': 'RamFilter', 'calls': 2,
+                          'elapsed_ms': 4.0, 'hosts_in': 10,
+                          'hosts_out': 7},
+                         {'name': 'CoreFilter', 'calls': 1,
+                          'elapsed_ms': 1.0, 'hosts_in': 8,
+                          'hosts_out': 8}],
+             'weighers': [{'name': 'RAMWeigher', 'calls': 1,
+                           'elapsed_ms': 4.0, 'hosts_in': 7,
+                           'hosts_out': 7}]},
+            profile.to_dict())
+
+    @mock.patch('time.time')
+    def test_finish(self, mock_time):
+        mock_time.side_effect = [10.0, 10.5]
+        profile = profiler.RequestProfile()
+        profile.finish()
+        self.assertEqual(0.5, profile.elapsed)
+
+
+class StatsTestCase(test.NoDBTestCase):
+
+    def test_add_profile(self):
+        stats = {}
+        profiler.add_profile(stats, _get_profile(
+            30.0, filters=[('RamFilter', 0.5, 10, 8)]))
+        profiler.add_profile(stats, _get_profile(
+            6000.0, filters=[('RamFilter', 7.0, 10, 6)]))
+
+        self.assertEqual(['filter:RamFilter', 'request:total'],
+                         sorted(stats))
+        stat = stats['filter:RamFilter']
+        self.assertEqual(2, stat['requests'])
+        self.assertEqual(2, stat['calls'])
+        self.assertEqual(7.5, stat['elapsed_ms'])
+        self.assertEqual(7.0, stat['max_ms'])
+        self.assertEqual(20, stat['hosts_in'])
+        self.assertEqual(14, stat['hosts_out'])
+        # 0.5ms is in the first bucket and 7ms in the one below 10ms
+        self.assertEqual([1, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+                         stat['histogram'])
+        self.assertEqual([0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1],
+                         stats['request:total']['histogram'])
+
+    def test_merge_stats(self):
+        stats = {}
+        profiler.add_profile(stats, _get_profile(
+            30.0, filters=[('RamFilter', 0.5, 10, 8)]))
+        other_stats = {}
+        profiler.add_profile(other_stats, _get_profile(
+            3.0, filters=[('RamFilter', 1.5, 10, 9)],
+            weighers=[('RAMWeigher', 1.0, 9)]))
+
+        profiler.merge_stats(stats, other_stats)
+
+        self.assertEqual(['filter:RamFilter', 'request:total',
+                          'weigher:RAMWeigher'], sorted(stats))
+        stat = stats['filter:RamFilter']
+        self.assertEqual(2, stat['requests'])
+        self.assertEqual(2.0, stat['elapsed_ms'])
+        self.assertEqual(1.5, stat['max_ms'])
+        self.assertEqual(17, stat['hosts_out'])
+        self.assertEqual([1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+                         stat['histogram'])
+        self.assertEqual(1, stats['weigher:RAMWeigher']['requests'])
+
+
+class SchedulerProfilerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(SchedulerProfilerTestCase, self).setUp()
+        lock_path = self.useFixture(fixtures.TempDir()).path
+        self.useFixture(config_fixture.Config(lockutils.CONF)).config(
+            lock_path=lock_path, group='oslo_concurrency')
+        # The schedulers and nova-manage share the same cache
+        mc = cache_utils.get_client()
+        self.stub_out('nova.cache_utils.get_client',
+                      lambda expiration_time=0: mc)
+
+    @mock.patch('time.time')
+    def test_record_publishes_periodically(self, mock_time):
+        mock_time.return_value = 100.0
+        scheduler_profiler = profiler.SchedulerProfiler('host1')
+
+        scheduler_profiler.record(_get_profile(
+            3.0, filters=[('RamFilter', 1.0, 10, 9)]))
+        self.assertEqual({}, profiler.get_stats(['host1']))
+
+        mock_time.return_value = 100.0 + profiler.PUBLISH_INTERVAL
+        scheduler_profiler.record(_get_profile(
+            3.0, filters=[('RamFilter', 1.0, 10, 9)]))
+        stats = profiler.get_stats(['host1'])
+        self.assertEqual(2, stats['filter:RamFilter']['requests'])
+
+        # Only the new requests are added on the next publication
+        scheduler_profiler.record(_get_profile(3.0))
+        scheduler_profiler.publish()
+        stats = profiler.get_stats(['host1'])
+        self.assertEqual(2, stats['filter:RamFilter']['requests'])
+        self.assertEqual(3, stats['request:total']['requests'])
+
+    def test_get_and_reset_stats(self):
+        for host in ('host1', 'host2'):
+            scheduler_profiler = profiler.SchedulerProfiler(host)
+            scheduler_profiler.record(_get_profile(
+                3.0, filters=[('RamFilter', 1.0, 10, 9)]))
+            scheduler_profiler.publish()
+
+        stats = profiler.get_stats(['host1', 'host2', 'host3'])
+        self.assertEqual(2, stats['filter:RamFilter']['requests'])
+
+        profiler.reset_stats(['host1'])
+        stats = profiler.get_stats(['host1', 'host2'])
+        self.assertEqual(1, stats['filter:RamFilter']['requests'])
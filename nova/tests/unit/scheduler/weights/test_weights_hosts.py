@@ -16,8 +16,13 @@
 Tests For Scheduler weights.
 """
 
+import testtools
+
+from nova import objects
+from nova.scheduler import filters
 from nova.scheduler import weights
 from nova.scheduler.weights import affinity
+from nova.scheduler.weights import disk
 from nova.scheduler.weights import io_ops
 from nova.scheduler.weights import metrics
 from nova.scheduler.weights import ram
@@ -41,3 +46,61 @@ class TestWeighedHost(test.NoDBTestCase):
         self.assertIn(io_ops.IoOpsWeigher, classes)
         self.assertIn(affinity.ServerGroupSoftAffinityWeigher, classes)
         self.assertIn(affinity.ServerGroupSoftAntiAffinityWeigher, classes)
+
+
+@testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+class TestBatchHostWeightHandler(test.NoDBTestCase):
+    def setUp(self):
+        super(TestBatchHostWeightHandler, self).setUp()
+        self.weight_handler = weights.HostWeightHandler()
+
+    def _get_all_hosts(self):
+        host_values = [(512, 2048, 0, {}),
+                       (1024, 1024, 2, {'member1': None}),
+                       (1024, 1024, 2, {'member1': None}),
+                       (3072, 0, 1, {}),
+                       (256, 4096, 0, {'member1': None, 'member2': None}),
+                       (1024, 1024, 2, {'member1': None}),
+                       (8192, 512, 4, {})]
+        return [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                    {'free_ram_mb': ram_mb,
+                                     'free_disk_mb': disk_mb,
+                                     'num_io_ops': io_ops,
+                                     'instances': instances})
+                for i, (ram_mb, disk_mb, io_ops, instances)
+                in enumerate(host_values)]
+
+    def _get_weighed_hosts(self, batch):
+        self.flags(scheduler_batch_weighers=batch)
+        weighers = [ram.RAMWeigher(), disk.DiskWeigher(),
+                    io_ops.IoOpsWeigher(),
+                    affinity.ServerGroupSoftAffinityWeigher()]
+        request_spec = objects.RequestSpec(
+            instance_group=objects.InstanceGroup(
+                policies=['soft-affinity'],
+                members=['member1', 'member2']))
+        return [(weighed_host.obj.host, weighed_host.weight)
+                for weighed_host in self.weight_handler.get_weighed_objects(
+                    weighers, self._get_all_hosts(), request_spec)]
+
+    def test_get_weighed_objects(self):
+        self.flags(scheduler_host_subset_size=4)
+        expected = self._get_weighed_hosts(False)[:4]
+        self.assertEqual(expected, self._get_weighed_hosts(True))
+        # host1, host2 and host5 have the same weight, so the first ones are
+        # selected
+        self.assertEqual(['host4', 'host0', 'host1', 'host2'],
+                         [host for host, weight in expected])
+
+    def test_get_weighed_objects_all_hosts(self):
+        self.flags(scheduler_host_subset_size=10)
+        self.assertEqual(self._get_weighed_hosts(False),
+                         self._get_weighed_hosts(True))
+
+    def test_best_indexes(self):
+        numpy = filters.numpy
+        values = numpy.array([1.0, 3.0, 2.0, 3.0, 2.0, 0.0])
+        self.assertEqual([1, 3, 2],
+                         weights.best_indexes(values, 3).tolist())
+        self.assertEqual([1, 3, 2, 4, 0, 5],
+                         weights.best_indexes(values, 10).tolist())
@@ -13,6 +13,9 @@
 Tests For Scheduler IoOpsWeigher weights
 """
 
+import testtools
+
+from nova.scheduler import filters
 from nova.scheduler import weights
 from nova.scheduler.weights import io_ops
 from nova import test
@@ -66,3 +69,10 @@ class IoOpsWeigherTestCase(test.NoDBTestCase):
         self._do_test(io_ops_weight_multiplier=2.0,
                       expected_weight=2.0,
                       expected_host='host4')
+
+
+@testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+class BatchIoOpsWeigherTestCase(IoOpsWeigherTestCase):
+    def setUp(self):
+        super(BatchIoOpsWeigherTestCase, self).setUp()
+        self.flags(scheduler_batch_weighers=True)
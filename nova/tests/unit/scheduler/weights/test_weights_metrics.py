@@ -13,9 +13,12 @@
 Tests For Scheduler metrics weights.
 """
 
+import testtools
+
 from nova import exception
 from nova.objects import fields
 from nova.objects import monitor_metric
+from nova.scheduler import filters
 from nova.scheduler import weights
 from nova.scheduler.weights import metrics
 from nova import test
@@ -181,3 +184,10 @@ class MetricsWeigherTestCase(test.NoDBTestCase):
         self.flags(required=False, group='metrics')
         setting = [idle + '=0.0001', user + '=-1']
         self._do_test(setting, 1.0, 'host5')
+
+
+@testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+class BatchMetricsWeigherTestCase(MetricsWeigherTestCase):
+    def setUp(self):
+        super(BatchMetricsWeigherTestCase, self).setUp()
+        self.flags(scheduler_batch_weighers=True)
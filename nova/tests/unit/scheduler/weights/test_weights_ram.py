@@ -16,6 +16,9 @@
 Tests For Scheduler RAM weights.
 """
 
+import testtools
+
+from nova.scheduler import filters
 from nova.scheduler import weights
 from nova.scheduler.weights import ram
 from nova import test
@@ -109,3 +112,12 @@ class RamWeigherTestCase(test.NoDBTestCase):
         weighed_host = weights[-1]
         self.assertEqual(0, weighed_host.weight)
         self.assertEqual('negative', weighed_host.obj.host)
+
+
+@testtools.skipIf(filters.numpy is None, 'numpy is not installed')
+class BatchRamWeigherTestCase(RamWeigherTestCase):
+    def setUp(self):
+        super(BatchRamWeigherTestCase, self).setUp()
+        self.flags(scheduler_batch_weighers=True)
+        # NOTE: Some tests check the weight of the last host
+        self.flags(scheduler_host_subset_size=10)
@@ -27,6 +27,7 @@ from nova.db import migration
 from nova.db.sqlalchemy import migration as sqla_migration
 from nova import exception
 from nova import objects
+from nova.scheduler import profiler
 from nova import test
 from nova.tests.unit.db import fakes as db_fakes
 from nova.tests.unit import fake_instance
@@ -542,6 +543,55 @@ class ServiceCommandsTestCase(test.TestCase):
         self.assertEqual(2, self.commands.disable('nohost', 'noservice'))
 
 
+class SchedulerCommandsTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(SchedulerCommandsTestCase, self).setUp()
+        self.commands = manage.SchedulerCommands()
+        self.output = StringIO()
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', self.output))
+        self.stats = {}
+        profile = profiler.RequestProfile()
+        profile.add_filter('RamFilter', 0.004, 10, 6)
+        profile.add_weigher('RAMWeigher', 0.0015, 6)
+        profile.elapsed = 0.03
+        profiler.add_profile(self.stats, profile)
+
+    @mock.patch.object(profiler, 'get_stats')
+    @mock.patch.object(db, 'service_get_all_by_binary')
+    def test_profile(self, mock_get_services, mock_get_stats):
+        mock_get_services.return_value = [{'host': 'host1'},
+                                          {'host': 'host2'}]
+        mock_get_stats.return_value = self.stats
+
+        self.commands.profile(histogram=True)
+
+        mock_get_services.assert_called_once_with(mock.ANY, 'nova-scheduler',
+                                                  include_disabled=True)
+        mock_get_stats.assert_called_once_with(['host1', 'host2'])
+        lines = self.output.getvalue().splitlines()
+        self.assertEqual(['Type', 'Name', 'Requests', 'Calls', 'Avg', '(ms)',
+                          'Max', '(ms)', 'Hosts', 'in', 'Hosts', 'out'],
+                         lines[0].split())
+        self.assertEqual(['request', 'total', '1', '1', '30.00', '30.00',
+                          '0.0', '0.0'], lines[1].split())
+        self.assertEqual(['filter', 'RamFilter', '1', '1', '4.00', '4.00',
+                          '10.0', '6.0'], lines[2].split())
+        self.assertEqual(['weigher', 'RAMWeigher', '1', '1', '1.50', '1.50',
+                          '6.0', '6.0'], lines[3].split())
+        self.assertEqual(['RamFilter', '0', '0', '1', '0', '0', '0', '0',
+                          '0', '0', '0', '0', '0', '0'], lines[8].split())
+
+    @mock.patch.object(profiler, 'get_stats', return_value={})
+    def test_profile_host_no_stats(self, mock_get_stats):
+        self.assertEqual(1, self.commands.profile(host='host1'))
+        mock_get_stats.assert_called_once_with(['host1'])
+
+    @mock.patch.object(profiler, 'reset_stats')
+    def test_profile_reset(self, mock_reset_stats):
+        self.commands.profile_reset(host='host1')
+        mock_reset_stats.assert_called_once_with(['host1'])
+
+
 class CellCommandsTestCase(test.NoDBTestCase):
     def setUp(self):
         super(CellCommandsTestCase, self).setUp()
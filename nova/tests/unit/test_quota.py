@@ -16,6 +16,7 @@
 
 import datetime
 
+import mock
 from oslo_db.sqlalchemy import enginefacade
 from oslo_utils import timeutils
 from six.moves import range
@@ -2787,6 +2788,56 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.compare_reservation(result, reservations_list)
 
 
+class ConditionalUpdateQuotaDriverTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ConditionalUpdateQuotaDriverTestCase, self).setUp()
+        self.driver = quota.ConditionalUpdateQuotaDriver()
+        self.context = FakeContext('test_project', 'test_class')
+
+    @mock.patch.object(db, 'quota_reserve')
+    @mock.patch.object(db, 'quota_reserve_conditional',
+                       return_value=['resv-1'])
+    @mock.patch.object(quota.ConditionalUpdateQuotaDriver, '_get_quotas',
+                       return_value={'instances': 10})
+    @mock.patch.object(db, 'quota_get_all_by_project', return_value={})
+    def test_reserve(self, mock_get_all, mock_get_quotas, mock_reserve,
+                     mock_locking_reserve):
+        self.flags(until_refresh=500)
+        expire = timeutils.utcnow() + datetime.timedelta(seconds=120)
+
+        result = self.driver.reserve(self.context, quota.QUOTAS._resources,
+                                     dict(instances=2), expire=expire)
+
+        self.assertEqual(['resv-1'], result)
+        mock_reserve.assert_called_once_with(
+            self.context, quota.QUOTAS._resources, {'instances': 10},
+            {'instances': 10}, dict(instances=2), expire, 500, 0,
+            project_id='test_project', user_id='fake_user')
+        self.assertFalse(mock_locking_reserve.called)
+
+    @mock.patch.object(db, 'reservation_commit')
+    @mock.patch.object(db, 'reservation_commit_conditional')
+    def test_commit(self, mock_commit, mock_locking_commit):
+        self.driver.commit(self.context, ['resv-1'])
+        mock_commit.assert_called_once_with(self.context, ['resv-1'])
+        self.assertFalse(mock_locking_commit.called)
+
+    @mock.patch.object(db, 'reservation_rollback')
+    @mock.patch.object(db, 'reservation_rollback_conditional')
+    def test_rollback(self, mock_rollback, mock_locking_rollback):
+        self.driver.rollback(self.context, ['resv-1'], project_id='p1',
+                             user_id='u1')
+        mock_rollback.assert_called_once_with(self.context, ['resv-1'])
+        self.assertFalse(mock_locking_rollback.called)
+
+    @mock.patch.object(db, 'reservation_expire')
+    @mock.patch.object(db, 'reservation_expire_conditional')
+    def test_expire(self, mock_expire, mock_locking_expire):
+        self.driver.expire(self.context)
+        mock_expire.assert_called_once_with(self.context)
+        self.assertFalse(mock_locking_expire.called)
+
+
 class NoopQuotaDriverTestCase(test.TestCase):
     def setUp(self):
         super(NoopQuotaDriverTestCase, self).setUp()
@@ -72,3 +72,16 @@ class TestWeigher(test.NoDBTestCase):
         self.assertEqual(1, len(weighed_host))
         self.assertEqual('host1', weighed_host[0].obj.host)
         self.assertFalse(mock_weigh.called)
+
+    def test_get_weighed_objects_profile(self):
+        hostinfo = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                        {'free_ram_mb': 512 * i})
+                    for i in range(3)]
+        profile = mock.Mock()
+
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighed_hosts = weight_handler.get_weighed_objects(
+            [ram.RAMWeigher()], hostinfo, {}, profile=profile)
+
+        self.assertEqual('host2', weighed_hosts[0].obj.host)
+        profile.add_weigher.assert_called_once_with('RAMWeigher', mock.ANY, 3)
@@ -5370,6 +5370,27 @@ class LibvirtConnTestCase(test.NoDBTestCase):
         self.assertEqual(uuids[3], vm4.UUIDString())
         mock_list.assert_called_with(only_guests=True, only_running=False)
 
+    @mock.patch.object(libvirt_guest.Guest, "get_power_state")
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_power_states(self, mock_list, mock_power_state):
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(name="instance00000002")
+        vm3 = FakeVirtDomain(name="instance00000003")
+
+        mock_list.return_value = [vm1, vm2, vm3]
+        # The second domain is undefined after being listed
+        mock_power_state.side_effect = [
+            power_state.RUNNING,
+            exception.InstanceNotFound(instance_id=vm2.UUIDString()),
+            power_state.SHUTDOWN]
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        power_states = drvr.get_power_states()
+        self.assertEqual({vm1.UUIDString(): power_state.RUNNING,
+                          vm3.UUIDString(): power_state.SHUTDOWN},
+                         power_states)
+        mock_list.assert_called_once_with(only_guests=True,
+                                          only_running=False)
+
     @mock.patch('nova.virt.libvirt.host.Host.get_online_cpus')
     def test_get_host_vcpus(self, get_online_cpus):
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
@@ -166,6 +166,19 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_power_states(self):
+        """Return the power states of all the instances known to the
+        virtualization layer, in a single query of the hypervisor.
+
+        This lets the compute manager compare them with the database
+        without a get_info() call per instance. The instances which are
+        not known to the hypervisor are absent from the result.
+
+        :returns: a dict of the power states, from nova.compute.power_state,
+                  by instance uuid
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
@@ -873,6 +873,18 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return uuids
 
+    def get_power_states(self):
+        # NOTE: the domains are all listed with a single call, their state is
+        # then read from the returned handles without looking them up again.
+        power_states = {}
+        for guest in self._host.list_guests(only_running=False):
+            try:
+                power_states[guest.uuid] = guest.get_power_state(self._host)
+            except exception.InstanceNotFound:
+                # The domain was undefined since it was listed
+                continue
+        return power_states
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for vif in network_info:
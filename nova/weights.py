@@ -18,6 +18,7 @@ Pluggable Weighing support
 """
 
 import abc
+import time
 
 import six
 
@@ -121,14 +122,28 @@ class BaseWeigher(object):
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
-    def get_weighed_objects(self, weighers, obj_list, weighing_properties):
-        """Return a sorted (descending), normalized list of WeighedObjects."""
+    def get_weighed_objects(self, weighers, obj_list, weighing_properties,
+                            profile=None):
+        """Return a sorted (descending), normalized list of WeighedObjects.
+
+        If a profile is given, the time spent by each weigher and the number
+        of objects it weighed are added to it with its
+        add_weigher(name, elapsed, count) method.
+        """
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
 
         if len(weighed_objs) <= 1:
             return weighed_objs
 
+        self._weigh_objects(weighers, weighed_objs, weighing_properties,
+                            profile=profile)
+        return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
+    def _weigh_objects(self, weighers, weighed_objs, weighing_properties,
+                       profile=None):
+        """Add the normalized weights of each weigher to the WeighedObjects."""
         for weigher in weighers:
+            start_time = time.time()
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
             # Normalize the weights
@@ -139,5 +154,7 @@ class BaseWeightHandler(loadables.BaseLoader):
             for i, weight in enumerate(weights):
                 obj = weighed_objs[i]
                 obj.weight += weigher.weight_multiplier() * weight
-
-        return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+            if profile is not None:
+                profile.add_weigher(weigher.__class__.__name__,
+                                    time.time() - start_time,
+                                    len(weighed_objs))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the scheduler host states refresh.
+
+For an increasing number of compute nodes, this measures the number of
+compute node and service rows read from the database and the wall time spent
+in HostManager.get_all_host_states() for each scheduling request, with the
+full refresh and with the incremental one enabled by the
+'scheduler_host_state_delta_sync' option.
+
+The database is an in-memory sqlite one. Between two requests, the clock is
+advanced by --interval seconds, during which --changes compute nodes report a
+resource change and the services send their heartbeats every
+--report-interval seconds, like with the database servicegroup driver.
+
+Run like:
+
+    ./tools/benchmarks/host_state_sync.py --nodes 100,1000,3000
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import random
+import sys
+import time
+
+from oslo_utils import timeutils
+
+from nova import config
+from nova import context
+from nova import db
+from nova.db import migration
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova import objects
+from nova.scheduler import host_manager
+
+CONF = config.CONF
+CONF.import_opt('report_interval', 'nova.service')
+
+COUNTED_DB_CALLS = ['compute_node_get_all',
+                    'compute_node_get_all_changed_since',
+                    'service_get_all_by_binary',
+                    'service_get_all_by_binary_changed_since']
+
+
+class RowCounter(object):
+    """Counts the rows returned by the DB API calls reading the compute node
+    and service records.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        for name in COUNTED_DB_CALLS:
+            setattr(db, name, self._wrap(getattr(db, name)))
+
+    def _wrap(self, func):
+        def counted(*args, **kwargs):
+            result = func(*args, **kwargs)
+            self.rows += len(result)
+            return result
+        return counted
+
+
+def setup_database():
+    config.parse_args([sys.argv[0]], default_config_files=[],
+                      configure_db=False, init_rpc=False)
+    CONF.set_override('connection', 'sqlite://', group='database')
+    CONF.set_override('sqlite_synchronous', False, group='database')
+    sqlalchemy_api.configure(CONF)
+    migration.db_sync()
+    objects.register_all()
+
+
+def create_hosts(ctxt, offset, count):
+    created_at = timeutils.utcnow() - datetime.timedelta(hours=1)
+    services = []
+    for i in range(offset, offset + count):
+        host = 'host%d' % i
+        services.append(db.service_create(ctxt, {
+            'host': host, 'binary': 'nova-compute', 'topic': 'compute',
+            'report_count': 0, 'created_at': created_at}))
+        db.compute_node_create(ctxt, {
+            'host': host, 'hypervisor_hostname': 'node%d' % i,
+            'service_id': services[-1]['id'], 'created_at': created_at,
+            'vcpus': 32, 'memory_mb': 262144, 'local_gb': 2048,
+            'vcpus_used': 0, 'memory_mb_used': 0, 'local_gb_used': 0,
+            'free_ram_mb': 262144, 'free_disk_gb': 2048,
+            'disk_available_least': 2048, 'running_vms': 0,
+            'current_workload': 0, 'hypervisor_type': 'QEMU',
+            'hypervisor_version': 2005000, 'cpu_info': '{}',
+            'host_ip': '10.0.0.1', 'supported_instances': '[]',
+            'pci_stats': None, 'metrics': '[]', 'stats': '{}',
+            'numa_topology': None, 'cpu_allocation_ratio': 16.0,
+            'ram_allocation_ratio': 1.5, 'disk_allocation_ratio': 1.0})
+    return services
+
+
+def simulate_activity(ctxt, services, nodes, tick, args):
+    """Simulates the compute services activity during a request interval."""
+    for _ in range(args.interval):
+        tick += 1
+        timeutils.advance_time_seconds(1)
+        for service in services[tick % args.report_interval::
+                                args.report_interval]:
+            db.service_update(ctxt, service['id'], {'report_count': tick})
+        for node in random.sample(nodes, min(args.changes, len(nodes))):
+            db.compute_node_update(ctxt, node['id'],
+                                   {'vcpus_used': tick % 32})
+    return tick
+
+
+def run(ctxt, counter, services, delta_sync, args):
+    CONF.set_override('scheduler_host_state_delta_sync', delta_sync)
+    hm = host_manager.HostManager()
+    hm._instance_info = {service['host']: {'instances': {}, 'updated': True}
+                         for service in services}
+    nodes = db.compute_node_get_all(ctxt)
+    # The first request always does a full refresh
+    list(hm.get_all_host_states(ctxt))
+
+    tick = 0
+    rows = 0
+    elapsed = 0.0
+    for _ in range(args.requests):
+        tick = simulate_activity(ctxt, services, nodes, tick, args)
+        counter.rows = 0
+        start = time.time()
+        list(hm.get_all_host_states(ctxt))
+        elapsed += time.time() - start
+        rows += counter.rows
+    return float(rows) / args.requests, elapsed * 1000 / args.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nodes', default='100,500,1000,3000',
+                        help='Comma-separated numbers of compute nodes')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='Number of scheduling requests measured')
+    parser.add_argument('--interval', type=int, default=1,
+                        help='Seconds elapsed between two requests')
+    parser.add_argument('--changes', type=int, default=10,
+                        help='Compute nodes updated per second')
+    parser.add_argument('--report-interval', type=int, default=10,
+                        help='Seconds between two service heartbeats')
+    args = parser.parse_args()
+
+    setup_database()
+    CONF.set_override('scheduler_tracks_instance_changes', False)
+    ctxt = context.get_admin_context()
+    counter = RowCounter()
+    timeutils.set_time_override()
+
+    print('%8s %8s %14s %14s' % ('nodes', 'mode', 'rows/request',
+                                 'ms/request'))
+    services = []
+    for count in sorted(int(n) for n in args.nodes.split(',')):
+        services += create_hosts(ctxt, len(services), count - len(services))
+        for delta_sync in (False, True):
+            rows, msecs = run(ctxt, counter, services, delta_sync, args)
+            print('%8d %8s %14.1f %14.2f' % (
+                count, 'delta' if delta_sync else 'full', rows, msecs))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
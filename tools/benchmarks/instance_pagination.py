@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the pagination of the instances listings.
+
+This synthesizes instances, a part of them soft-deleted, in a sqlite database
+by default or in the MySQL database given with --connection, and runs the
+queries of instance_get_all_by_filters_sort() for the first and deep pages of
+the listings of all the instances and of the instances of a project, and for
+the polling of the instances which changed since a date. It reports the
+latency of each query along with the query plan of the database: whether the
+instances table is searched through an index, or scanned, and whether the
+rows are sorted after being selected.
+
+To catch regressions of the query plans, save the results of a baseline run
+with --output, and compare another run against it with --compare, which exits
+with an error status when a query scans more of the instances table than in
+the baseline, searches a shorter index key, starts sorting its rows, or is
+more than --tolerance percent slower.
+
+Run like:
+
+    ./tools/benchmarks/instance_pagination.py --instances 1000000 \\
+        --output base.json
+    ./tools/benchmarks/instance_pagination.py --instances 1000000 \\
+        --compare base.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import random
+import sys
+import time
+
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+from oslo_utils import uuidutils
+import sqlalchemy
+from sqlalchemy import event
+
+from nova.compute import vm_states
+from nova import config
+from nova import context
+from nova.db import migration
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import models
+
+CONF = config.CONF
+
+# The instances are created over this period before the run
+CREATION_PERIOD = datetime.timedelta(days=365)
+INSERT_BATCH_SIZE = 10000
+
+# Ways a query reads the instances table, from the cheapest
+SEEK = 'seek'
+INDEX_SCAN = 'index scan'
+TABLE_SCAN = 'table scan'
+ACCESS_RANKS = {SEEK: 0, INDEX_SCAN: 1, TABLE_SCAN: 2}
+
+
+def setup(args):
+    config.parse_args([sys.argv[0]], default_config_files=[],
+                      configure_db=False, init_rpc=False)
+    CONF.set_override('connection', args.connection, group='database')
+    CONF.set_override('sqlite_synchronous', False, group='database')
+    sqlalchemy_api.configure(CONF)
+    migration.db_sync()
+    return sqlalchemy_api.get_engine()
+
+
+def create_instances(engine, args, now):
+    """Inserts the synthesized instances, returning the project of the
+    listings of a project.
+    """
+    table = models.Instance.__table__
+    project_ids = ['project%d' % i for i in range(args.projects)]
+    start = now - CREATION_PERIOD
+    period = CREATION_PERIOD.total_seconds()
+    rows = []
+    for inst_id in range(1, args.instances + 1):
+        # The instances are created in order, a few of them at the same time
+        created_at = start + datetime.timedelta(
+            seconds=int(period * inst_id / args.instances))
+        updated_at = created_at + datetime.timedelta(
+            seconds=random.uniform(0, (now - created_at).total_seconds()))
+        deleted = random.random() < args.deleted_ratio
+        rows.append({
+            'id': inst_id,
+            'uuid': uuidutils.generate_uuid(),
+            'project_id': random.choice(project_ids),
+            'user_id': 'user',
+            'display_name': 'instance-%d' % inst_id,
+            'host': 'host%d' % (inst_id % 1000),
+            'node': 'node%d' % (inst_id % 1000),
+            'vm_state': (vm_states.DELETED if deleted else
+                         random.choice([vm_states.ACTIVE, vm_states.STOPPED,
+                                        vm_states.SOFT_DELETED])),
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'deleted_at': updated_at if deleted else None,
+            'deleted': inst_id if deleted else 0,
+            'cleaned': 1 if deleted else 0,
+        })
+        if len(rows) == INSERT_BATCH_SIZE:
+            engine.execute(table.insert(), rows)
+            rows = []
+    if rows:
+        engine.execute(table.insert(), rows)
+    return project_ids[0]
+
+
+def get_marker(engine, depth, project_id=None):
+    """Returns the uuid of the instance at depth in the default order of the
+    listings of the instances which are not deleted.
+    """
+    table = models.Instance.__table__
+    query = sqlalchemy.select([table.c.uuid]).\
+        where(table.c.deleted == 0).\
+        where(sqlalchemy.or_(table.c.vm_state != vm_states.SOFT_DELETED,
+                             table.c.vm_state == sqlalchemy.null())).\
+        order_by(table.c.created_at.desc(), table.c.id.desc()).\
+        offset(depth).limit(1)
+    if project_id is not None:
+        query = query.where(table.c.project_id == project_id)
+    row = engine.execute(query).first()
+    return row[0] if row else None
+
+
+def get_scenarios(engine, args, project_id, now):
+    admin_ctxt = context.get_admin_context()
+    project_ctxt = context.RequestContext('user', project_id, is_admin=False)
+    not_deleted = {'deleted': False}
+    changes_since = {'changes-since': now - datetime.timedelta(
+        seconds=args.changes_since)}
+    return [
+        ('all_first_page', admin_ctxt, not_deleted, None),
+        ('all_deep_page', admin_ctxt, not_deleted,
+         get_marker(engine, args.depth)),
+        ('project_first_page', project_ctxt, not_deleted, None),
+        ('project_deep_page', project_ctxt, not_deleted,
+         get_marker(engine, args.depth // args.projects, project_id)),
+        ('changes_since', admin_ctxt, changes_since, None),
+    ]
+
+
+class StatementRecorder(object):
+    """Records the queries of the instances table run by the engine."""
+
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self.record)
+
+    def record(self, conn, cursor, statement, parameters, context,
+               executemany):
+        if (statement.lstrip().upper().startswith('SELECT') and
+                'FROM instances' in statement):
+            self.statements.append((statement, parameters))
+
+
+def explain(engine, statement, parameters):
+    """Returns the query plan of a statement, how it reads the instances
+    table and whether it sorts its rows.
+
+    The key length is the length of the index key searched, in columns for
+    sqlite and in bytes for MySQL: the longer the key, the fewer rows are
+    read.
+    """
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        if engine.name == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            plan = [row[-1] for row in cursor.fetchall()]
+        else:
+            cursor.execute('EXPLAIN ' + statement, parameters)
+            names = [column[0] for column in cursor.description]
+            plan = [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+    if engine.name == 'sqlite':
+        details = [step for step in plan if ' instances' in step]
+        key_length = sum(step.partition('(')[2].count('?')
+                         for step in details if step.startswith('SEARCH'))
+        if any(step.startswith('SEARCH') for step in details):
+            access = SEEK
+        elif any('USING' in step for step in details):
+            access = INDEX_SCAN
+        else:
+            access = TABLE_SCAN
+        sorted_rows = any('TEMP B-TREE' in step for step in plan)
+        plan = '; '.join(plan)
+    else:
+        steps = [step for step in plan if step['table'] == 'instances']
+        types = set(step['type'] for step in steps)
+        if 'ALL' in types:
+            access = TABLE_SCAN
+        elif 'index' in types:
+            access = INDEX_SCAN
+        else:
+            access = SEEK
+        sorted_rows = any('filesort' in (step['Extra'] or '')
+                          for step in steps)
+        key_length = sum(int(step['key_len'] or 0) for step in steps)
+        plan = '; '.join('%s %s %s' % (step['type'], step['key'],
+                                       step['Extra'] or '')
+                         for step in steps)
+    return {'plan': plan, 'access': access, 'key_length': key_length,
+            'sorted': sorted_rows}
+
+
+def run(engine, scenarios, args):
+    recorder = StatementRecorder(engine)
+    results = {}
+    for name, ctxt, filters, marker in scenarios:
+        latencies = []
+        for i in range(args.repeat):
+            del recorder.statements[:]
+            start = time.time()
+            instances = sqlalchemy_api.instance_get_all_by_filters_sort(
+                ctxt, filters, limit=args.page_size, marker=marker,
+                columns_to_join=[])
+            latencies.append((time.time() - start) * 1000)
+        latencies.sort()
+        result = explain(engine, *recorder.statements[-1])
+        result['latency_ms'] = latencies[len(latencies) // 2]
+        result['instances'] = len(instances)
+        results[name] = result
+    return results
+
+
+def report(results):
+    print('%-20s %10s %10s %-12s %4s %s' % ('Query', 'Instances', 'ms',
+                                             'Access', 'Key', 'Sorted'))
+    for name, result in sorted(results.items()):
+        print('%-20s %10d %10.2f %-12s %4d %s' % (
+            name, result['instances'], result['latency_ms'],
+            result['access'], result['key_length'],
+            'yes' if result['sorted'] else 'no'))
+    print()
+    print('Query plans:')
+    for name, result in sorted(results.items()):
+        print('  %-20s %s' % (name, result['plan']))
+
+
+def compare(results, baseline, tolerance):
+    """Prints the changes from the baseline, returning False if a query plan
+    got worse or a query got more than tolerance percent slower.
+    """
+    print()
+    print('Compared to the baseline:')
+    passed = True
+    for name, result in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        regressions = []
+        if ACCESS_RANKS[result['access']] > ACCESS_RANKS[before['access']]:
+            regressions.append('%s instead of %s' % (result['access'],
+                                                     before['access']))
+        elif (result['access'] == before['access'] and
+                result['key_length'] < before['key_length']):
+            regressions.append('shorter key')
+        if result['sorted'] and not before['sorted']:
+            regressions.append('sorted')
+        change = ((result['latency_ms'] - before['latency_ms']) /
+                  before['latency_ms'] * 100 if before['latency_ms'] else 0.0)
+        if change > tolerance:
+            regressions.append('slower')
+        passed = passed and not regressions
+        print('  %-20s %10.2f -> %10.2f  %+7.1f%%%s' % (
+            name, before['latency_ms'], result['latency_ms'], change,
+            '  REGRESSION: %s' % ', '.join(regressions)
+            if regressions else ''))
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--connection', default='sqlite://',
+                        help='Database to synthesize the instances in, an '
+                             'in-memory sqlite database by default')
+    parser.add_argument('--instances', type=int, default=200000,
+                        help='Number of instances')
+    parser.add_argument('--deleted-ratio', type=float, default=0.5,
+                        help='Ratio of the instances which are deleted')
+    parser.add_argument('--projects', type=int, default=100,
+                        help='Number of projects')
+    parser.add_argument('--page-size', type=int, default=1000,
+                        help='Number of instances per page')
+    parser.add_argument('--depth', type=int, default=50000,
+                        help='Number of instances before the marker of the '
+                             'deep pages of all the instances, divided by '
+                             'the number of projects for a project')
+    parser.add_argument('--changes-since', type=int, default=3600,
+                        help='Seconds before now of the changes-since date')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of runs of each query, the median '
+                             'latency being reported')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the synthesized instances')
+    parser.add_argument('--output', help='Save the results to this JSON file')
+    parser.add_argument('--compare',
+                        help='Compare the results with the ones saved in '
+                             'this JSON file')
+    parser.add_argument('--tolerance', type=float, default=20.0,
+                        help='Latency increase, in percent, over which '
+                             '--compare reports a regression')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    engine = setup(args)
+    now = timeutils.utcnow()
+    project_id = create_instances(engine, args, now)
+    scenarios = get_scenarios(engine, args, project_id, now)
+
+    results = run(engine, scenarios, args)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(jsonutils.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = jsonutils.loads(f.read())
+        if not compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the scheduler placement.
+
+This synthesizes compute nodes with NUMA topologies, PCI device pools,
+aggregates and instances in an in-memory sqlite database, and replays a trace
+of scheduling requests through FilterScheduler.select_destinations() with the
+configured filters and weighers. It reports the latency percentiles of the
+requests, the time spent by each filter and weigher, and the quality of the
+resulting placement.
+
+The trace is a JSON list of requests using the flavors defined in FLAVORS,
+like:
+
+    [{"flavor": "m1.small", "num_instances": 2, "project_id": "project1",
+      "image_properties": {"hw_vm_mode": "hvm"}}]
+
+A trace is synthesized from the --seed when none is given with --trace, and
+can be saved with --save-trace. Any scheduler option can be set with --set.
+
+To catch performance regressions, save the results of a baseline run with
+--output, and compare another run against it with --compare, which exits with
+an error status when a latency percentile is more than --tolerance percent
+higher than in the baseline.
+
+Run like:
+
+    ./tools/benchmarks/scheduler_placement.py --hosts 1000 --output base.json
+    ./tools/benchmarks/scheduler_placement.py --hosts 1000 \\
+        --set scheduler_batch_filters=True --compare base.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import math
+import random
+import sys
+import time
+
+from oslo_messaging import conffixture as messaging_conffixture
+from oslo_serialization import jsonutils
+from oslo_utils import uuidutils
+
+from nova import config
+from nova import context
+from nova.db import migration
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova import exception
+from nova import objects
+from nova.objects import fields
+from nova.pci import request as pci_request
+from nova import rpc
+from nova.scheduler import filter_scheduler
+from nova.scheduler import profiler
+from nova.virt import hardware
+
+CONF = config.CONF
+CONF.import_opt('report_interval', 'nova.service')
+
+# Name: (vcpus, memory_mb, root_gb, extra_specs, weight in synthesized traces)
+FLAVORS = {
+    'm1.small': (1, 2048, 20, {}, 30),
+    'm1.medium': (2, 4096, 40, {}, 25),
+    'm1.large': (4, 8192, 80, {}, 15),
+    'm1.xlarge': (8, 16384, 160, {}, 5),
+    'numa.large': (8, 16384, 80, {'hw:numa_nodes': '2'}, 10),
+    'ssd.medium': (2, 4096, 40,
+                   {'aggregate_instance_extra_specs:ssd': 'true'}, 10),
+    'gpu.large': (8, 16384, 80, {'pci_passthrough:alias': 'gpu:1'}, 5),
+}
+
+GPU_ALIAS = {'name': 'gpu', 'vendor_id': '10de', 'product_id': '1eb8'}
+
+DEFAULT_FILTERS = ['RetryFilter', 'AvailabilityZoneFilter', 'RamFilter',
+                   'DiskFilter', 'CoreFilter', 'ComputeFilter',
+                   'ImagePropertiesFilter',
+                   'AggregateInstanceExtraSpecsFilter',
+                   'AggregateMultiTenancyIsolation', 'NUMATopologyFilter',
+                   'PciPassthroughFilter', 'ServerGroupAntiAffinityFilter',
+                   'ServerGroupAffinityFilter']
+
+PERCENTILES = (50, 90, 99)
+
+# Resources of the synthesized compute nodes
+NUMA_CELLS = 2
+CPUS_PER_CELL = 16
+MEMORY_PER_CELL = 65536
+LOCAL_GB = 2048
+
+
+class LocalProfiler(object):
+    """Aggregates the profiles of the requests in place of the
+    SchedulerProfiler, which publishes them to the cache.
+    """
+
+    def __init__(self):
+        self.stats = {}
+
+    def record(self, profile):
+        profiler.add_profile(self.stats, profile)
+
+
+def setup(args):
+    config.parse_args([sys.argv[0]], default_config_files=[],
+                      configure_db=False, init_rpc=False)
+    CONF.set_override('connection', 'sqlite://', group='database')
+    CONF.set_override('sqlite_synchronous', False, group='database')
+    sqlalchemy_api.configure(CONF)
+    migration.db_sync()
+    objects.register_all()
+    # The notifications of the scheduler go to the fake driver
+    messaging_conf = messaging_conffixture.ConfFixture(CONF)
+    messaging_conf.setUp()
+    messaging_conf.transport_driver = 'fake'
+    rpc.init(CONF)
+
+    CONF.set_override('pci_alias', [jsonutils.dumps(GPU_ALIAS)])
+    CONF.set_override('scheduler_default_filters', args.filters.split(','))
+    CONF.set_override('scheduler_weight_classes', args.weighers.split(','))
+    CONF.set_override('scheduler_tracks_instance_changes', False)
+    for option in args.set:
+        name, _sep, value = option.partition('=')
+        CONF.set_override(name, value, enforce_type=True)
+
+
+def _numa_topology():
+    cells = [objects.NUMACell(id=i,
+                              cpuset=set(range(i * CPUS_PER_CELL,
+                                               (i + 1) * CPUS_PER_CELL)),
+                              memory=MEMORY_PER_CELL, cpu_usage=0,
+                              memory_usage=0, mempages=[], siblings=[],
+                              pinned_cpus=set())
+             for i in range(NUMA_CELLS)]
+    return objects.NUMATopology(cells=cells)._to_json()
+
+
+def _pci_device_pools(gpus):
+    pools = []
+    if gpus:
+        pools.append(objects.PciDevicePool(
+            vendor_id=GPU_ALIAS['vendor_id'],
+            product_id=GPU_ALIAS['product_id'], numa_node=0,
+            tags={'dev_type': fields.PciDeviceType.STANDARD}, count=gpus))
+    return objects.PciDevicePoolList(objects=pools)
+
+
+def create_hosts(ctxt, args):
+    """Creates the compute nodes and their services, returning the instances
+    already running on each host, keyed by host.
+    """
+    vcpus = NUMA_CELLS * CPUS_PER_CELL
+    memory_mb = NUMA_CELLS * MEMORY_PER_CELL
+    plain_flavors = [name for name, flavor in FLAVORS.items()
+                     if not flavor[3]]
+    instances_by_host = {}
+    for i in range(args.hosts):
+        host = 'host%d' % i
+        service = objects.Service(ctxt, host=host, binary='nova-compute',
+                                  topic='compute', report_count=0)
+        service.create()
+
+        # Existing instances use a random part of the host resources
+        instances = {}
+        vcpus_used = memory_mb_used = local_gb_used = 0
+        for _ in range(random.randint(0, 2 * args.instances_per_host)):
+            flavor = FLAVORS[random.choice(plain_flavors)]
+            if (vcpus_used + flavor[0] > vcpus or
+                    memory_mb_used + flavor[1] > memory_mb):
+                break
+            vcpus_used += flavor[0]
+            memory_mb_used += flavor[1]
+            local_gb_used += flavor[2]
+            instance = objects.Instance(
+                uuid=uuidutils.generate_uuid(), host=host, node=host,
+                project_id='project%d' % random.randrange(args.projects))
+            instances[instance.uuid] = instance
+        instances_by_host[host] = instances
+
+        gpus = 2 if random.random() < args.gpu_ratio else 0
+        objects.ComputeNode(
+            ctxt, host=host, hypervisor_hostname=host, service_id=service.id,
+            vcpus=vcpus, memory_mb=memory_mb, local_gb=LOCAL_GB,
+            vcpus_used=vcpus_used, memory_mb_used=memory_mb_used,
+            local_gb_used=local_gb_used,
+            free_ram_mb=memory_mb - memory_mb_used,
+            free_disk_gb=LOCAL_GB - local_gb_used,
+            disk_available_least=LOCAL_GB - local_gb_used,
+            running_vms=len(instances), current_workload=0,
+            hypervisor_type='QEMU', hypervisor_version=2005000,
+            cpu_info='{}', host_ip='10.0.%d.%d' % (i // 256, i % 256),
+            supported_hv_specs=[objects.HVSpec.from_list(
+                ['x86_64', 'kvm', 'hvm'])],
+            pci_device_pools=_pci_device_pools(gpus), metrics='[]',
+            stats={'num_instances': str(len(instances))},
+            numa_topology=_numa_topology(), cpu_allocation_ratio=4.0,
+            ram_allocation_ratio=1.5, disk_allocation_ratio=1.0).create()
+    return instances_by_host
+
+
+def create_aggregates(ctxt, args):
+    """Splits the hosts in aggregates, every other one having SSDs, the last
+    one being isolated for a tenant.
+    """
+    hosts = ['host%d' % i for i in range(args.hosts)]
+    size = int(math.ceil(float(len(hosts)) / args.aggregates))
+    for i in range(args.aggregates):
+        metadata = {'ssd': 'true' if i % 2 == 0 else 'false',
+                    'rack': 'rack%d' % i}
+        if i == args.aggregates - 1 and i > 0:
+            metadata['filter_tenant_id'] = 'project0'
+        aggregate = objects.Aggregate(ctxt, name='aggregate%d' % i,
+                                      metadata=metadata)
+        aggregate.create()
+        for host in hosts[i * size:(i + 1) * size]:
+            aggregate.add_host(host)
+
+
+def synthesize_trace(args):
+    names = sorted(FLAVORS)
+    weights = [FLAVORS[name][4] for name in names]
+    trace = []
+    for _ in range(args.requests):
+        num_instances = 1
+        if random.random() < args.multi_ratio:
+            num_instances = random.randint(2, args.max_instances)
+        trace.append({
+            'flavor': _weighted_choice(names, weights),
+            'num_instances': num_instances,
+            'project_id': 'project%d' % random.randrange(args.projects),
+            'image_properties': {}})
+    return trace
+
+
+def _weighted_choice(names, weights):
+    point = random.uniform(0, sum(weights))
+    for name, weight in zip(names, weights):
+        point -= weight
+        if point <= 0:
+            return name
+    return names[-1]
+
+
+def _get_flavors():
+    flavors = {}
+    for i, (name, flavor) in enumerate(sorted(FLAVORS.items())):
+        vcpus, memory_mb, root_gb, extra_specs, _weight = flavor
+        flavors[name] = objects.Flavor(
+            id=i + 1, flavorid=str(i + 1), name=name, vcpus=vcpus,
+            memory_mb=memory_mb, root_gb=root_gb, ephemeral_gb=0, swap=0,
+            rxtx_factor=1.0, vcpu_weight=0, disabled=False, is_public=True,
+            extra_specs=dict(extra_specs))
+    return flavors
+
+
+def build_request_spec(ctxt, flavor, request):
+    image = objects.ImageMeta(properties=objects.ImageMetaProps(
+        **request.get('image_properties', {})))
+    request_ctxt = context.RequestContext('admin', request['project_id'],
+                                          is_admin=True)
+    spec_obj = objects.RequestSpec.from_components(
+        request_ctxt, uuidutils.generate_uuid(), image, flavor,
+        hardware.numa_get_constraints(flavor, image),
+        pci_request.get_pci_requests_from_flavor(flavor), {}, None, None)
+    spec_obj.num_instances = request['num_instances']
+    return spec_obj
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[max(index, 0)]
+
+
+def placement_quality(host_states, placed_by_host, flavors):
+    """Returns metrics of the placement quality of the host states."""
+    ram_usage = [1.0 - float(host_state.free_ram_mb) /
+                 host_state.total_usable_ram_mb
+                 for host_state in host_states]
+    mean = sum(ram_usage) / len(ram_usage)
+    stddev = math.sqrt(sum((usage - mean) ** 2 for usage in ram_usage) /
+                       len(ram_usage))
+    largest = max(flavors.values(), key=lambda flavor: flavor.memory_mb)
+    fitting = [host_state for host_state in host_states
+               if host_state.free_ram_mb >= largest.memory_mb and
+               host_state.free_disk_mb >= largest.root_gb * 1024]
+    return {'hosts_used': len(placed_by_host),
+            'max_instances_per_host': max(placed_by_host.values() or [0]),
+            'ram_usage_mean': mean,
+            'ram_usage_stddev': stddev,
+            'hosts_fitting_largest_flavor': len(fitting)}
+
+
+def run(ctxt, trace, instances_by_host):
+    scheduler = filter_scheduler.FilterScheduler()
+    scheduler.profiler = LocalProfiler()
+    host_manager = scheduler.host_manager
+    host_manager.tracks_instance_changes = True
+    host_manager._instance_info = {
+        host: {'instances': instances, 'updated': True}
+        for host, instances in instances_by_host.items()}
+
+    start = time.time()
+    list(host_manager.get_all_host_states(ctxt))
+    initial_load = time.time() - start
+
+    flavors = _get_flavors()
+    latencies = []
+    failures = 0
+    placed = 0
+    placed_by_host = collections.Counter()
+    for request in trace:
+        spec_obj = build_request_spec(ctxt, flavors[request['flavor']],
+                                      request)
+        start = time.time()
+        try:
+            dests = scheduler.select_destinations(ctxt, spec_obj)
+        except exception.NoValidHost:
+            failures += 1
+            dests = []
+        latencies.append((time.time() - start) * 1000)
+        placed += len(dests)
+        for dest in dests:
+            placed_by_host[dest['host']] += 1
+
+    requests = len(trace)
+    per_request = collections.OrderedDict()
+    for stat in sorted(scheduler.profiler.stats.values(),
+                       key=lambda stat: -stat['elapsed_ms']):
+        if stat['type'] == profiler.REQUEST:
+            continue
+        per_request['%s:%s' % (stat['type'], stat['name'])] = (
+            stat['elapsed_ms'] / requests)
+
+    quality = placement_quality(list(host_manager.host_state_map.values()),
+                                placed_by_host, flavors)
+    quality.update({'requests': requests, 'failed_requests': failures,
+                    'instances_placed': placed})
+    latency = {'p%d' % pct: percentile(latencies, pct)
+               for pct in PERCENTILES}
+    latency['mean'] = sum(latencies) / max(requests, 1)
+    latency['max'] = max(latencies or [0.0])
+    return {'initial_load_ms': initial_load * 1000,
+            'latency_ms': latency,
+            'cost_ms_per_request': per_request,
+            'quality': quality}
+
+
+def report(results):
+    print('Initial host states load: %.1f ms' % results['initial_load_ms'])
+    print()
+    print('Request latency (ms):')
+    latency = results['latency_ms']
+    for name in ['p%d' % pct for pct in PERCENTILES] + ['mean', 'max']:
+        print('  %-8s %10.2f' % (name, latency[name]))
+    print()
+    print('Cost per request (ms):')
+    for name, cost in results['cost_ms_per_request'].items():
+        print('  %-50s %10.3f' % (name, cost))
+    print()
+    print('Placement quality:')
+    for name, value in sorted(results['quality'].items()):
+        print('  %-30s %10s' % (name, ('%.3f' % value
+                                       if isinstance(value, float)
+                                       else value)))
+
+
+def compare(results, baseline, tolerance):
+    """Prints the latency changes from the baseline, returning False if one
+    of the percentiles regressed by more than tolerance percent.
+    """
+    print()
+    print('Latency compared to the baseline:')
+    passed = True
+    for name in ['p%d' % pct for pct in PERCENTILES]:
+        before = baseline['latency_ms'][name]
+        after = results['latency_ms'][name]
+        change = (after - before) / before * 100 if before else 0.0
+        regressed = change > tolerance
+        passed = passed and not regressed
+        print('  %-8s %10.2f -> %10.2f  %+7.1f%%%s' % (
+            name, before, after, change, '  REGRESSION' if regressed else ''))
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--hosts', type=int, default=500,
+                        help='Number of compute nodes')
+    parser.add_argument('--aggregates', type=int, default=10,
+                        help='Number of host aggregates')
+    parser.add_argument('--instances-per-host', type=int, default=10,
+                        help='Mean number of instances already running on '
+                             'each host')
+    parser.add_argument('--gpu-ratio', type=float, default=0.1,
+                        help='Ratio of the hosts with GPUs')
+    parser.add_argument('--projects', type=int, default=10,
+                        help='Number of projects')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='Number of requests of a synthesized trace')
+    parser.add_argument('--multi-ratio', type=float, default=0.1,
+                        help='Ratio of the requests for several instances '
+                             'in a synthesized trace')
+    parser.add_argument('--max-instances', type=int, default=5,
+                        help='Maximum number of instances of a request in a '
+                             'synthesized trace')
+    parser.add_argument('--trace', help='JSON file of the requests to replay')
+    parser.add_argument('--save-trace', help='Save the replayed requests to '
+                                             'this JSON file')
+    parser.add_argument('--filters', default=','.join(DEFAULT_FILTERS),
+                        help='Comma-separated scheduler filters')
+    parser.add_argument('--weighers',
+                        default='nova.scheduler.weights.all_weighers',
+                        help='Comma-separated scheduler weigher classes')
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='OPTION=VALUE',
+                        help='Set a scheduler option, can be repeated')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the synthesized hosts and trace')
+    parser.add_argument('--output', help='Save the results to this JSON file')
+    parser.add_argument('--compare',
+                        help='Compare the latency with the results saved in '
+                             'this JSON file')
+    parser.add_argument('--tolerance', type=float, default=20.0,
+                        help='Latency increase, in percent, over which '
+                             '--compare reports a regression')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    setup(args)
+    ctxt = context.get_admin_context()
+    instances_by_host = create_hosts(ctxt, args)
+    create_aggregates(ctxt, args)
+
+    if args.trace:
+        with open(args.trace) as f:
+            trace = jsonutils.loads(f.read())
+    else:
+        trace = synthesize_trace(args)
+    if args.save_trace:
+        with open(args.save_trace, 'w') as f:
+            f.write(jsonutils.dumps(trace, indent=2))
+
+    results = run(ctxt, trace, instances_by_host)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(jsonutils.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = jsonutils.loads(f.read())
+        if not compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())